@@ -0,0 +1,513 @@
+-- Migration 008: optional partitioned layout for annotation-keyed tables
+-- Schema H — annotation / geometry / provenance / quality LIST-partitioned by set_id
+-- Mirror note: keep this file byte-identical with its corresponding add/migration pair.
+--
+-- Purpose:
+--   annotation and annotation_geometry are single heaps carrying ~10 indexes
+--   each, so every bulk model run pays index maintenance against the whole
+--   corpus, and removing a bad run means a huge DELETE (which migration 004
+--   forbids anyway).  This migration converts the four annotation-keyed tables
+--   into tables partitioned by set_id, one partition per annotation_set:
+--     annotation            -> annotation_p_<set hex>
+--     annotation_geometry   -> annotation_geometry_p_<set hex>
+--     annotation_provenance -> annotation_provenance_p_<set hex>
+--     annotation_quality    -> annotation_quality_p_<set hex>
+--   A run is written into fresh, small partitions; queries filtered on set_id
+--   prune to them; annotation_partition_detach(set_id) takes a whole run out
+--   of the live tables without touching other runs (the detached tables can
+--   be archived or dropped), and annotation_partition_attach(set_id) puts it
+--   back.
+--
+-- Context:
+--   - LIST on set_id rather than HASH(set_id) or RANGE(created_at): a hash
+--     partition mixes unrelated runs and a created_at range splits long runs,
+--     so neither lets one run be detached on its own.  The layout targets the
+--     run-sized sets this repo produces (tens to low thousands); planning cost
+--     grows with the partition count for queries that do not filter on set_id.
+--   - Partitioned tables cannot enforce uniqueness without the partition key,
+--     so keys become composite: annotation PRIMARY KEY (annotation_id, set_id),
+--     and geometry / provenance / quality gain a set_id column with a
+--     composite FK (annotation_id, set_id) -> annotation.  Writers must supply
+--     set_id on those child tables (scripts/annotations/writer.py does).
+--     annotation_id stays globally unique by construction (gen_random_uuid()).
+--   - annotation_supersession links annotations across sets and stays a plain
+--     table; its two FKs to annotation(annotation_id) are replaced by a
+--     statement-level reference check.
+--   - Every partition carries CHECK (set_id = <set>) so re-attaching a detached
+--     run does not rescan it, and inserting into annotation_set creates the
+--     run's four partitions (trg_annotation_set_create_partitions).
+--   - Existing non-constraint indexes, user triggers (provenance constraint
+--     trigger, forbid-delete, touch_updated_at, selection change log) and the
+--     views reading these tables are captured from the catalog before the swap
+--     and replayed verbatim afterwards, so later additions carry over.
+--
+-- Prerequisites:
+--   - Migrations 001-007
+--
+-- Safety:
+--   - Not idempotent: refuses to run when annotation is already partitioned.
+--   - Rewrites the four tables (copy into partitions) under ACCESS EXCLUSIVE
+--     locks in one transaction; schedule it like a maintenance window.
+--   - Creating an annotation_set now runs DDL (four CREATE TABLE ... PARTITION
+--     OF), which briefly locks the parents exclusively; it waits behind
+--     long-running readers such as export streams.
+--   - The ORM (models/annotation_models.py) keeps describing the base layout;
+--     use it for reads only once this layout is applied.
+--
+-- Rollback: see 008_annotation_partitioned_layout_rollback.sql
+-- Verification: see 008_annotation_partitioned_layout_verify.sql
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'annotation'::regclass
+    ) THEN
+        RAISE EXCEPTION 'migration 008: annotation is already partitioned';
+    END IF;
+END;
+$$;
+
+LOCK TABLE annotation, annotation_geometry, annotation_provenance,
+           annotation_quality, annotation_supersession
+    IN ACCESS EXCLUSIVE MODE;
+
+-- ============================================================================
+-- Capture dependent objects that must be replayed on the new tables
+-- ============================================================================
+-- Definitions are taken while the tables still carry their canonical names,
+-- so each captured statement targets the partitioned table after the swap.
+
+CREATE TEMP TABLE migration_008_replay (
+    ord        SERIAL PRIMARY KEY,
+    kind       TEXT NOT NULL,
+    obj_name   TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    obj_comment TEXT
+) ON COMMIT DROP;
+
+INSERT INTO migration_008_replay (kind, obj_name, definition, obj_comment)
+SELECT 'index', ic.relname, pg_get_indexdef(i.indexrelid), obj_description(i.indexrelid, 'pg_class')
+FROM pg_index i
+JOIN pg_class ic ON ic.oid = i.indexrelid
+WHERE i.indrelid IN ('annotation'::regclass, 'annotation_geometry'::regclass,
+                     'annotation_provenance'::regclass, 'annotation_quality'::regclass)
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+ORDER BY i.indrelid, ic.relname;
+
+INSERT INTO migration_008_replay (kind, obj_name, definition, obj_comment)
+SELECT 'trigger', t.tgname, pg_get_triggerdef(t.oid), NULL
+FROM pg_trigger t
+WHERE t.tgrelid IN ('annotation'::regclass, 'annotation_geometry'::regclass,
+                    'annotation_provenance'::regclass, 'annotation_quality'::regclass)
+  AND NOT t.tgisinternal
+ORDER BY t.tgrelid, t.tgname;
+
+INSERT INTO migration_008_replay (kind, obj_name, definition, obj_comment)
+SELECT DISTINCT 'view', v.oid::regclass::text, pg_get_viewdef(v.oid), obj_description(v.oid, 'pg_class')
+FROM pg_depend d
+JOIN pg_rewrite r ON r.oid = d.objid
+JOIN pg_class v ON v.oid = r.ev_class
+WHERE v.relkind = 'v'
+  AND d.refobjid IN ('annotation'::regclass, 'annotation_geometry'::regclass,
+                     'annotation_provenance'::regclass, 'annotation_quality'::regclass)
+ORDER BY 3;
+
+INSERT INTO migration_008_replay (kind, obj_name, definition, obj_comment)
+SELECT 'table', c.relname, c.relname, obj_description(c.oid, 'pg_class')
+FROM pg_class c
+WHERE c.oid IN ('annotation'::regclass, 'annotation_geometry'::regclass,
+                'annotation_provenance'::regclass, 'annotation_quality'::regclass);
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT obj_name FROM migration_008_replay WHERE kind = 'view' ORDER BY ord DESC LOOP
+        EXECUTE format('DROP VIEW %s', r.obj_name);
+    END LOOP;
+
+    FOR r IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'annotation_supersession'::regclass
+          AND contype = 'f'
+          AND confrelid = 'annotation'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE annotation_supersession DROP CONSTRAINT %I', r.conname);
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE annotation_quality    RENAME TO annotation_quality_unpartitioned;
+ALTER TABLE annotation_provenance RENAME TO annotation_provenance_unpartitioned;
+ALTER TABLE annotation_geometry   RENAME TO annotation_geometry_unpartitioned;
+ALTER TABLE annotation            RENAME TO annotation_unpartitioned;
+
+-- ============================================================================
+-- Partitioned parents
+-- ============================================================================
+-- Columns, defaults, CHECK constraints and column comments come from the
+-- current tables; keys, FKs and indexes are added after the data is copied.
+
+CREATE TABLE annotation (
+    LIKE annotation_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+) PARTITION BY LIST (set_id);
+
+CREATE TABLE annotation_geometry (
+    LIKE annotation_geometry_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS,
+    set_id UUID NOT NULL
+) PARTITION BY LIST (set_id);
+
+CREATE TABLE annotation_provenance (
+    LIKE annotation_provenance_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS,
+    set_id UUID NOT NULL
+) PARTITION BY LIST (set_id);
+
+CREATE TABLE annotation_quality (
+    LIKE annotation_quality_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS,
+    set_id UUID NOT NULL
+) PARTITION BY LIST (set_id);
+
+COMMENT ON COLUMN annotation_geometry.set_id   IS 'Partition key: annotation_set of the owning annotation (copied from annotation.set_id).';
+COMMENT ON COLUMN annotation_provenance.set_id IS 'Partition key: annotation_set of the owning annotation (copied from annotation.set_id).';
+COMMENT ON COLUMN annotation_quality.set_id    IS 'Partition key: annotation_set of the owning annotation (copied from annotation.set_id).';
+
+-- ============================================================================
+-- Partition management
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION annotation_partition_name(in_table TEXT, in_set_id UUID)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT in_table || '_p_' || replace(in_set_id::text, '-', '');
+$$;
+
+COMMENT ON FUNCTION annotation_partition_name(TEXT, UUID) IS
+    'Name of the set_id partition of an annotation-keyed table (Schema H).';
+
+-- Creates whichever of the set's four partitions do not exist yet; returns
+-- how many were created.  A detached partition still exists and is left alone.
+CREATE OR REPLACE FUNCTION annotation_partition_create(in_set_id UUID)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    parent TEXT;
+    part TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['annotation', 'annotation_geometry',
+                                  'annotation_provenance', 'annotation_quality']
+    LOOP
+        part := annotation_partition_name(parent, in_set_id);
+        CONTINUE WHEN to_regclass(part) IS NOT NULL;
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF %I '
+            '(CONSTRAINT chk_partition_set CHECK (set_id = %L::uuid)) '
+            'FOR VALUES IN (%L)',
+            part, parent, in_set_id, in_set_id
+        );
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_partition_create(UUID) IS
+    'Create the annotation/geometry/provenance/quality partitions for one annotation_set (Schema H).';
+
+-- Takes one run out of the live tables.  Child partitions go first and lose
+-- their FK to annotation (a detached table may not reference the parent), then
+-- the annotation partition itself.  The run's subjects are queued for the
+-- export selection refresh (migration 007).  Returns the detached annotation
+-- row count.
+CREATE OR REPLACE FUNCTION annotation_partition_detach(in_set_id UUID)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    child TEXT;
+    part TEXT;
+    fk RECORD;
+    detached BIGINT;
+BEGIN
+    part := annotation_partition_name('annotation', in_set_id);
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_inherits
+        WHERE inhparent = 'annotation'::regclass AND inhrelid = to_regclass(part)
+    ) THEN
+        RAISE EXCEPTION 'annotation_partition_detach: set % has no attached partition', in_set_id;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1
+        FROM annotation a
+        JOIN annotation_supersession s
+          ON a.annotation_id IN (s.superseded_annotation_id, s.replacement_annotation_id)
+        WHERE a.set_id = in_set_id
+    ) THEN
+        RAISE EXCEPTION
+            'annotation_partition_detach: set % is referenced by annotation_supersession',
+            in_set_id;
+    END IF;
+
+    INSERT INTO annotation_selection_change_log (subject_id)
+    SELECT DISTINCT subject_id FROM annotation WHERE set_id = in_set_id;
+
+    SELECT COUNT(*) INTO detached FROM annotation WHERE set_id = in_set_id;
+
+    FOREACH child IN ARRAY ARRAY['annotation_geometry', 'annotation_provenance', 'annotation_quality']
+    LOOP
+        part := annotation_partition_name(child, in_set_id);
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', child, part);
+        FOR fk IN
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = part::regclass
+              AND contype = 'f'
+              AND confrelid = 'annotation'::regclass
+        LOOP
+            EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', part, fk.conname);
+        END LOOP;
+    END LOOP;
+
+    EXECUTE format('ALTER TABLE annotation DETACH PARTITION %I',
+                   annotation_partition_name('annotation', in_set_id));
+    RETURN detached;
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_partition_detach(UUID) IS
+    'Detach one annotation_set''s partitions from annotation/geometry/provenance/quality (Schema H).';
+
+-- Puts a detached run back.  The CHECK (set_id = ...) constraint each
+-- partition carries lets ATTACH skip the partition-constraint scan; the child
+-- FKs to annotation are re-created and validated.  Returns the attached
+-- annotation row count.
+CREATE OR REPLACE FUNCTION annotation_partition_attach(in_set_id UUID)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    parent TEXT;
+    part TEXT;
+    attached BIGINT;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM annotation_set WHERE set_id = in_set_id) THEN
+        RAISE EXCEPTION 'annotation_partition_attach: annotation_set % does not exist', in_set_id;
+    END IF;
+
+    FOREACH parent IN ARRAY ARRAY['annotation', 'annotation_geometry',
+                                  'annotation_provenance', 'annotation_quality']
+    LOOP
+        part := annotation_partition_name(parent, in_set_id);
+        IF to_regclass(part) IS NULL THEN
+            RAISE EXCEPTION 'annotation_partition_attach: table % does not exist', part;
+        END IF;
+        CONTINUE WHEN EXISTS (
+            SELECT 1 FROM pg_inherits
+            WHERE inhparent = parent::regclass AND inhrelid = part::regclass
+        );
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES IN (%L)',
+                       parent, part, in_set_id);
+    END LOOP;
+
+    INSERT INTO annotation_selection_change_log (subject_id)
+    SELECT DISTINCT subject_id FROM annotation WHERE set_id = in_set_id;
+
+    SELECT COUNT(*) INTO attached FROM annotation WHERE set_id = in_set_id;
+    RETURN attached;
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_partition_attach(UUID) IS
+    'Re-attach one annotation_set''s detached partitions (Schema H).';
+
+DO $$
+BEGIN
+    PERFORM annotation_partition_create(set_id) FROM annotation_set;
+END;
+$$;
+
+-- ============================================================================
+-- Copy rows into their partitions and drop the old heaps
+-- ============================================================================
+-- Triggers are replayed only after the copy, so the provenance check and the
+-- selection change log do not fire for rows that already existed.
+
+INSERT INTO annotation
+SELECT * FROM annotation_unpartitioned;
+
+INSERT INTO annotation_geometry
+SELECT g.*, a.set_id
+FROM annotation_geometry_unpartitioned g
+JOIN annotation_unpartitioned a ON a.annotation_id = g.annotation_id;
+
+INSERT INTO annotation_provenance
+SELECT p.*, a.set_id
+FROM annotation_provenance_unpartitioned p
+JOIN annotation_unpartitioned a ON a.annotation_id = p.annotation_id;
+
+INSERT INTO annotation_quality
+SELECT q.*, a.set_id
+FROM annotation_quality_unpartitioned q
+JOIN annotation_unpartitioned a ON a.annotation_id = q.annotation_id;
+
+DROP TABLE annotation_quality_unpartitioned;
+DROP TABLE annotation_provenance_unpartitioned;
+DROP TABLE annotation_geometry_unpartitioned;
+DROP TABLE annotation_unpartitioned;
+
+-- ============================================================================
+-- Keys and foreign keys
+-- ============================================================================
+
+ALTER TABLE annotation
+    ADD CONSTRAINT annotation_pkey PRIMARY KEY (annotation_id, set_id),
+    ADD CONSTRAINT annotation_subject_id_fkey
+        FOREIGN KEY (subject_id) REFERENCES annotation_subject (subject_id),
+    ADD CONSTRAINT annotation_set_id_fkey
+        FOREIGN KEY (set_id) REFERENCES annotation_set (set_id);
+
+ALTER TABLE annotation_geometry
+    ADD CONSTRAINT annotation_geometry_pkey PRIMARY KEY (geometry_id, set_id),
+    ADD CONSTRAINT fk_geometry_annotation
+        FOREIGN KEY (annotation_id, set_id) REFERENCES annotation (annotation_id, set_id);
+
+ALTER TABLE annotation_provenance
+    ADD CONSTRAINT annotation_provenance_pkey PRIMARY KEY (provenance_id, set_id),
+    ADD CONSTRAINT uq_annotation_provenance_annotation UNIQUE (annotation_id, set_id),
+    ADD CONSTRAINT fk_provenance_annotation
+        FOREIGN KEY (annotation_id, set_id) REFERENCES annotation (annotation_id, set_id);
+
+ALTER TABLE annotation_quality
+    ADD CONSTRAINT annotation_quality_pkey PRIMARY KEY (quality_id, set_id),
+    ADD CONSTRAINT uq_annotation_quality_annotation UNIQUE (annotation_id, set_id),
+    ADD CONSTRAINT fk_quality_annotation
+        FOREIGN KEY (annotation_id, set_id) REFERENCES annotation (annotation_id, set_id);
+
+-- ============================================================================
+-- Replay indexes, triggers, views and table comments
+-- ============================================================================
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT * FROM migration_008_replay WHERE kind IN ('index', 'trigger') ORDER BY ord LOOP
+        EXECUTE r.definition;
+        IF r.obj_comment IS NOT NULL THEN
+            EXECUTE format('COMMENT ON INDEX %I IS %L', r.obj_name, r.obj_comment);
+        END IF;
+    END LOOP;
+
+    FOR r IN SELECT * FROM migration_008_replay WHERE kind = 'view' ORDER BY ord LOOP
+        EXECUTE format('CREATE VIEW %s AS %s', r.obj_name, r.definition);
+        IF r.obj_comment IS NOT NULL THEN
+            EXECUTE format('COMMENT ON VIEW %s IS %L', r.obj_name, r.obj_comment);
+        END IF;
+    END LOOP;
+
+    FOR r IN SELECT * FROM migration_008_replay WHERE kind = 'table' AND obj_comment IS NOT NULL LOOP
+        EXECUTE format('COMMENT ON TABLE %I IS %L', r.obj_name,
+                       r.obj_comment || ' Partitioned by set_id (Schema H).');
+    END LOOP;
+END;
+$$;
+
+-- ============================================================================
+-- Supersession references (replaces the FKs to annotation.annotation_id)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION enforce_supersession_annotation_refs()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    missing UUID;
+BEGIN
+    SELECT ref.annotation_id INTO missing
+    FROM (
+        SELECT superseded_annotation_id AS annotation_id FROM changed_rows
+        UNION
+        SELECT replacement_annotation_id FROM changed_rows
+    ) ref
+    WHERE NOT EXISTS (
+        SELECT 1 FROM annotation a WHERE a.annotation_id = ref.annotation_id
+    )
+    LIMIT 1;
+
+    IF missing IS NOT NULL THEN
+        RAISE EXCEPTION 'annotation_supersession references unknown annotation %', missing
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_supersession_annotation_refs_insert ON annotation_supersession;
+CREATE TRIGGER trg_supersession_annotation_refs_insert
+AFTER INSERT ON annotation_supersession
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION enforce_supersession_annotation_refs();
+
+DROP TRIGGER IF EXISTS trg_supersession_annotation_refs_update ON annotation_supersession;
+CREATE TRIGGER trg_supersession_annotation_refs_update
+AFTER UPDATE ON annotation_supersession
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION enforce_supersession_annotation_refs();
+
+-- ============================================================================
+-- New sets get their partitions on insert
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION annotation_set_create_partitions()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM annotation_partition_create(NEW.set_id);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_annotation_set_create_partitions ON annotation_set;
+CREATE TRIGGER trg_annotation_set_create_partitions
+AFTER INSERT ON annotation_set
+FOR EACH ROW EXECUTE FUNCTION annotation_set_create_partitions();
+
+-- ============================================================================
+-- Partition inventory
+-- ============================================================================
+
+CREATE OR REPLACE VIEW annotation_set_partition_v1 AS
+SELECT
+    s.set_id,
+    s.name,
+    s.source_kind,
+    s.source_name,
+    s.run_id,
+    annotation_partition_name('annotation', s.set_id) AS partition_name,
+    to_regclass(annotation_partition_name('annotation', s.set_id)) IS NOT NULL AS partition_exists,
+    EXISTS (
+        SELECT 1 FROM pg_inherits i
+        WHERE i.inhparent = 'annotation'::regclass
+          AND i.inhrelid = to_regclass(annotation_partition_name('annotation', s.set_id))
+    ) AS attached,
+    (
+        SELECT CASE WHEN c.reltuples >= 0 THEN c.reltuples::BIGINT END FROM pg_class c
+        WHERE c.oid = to_regclass(annotation_partition_name('annotation', s.set_id))
+    ) AS estimated_rows
+FROM annotation_set s;
+
+COMMENT ON VIEW annotation_set_partition_v1 IS
+    'Per-set annotation partition name, attach state and planner row estimate (Schema H).';
+
+ANALYZE annotation;
+ANALYZE annotation_geometry;
+ANALYZE annotation_provenance;
+ANALYZE annotation_quality;
+
+COMMIT;
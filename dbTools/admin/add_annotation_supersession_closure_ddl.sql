@@ -0,0 +1,292 @@
+-- Migration 011: maintained supersession closure and bulk terminal resolution
+-- Schema K — annotation_id -> terminal replacement, statement-level maintenance
+-- Mirror note: keep this file byte-identical with its corresponding add/migration pair.
+--
+-- Purpose:
+--   annotation_supersession stores one superseded -> replacement edge per row,
+--   so finding the current annotation at the end of a revision chain takes one
+--   self-join per revision.  The per-row trigger from migration 004 also runs
+--   one UPDATE per inserted edge, which dominates bulk re-labeling runs that
+--   insert millions of edges.  This migration adds:
+--     - annotation_supersession_closure: one row per superseded annotation with
+--       its terminal replacement (the end of its chain) and the chain length;
+--     - annotation_supersession_resolve(ids): any annotation_id -> terminal
+--       annotation_id in one primary-key lookup (unsuperseded ids map to
+--       themselves with depth 0);
+--     - trg_supersession_closure_insert: one statement-level trigger (transition
+--       table) that keeps the closure current, flips lifecycle_state to
+--       'superseded' for the whole statement in one UPDATE, and rejects cycles.
+--       It replaces the per-row trg_sync_lifecycle_on_supersession;
+--     - annotation_supersession_closure_rebuild(): recompute from the edges.
+--
+-- Context:
+--   uq_superseded_annotation gives every annotation at most one replacement,
+--   so the edges form chains that may merge (two annotations replaced by the
+--   same one) but never branch.  Closure maintenance walks backwards from the
+--   chain ends touched by a statement through idx_supersession_replacement:
+--     - the ends are the statement's replacement ids, or their old terminal
+--       when a replacement was itself already superseded, that are not
+--       superseded after the statement;
+--     - every annotation reached gets (terminal, depth) upserted, so older
+--       revisions whose terminal was just superseded move to the new terminal.
+--   Cost is proportional to the size of the touched chains, not to the number
+--   of statements, so one INSERT ... SELECT of a million edges fires the
+--   trigger once.
+--
+--   A chain that closes on itself has no end, so its edges are never reached
+--   by the backward walk: any inserted edge left without a closure row is part
+--   of (or leads into) a cycle and the statement fails.  The rebuild applies
+--   the same check to pre-existing edges, so applying this migration fails on
+--   a cyclic lineage instead of materializing it.
+--
+--   Maintenance takes a transaction-scoped advisory lock, so concurrent
+--   supersession writers are serialized until commit and always extend the
+--   committed closure (READ COMMITTED).
+--
+--   annotation_supersession edges are insert-only: deletes were already
+--   forbidden (migration 004); changing superseded_annotation_id or
+--   replacement_annotation_id on an existing edge is now rejected as well.
+--   reason / created_by stay updatable.
+--
+-- Prerequisites:
+--   - Migrations 001-005
+--   - Works on the base layout and on the set_id-partitioned layout (008).
+--
+-- Safety:
+--   - Idempotent: CREATE TABLE/INDEX IF NOT EXISTS, CREATE OR REPLACE FUNCTION,
+--     DROP TRIGGER IF EXISTS + CREATE TRIGGER; the closure is rebuilt in place.
+--   - Non-destructive: one new table; annotation_supersession rows unchanged.
+--   - Write overhead: one backward walk plus one lifecycle UPDATE per
+--     inserting statement instead of one UPDATE per inserted edge.
+--
+-- Rollback: see 011_annotation_supersession_closure_rollback.sql
+-- Verification: see 011_annotation_supersession_closure_verify.sql
+
+BEGIN;
+
+-- ============================================================================
+-- Closure table
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS annotation_supersession_closure (
+    annotation_id            UUID    NOT NULL,
+    terminal_annotation_id   UUID    NOT NULL,
+    depth                    INTEGER NOT NULL,
+
+    CONSTRAINT pk_annotation_supersession_closure PRIMARY KEY (annotation_id),
+    CONSTRAINT chk_supersession_closure_depth CHECK (depth >= 1),
+    CONSTRAINT chk_supersession_closure_distinct_ids CHECK (
+        annotation_id <> terminal_annotation_id
+    )
+);
+
+COMMENT ON TABLE annotation_supersession_closure IS
+    'Terminal replacement of every superseded annotation; maintained from annotation_supersession (Schema K).';
+COMMENT ON COLUMN annotation_supersession_closure.terminal_annotation_id IS
+    'Last annotation of the supersession chain starting at annotation_id (not itself superseded).';
+COMMENT ON COLUMN annotation_supersession_closure.depth IS
+    'Number of supersession edges between annotation_id and terminal_annotation_id.';
+
+CREATE INDEX IF NOT EXISTS idx_supersession_closure_terminal
+    ON annotation_supersession_closure (terminal_annotation_id);
+
+
+-- ============================================================================
+-- Resolution
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION annotation_supersession_resolve(in_annotation_ids UUID[])
+RETURNS TABLE (
+    annotation_id UUID,
+    terminal_annotation_id UUID,
+    depth INTEGER
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT ids.annotation_id,
+           COALESCE(c.terminal_annotation_id, ids.annotation_id),
+           COALESCE(c.depth, 0)
+    FROM unnest(in_annotation_ids) AS ids(annotation_id)
+    LEFT JOIN annotation_supersession_closure c
+      ON c.annotation_id = ids.annotation_id
+$$;
+
+COMMENT ON FUNCTION annotation_supersession_resolve(UUID[]) IS
+    'Map annotation_ids to the terminal replacement of their supersession chain; unsuperseded ids map to themselves (Schema K).';
+
+
+-- ============================================================================
+-- Statement-level maintenance
+-- ============================================================================
+-- new_edges is the transition table of the inserting statement.
+
+CREATE OR REPLACE FUNCTION maintain_annotation_supersession_closure()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    cyclic UUID;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('annotation_supersession_closure'));
+
+    UPDATE annotation a
+       SET lifecycle_state = 'superseded',
+           updated_at = NOW()
+      FROM (SELECT DISTINCT superseded_annotation_id FROM new_edges) n
+     WHERE a.annotation_id = n.superseded_annotation_id
+       AND a.lifecycle_state <> 'superseded';
+
+    WITH RECURSIVE chain_end AS (
+        SELECT DISTINCT e.node
+        FROM (
+            SELECT n.replacement_annotation_id AS node
+            FROM new_edges n
+            UNION
+            SELECT c.terminal_annotation_id
+            FROM new_edges n
+            JOIN annotation_supersession_closure c
+              ON c.annotation_id = n.replacement_annotation_id
+        ) e
+        WHERE NOT EXISTS (
+            SELECT 1 FROM annotation_supersession s
+            WHERE s.superseded_annotation_id = e.node
+        )
+    ), walk (annotation_id, terminal_annotation_id, depth) AS (
+        SELECT s.superseded_annotation_id, ce.node, 1
+        FROM chain_end ce
+        JOIN annotation_supersession s ON s.replacement_annotation_id = ce.node
+        UNION ALL
+        SELECT s.superseded_annotation_id, w.terminal_annotation_id, w.depth + 1
+        FROM walk w
+        JOIN annotation_supersession s ON s.replacement_annotation_id = w.annotation_id
+    )
+    INSERT INTO annotation_supersession_closure AS c (annotation_id, terminal_annotation_id, depth)
+    SELECT annotation_id, terminal_annotation_id, depth
+    FROM walk
+    ON CONFLICT (annotation_id) DO UPDATE
+       SET terminal_annotation_id = EXCLUDED.terminal_annotation_id,
+           depth = EXCLUDED.depth
+     WHERE (c.terminal_annotation_id, c.depth)
+           IS DISTINCT FROM (EXCLUDED.terminal_annotation_id, EXCLUDED.depth);
+
+    SELECT n.superseded_annotation_id INTO cyclic
+    FROM new_edges n
+    WHERE NOT EXISTS (
+        SELECT 1 FROM annotation_supersession_closure c
+        WHERE c.annotation_id = n.superseded_annotation_id
+    )
+    LIMIT 1;
+
+    IF cyclic IS NOT NULL THEN
+        RAISE EXCEPTION 'annotation_supersession cycle through annotation %', cyclic
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION forbid_supersession_edge_update()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changed UUID;
+BEGIN
+    SELECT n.supersession_id INTO changed
+    FROM new_edges n
+    WHERE NOT EXISTS (
+        SELECT 1 FROM old_edges o
+        WHERE o.supersession_id = n.supersession_id
+          AND o.superseded_annotation_id = n.superseded_annotation_id
+          AND o.replacement_annotation_id = n.replacement_annotation_id
+    )
+    LIMIT 1;
+
+    IF changed IS NOT NULL THEN
+        RAISE EXCEPTION 'annotation_supersession edges are insert-only (supersession %)', changed
+            USING ERRCODE = 'check_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_sync_lifecycle_on_supersession ON annotation_supersession;
+
+DROP TRIGGER IF EXISTS trg_supersession_closure_insert ON annotation_supersession;
+CREATE TRIGGER trg_supersession_closure_insert
+AFTER INSERT ON annotation_supersession
+REFERENCING NEW TABLE AS new_edges
+FOR EACH STATEMENT EXECUTE FUNCTION maintain_annotation_supersession_closure();
+
+DROP TRIGGER IF EXISTS trg_supersession_edge_update ON annotation_supersession;
+CREATE TRIGGER trg_supersession_edge_update
+AFTER UPDATE ON annotation_supersession
+REFERENCING OLD TABLE AS old_edges NEW TABLE AS new_edges
+FOR EACH STATEMENT EXECUTE FUNCTION forbid_supersession_edge_update();
+
+
+-- ============================================================================
+-- Rebuild
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION annotation_supersession_closure_rebuild()
+RETURNS TABLE (
+    edges BIGINT,
+    closure_rows BIGINT,
+    max_depth INTEGER
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    cyclic UUID;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('annotation_supersession_closure'));
+
+    DELETE FROM annotation_supersession_closure;
+
+    WITH RECURSIVE walk (annotation_id, terminal_annotation_id, depth) AS (
+        SELECT s.superseded_annotation_id, s.replacement_annotation_id, 1
+        FROM annotation_supersession s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM annotation_supersession t
+            WHERE t.superseded_annotation_id = s.replacement_annotation_id
+        )
+        UNION ALL
+        SELECT s.superseded_annotation_id, w.terminal_annotation_id, w.depth + 1
+        FROM walk w
+        JOIN annotation_supersession s ON s.replacement_annotation_id = w.annotation_id
+    )
+    INSERT INTO annotation_supersession_closure (annotation_id, terminal_annotation_id, depth)
+    SELECT annotation_id, terminal_annotation_id, depth
+    FROM walk;
+
+    SELECT s.superseded_annotation_id INTO cyclic
+    FROM annotation_supersession s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM annotation_supersession_closure c
+        WHERE c.annotation_id = s.superseded_annotation_id
+    )
+    LIMIT 1;
+
+    IF cyclic IS NOT NULL THEN
+        RAISE EXCEPTION 'annotation_supersession cycle through annotation %', cyclic
+            USING ERRCODE = 'check_violation';
+    END IF;
+
+    RETURN QUERY
+    SELECT (SELECT COUNT(*) FROM annotation_supersession),
+           COUNT(*),
+           COALESCE(MAX(c.depth), 0)
+    FROM annotation_supersession_closure c;
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_supersession_closure_rebuild() IS
+    'Recompute annotation_supersession_closure from the edges; fails on a cyclic lineage; returns edge/row counts and the longest chain (Schema K).';
+
+SELECT * FROM annotation_supersession_closure_rebuild();
+
+ANALYZE annotation_supersession_closure;
+
+COMMIT;
@@ -0,0 +1,97 @@
+-- DDL for in-database pHash near-duplicate search on media.phash_64
+-- Requires add_media_catalog_ddl.sql (media table) and PostgreSQL >= 14 (bit_count).
+--
+-- The 64-bit pHash is split into four 16-bit bands, each covered by a partial
+-- expression index. Two hashes within Hamming distance k agree to within
+-- floor(k / 4) bits on at least one band (pigeonhole), so candidate rows are
+-- found by band-equality probes and then verified with bit_count(a # b).
+--   k <= 3 : one exact probe per band (4 index probes per query hash)
+--   k <= 7 : the band value plus its 16 one-bit neighbours (68 probes)
+-- Larger k is rejected; use scripts/phash_index.py for wide-radius scans.
+
+-- Band expression indexes. The expressions must match media_phash_candidates()
+-- exactly for the planner to use them.
+CREATE INDEX IF NOT EXISTS idx_media_phash_band0
+    ON media (((phash_64 & 65535)::integer)) WHERE phash_64 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_media_phash_band1
+    ON media ((((phash_64 >> 16) & 65535)::integer)) WHERE phash_64 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_media_phash_band2
+    ON media ((((phash_64 >> 32) & 65535)::integer)) WHERE phash_64 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_media_phash_band3
+    ON media ((((phash_64 >> 48) & 65535)::integer)) WHERE phash_64 IS NOT NULL;
+
+-- Candidate search: one row per (query hash, media row) pair within max_distance.
+-- query_idx is the 1-based position of the hash in query_hashes.
+CREATE OR REPLACE FUNCTION media_phash_candidates(
+    query_hashes BIGINT[],
+    max_distance INTEGER DEFAULT 6,
+    exclude_dataset TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    query_idx INTEGER,
+    query_hash BIGINT,
+    media_id BIGINT,
+    hamming_distance INTEGER
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+    IF max_distance IS NULL OR max_distance < 0 OR max_distance > 7 THEN
+        RAISE EXCEPTION 'media_phash_candidates: max_distance must be between 0 and 7 (got %)', max_distance;
+    END IF;
+
+    RETURN QUERY
+    WITH q AS (
+        SELECT u.ord::integer AS q_idx, u.h AS q_hash
+        FROM unnest(query_hashes) WITH ORDINALITY AS u(h, ord)
+        WHERE u.h IS NOT NULL
+    ),
+    flips AS (
+        SELECT 0 AS mask
+        UNION ALL
+        SELECT 1 << b FROM generate_series(0, 15) AS b WHERE max_distance >= 4
+    ),
+    probes AS (
+        SELECT
+            q.q_idx,
+            q.q_hash,
+            ((q.q_hash & 65535)::integer # f.mask)         AS p0,
+            (((q.q_hash >> 16) & 65535)::integer # f.mask) AS p1,
+            (((q.q_hash >> 32) & 65535)::integer # f.mask) AS p2,
+            (((q.q_hash >> 48) & 65535)::integer # f.mask) AS p3
+        FROM q CROSS JOIN flips f
+    ),
+    cand AS (
+        SELECT p.q_idx, p.q_hash, m.media_id, m.phash_64, m.dataset
+        FROM probes p
+        JOIN media m ON (m.phash_64 & 65535)::integer = p.p0
+        WHERE m.phash_64 IS NOT NULL
+        UNION
+        SELECT p.q_idx, p.q_hash, m.media_id, m.phash_64, m.dataset
+        FROM probes p
+        JOIN media m ON ((m.phash_64 >> 16) & 65535)::integer = p.p1
+        WHERE m.phash_64 IS NOT NULL
+        UNION
+        SELECT p.q_idx, p.q_hash, m.media_id, m.phash_64, m.dataset
+        FROM probes p
+        JOIN media m ON ((m.phash_64 >> 32) & 65535)::integer = p.p2
+        WHERE m.phash_64 IS NOT NULL
+        UNION
+        SELECT p.q_idx, p.q_hash, m.media_id, m.phash_64, m.dataset
+        FROM probes p
+        JOIN media m ON ((m.phash_64 >> 48) & 65535)::integer = p.p3
+        WHERE m.phash_64 IS NOT NULL
+    )
+    SELECT c.q_idx, c.q_hash, c.media_id, bit_count((c.q_hash # c.phash_64)::bit(64))::integer
+    FROM cand c
+    WHERE (exclude_dataset IS NULL OR c.dataset <> exclude_dataset)
+      AND bit_count((c.q_hash # c.phash_64)::bit(64)) <= max_distance
+    ORDER BY c.q_idx, 4, c.media_id;
+END;
+$$;
+
+COMMENT ON FUNCTION media_phash_candidates(BIGINT[], INTEGER, TEXT) IS
+    'pHash near-duplicate candidates from media within Hamming distance max_distance (0-7), via band-equality index probes + bit_count verification.';
+
+GRANT EXECUTE ON FUNCTION media_phash_candidates(BIGINT[], INTEGER, TEXT) TO PUBLIC;
@@ -0,0 +1,54 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+DB_CONTAINER="${DB_CONTAINER:-ibridaDB}"
+DB_USER="${DB_USER:-postgres}"
+DB_NAME="${DB_NAME:-ibrida-v0}"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+psql_exec() {
+  docker exec -i "${DB_CONTAINER}" psql -U "${DB_USER}" -d "${DB_NAME}" "$@"
+}
+
+echo "==> Applying media pHash search DDL to ${DB_NAME}"
+
+HAS_MEDIA="$(psql_exec -Atqc "SELECT to_regclass('public.media') IS NOT NULL;")"
+if [[ "${HAS_MEDIA}" != "t" ]]; then
+  echo "ERROR: media table not found; run apply_media_catalog_ddl.sh first." >&2
+  exit 1
+fi
+
+SERVER_VERSION_NUM="$(psql_exec -Atqc "SHOW server_version_num;")"
+if [[ "${SERVER_VERSION_NUM}" -lt 140000 ]]; then
+  echo "ERROR: bit_count() requires PostgreSQL 14+ (server_version_num=${SERVER_VERSION_NUM})." >&2
+  exit 1
+fi
+
+psql_exec -v ON_ERROR_STOP=1 < "${SCRIPT_DIR}/add_media_phash_search_ddl.sql"
+
+echo "==> DDL applied successfully"
+
+echo "==> Verifying band indexes"
+psql_exec -c "
+SELECT indexname
+FROM pg_indexes
+WHERE schemaname = 'public'
+  AND tablename = 'media'
+  AND indexname LIKE 'idx_media_phash_band%'
+ORDER BY indexname;
+"
+
+echo "==> Testing media_phash_candidates()"
+psql_exec -v ON_ERROR_STOP=1 -c "
+BEGIN;
+INSERT INTO media (dataset, release, uri, sha256_hex, phash_64)
+VALUES ('test', 'r0', 'file:///tmp/phash_test.jpg', repeat('0', 64), 81985529216486895);
+
+-- Same hash with three bits flipped (one per band 0..2) must match at k=3.
+SELECT query_idx, media_id, hamming_distance
+FROM media_phash_candidates(ARRAY[81985529216486895 # 4295032833]::bigint[], 3)
+WHERE media_id = (SELECT media_id FROM media WHERE uri = 'file:///tmp/phash_test.jpg');
+ROLLBACK;
+"
+
+echo "==> Media pHash search setup complete"
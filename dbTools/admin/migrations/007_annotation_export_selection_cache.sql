@@ -0,0 +1,481 @@
+-- Migration 007: incrementally maintained annotation export selection
+-- Schema G — materialized global selector winners + subject change log
+-- Mirror note: keep this file byte-identical with its corresponding add/migration pair.
+--
+-- Purpose:
+--   annotation_export_select_v1 re-ranks the whole active annotation corpus on
+--   every call (active selection x provenance x quality x trusted selection,
+--   then row_number() per (subject_id, label)).  Exports that only need the
+--   current global winners should not pay that cost each time.
+--
+--   This migration materializes the global (in_set_ids IS NULL) selection per
+--   registered (policy_name, policy_version) into annotation_export_selection
+--   and keeps it current incrementally:
+--     - statement-level triggers with transition tables append the affected
+--       subject_ids to annotation_selection_change_log whenever annotation,
+--       annotation_provenance, annotation_quality or annotation_supersession
+--       rows are inserted/updated;
+--     - annotation_export_selection_refresh() consumes the log and re-ranks
+--       only the touched subjects for every registered policy;
+--     - annotation_export_selection_rebuild(policy, version) (re)builds one
+--       policy from scratch and registers it for incremental maintenance.
+--
+-- Context:
+--   Ranking a subset of subjects uses annotation_export_select_subjects_v1(),
+--   which carries the same candidate filter and ORDER BY as
+--   annotation_export_select_v1 (migration 006) plus a subject_id filter.  The
+--   verification script checks that both agree.  Set-scoped selections
+--   (non-NULL in_set_ids) rank within the requested sets and are not cached;
+--   callers keep using annotation_export_select_v1 for those.
+--
+--   The change log is append-only (no uniqueness on subject_id) so a change
+--   committed while a refresh is running is never lost: its log row only
+--   becomes visible after commit and is picked up by the next refresh.
+--
+-- Prerequisites:
+--   - Migrations 001-006
+--
+-- Safety:
+--   - Idempotent: CREATE TABLE/INDEX IF NOT EXISTS, CREATE OR REPLACE FUNCTION,
+--     DROP TRIGGER IF EXISTS + CREATE TRIGGER.
+--   - Non-destructive: only new tables, functions and triggers.
+--   - Write overhead: one INSERT ... SELECT DISTINCT per writing statement,
+--     independent of how many rows the statement touched.
+--
+-- Rollback: see 007_annotation_export_selection_cache_rollback.sql
+-- Verification: see 007_annotation_export_selection_cache_verify.sql
+
+BEGIN;
+
+-- ============================================================================
+-- Registry of materialized policies
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS annotation_export_selection_policy (
+    policy_name        VARCHAR(64) NOT NULL,
+    policy_version     INTEGER     NOT NULL,
+    needs_rebuild      BOOLEAN     NOT NULL DEFAULT FALSE,
+    rebuilt_at         TIMESTAMPTZ,
+    refreshed_at       TIMESTAMPTZ,
+
+    CONSTRAINT pk_annotation_export_selection_policy PRIMARY KEY (policy_name, policy_version),
+    CONSTRAINT fk_annotation_export_selection_policy FOREIGN KEY (policy_name, policy_version)
+        REFERENCES annotation_export_policy (policy_name, policy_version)
+);
+
+COMMENT ON TABLE annotation_export_selection_policy IS
+    'Export policies whose global selection is materialized in annotation_export_selection.';
+COMMENT ON COLUMN annotation_export_selection_policy.needs_rebuild IS
+    'Set when the policy row itself changes; the next refresh rebuilds the policy from scratch.';
+
+
+-- ============================================================================
+-- Materialized winners
+-- ============================================================================
+-- Same columns as annotation_export_select_v1, one row per
+-- (policy, subject_id, label).
+
+CREATE TABLE IF NOT EXISTS annotation_export_selection (
+    policy_name        VARCHAR(64)      NOT NULL,
+    policy_version     INTEGER          NOT NULL,
+    strategy           VARCHAR(32)      NOT NULL,
+    subject_id         UUID             NOT NULL,
+    label              VARCHAR(255)     NOT NULL,
+    annotation_id      UUID             NOT NULL,
+    source_kind        VARCHAR(32)      NOT NULL,
+    trust_rank         INTEGER          NOT NULL,
+    confidence_score   DOUBLE PRECISION,
+    review_status      VARCHAR(32)      NOT NULL,
+    conflict_flag      BOOLEAN          NOT NULL,
+    source_priority    INTEGER          NOT NULL,
+    selected_at        TIMESTAMPTZ      NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT pk_annotation_export_selection
+        PRIMARY KEY (policy_name, policy_version, subject_id, label),
+    CONSTRAINT fk_export_selection_registry FOREIGN KEY (policy_name, policy_version)
+        REFERENCES annotation_export_selection_policy (policy_name, policy_version)
+);
+
+COMMENT ON TABLE annotation_export_selection IS
+    'Materialized global annotation_export_select_v1 winners per registered policy; maintained by annotation_export_selection_refresh().';
+
+CREATE INDEX IF NOT EXISTS idx_export_selection_subject
+    ON annotation_export_selection (subject_id);
+
+CREATE INDEX IF NOT EXISTS idx_export_selection_annotation
+    ON annotation_export_selection (annotation_id);
+
+
+-- ============================================================================
+-- Subject change log
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS annotation_selection_change_log (
+    change_id          BIGSERIAL   PRIMARY KEY,
+    subject_id         UUID        NOT NULL,
+    logged_at          TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE annotation_selection_change_log IS
+    'Append-only queue of subjects whose export selection may have changed; consumed by annotation_export_selection_refresh().';
+
+
+-- ============================================================================
+-- Change-log triggers (statement level, transition tables)
+-- ============================================================================
+-- Transition tables cannot be shared across events, so each event gets its
+-- own trigger.  The functions only read NEW TABLE, which is present for both
+-- INSERT and UPDATE triggers.
+
+CREATE OR REPLACE FUNCTION log_annotation_selection_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO annotation_selection_change_log (subject_id)
+    SELECT DISTINCT n.subject_id FROM changed_rows n;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION log_annotation_child_selection_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO annotation_selection_change_log (subject_id)
+    SELECT DISTINCT a.subject_id
+    FROM changed_rows n
+    JOIN annotation a ON a.annotation_id = n.annotation_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION log_supersession_selection_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO annotation_selection_change_log (subject_id)
+    SELECT DISTINCT a.subject_id
+    FROM changed_rows n
+    JOIN annotation a
+      ON a.annotation_id IN (n.superseded_annotation_id, n.replacement_annotation_id);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_annotation_selection_log_insert ON annotation;
+CREATE TRIGGER trg_annotation_selection_log_insert
+AFTER INSERT ON annotation
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION log_annotation_selection_change();
+
+DROP TRIGGER IF EXISTS trg_annotation_selection_log_update ON annotation;
+CREATE TRIGGER trg_annotation_selection_log_update
+AFTER UPDATE ON annotation
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION log_annotation_selection_change();
+
+DROP TRIGGER IF EXISTS trg_provenance_selection_log_insert ON annotation_provenance;
+CREATE TRIGGER trg_provenance_selection_log_insert
+AFTER INSERT ON annotation_provenance
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION log_annotation_child_selection_change();
+
+DROP TRIGGER IF EXISTS trg_provenance_selection_log_update ON annotation_provenance;
+CREATE TRIGGER trg_provenance_selection_log_update
+AFTER UPDATE ON annotation_provenance
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION log_annotation_child_selection_change();
+
+DROP TRIGGER IF EXISTS trg_quality_selection_log_insert ON annotation_quality;
+CREATE TRIGGER trg_quality_selection_log_insert
+AFTER INSERT ON annotation_quality
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION log_annotation_child_selection_change();
+
+DROP TRIGGER IF EXISTS trg_quality_selection_log_update ON annotation_quality;
+CREATE TRIGGER trg_quality_selection_log_update
+AFTER UPDATE ON annotation_quality
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION log_annotation_child_selection_change();
+
+DROP TRIGGER IF EXISTS trg_supersession_selection_log_insert ON annotation_supersession;
+CREATE TRIGGER trg_supersession_selection_log_insert
+AFTER INSERT ON annotation_supersession
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION log_supersession_selection_change();
+
+
+-- A changed policy row invalidates its whole materialization.
+CREATE OR REPLACE FUNCTION flag_export_policy_rebuild()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE annotation_export_selection_policy sp
+       SET needs_rebuild = TRUE
+      FROM changed_rows n
+     WHERE sp.policy_name = n.policy_name
+       AND sp.policy_version = n.policy_version;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_export_policy_flag_rebuild ON annotation_export_policy;
+CREATE TRIGGER trg_export_policy_flag_rebuild
+AFTER UPDATE ON annotation_export_policy
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION flag_export_policy_rebuild();
+
+
+-- ============================================================================
+-- Subject-scoped selector
+-- ============================================================================
+-- annotation_export_select_v1 restricted to in_subject_ids.  Keep the
+-- candidate filter and ranking in sync with migration 006.
+
+CREATE OR REPLACE FUNCTION annotation_export_select_subjects_v1(
+    in_policy_name VARCHAR,
+    in_policy_version INTEGER,
+    in_subject_ids UUID[]
+)
+RETURNS TABLE (
+    policy_name VARCHAR,
+    policy_version INTEGER,
+    strategy VARCHAR,
+    subject_id UUID,
+    label VARCHAR,
+    annotation_id UUID,
+    source_kind VARCHAR,
+    trust_rank INTEGER,
+    confidence_score DOUBLE PRECISION,
+    review_status VARCHAR,
+    conflict_flag BOOLEAN,
+    source_priority INTEGER
+)
+LANGUAGE sql
+STABLE
+AS $$
+WITH selected_policy AS (
+    SELECT
+        p.policy_name,
+        p.policy_version,
+        p.strategy,
+        p.min_trust_rank,
+        p.allowed_source_kinds,
+        p.include_conflict
+    FROM annotation_export_policy p
+    WHERE p.policy_name = in_policy_name
+      AND p.policy_version = in_policy_version
+),
+candidates AS (
+    SELECT
+        policy.policy_name,
+        policy.policy_version,
+        policy.strategy,
+        a.subject_id,
+        a.label,
+        a.annotation_id,
+        prov.source_kind,
+        COALESCE(ts.trust_rank, 0) AS trust_rank,
+        q.confidence_score,
+        COALESCE(q.review_status, 'unreviewed') AS review_status,
+        COALESCE(q.conflict_flag, FALSE) AS conflict_flag,
+        CASE
+            WHEN policy.strategy = 'human_first' THEN
+                CASE prov.source_kind
+                    WHEN 'human' THEN 0
+                    WHEN 'imported_dataset' THEN 1
+                    WHEN 'model' THEN 2
+                    ELSE 9
+                END
+            WHEN policy.strategy = 'model_first' THEN
+                CASE prov.source_kind
+                    WHEN 'model' THEN 0
+                    WHEN 'human' THEN 1
+                    WHEN 'imported_dataset' THEN 2
+                    ELSE 9
+                END
+            ELSE
+                CASE prov.source_kind
+                    WHEN 'human' THEN 0
+                    WHEN 'model' THEN 1
+                    WHEN 'imported_dataset' THEN 2
+                    ELSE 9
+                END
+        END AS source_priority
+    FROM annotation_active_selection_v1 a
+    JOIN annotation_provenance prov
+      ON prov.annotation_id = a.annotation_id
+    LEFT JOIN annotation_quality q
+      ON q.annotation_id = a.annotation_id
+    LEFT JOIN annotation_trusted_selection_v1 ts
+      ON ts.annotation_id = a.annotation_id
+    CROSS JOIN selected_policy policy
+    WHERE prov.source_kind = ANY(policy.allowed_source_kinds)
+      AND COALESCE(ts.trust_rank, 0) >= policy.min_trust_rank
+      AND (policy.include_conflict OR COALESCE(q.conflict_flag, FALSE) = FALSE)
+      AND COALESCE(q.review_status, 'unreviewed') <> 'rejected'
+      AND a.subject_id = ANY(in_subject_ids)
+),
+ranked AS (
+    SELECT
+        c.*,
+        row_number() OVER (
+            PARTITION BY c.subject_id, c.label
+            ORDER BY
+                c.source_priority ASC,
+                c.trust_rank DESC,
+                c.confidence_score DESC NULLS LAST,
+                c.annotation_id ASC
+        ) AS rn
+    FROM candidates c
+)
+SELECT
+    policy_name,
+    policy_version,
+    strategy,
+    subject_id,
+    label,
+    annotation_id,
+    source_kind,
+    trust_rank,
+    confidence_score,
+    review_status,
+    conflict_flag,
+    source_priority
+FROM ranked
+WHERE rn = 1
+ORDER BY subject_id, label, annotation_id;
+$$;
+
+COMMENT ON FUNCTION annotation_export_select_subjects_v1(VARCHAR, INTEGER, UUID[]) IS
+    'annotation_export_select_v1 ranking restricted to the given subject_ids; used for incremental selection refresh.';
+
+
+-- ============================================================================
+-- Rebuild / refresh
+-- ============================================================================
+-- Both take the same transaction-scoped advisory lock so a rebuild and a
+-- refresh (or two refreshes) never interleave on the same cache rows.
+
+CREATE OR REPLACE FUNCTION annotation_export_selection_rebuild(
+    in_policy_name VARCHAR,
+    in_policy_version INTEGER
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    inserted INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('annotation_export_selection'));
+
+    INSERT INTO annotation_export_selection_policy (policy_name, policy_version)
+    VALUES (in_policy_name, in_policy_version)
+    ON CONFLICT (policy_name, policy_version) DO NOTHING;
+
+    DELETE FROM annotation_export_selection
+     WHERE policy_name = in_policy_name
+       AND policy_version = in_policy_version;
+
+    INSERT INTO annotation_export_selection (
+        policy_name, policy_version, strategy, subject_id, label, annotation_id,
+        source_kind, trust_rank, confidence_score, review_status, conflict_flag,
+        source_priority
+    )
+    SELECT
+        s.policy_name, s.policy_version, s.strategy, s.subject_id, s.label, s.annotation_id,
+        s.source_kind, s.trust_rank, s.confidence_score, s.review_status, s.conflict_flag,
+        s.source_priority
+    FROM annotation_export_select_v1(in_policy_name, in_policy_version) s;
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+
+    UPDATE annotation_export_selection_policy
+       SET needs_rebuild = FALSE,
+           rebuilt_at = NOW(),
+           refreshed_at = NOW()
+     WHERE policy_name = in_policy_name
+       AND policy_version = in_policy_version;
+
+    RETURN inserted;
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_export_selection_rebuild(VARCHAR, INTEGER) IS
+    'Register a policy for materialized selection and rebuild its rows from annotation_export_select_v1; returns rows written.';
+
+CREATE OR REPLACE FUNCTION annotation_export_selection_refresh(
+    in_max_changes INTEGER DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    dirty_subjects UUID[];
+    policy RECORD;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('annotation_export_selection'));
+
+    -- Policies whose definition changed are rebuilt wholesale.
+    FOR policy IN
+        SELECT sp.policy_name, sp.policy_version
+        FROM annotation_export_selection_policy sp
+        WHERE sp.needs_rebuild
+    LOOP
+        PERFORM annotation_export_selection_rebuild(policy.policy_name, policy.policy_version);
+    END LOOP;
+
+    -- Consume the oldest committed change-log rows.
+    WITH claimed AS (
+        DELETE FROM annotation_selection_change_log l
+         WHERE l.change_id IN (
+            SELECT c.change_id
+            FROM annotation_selection_change_log c
+            ORDER BY c.change_id
+            LIMIT in_max_changes
+         )
+        RETURNING l.subject_id
+    )
+    SELECT array_agg(DISTINCT claimed.subject_id) INTO dirty_subjects FROM claimed;
+
+    IF dirty_subjects IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    DELETE FROM annotation_export_selection sel
+     USING annotation_export_selection_policy sp
+     WHERE sel.policy_name = sp.policy_name
+       AND sel.policy_version = sp.policy_version
+       AND sel.subject_id = ANY(dirty_subjects);
+
+    FOR policy IN
+        SELECT sp.policy_name, sp.policy_version
+        FROM annotation_export_selection_policy sp
+    LOOP
+        INSERT INTO annotation_export_selection (
+            policy_name, policy_version, strategy, subject_id, label, annotation_id,
+            source_kind, trust_rank, confidence_score, review_status, conflict_flag,
+            source_priority
+        )
+        SELECT
+            s.policy_name, s.policy_version, s.strategy, s.subject_id, s.label, s.annotation_id,
+            s.source_kind, s.trust_rank, s.confidence_score, s.review_status, s.conflict_flag,
+            s.source_priority
+        FROM annotation_export_select_subjects_v1(
+            policy.policy_name, policy.policy_version, dirty_subjects
+        ) s;
+    END LOOP;
+
+    UPDATE annotation_export_selection_policy SET refreshed_at = NOW();
+
+    RETURN cardinality(dirty_subjects);
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_export_selection_refresh(INTEGER) IS
+    'Consume annotation_selection_change_log (optionally at most in_max_changes rows) and re-rank the touched subjects for every materialized policy; returns subjects refreshed.';
+
+COMMIT;
@@ -0,0 +1,29 @@
+-- Rollback for Migration 007 (Schema G)
+-- Drops the materialized export selection, its change log, triggers and
+-- maintenance functions.  annotation_export_select_v1 is untouched, so callers
+-- reading the cache table must switch back to the function first.
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS trg_export_policy_flag_rebuild ON annotation_export_policy;
+DROP TRIGGER IF EXISTS trg_supersession_selection_log_insert ON annotation_supersession;
+DROP TRIGGER IF EXISTS trg_quality_selection_log_update ON annotation_quality;
+DROP TRIGGER IF EXISTS trg_quality_selection_log_insert ON annotation_quality;
+DROP TRIGGER IF EXISTS trg_provenance_selection_log_update ON annotation_provenance;
+DROP TRIGGER IF EXISTS trg_provenance_selection_log_insert ON annotation_provenance;
+DROP TRIGGER IF EXISTS trg_annotation_selection_log_update ON annotation;
+DROP TRIGGER IF EXISTS trg_annotation_selection_log_insert ON annotation;
+
+DROP FUNCTION IF EXISTS annotation_export_selection_refresh(INTEGER);
+DROP FUNCTION IF EXISTS annotation_export_selection_rebuild(VARCHAR, INTEGER);
+DROP FUNCTION IF EXISTS annotation_export_select_subjects_v1(VARCHAR, INTEGER, UUID[]);
+DROP FUNCTION IF EXISTS flag_export_policy_rebuild();
+DROP FUNCTION IF EXISTS log_supersession_selection_change();
+DROP FUNCTION IF EXISTS log_annotation_child_selection_change();
+DROP FUNCTION IF EXISTS log_annotation_selection_change();
+
+DROP TABLE IF EXISTS annotation_selection_change_log;
+DROP TABLE IF EXISTS annotation_export_selection;
+DROP TABLE IF EXISTS annotation_export_selection_policy;
+
+COMMIT;
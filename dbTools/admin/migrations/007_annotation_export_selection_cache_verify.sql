@@ -0,0 +1,227 @@
+-- Verification script for Migration 007 (Schema G)
+--
+-- Purpose:
+--   Validate the incrementally maintained export selection:
+--     - annotation_export_selection_rebuild() materializes exactly the global
+--       annotation_export_select_v1 output for a policy,
+--     - writes to annotation / provenance / quality / supersession append the
+--       touched subject to annotation_selection_change_log,
+--     - annotation_export_selection_refresh() consumes the log and the cache
+--       matches the live selector again after each kind of change,
+--     - updating a policy row flags it for rebuild and refresh clears the flag.
+--
+-- Usage:
+--   psql -U postgres -d <db_name> -f dbTools/admin/migrations/007_annotation_export_selection_cache_verify.sql
+--
+-- Safety:
+--   Runs in a transaction and ends with ROLLBACK.
+
+BEGIN;
+
+-- Helper: cache and live selector must agree for human_first/1.
+CREATE OR REPLACE FUNCTION pg_temp.verify_007_assert_in_sync(step TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    mismatches BIGINT;
+BEGIN
+    SELECT COUNT(*) INTO mismatches
+    FROM (
+        (
+            SELECT subject_id, label, annotation_id
+            FROM annotation_export_select_v1('human_first', 1)
+            EXCEPT
+            SELECT subject_id, label, annotation_id
+            FROM annotation_export_selection
+            WHERE policy_name = 'human_first' AND policy_version = 1
+        )
+        UNION ALL
+        (
+            SELECT subject_id, label, annotation_id
+            FROM annotation_export_selection
+            WHERE policy_name = 'human_first' AND policy_version = 1
+            EXCEPT
+            SELECT subject_id, label, annotation_id
+            FROM annotation_export_select_v1('human_first', 1)
+        )
+    ) diff;
+
+    IF mismatches <> 0 THEN
+        RAISE EXCEPTION '% : cache differs from annotation_export_select_v1 by % rows', step, mismatches;
+    END IF;
+    RAISE NOTICE 'OK: % : cache matches live selector', step;
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 1. Rebuild registers the policy and reproduces the live selector.
+-- ---------------------------------------------------------------------------
+SELECT annotation_export_selection_rebuild('human_first', 1);
+SELECT pg_temp.verify_007_assert_in_sync('rebuild');
+
+-- ---------------------------------------------------------------------------
+-- 2. Seed one subject with two human annotations for the same label.
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_set (set_id, dataset, release, source_kind, source_name, source_version, run_id)
+VALUES ('aaaaaaaa-0007-4007-8007-000000000001', 'verify', 'r2', 'human',
+        'schema-g-verify', 'v1', 'verify-run-007');
+
+INSERT INTO annotation_subject (subject_id, asset_uuid, asset_width_px, asset_height_px)
+VALUES ('bbbbbbbb-0007-4007-8007-000000000001',
+        'cccccccc-0007-4007-8007-000000000001', 1024, 768);
+
+INSERT INTO annotation (annotation_id, subject_id, set_id, label, score, source_annotation_key)
+VALUES
+    ('dddddddd-0007-4007-8007-000000000001',
+     'bbbbbbbb-0007-4007-8007-000000000001',
+     'aaaaaaaa-0007-4007-8007-000000000001',
+     'schema_g_probe', 0.40, 'g-probe-low'),
+    ('dddddddd-0007-4007-8007-000000000002',
+     'bbbbbbbb-0007-4007-8007-000000000001',
+     'aaaaaaaa-0007-4007-8007-000000000001',
+     'schema_g_probe', 0.90, 'g-probe-high');
+
+INSERT INTO annotation_provenance (annotation_id, source_kind, source_name, source_version, operator_identity)
+VALUES
+    ('dddddddd-0007-4007-8007-000000000001', 'human', 'schema-g-verify', 'v1',
+     'verify.operator@example.org'),
+    ('dddddddd-0007-4007-8007-000000000002', 'human', 'schema-g-verify', 'v1',
+     'verify.operator@example.org');
+
+INSERT INTO annotation_quality (annotation_id, review_status, confidence_score, adjudicated_by, adjudicated_at)
+VALUES
+    ('dddddddd-0007-4007-8007-000000000001', 'accepted', 0.40, 'verify.lead@example.org', NOW()),
+    ('dddddddd-0007-4007-8007-000000000002', 'accepted', 0.90, 'verify.lead@example.org', NOW());
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM annotation_selection_change_log
+        WHERE subject_id = 'bbbbbbbb-0007-4007-8007-000000000001'
+    ) THEN
+        RAISE EXCEPTION 'annotation inserts did not append to annotation_selection_change_log';
+    END IF;
+    RAISE NOTICE 'OK: inserts logged the touched subject';
+END;
+$$;
+
+SELECT annotation_export_selection_refresh();
+SELECT pg_temp.verify_007_assert_in_sync('after inserts');
+
+DO $$
+DECLARE
+    winner UUID;
+BEGIN
+    IF EXISTS (SELECT 1 FROM annotation_selection_change_log) THEN
+        RAISE EXCEPTION 'refresh left change-log rows behind';
+    END IF;
+
+    SELECT annotation_id INTO winner
+    FROM annotation_export_selection
+    WHERE policy_name = 'human_first' AND policy_version = 1
+      AND subject_id = 'bbbbbbbb-0007-4007-8007-000000000001'
+      AND label = 'schema_g_probe';
+
+    IF winner IS DISTINCT FROM 'dddddddd-0007-4007-8007-000000000002' THEN
+        RAISE EXCEPTION 'expected high-confidence winner, got %', winner;
+    END IF;
+    RAISE NOTICE 'OK: refresh materialized the high-confidence winner';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 3. Rejecting the winner (quality UPDATE) moves selection to the other row.
+-- ---------------------------------------------------------------------------
+UPDATE annotation_quality
+   SET review_status = 'rejected'
+ WHERE annotation_id = 'dddddddd-0007-4007-8007-000000000002';
+
+SELECT annotation_export_selection_refresh();
+SELECT pg_temp.verify_007_assert_in_sync('after quality update');
+
+DO $$
+DECLARE
+    winner UUID;
+BEGIN
+    SELECT annotation_id INTO winner
+    FROM annotation_export_selection
+    WHERE policy_name = 'human_first' AND policy_version = 1
+      AND subject_id = 'bbbbbbbb-0007-4007-8007-000000000001'
+      AND label = 'schema_g_probe';
+
+    IF winner IS DISTINCT FROM 'dddddddd-0007-4007-8007-000000000001' THEN
+        RAISE EXCEPTION 'expected fallback winner after rejection, got %', winner;
+    END IF;
+    RAISE NOTICE 'OK: quality update re-ranked the subject';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 4. Superseding the remaining candidate leaves no winner for the label.
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_supersession (superseded_annotation_id, replacement_annotation_id, reason, created_by)
+VALUES ('dddddddd-0007-4007-8007-000000000001',
+        'dddddddd-0007-4007-8007-000000000002',
+        'schema-g supersession verification', 'schema-g-verify');
+
+SELECT annotation_export_selection_refresh();
+SELECT pg_temp.verify_007_assert_in_sync('after supersession');
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM annotation_export_selection
+        WHERE subject_id = 'bbbbbbbb-0007-4007-8007-000000000001'
+          AND label = 'schema_g_probe'
+    ) THEN
+        RAISE EXCEPTION 'superseded annotation still materialized';
+    END IF;
+    RAISE NOTICE 'OK: supersession removed the materialized winner';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 5. Updating a policy flags it for rebuild; refresh clears the flag.
+-- ---------------------------------------------------------------------------
+UPDATE annotation_export_policy
+   SET notes = COALESCE(notes, '{}'::jsonb) || '{"verify":"schema-g"}'::jsonb
+ WHERE policy_name = 'human_first' AND policy_version = 1;
+
+DO $$
+BEGIN
+    IF NOT (
+        SELECT needs_rebuild FROM annotation_export_selection_policy
+        WHERE policy_name = 'human_first' AND policy_version = 1
+    ) THEN
+        RAISE EXCEPTION 'policy update did not flag needs_rebuild';
+    END IF;
+END;
+$$;
+
+SELECT annotation_export_selection_refresh();
+
+DO $$
+BEGIN
+    IF (
+        SELECT needs_rebuild FROM annotation_export_selection_policy
+        WHERE policy_name = 'human_first' AND policy_version = 1
+    ) THEN
+        RAISE EXCEPTION 'refresh did not rebuild the flagged policy';
+    END IF;
+    RAISE NOTICE 'OK: policy update triggers a rebuild on the next refresh';
+END;
+$$;
+
+SELECT pg_temp.verify_007_assert_in_sync('after policy rebuild');
+
+-- ---------------------------------------------------------------------------
+-- Summary output.
+-- ---------------------------------------------------------------------------
+SELECT policy_name, policy_version, needs_rebuild,
+       (SELECT COUNT(*) FROM annotation_export_selection s
+         WHERE s.policy_name = p.policy_name AND s.policy_version = p.policy_version) AS selected_rows
+FROM annotation_export_selection_policy p
+ORDER BY policy_name, policy_version;
+
+ROLLBACK;
@@ -0,0 +1,209 @@
+-- Rollback for Migration 008 (Schema H)
+-- Folds the set_id partitions back into plain annotation / annotation_geometry /
+-- annotation_provenance / annotation_quality heaps with their pre-008 keys and
+-- FKs (including annotation_supersession -> annotation), replays indexes,
+-- triggers and dependent views, and drops the partition management functions.
+--
+-- Refuses to run while any run is detached: re-attach it with
+-- annotation_partition_attach(set_id) or drop its tables first, otherwise its
+-- rows would silently stay behind in orphaned tables.
+
+BEGIN;
+
+DO $$
+DECLARE
+    orphan TEXT;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'annotation'::regclass
+    ) THEN
+        RAISE EXCEPTION 'rollback 008: annotation is not partitioned';
+    END IF;
+
+    SELECT c.relname INTO orphan
+    FROM pg_class c
+    WHERE c.relkind = 'r'
+      AND c.relname ~ '^annotation(_geometry|_provenance|_quality)?_p_[0-9a-f]{32}$'
+      AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+    LIMIT 1;
+    IF orphan IS NOT NULL THEN
+        RAISE EXCEPTION 'rollback 008: detached partition % exists; attach or drop it first', orphan;
+    END IF;
+END;
+$$;
+
+LOCK TABLE annotation, annotation_geometry, annotation_provenance,
+           annotation_quality, annotation_supersession
+    IN ACCESS EXCLUSIVE MODE;
+
+DROP VIEW IF EXISTS annotation_set_partition_v1;
+DROP TRIGGER IF EXISTS trg_annotation_set_create_partitions ON annotation_set;
+DROP TRIGGER IF EXISTS trg_supersession_annotation_refs_update ON annotation_supersession;
+DROP TRIGGER IF EXISTS trg_supersession_annotation_refs_insert ON annotation_supersession;
+DROP FUNCTION IF EXISTS annotation_set_create_partitions();
+DROP FUNCTION IF EXISTS enforce_supersession_annotation_refs();
+
+CREATE TEMP TABLE rollback_008_replay (
+    ord        SERIAL PRIMARY KEY,
+    kind       TEXT NOT NULL,
+    obj_name   TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    obj_comment TEXT
+) ON COMMIT DROP;
+
+INSERT INTO rollback_008_replay (kind, obj_name, definition, obj_comment)
+SELECT 'index', ic.relname, replace(pg_get_indexdef(i.indexrelid), ' ON ONLY ', ' ON '),
+       obj_description(i.indexrelid, 'pg_class')
+FROM pg_index i
+JOIN pg_class ic ON ic.oid = i.indexrelid
+WHERE i.indrelid IN ('annotation'::regclass, 'annotation_geometry'::regclass,
+                     'annotation_provenance'::regclass, 'annotation_quality'::regclass)
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+ORDER BY i.indrelid, ic.relname;
+
+INSERT INTO rollback_008_replay (kind, obj_name, definition, obj_comment)
+SELECT 'trigger', t.tgname, pg_get_triggerdef(t.oid), NULL
+FROM pg_trigger t
+WHERE t.tgrelid IN ('annotation'::regclass, 'annotation_geometry'::regclass,
+                    'annotation_provenance'::regclass, 'annotation_quality'::regclass)
+  AND NOT t.tgisinternal
+ORDER BY t.tgrelid, t.tgname;
+
+INSERT INTO rollback_008_replay (kind, obj_name, definition, obj_comment)
+SELECT DISTINCT 'view', v.oid::regclass::text, pg_get_viewdef(v.oid), obj_description(v.oid, 'pg_class')
+FROM pg_depend d
+JOIN pg_rewrite r ON r.oid = d.objid
+JOIN pg_class v ON v.oid = r.ev_class
+WHERE v.relkind = 'v'
+  AND d.refobjid IN ('annotation'::regclass, 'annotation_geometry'::regclass,
+                     'annotation_provenance'::regclass, 'annotation_quality'::regclass)
+ORDER BY 3;
+
+INSERT INTO rollback_008_replay (kind, obj_name, definition, obj_comment)
+SELECT 'table', c.relname, c.relname,
+       replace(obj_description(c.oid, 'pg_class'), ' Partitioned by set_id (Schema H).', '')
+FROM pg_class c
+WHERE c.oid IN ('annotation'::regclass, 'annotation_geometry'::regclass,
+                'annotation_provenance'::regclass, 'annotation_quality'::regclass);
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT obj_name FROM rollback_008_replay WHERE kind = 'view' ORDER BY ord DESC LOOP
+        EXECUTE format('DROP VIEW %s', r.obj_name);
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE annotation_quality    RENAME TO annotation_quality_partitioned;
+ALTER TABLE annotation_provenance RENAME TO annotation_provenance_partitioned;
+ALTER TABLE annotation_geometry   RENAME TO annotation_geometry_partitioned;
+ALTER TABLE annotation            RENAME TO annotation_partitioned;
+
+CREATE TABLE annotation (
+    LIKE annotation_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+);
+CREATE TABLE annotation_geometry (
+    LIKE annotation_geometry_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+);
+CREATE TABLE annotation_provenance (
+    LIKE annotation_provenance_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+);
+CREATE TABLE annotation_quality (
+    LIKE annotation_quality_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+);
+
+ALTER TABLE annotation_geometry   DROP COLUMN set_id;
+ALTER TABLE annotation_provenance DROP COLUMN set_id;
+ALTER TABLE annotation_quality    DROP COLUMN set_id;
+
+-- Child tables no longer carry set_id, so copy by the plain table's columns.
+DO $$
+DECLARE
+    target TEXT;
+    cols TEXT;
+BEGIN
+    INSERT INTO annotation SELECT * FROM annotation_partitioned;
+
+    FOREACH target IN ARRAY ARRAY['annotation_geometry', 'annotation_provenance', 'annotation_quality']
+    LOOP
+        SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO cols
+        FROM pg_attribute
+        WHERE attrelid = target::regclass AND attnum > 0 AND NOT attisdropped;
+        EXECUTE format('INSERT INTO %I (%s) SELECT %s FROM %I',
+                       target, cols, cols, target || '_partitioned');
+    END LOOP;
+END;
+$$;
+
+DROP TABLE annotation_quality_partitioned;
+DROP TABLE annotation_provenance_partitioned;
+DROP TABLE annotation_geometry_partitioned;
+DROP TABLE annotation_partitioned;
+
+ALTER TABLE annotation
+    ADD CONSTRAINT annotation_pkey PRIMARY KEY (annotation_id),
+    ADD CONSTRAINT annotation_subject_id_fkey
+        FOREIGN KEY (subject_id) REFERENCES annotation_subject (subject_id),
+    ADD CONSTRAINT annotation_set_id_fkey
+        FOREIGN KEY (set_id) REFERENCES annotation_set (set_id);
+
+ALTER TABLE annotation_geometry
+    ADD CONSTRAINT annotation_geometry_pkey PRIMARY KEY (geometry_id),
+    ADD CONSTRAINT annotation_geometry_annotation_id_fkey
+        FOREIGN KEY (annotation_id) REFERENCES annotation (annotation_id);
+
+ALTER TABLE annotation_provenance
+    ADD CONSTRAINT annotation_provenance_pkey PRIMARY KEY (provenance_id),
+    ADD CONSTRAINT uq_annotation_provenance_annotation UNIQUE (annotation_id),
+    ADD CONSTRAINT annotation_provenance_annotation_id_fkey
+        FOREIGN KEY (annotation_id) REFERENCES annotation (annotation_id);
+
+ALTER TABLE annotation_quality
+    ADD CONSTRAINT annotation_quality_pkey PRIMARY KEY (quality_id),
+    ADD CONSTRAINT uq_annotation_quality_annotation UNIQUE (annotation_id),
+    ADD CONSTRAINT annotation_quality_annotation_id_fkey
+        FOREIGN KEY (annotation_id) REFERENCES annotation (annotation_id);
+
+ALTER TABLE annotation_supersession
+    ADD CONSTRAINT annotation_supersession_superseded_annotation_id_fkey
+        FOREIGN KEY (superseded_annotation_id) REFERENCES annotation (annotation_id),
+    ADD CONSTRAINT annotation_supersession_replacement_annotation_id_fkey
+        FOREIGN KEY (replacement_annotation_id) REFERENCES annotation (annotation_id);
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT * FROM rollback_008_replay WHERE kind IN ('index', 'trigger') ORDER BY ord LOOP
+        EXECUTE r.definition;
+        IF r.obj_comment IS NOT NULL THEN
+            EXECUTE format('COMMENT ON INDEX %I IS %L', r.obj_name, r.obj_comment);
+        END IF;
+    END LOOP;
+
+    FOR r IN SELECT * FROM rollback_008_replay WHERE kind = 'view' ORDER BY ord LOOP
+        EXECUTE format('CREATE VIEW %s AS %s', r.obj_name, r.definition);
+        IF r.obj_comment IS NOT NULL THEN
+            EXECUTE format('COMMENT ON VIEW %s IS %L', r.obj_name, r.obj_comment);
+        END IF;
+    END LOOP;
+
+    FOR r IN SELECT * FROM rollback_008_replay WHERE kind = 'table' AND obj_comment IS NOT NULL LOOP
+        EXECUTE format('COMMENT ON TABLE %I IS %L', r.obj_name, r.obj_comment);
+    END LOOP;
+END;
+$$;
+
+DROP FUNCTION IF EXISTS annotation_partition_attach(UUID);
+DROP FUNCTION IF EXISTS annotation_partition_detach(UUID);
+DROP FUNCTION IF EXISTS annotation_partition_create(UUID);
+DROP FUNCTION IF EXISTS annotation_partition_name(TEXT, UUID);
+
+ANALYZE annotation;
+ANALYZE annotation_geometry;
+ANALYZE annotation_provenance;
+ANALYZE annotation_quality;
+
+COMMIT;
@@ -0,0 +1,250 @@
+-- Verification script for Migration 008 (Schema H)
+--
+-- Purpose:
+--   Validate the set_id-partitioned layout:
+--     - annotation, annotation_geometry, annotation_provenance and
+--       annotation_quality are LIST-partitioned on set_id,
+--     - inserting an annotation_set creates its four partitions and rows are
+--       routed to them,
+--     - a set_id filter prunes scans to that set's partition,
+--     - annotation_supersession still rejects unknown annotation ids,
+--     - annotation_partition_detach() removes a run from the live tables (and
+--       queues its subjects for the export selection refresh), and
+--       annotation_partition_attach() restores it,
+--     - lineage delete guards still apply to partitions.
+--
+-- Usage:
+--   psql -U postgres -d <db_name> -f dbTools/admin/migrations/008_annotation_partitioned_layout_verify.sql
+--
+-- Safety:
+--   Runs in a transaction and ends with ROLLBACK.
+
+BEGIN;
+
+-- ---------------------------------------------------------------------------
+-- 1. Parents are partitioned by LIST (set_id).
+-- ---------------------------------------------------------------------------
+DO $$
+DECLARE
+    parent TEXT;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['annotation', 'annotation_geometry',
+                                  'annotation_provenance', 'annotation_quality']
+    LOOP
+        IF NOT EXISTS (
+            SELECT 1
+            FROM pg_partitioned_table pt
+            JOIN pg_attribute att
+              ON att.attrelid = pt.partrelid AND att.attnum = pt.partattrs[0]
+            WHERE pt.partrelid = parent::regclass
+              AND pt.partstrat = 'l'
+              AND att.attname = 'set_id'
+        ) THEN
+            RAISE EXCEPTION '% is not LIST-partitioned on set_id', parent;
+        END IF;
+    END LOOP;
+    RAISE NOTICE 'OK: annotation-keyed tables are LIST-partitioned on set_id';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 2. New sets get partitions; rows are routed to them.
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_set (set_id, name, source_kind, source_name, source_version, model_id, config_hash, run_id)
+VALUES
+    ('a0000000-0000-0000-0000-000000000008', 'verify-008-model', 'model', 'verify-008', '1', 'verify-model',
+     repeat('b', 64), 'verify-008-run-a'),
+    ('b0000000-0000-0000-0000-000000000008', 'verify-008-import', 'imported_dataset', 'verify-008', '1', NULL,
+     NULL, 'verify-008-run-b');
+
+INSERT INTO annotation_subject (subject_id, asset_uuid, asset_width_px, asset_height_px)
+VALUES ('c0000000-0000-0000-0000-000000000008', 'd0000000-0000-0000-0000-000000000008', 640, 480);
+
+INSERT INTO annotation (annotation_id, subject_id, set_id, label, score)
+VALUES
+    ('e1000000-0000-0000-0000-000000000008', 'c0000000-0000-0000-0000-000000000008',
+     'a0000000-0000-0000-0000-000000000008', 'verify-bee', 0.9),
+    ('e2000000-0000-0000-0000-000000000008', 'c0000000-0000-0000-0000-000000000008',
+     'b0000000-0000-0000-0000-000000000008', 'verify-bee', NULL);
+
+INSERT INTO annotation_provenance (annotation_id, set_id, source_kind, source_name, source_version, model_id, config_hash, run_id)
+VALUES
+    ('e1000000-0000-0000-0000-000000000008', 'a0000000-0000-0000-0000-000000000008',
+     'model', 'verify-008', '1', 'verify-model', repeat('b', 64), 'verify-008-run-a'),
+    ('e2000000-0000-0000-0000-000000000008', 'b0000000-0000-0000-0000-000000000008',
+     'imported_dataset', 'verify-008', '1', NULL, NULL, 'verify-008-run-b');
+
+INSERT INTO annotation_geometry (annotation_id, set_id, geometry_kind, bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max)
+VALUES ('e1000000-0000-0000-0000-000000000008', 'a0000000-0000-0000-0000-000000000008',
+        'bbox', 0.1, 0.1, 0.4, 0.5);
+
+INSERT INTO annotation_quality (annotation_id, set_id, review_status, confidence_score)
+VALUES ('e1000000-0000-0000-0000-000000000008', 'a0000000-0000-0000-0000-000000000008',
+        'unreviewed', 0.9);
+
+-- Fire the deferred provenance checks now: DETACH/ATTACH below refuse to run
+-- while the tables have pending trigger events.
+SET CONSTRAINTS ALL IMMEDIATE;
+SET CONSTRAINTS ALL DEFERRED;
+
+DO $$
+DECLARE
+    routed TEXT;
+BEGIN
+    SELECT tableoid::regclass::text INTO routed
+    FROM annotation_geometry
+    WHERE annotation_id = 'e1000000-0000-0000-0000-000000000008';
+    IF routed <> annotation_partition_name('annotation_geometry', 'a0000000-0000-0000-0000-000000000008') THEN
+        RAISE EXCEPTION 'geometry row routed to %, expected the set partition', routed;
+    END IF;
+
+    IF (SELECT COUNT(*) FROM annotation_set_partition_v1
+        WHERE set_id IN ('a0000000-0000-0000-0000-000000000008', 'b0000000-0000-0000-0000-000000000008')
+          AND attached) <> 2 THEN
+        RAISE EXCEPTION 'annotation_set insert did not create attached partitions';
+    END IF;
+    RAISE NOTICE 'OK: set insert created partitions and rows are routed by set_id';
+END;
+$$;
+
+DO $$
+BEGIN
+    BEGIN
+        INSERT INTO annotation_geometry (annotation_id, set_id, geometry_kind, point_x, point_y)
+        VALUES ('e1000000-0000-0000-0000-000000000008', 'b0000000-0000-0000-0000-000000000008',
+                'point', 0.2, 0.2);
+        RAISE EXCEPTION 'geometry with a mismatched set_id was accepted';
+    EXCEPTION WHEN foreign_key_violation THEN
+        RAISE NOTICE 'OK: composite FK rejects child rows whose set_id disagrees with the annotation';
+    END;
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 3. A set_id filter prunes to one partition.
+-- ---------------------------------------------------------------------------
+DO $$
+DECLARE
+    plan_line TEXT;
+    scanned INTEGER := 0;
+BEGIN
+    FOR plan_line IN
+        EXECUTE 'EXPLAIN SELECT * FROM annotation WHERE set_id = '
+             || quote_literal('a0000000-0000-0000-0000-000000000008') || '::uuid'
+    LOOP
+        IF plan_line ~ 'annotation_p_' THEN
+            scanned := scanned + 1;
+        END IF;
+        IF plan_line ~ 'annotation_p_' AND plan_line !~ 'a0000000000000000000000000000008' THEN
+            RAISE EXCEPTION 'set_id filter scanned another partition: %', plan_line;
+        END IF;
+    END LOOP;
+    IF scanned = 0 THEN
+        RAISE EXCEPTION 'set_id filter plan did not reference the set partition';
+    END IF;
+    RAISE NOTICE 'OK: set_id filter prunes to the set partition';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 4. Supersession references are still checked.
+-- ---------------------------------------------------------------------------
+DO $$
+BEGIN
+    BEGIN
+        INSERT INTO annotation_supersession (superseded_annotation_id, replacement_annotation_id, reason)
+        VALUES ('e1000000-0000-0000-0000-000000000008', 'f0000000-0000-0000-0000-000000000008', 'verify-008');
+        RAISE EXCEPTION 'supersession to an unknown annotation was accepted';
+    EXCEPTION WHEN foreign_key_violation THEN
+        RAISE NOTICE 'OK: supersession rejects unknown annotation ids';
+    END;
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 5. Detach and re-attach a run.
+-- ---------------------------------------------------------------------------
+DO $$
+DECLARE
+    detached BIGINT;
+    attached BIGINT;
+    log_before BIGINT;
+BEGIN
+    SELECT COUNT(*) INTO log_before
+    FROM annotation_selection_change_log
+    WHERE subject_id = 'c0000000-0000-0000-0000-000000000008';
+
+    detached := annotation_partition_detach('a0000000-0000-0000-0000-000000000008');
+    IF detached <> 1 THEN
+        RAISE EXCEPTION 'detach reported % annotation rows, expected 1', detached;
+    END IF;
+    IF EXISTS (SELECT 1 FROM annotation WHERE set_id = 'a0000000-0000-0000-0000-000000000008')
+       OR EXISTS (SELECT 1 FROM annotation_geometry WHERE set_id = 'a0000000-0000-0000-0000-000000000008') THEN
+        RAISE EXCEPTION 'detached run is still visible through the parents';
+    END IF;
+    IF to_regclass(annotation_partition_name('annotation', 'a0000000-0000-0000-0000-000000000008')) IS NULL THEN
+        RAISE EXCEPTION 'detached annotation partition no longer exists';
+    END IF;
+    IF (SELECT COUNT(*) FROM annotation_selection_change_log
+        WHERE subject_id = 'c0000000-0000-0000-0000-000000000008') <= log_before THEN
+        RAISE EXCEPTION 'detach did not queue the run subjects for selection refresh';
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM annotation WHERE set_id = 'b0000000-0000-0000-0000-000000000008') THEN
+        RAISE EXCEPTION 'detaching one run affected another';
+    END IF;
+    RAISE NOTICE 'OK: detach removes exactly one run from the live tables';
+
+    attached := annotation_partition_attach('a0000000-0000-0000-0000-000000000008');
+    IF attached <> 1
+       OR NOT EXISTS (SELECT 1 FROM annotation_geometry WHERE set_id = 'a0000000-0000-0000-0000-000000000008')
+       OR NOT EXISTS (SELECT 1 FROM annotation_quality WHERE set_id = 'a0000000-0000-0000-0000-000000000008') THEN
+        RAISE EXCEPTION 'attach did not restore the run';
+    END IF;
+    RAISE NOTICE 'OK: attach restores the run with its child rows';
+END;
+$$;
+
+DO $$
+BEGIN
+    INSERT INTO annotation (annotation_id, subject_id, set_id, label, score)
+    VALUES ('e3000000-0000-0000-0000-000000000008', 'c0000000-0000-0000-0000-000000000008',
+            'a0000000-0000-0000-0000-000000000008', 'verify-wasp', 0.7);
+    INSERT INTO annotation_supersession (superseded_annotation_id, replacement_annotation_id, reason)
+    VALUES ('e2000000-0000-0000-0000-000000000008', 'e3000000-0000-0000-0000-000000000008', 'verify-008');
+
+    BEGIN
+        PERFORM annotation_partition_detach('a0000000-0000-0000-0000-000000000008');
+        RAISE EXCEPTION 'detach of a run referenced by supersession succeeded';
+    EXCEPTION WHEN raise_exception THEN
+        IF SQLERRM NOT LIKE '%referenced by annotation_supersession%' THEN
+            RAISE;
+        END IF;
+        RAISE NOTICE 'OK: runs referenced by supersession cannot be detached';
+    END;
+END;
+$$;
+
+INSERT INTO annotation_provenance (annotation_id, set_id, source_kind, source_name, source_version, model_id, config_hash, run_id)
+VALUES ('e3000000-0000-0000-0000-000000000008', 'a0000000-0000-0000-0000-000000000008',
+        'model', 'verify-008', '1', 'verify-model', repeat('b', 64), 'verify-008-run-a');
+
+-- ---------------------------------------------------------------------------
+-- 6. Delete guards reach the partitions.
+-- ---------------------------------------------------------------------------
+DO $$
+BEGIN
+    BEGIN
+        DELETE FROM annotation_geometry WHERE set_id = 'a0000000-0000-0000-0000-000000000008';
+        RAISE EXCEPTION 'delete on annotation_geometry partition succeeded';
+    EXCEPTION WHEN raise_exception THEN
+        IF SQLERRM NOT LIKE 'Deletes are forbidden%' THEN
+            RAISE;
+        END IF;
+        RAISE NOTICE 'OK: lineage delete guard fires on partitions';
+    END;
+END;
+$$;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+
+ROLLBACK;
@@ -0,0 +1,335 @@
+-- Migration 009: packed binary polygon / mask payloads
+-- Schema I — bytea polygon_packed + mask_rle_packed on annotation_geometry
+-- Mirror note: keep this file byte-identical with its corresponding add/migration pair.
+--
+-- Purpose:
+--   polygon_vertices and mask_rle are JSONB.  A vertex ring or RLE count list
+--   stored as JSONB spends ~10-20 bytes per number (numeric header, JEntry,
+--   container overhead) and every consumer pays a full JSON parse to get the
+--   numbers back.  This migration adds compact binary columns and moves
+--   packable payloads into them:
+--     - polygon_packed  BYTEA: 0x01 format byte, then big-endian int32 (x, y)
+--       pairs in fixed point, 2^30 units per normalized coordinate (8 bytes
+--       per vertex, quantization step ~9.3e-10).
+--     - mask_rle_packed BYTEA: 0x01 format byte, a value-width byte (1, 2, 4
+--       or 8: the fewest bytes that hold the largest value), then height,
+--       width and the COCO uncompressed RLE counts as big-endian unsigned
+--       integers of that width (2 bytes per run while all values < 65536).
+--   scripts/annotations/codec.py reads and writes the same layout and decodes
+--   straight into NumPy arrays; fixed-width values make the RLE decode a
+--   single np.frombuffer.
+--
+-- Context:
+--   Writers are unchanged: a BEFORE INSERT/UPDATE trigger packs any incoming
+--   polygon_vertices / mask_rle and clears the JSONB column.  Payloads that do
+--   not fit the packed formats stay JSONB untouched:
+--     - polygons whose vertices are not exactly [x, y] number pairs, or have a
+--       coordinate outside (-2, 2);
+--     - RLE objects with keys beyond counts/size, COCO compressed string
+--       counts, or non-integer/negative counts.
+--   Exactly one of the JSONB and packed column is populated per payload.
+--   annotation_geometry_json_v1 exposes the decoded JSONB for SQL consumers
+--   that still want polygon_vertices / mask_rle.
+--
+--   Existing rows are converted in place by one UPDATE.  The old JSONB
+--   versions become dead tuples: run VACUUM (ANALYZE) annotation_geometry
+--   afterwards (VACUUM FULL / pg_repack to return the space to the OS).
+--
+-- Prerequisites:
+--   - Migrations 001-004 (annotation_geometry)
+--   - Works on the base layout and on the set_id-partitioned layout (008);
+--     under 008 every run must be attached (a detached geometry partition
+--     would miss the new columns and could not be re-attached).
+--
+-- Safety:
+--   - Idempotent: ADD COLUMN IF NOT EXISTS, CREATE OR REPLACE FUNCTION/VIEW,
+--     constraints and trigger dropped before re-creation.
+--   - Rewrites every polygon/mask geometry row once (row locks only).
+--   - Payload values are preserved except polygon coordinates, which are
+--     rounded to the 2^-30 fixed-point grid.
+--
+-- Rollback: see 009_annotation_geometry_packed_payloads_rollback.sql
+-- Verification: see 009_annotation_geometry_packed_payloads_verify.sql
+
+BEGIN;
+
+DO $$
+DECLARE
+    orphan TEXT;
+BEGIN
+    SELECT c.relname INTO orphan
+    FROM pg_class c
+    WHERE c.relkind = 'r'
+      AND c.relname ~ '^annotation_geometry_p_[0-9a-f]{32}$'
+      AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+    LIMIT 1;
+    IF orphan IS NOT NULL THEN
+        RAISE EXCEPTION 'migration 009: detached partition % exists; attach or drop it first', orphan;
+    END IF;
+END;
+$$;
+
+-- ============================================================================
+-- Codec functions (mirrored by scripts/annotations/codec.py)
+-- ============================================================================
+
+-- [[x, y], ...] -> 0x01 || int4send(round(x * 2^30)) || int4send(round(y * 2^30)) ...
+-- NULL when the value is not a non-empty array of [number, number] pairs
+-- inside the int32 fixed-point range.
+CREATE OR REPLACE FUNCTION annotation_polygon_pack(in_vertices JSONB)
+RETURNS BYTEA
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+    WITH vertex AS (
+        SELECT e.ord,
+               CASE WHEN jsonb_typeof(e.v) = 'array'
+                     AND jsonb_array_length(e.v) = 2
+                     AND jsonb_typeof(e.v -> 0) = 'number'
+                     AND jsonb_typeof(e.v -> 1) = 'number'
+                    THEN round((e.v ->> 0)::double precision * 1073741824) END AS qx,
+               CASE WHEN jsonb_typeof(e.v) = 'array'
+                     AND jsonb_array_length(e.v) = 2
+                     AND jsonb_typeof(e.v -> 0) = 'number'
+                     AND jsonb_typeof(e.v -> 1) = 'number'
+                    THEN round((e.v ->> 1)::double precision * 1073741824) END AS qy
+        FROM jsonb_array_elements(
+                 CASE WHEN jsonb_typeof(in_vertices) = 'array' THEN in_vertices ELSE '[]'::jsonb END
+             ) WITH ORDINALITY AS e(v, ord)
+    ), checked AS (
+        SELECT ord, qx, qy,
+               qx BETWEEN -2147483648 AND 2147483647
+               AND qy BETWEEN -2147483648 AND 2147483647 AS in_range
+        FROM vertex
+    )
+    SELECT CASE
+               WHEN count(*) = 0 OR bool_and(in_range) IS NOT TRUE THEN NULL
+               ELSE '\x01'::bytea || string_agg(
+                        CASE WHEN in_range THEN int4send(qx::integer) || int4send(qy::integer) END,
+                        ''::bytea ORDER BY ord)
+           END
+    FROM checked
+$$;
+
+CREATE OR REPLACE FUNCTION annotation_polygon_unpack(in_packed BYTEA)
+RETURNS JSONB
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+    SELECT jsonb_agg(
+               jsonb_build_array(
+                   ('x' || encode(substring(in_packed FROM 2 + 8 * i FOR 4), 'hex'))::bit(32)::integer
+                       / 1073741824.0::double precision,
+                   ('x' || encode(substring(in_packed FROM 6 + 8 * i FOR 4), 'hex'))::bit(32)::integer
+                       / 1073741824.0::double precision)
+               ORDER BY i)
+    FROM generate_series(0, (length(in_packed) - 1) / 8 - 1) AS i
+$$;
+
+-- {"counts": [...], "size": [h, w]} -> 0x01 || width || h || w || count ...
+-- with every value big-endian in `width` bytes (1, 2, 4 or 8, the smallest
+-- that holds the largest value).  NULL unless the object has exactly those
+-- two keys and every value is a non-negative JSON integer.
+CREATE OR REPLACE FUNCTION annotation_rle_pack(in_rle JSONB)
+RETURNS BYTEA
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+    WITH shape AS (
+        SELECT jsonb_typeof(in_rle) = 'object'
+               AND (in_rle - 'counts' - 'size') = '{}'::jsonb
+               AND jsonb_typeof(in_rle -> 'counts') = 'array'
+               AND jsonb_typeof(in_rle -> 'size') = 'array'
+               AND jsonb_array_length(in_rle -> 'size') = 2 AS ok
+    ), number AS (
+        SELECT s.ord, s.v
+        FROM shape, jsonb_array_elements(CASE WHEN shape.ok THEN in_rle -> 'size' ELSE '[]'::jsonb END)
+                    WITH ORDINALITY AS s(v, ord)
+        UNION ALL
+        SELECT 2 + c.ord, c.v
+        FROM shape, jsonb_array_elements(CASE WHEN shape.ok THEN in_rle -> 'counts' ELSE '[]'::jsonb END)
+                    WITH ORDINALITY AS c(v, ord)
+    ), parsed AS (
+        SELECT ord,
+               CASE WHEN jsonb_typeof(v) = 'number' AND (v #>> '{}') ~ '^[0-9]{1,18}$'
+                    THEN (v #>> '{}')::bigint END AS n
+        FROM number
+    ), width AS (
+        SELECT CASE
+                   WHEN max(n) < 256 THEN 1
+                   WHEN max(n) < 65536 THEN 2
+                   WHEN max(n) < 4294967296 THEN 4
+                   ELSE 8
+               END AS w
+        FROM parsed
+    )
+    SELECT CASE
+               WHEN NOT (SELECT ok FROM shape) OR count(n) < count(*) THEN NULL
+               ELSE '\x01'::bytea || set_byte('\x00'::bytea, 0, width.w)
+                    || string_agg(substring(int8send(n) FROM 9 - width.w), ''::bytea ORDER BY ord)
+           END
+    FROM parsed, width
+    GROUP BY width.w
+$$;
+
+CREATE OR REPLACE FUNCTION annotation_rle_unpack(in_packed BYTEA)
+RETURNS JSONB
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+    WITH value AS (
+        SELECT i, ('x' || lpad(encode(substring(in_packed FROM 3 + i * w FOR w), 'hex'), 16, '0'))::bit(64)::bigint AS n
+        FROM (SELECT get_byte(in_packed, 1) AS w) width,
+             generate_series(0, (length(in_packed) - 2) / w - 1) AS i
+    )
+    SELECT jsonb_build_object(
+               'counts', COALESCE(jsonb_agg(n ORDER BY i) FILTER (WHERE i >= 2), '[]'::jsonb),
+               'size', jsonb_build_array(max(n) FILTER (WHERE i = 0), max(n) FILTER (WHERE i = 1)))
+    FROM value
+$$;
+
+COMMENT ON FUNCTION annotation_polygon_pack(JSONB) IS
+    'Pack a [[x, y], ...] vertex ring into polygon_packed (int32 fixed point, 2^30 per unit); NULL if not packable.';
+COMMENT ON FUNCTION annotation_polygon_unpack(BYTEA) IS
+    'Decode polygon_packed back to a [[x, y], ...] JSONB vertex ring.';
+COMMENT ON FUNCTION annotation_rle_pack(JSONB) IS
+    'Pack a COCO uncompressed RLE {"counts", "size"} into mask_rle_packed (fixed-width big-endian values); NULL if not packable.';
+COMMENT ON FUNCTION annotation_rle_unpack(BYTEA) IS
+    'Decode mask_rle_packed back to a COCO RLE {"counts": [...], "size": [h, w]} JSONB object.';
+
+-- ============================================================================
+-- Columns and constraints
+-- ============================================================================
+
+ALTER TABLE annotation_geometry
+    ADD COLUMN IF NOT EXISTS polygon_packed  BYTEA,
+    ADD COLUMN IF NOT EXISTS mask_rle_packed BYTEA;
+
+COMMENT ON COLUMN annotation_geometry.polygon_packed IS
+    'Packed vertex ring: 0x01 + big-endian int32 (x, y) pairs, 2^30 per normalized unit (Schema I).';
+COMMENT ON COLUMN annotation_geometry.mask_rle_packed IS
+    'Packed COCO RLE: 0x01 + value width (1/2/4/8) + big-endian h, w, counts... (Schema I).';
+
+ALTER TABLE annotation_geometry
+    DROP CONSTRAINT IF EXISTS chk_mask_payload,
+    DROP CONSTRAINT IF EXISTS chk_polygon_complete,
+    DROP CONSTRAINT IF EXISTS chk_polygon_packed_format,
+    DROP CONSTRAINT IF EXISTS chk_mask_rle_packed_format,
+    DROP CONSTRAINT IF EXISTS chk_polygon_single_payload,
+    DROP CONSTRAINT IF EXISTS chk_mask_rle_single_payload;
+
+ALTER TABLE annotation_geometry
+    ADD CONSTRAINT chk_mask_payload CHECK (
+        geometry_kind != 'mask'
+        OR mask_rle IS NOT NULL
+        OR mask_rle_packed IS NOT NULL
+        OR mask_uri IS NOT NULL
+    ),
+    ADD CONSTRAINT chk_polygon_complete CHECK (
+        geometry_kind != 'polygon'
+        OR polygon_vertices IS NOT NULL
+        OR polygon_packed IS NOT NULL
+    ),
+    ADD CONSTRAINT chk_polygon_packed_format CHECK (
+        polygon_packed IS NULL
+        OR (length(polygon_packed) > 1
+            AND (length(polygon_packed) - 1) % 8 = 0
+            AND get_byte(polygon_packed, 0) = 1)
+    ),
+    ADD CONSTRAINT chk_mask_rle_packed_format CHECK (
+        mask_rle_packed IS NULL
+        OR (length(mask_rle_packed) >= 4
+            AND get_byte(mask_rle_packed, 0) = 1
+            AND get_byte(mask_rle_packed, 1) IN (1, 2, 4, 8)
+            AND (length(mask_rle_packed) - 2) % get_byte(mask_rle_packed, 1) = 0
+            AND length(mask_rle_packed) - 2 >= 2 * get_byte(mask_rle_packed, 1))
+    ),
+    ADD CONSTRAINT chk_polygon_single_payload CHECK (
+        polygon_vertices IS NULL OR polygon_packed IS NULL
+    ),
+    ADD CONSTRAINT chk_mask_rle_single_payload CHECK (
+        mask_rle IS NULL OR mask_rle_packed IS NULL
+    );
+
+-- ============================================================================
+-- Pack on write
+-- ============================================================================
+
+-- JSONB written by a caller wins: it replaces any packed value, and stays
+-- JSONB only when it cannot be packed.
+CREATE OR REPLACE FUNCTION annotation_geometry_pack_payloads()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.polygon_vertices IS NOT NULL THEN
+        NEW.polygon_packed := annotation_polygon_pack(NEW.polygon_vertices);
+        IF NEW.polygon_packed IS NOT NULL THEN
+            NEW.polygon_vertices := NULL;
+        END IF;
+    END IF;
+
+    IF NEW.mask_rle IS NOT NULL THEN
+        NEW.mask_rle_packed := annotation_rle_pack(NEW.mask_rle);
+        IF NEW.mask_rle_packed IS NOT NULL THEN
+            NEW.mask_rle := NULL;
+        END IF;
+    END IF;
+
+    RETURN NEW;
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_geometry_pack_payloads() IS
+    'BEFORE INSERT/UPDATE trigger function: move packable polygon_vertices / mask_rle JSONB into the packed columns (Schema I).';
+
+DROP TRIGGER IF EXISTS trg_annotation_geometry_pack_payloads ON annotation_geometry;
+CREATE TRIGGER trg_annotation_geometry_pack_payloads
+BEFORE INSERT OR UPDATE ON annotation_geometry
+FOR EACH ROW
+WHEN (NEW.polygon_vertices IS NOT NULL OR NEW.mask_rle IS NOT NULL)
+EXECUTE FUNCTION annotation_geometry_pack_payloads();
+
+-- ============================================================================
+-- Convert existing rows (the trigger does the packing)
+-- ============================================================================
+
+UPDATE annotation_geometry
+SET polygon_vertices = polygon_vertices,
+    mask_rle = mask_rle
+WHERE polygon_vertices IS NOT NULL
+   OR mask_rle IS NOT NULL;
+
+-- ============================================================================
+-- JSONB compatibility view
+-- ============================================================================
+
+CREATE OR REPLACE VIEW annotation_geometry_json_v1 AS
+SELECT
+    g.geometry_id,
+    g.annotation_id,
+    g.geometry_kind,
+    g.bbox_x_min,
+    g.bbox_y_min,
+    g.bbox_x_max,
+    g.bbox_y_max,
+    g.bbox_x_min_px,
+    g.bbox_y_min_px,
+    g.bbox_x_max_px,
+    g.bbox_y_max_px,
+    COALESCE(g.polygon_vertices, annotation_polygon_unpack(g.polygon_packed)) AS polygon_vertices,
+    COALESCE(g.mask_rle, annotation_rle_unpack(g.mask_rle_packed)) AS mask_rle,
+    g.mask_uri,
+    g.mask_format,
+    g.point_x,
+    g.point_y,
+    g.sidecar,
+    g.created_at
+FROM annotation_geometry g;
+
+COMMENT ON VIEW annotation_geometry_json_v1 IS
+    'annotation_geometry with polygon_vertices / mask_rle decoded from the packed columns (Schema I).';
+
+ANALYZE annotation_geometry;
+
+COMMIT;
@@ -0,0 +1,52 @@
+-- Rollback for Migration 009 (Schema I)
+-- Decodes polygon_packed / mask_rle_packed back into polygon_vertices /
+-- mask_rle, restores the pre-009 payload constraints and drops the packed
+-- columns, the pack trigger, the compatibility view and the codec functions.
+--
+-- Polygon coordinates come back on the 2^-30 fixed-point grid they were
+-- packed to (within ~1e-9 of the original values).  Run
+-- VACUUM (ANALYZE) annotation_geometry afterwards.
+
+BEGIN;
+
+DROP VIEW IF EXISTS annotation_geometry_json_v1;
+DROP TRIGGER IF EXISTS trg_annotation_geometry_pack_payloads ON annotation_geometry;
+DROP FUNCTION IF EXISTS annotation_geometry_pack_payloads();
+
+ALTER TABLE annotation_geometry
+    DROP CONSTRAINT IF EXISTS chk_mask_rle_single_payload,
+    DROP CONSTRAINT IF EXISTS chk_polygon_single_payload,
+    DROP CONSTRAINT IF EXISTS chk_mask_rle_packed_format,
+    DROP CONSTRAINT IF EXISTS chk_polygon_packed_format,
+    DROP CONSTRAINT IF EXISTS chk_polygon_complete,
+    DROP CONSTRAINT IF EXISTS chk_mask_payload;
+
+UPDATE annotation_geometry
+SET polygon_vertices = COALESCE(polygon_vertices, annotation_polygon_unpack(polygon_packed)),
+    mask_rle = COALESCE(mask_rle, annotation_rle_unpack(mask_rle_packed))
+WHERE polygon_packed IS NOT NULL
+   OR mask_rle_packed IS NOT NULL;
+
+ALTER TABLE annotation_geometry
+    DROP COLUMN IF EXISTS mask_rle_packed,
+    DROP COLUMN IF EXISTS polygon_packed;
+
+ALTER TABLE annotation_geometry
+    ADD CONSTRAINT chk_mask_payload CHECK (
+        geometry_kind != 'mask'
+        OR mask_rle IS NOT NULL
+        OR mask_uri IS NOT NULL
+    ),
+    ADD CONSTRAINT chk_polygon_complete CHECK (
+        geometry_kind != 'polygon'
+        OR polygon_vertices IS NOT NULL
+    );
+
+DROP FUNCTION IF EXISTS annotation_rle_unpack(BYTEA);
+DROP FUNCTION IF EXISTS annotation_rle_pack(JSONB);
+DROP FUNCTION IF EXISTS annotation_polygon_unpack(BYTEA);
+DROP FUNCTION IF EXISTS annotation_polygon_pack(JSONB);
+
+ANALYZE annotation_geometry;
+
+COMMIT;
@@ -0,0 +1,204 @@
+-- Verification script for Migration 009 (Schema I)
+--
+-- Purpose:
+--   Validate packed polygon / mask payloads:
+--     - the SQL codec produces the documented byte layout and round-trips,
+--     - inserts through the normal JSONB columns land in polygon_packed /
+--       mask_rle_packed with the JSONB column cleared,
+--     - payloads that cannot be packed (compressed RLE strings, out-of-range
+--       coordinates) stay JSONB,
+--     - annotation_geometry_json_v1 decodes packed rows back to JSONB,
+--     - malformed packed bytes are rejected and a row never carries both a
+--       JSONB and a packed payload.
+--
+-- Works on the base layout and on the set_id-partitioned layout (008): the
+-- geometry rows get a set_id only when the column exists.
+--
+-- Usage:
+--   psql -U postgres -d <db_name> -f dbTools/admin/migrations/009_annotation_geometry_packed_payloads_verify.sql
+--
+-- Safety:
+--   Runs in a transaction and ends with ROLLBACK.
+
+BEGIN;
+
+-- ---------------------------------------------------------------------------
+-- 1. Codec byte layout and round trip.
+-- ---------------------------------------------------------------------------
+DO $$
+BEGIN
+    IF annotation_polygon_pack('[[0.5, 0.25], [-0.1, 1.0]]') <> '\x012000000010000000f999999a40000000'::bytea THEN
+        RAISE EXCEPTION 'annotation_polygon_pack byte layout mismatch: %',
+            encode(annotation_polygon_pack('[[0.5, 0.25], [-0.1, 1.0]]'), 'hex');
+    END IF;
+    IF annotation_rle_pack('{"size": [4, 100], "counts": [300, 100]}') <> '\x010200040064012c0064'::bytea THEN
+        RAISE EXCEPTION 'annotation_rle_pack byte layout mismatch: %',
+            encode(annotation_rle_pack('{"size": [4, 100], "counts": [300, 100]}'), 'hex');
+    END IF;
+
+    IF annotation_rle_unpack(annotation_rle_pack('{"size": [480, 640], "counts": [0, 127, 128, 16384, 100000000000000000]}'))
+       <> '{"size": [480, 640], "counts": [0, 127, 128, 16384, 100000000000000000]}'::jsonb THEN
+        RAISE EXCEPTION 'RLE round trip changed the payload';
+    END IF;
+    IF EXISTS (
+        SELECT 1
+        FROM jsonb_array_elements(annotation_polygon_unpack(annotation_polygon_pack('[[0.1, 0.2], [0.3, 0.4], [0.123456789, 0.987654321]]')))
+                 WITH ORDINALITY AS got(v, ord)
+        JOIN jsonb_array_elements('[[0.1, 0.2], [0.3, 0.4], [0.123456789, 0.987654321]]'::jsonb)
+                 WITH ORDINALITY AS want(v, ord) USING (ord)
+        WHERE abs((got.v ->> 0)::double precision - (want.v ->> 0)::double precision) > 1e-9
+           OR abs((got.v ->> 1)::double precision - (want.v ->> 1)::double precision) > 1e-9
+    ) THEN
+        RAISE EXCEPTION 'polygon round trip moved a vertex by more than 1e-9';
+    END IF;
+
+    IF annotation_polygon_pack('[[0.5, 2.5]]') IS NOT NULL
+       OR annotation_polygon_pack('[[0.5, 0.5, 1.0]]') IS NOT NULL
+       OR annotation_rle_pack('{"size": [4, 100], "counts": "PPYo0"}') IS NOT NULL
+       OR annotation_rle_pack('{"size": [4, 100], "counts": [1.5]}') IS NOT NULL
+       OR annotation_rle_pack('{"size": [4, 100], "counts": [4], "extra": true}') IS NOT NULL THEN
+        RAISE EXCEPTION 'codec packed a payload it cannot represent exactly';
+    END IF;
+    RAISE NOTICE 'OK: SQL codec byte layout, round trip and unpackable inputs';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 2. Writes through the JSONB columns are packed.
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_set (set_id, name, source_kind, source_name, source_version, model_id, config_hash, run_id)
+VALUES ('a0000000-0000-0000-0000-000000000009', 'verify-009-model', 'model', 'verify-009', '1', 'verify-model',
+        repeat('c', 64), 'verify-009-run');
+
+INSERT INTO annotation_subject (subject_id, asset_uuid, asset_width_px, asset_height_px)
+VALUES ('c0000000-0000-0000-0000-000000000009', 'd0000000-0000-0000-0000-000000000009', 640, 480);
+
+INSERT INTO annotation (annotation_id, subject_id, set_id, label, score)
+VALUES
+    ('e1000000-0000-0000-0000-000000000009', 'c0000000-0000-0000-0000-000000000009',
+     'a0000000-0000-0000-0000-000000000009', 'verify-bee', 0.9),
+    ('e2000000-0000-0000-0000-000000000009', 'c0000000-0000-0000-0000-000000000009',
+     'a0000000-0000-0000-0000-000000000009', 'verify-bee', 0.8);
+
+INSERT INTO annotation_provenance (annotation_id, source_kind, source_name, source_version, model_id, config_hash, run_id)
+SELECT annotation_id, 'model', 'verify-009', '1', 'verify-model', repeat('c', 64), 'verify-009-run'
+FROM annotation
+WHERE set_id = 'a0000000-0000-0000-0000-000000000009'
+  AND NOT EXISTS (SELECT 1 FROM pg_attribute
+                  WHERE attrelid = 'annotation_provenance'::regclass AND attname = 'set_id' AND NOT attisdropped);
+
+DO $$
+DECLARE
+    set_col TEXT := '';
+    set_val TEXT := '';
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_attribute
+               WHERE attrelid = 'annotation_geometry'::regclass AND attname = 'set_id' AND NOT attisdropped) THEN
+        set_col := ', set_id';
+        set_val := ', ' || quote_literal('a0000000-0000-0000-0000-000000000009');
+
+        EXECUTE 'INSERT INTO annotation_provenance (annotation_id, set_id, source_kind, source_name, source_version, '
+             || 'model_id, config_hash, run_id) '
+             || 'SELECT annotation_id, set_id, ''model'', ''verify-009'', ''1'', ''verify-model'', repeat(''c'', 64), '
+             || '''verify-009-run'' FROM annotation WHERE set_id = ''a0000000-0000-0000-0000-000000000009''';
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO annotation_geometry (geometry_id, annotation_id, geometry_kind, polygon_vertices%s) '
+        'VALUES (%L, %L, ''polygon'', %L%s)',
+        set_col, 'f1000000-0000-0000-0000-000000000009', 'e1000000-0000-0000-0000-000000000009',
+        '[[0.1, 0.1], [0.4, 0.1], [0.4, 0.5]]', set_val);
+    EXECUTE format(
+        'INSERT INTO annotation_geometry (geometry_id, annotation_id, geometry_kind, mask_rle, mask_format%s) '
+        'VALUES (%L, %L, ''mask'', %L, ''coco_rle''%s)',
+        set_col, 'f2000000-0000-0000-0000-000000000009', 'e1000000-0000-0000-0000-000000000009',
+        '{"size": [4, 5], "counts": [3, 9, 8]}', set_val);
+    EXECUTE format(
+        'INSERT INTO annotation_geometry (geometry_id, annotation_id, geometry_kind, mask_rle, mask_format%s) '
+        'VALUES (%L, %L, ''mask'', %L, ''coco_rle''%s)',
+        set_col, 'f3000000-0000-0000-0000-000000000009', 'e2000000-0000-0000-0000-000000000009',
+        '{"size": [4, 5], "counts": "23l0"}', set_val);
+END;
+$$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM annotation_geometry
+        WHERE geometry_id = 'f1000000-0000-0000-0000-000000000009'
+          AND polygon_vertices IS NULL
+          AND polygon_packed = annotation_polygon_pack('[[0.1, 0.1], [0.4, 0.1], [0.4, 0.5]]')
+    ) THEN
+        RAISE EXCEPTION 'polygon insert was not packed';
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM annotation_geometry
+        WHERE geometry_id = 'f2000000-0000-0000-0000-000000000009'
+          AND mask_rle IS NULL
+          AND mask_rle_packed = '\x01010405030908'::bytea
+    ) THEN
+        RAISE EXCEPTION 'mask insert was not packed';
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM annotation_geometry
+        WHERE geometry_id = 'f3000000-0000-0000-0000-000000000009'
+          AND mask_rle_packed IS NULL
+          AND mask_rle = '{"size": [4, 5], "counts": "23l0"}'::jsonb
+    ) THEN
+        RAISE EXCEPTION 'compressed RLE string was not kept as JSONB';
+    END IF;
+    RAISE NOTICE 'OK: JSONB writes are packed; unpackable payloads stay JSONB';
+
+    IF (SELECT mask_rle FROM annotation_geometry_json_v1
+        WHERE geometry_id = 'f2000000-0000-0000-0000-000000000009')
+       <> '{"size": [4, 5], "counts": [3, 9, 8]}'::jsonb
+       OR (SELECT mask_rle FROM annotation_geometry_json_v1
+           WHERE geometry_id = 'f3000000-0000-0000-0000-000000000009')
+          <> '{"size": [4, 5], "counts": "23l0"}'::jsonb
+       OR (SELECT jsonb_array_length(polygon_vertices) FROM annotation_geometry_json_v1
+           WHERE geometry_id = 'f1000000-0000-0000-0000-000000000009') <> 3 THEN
+        RAISE EXCEPTION 'annotation_geometry_json_v1 did not decode the payloads';
+    END IF;
+    RAISE NOTICE 'OK: annotation_geometry_json_v1 decodes packed payloads';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 3. Malformed packed bytes and double payloads are rejected.
+-- ---------------------------------------------------------------------------
+DO $$
+BEGIN
+    BEGIN
+        UPDATE annotation_geometry SET polygon_packed = '\x0100000001'::bytea
+        WHERE geometry_id = 'f1000000-0000-0000-0000-000000000009';
+        RAISE EXCEPTION 'truncated polygon_packed was accepted';
+    EXCEPTION WHEN check_violation THEN
+        NULL;
+    END;
+    BEGIN
+        UPDATE annotation_geometry SET mask_rle_packed = '\x0102000400'::bytea
+        WHERE geometry_id = 'f2000000-0000-0000-0000-000000000009';
+        RAISE EXCEPTION 'truncated mask_rle_packed was accepted';
+    EXCEPTION WHEN check_violation THEN
+        NULL;
+    END;
+    RAISE NOTICE 'OK: malformed packed payloads are rejected';
+
+    -- A row keeps one payload: JSONB that cannot be packed wins over a packed
+    -- value written alongside it.
+    UPDATE annotation_geometry SET mask_rle_packed = '\x010104050c08'::bytea
+    WHERE geometry_id = 'f3000000-0000-0000-0000-000000000009';
+    IF NOT EXISTS (
+        SELECT 1 FROM annotation_geometry
+        WHERE geometry_id = 'f3000000-0000-0000-0000-000000000009'
+          AND mask_rle IS NOT NULL AND mask_rle_packed IS NULL
+    ) THEN
+        RAISE EXCEPTION 'row ended up with both mask_rle and mask_rle_packed';
+    END IF;
+    RAISE NOTICE 'OK: geometry rows keep a single polygon/mask payload';
+END;
+$$;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+
+ROLLBACK;
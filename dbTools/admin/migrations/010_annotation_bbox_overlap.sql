@@ -0,0 +1,211 @@
+-- Migration 010: bbox overlap index and IoU conflict detection
+-- Schema J — GiST box index on annotation_geometry + set-wise IoU conflicts
+-- Mirror note: keep this file byte-identical with its corresponding add/migration pair.
+--
+-- Purpose:
+--   annotation_geometry stores boxes as four float columns with no spatial
+--   index, so "which boxes overlap this one" means a nested scan, and NMS-style
+--   conflict detection between runs (or setting annotation_quality.conflict_flag)
+--   is done row by row in client code.  This migration adds:
+--     - annotation_bbox(x_min, y_min, x_max, y_max): the geometry's box as a
+--       native PostgreSQL box, and a GiST expression index over it, so
+--       overlap (&&) / containment (@>, <@) predicates are index-assisted;
+--     - annotation_box_iou(box, box): intersection over union;
+--     - annotation_box_conflicts_v1(set_ids, min_iou, same_label, within_set):
+--       every pair of active boxes on the same subject, from different sets
+--       (or within one set), whose IoU reaches min_iou -- one set-based query;
+--     - annotation_flag_box_conflicts(...): writes the conflicts into
+--       annotation_quality in one UPDATE and returns summary counts.
+--
+-- Context:
+--   Boxes are normalized to [0,1] for every subject, so the spatial index alone
+--   cannot narrow candidates to one subject: pairs are generated per subject
+--   through idx_annotation_subject_set, and the box predicate (&&, then IoU)
+--   filters them.  The GiST index serves overlap lookups against a region or a
+--   handful of boxes (e.g. one set's partition under migration 008).
+--
+--   An expression index is used instead of a stored generated column so the
+--   set_id-partitioned re-layout (008, which rebuilds tables with LIKE) and its
+--   rollback carry the index over unchanged.
+--
+--   Flagging follows the quality constraints from migration 003: a flagged row
+--   becomes review_status = 'conflict' with conflict_flag, conflict_reason
+--   ("bbox IoU <x> with annotation <id>", strongest overlap), adjudicated_by
+--   and adjudicated_at.  Only 'unreviewed' / 'needs_review' rows are touched;
+--   adjudicated rows are counted, never overwritten.
+--
+-- Prerequisites:
+--   - Migrations 001-004
+--   - Works on the base layout and on the set_id-partitioned layout (008).
+--
+-- Safety:
+--   - Idempotent: CREATE OR REPLACE FUNCTION, CREATE INDEX IF NOT EXISTS.
+--   - Non-destructive: functions and one index; annotation_quality is only
+--     written when annotation_flag_box_conflicts() is called.
+--
+-- Rollback: see 010_annotation_bbox_overlap_rollback.sql
+-- Verification: see 010_annotation_bbox_overlap_verify.sql
+
+BEGIN;
+
+-- ============================================================================
+-- Box helpers
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION annotation_bbox(
+    in_x_min DOUBLE PRECISION,
+    in_y_min DOUBLE PRECISION,
+    in_x_max DOUBLE PRECISION,
+    in_y_max DOUBLE PRECISION
+)
+RETURNS BOX
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+    SELECT box(point(in_x_min, in_y_min), point(in_x_max, in_y_max))
+$$;
+
+CREATE OR REPLACE FUNCTION annotation_box_iou(in_a BOX, in_b BOX)
+RETURNS DOUBLE PRECISION
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+    SELECT CASE
+               WHEN NOT (in_a && in_b) THEN 0.0
+               ELSE COALESCE(
+                   area(in_a # in_b) / NULLIF(area(in_a) + area(in_b) - area(in_a # in_b), 0.0),
+                   0.0)
+           END
+$$;
+
+COMMENT ON FUNCTION annotation_bbox(DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION) IS
+    'Normalized bbox columns as a box; matches the idx_geometry_bbox_gist expression (Schema J).';
+COMMENT ON FUNCTION annotation_box_iou(BOX, BOX) IS
+    'Intersection over union of two boxes; 0 when they do not overlap.';
+
+CREATE INDEX IF NOT EXISTS idx_geometry_bbox_gist
+    ON annotation_geometry
+    USING GIST (annotation_bbox(bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max))
+    WHERE bbox_x_min IS NOT NULL;
+
+COMMENT ON INDEX idx_geometry_bbox_gist IS
+    'Overlap/containment lookups on annotation_bbox(bbox_*) (Schema J).';
+
+-- ============================================================================
+-- Pairwise conflicts
+-- ============================================================================
+
+-- Pairs are emitted once, ordered so (set_id, annotation_id) <
+-- (other_set_id, other_annotation_id).  in_same_label: TRUE = duplicates of
+-- the same label, FALSE = label disagreements, NULL = both.  in_within_set
+-- also pairs boxes from the same set (NMS-style duplicates within a run).
+CREATE OR REPLACE FUNCTION annotation_box_conflicts_v1(
+    in_set_ids UUID[],
+    in_min_iou DOUBLE PRECISION DEFAULT 0.5,
+    in_same_label BOOLEAN DEFAULT NULL,
+    in_within_set BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+    subject_id UUID,
+    annotation_id UUID,
+    set_id UUID,
+    label VARCHAR,
+    other_annotation_id UUID,
+    other_set_id UUID,
+    other_label VARCHAR,
+    iou DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH boxed AS (
+        SELECT a.subject_id, a.annotation_id, a.set_id, a.label,
+               annotation_bbox(g.bbox_x_min, g.bbox_y_min, g.bbox_x_max, g.bbox_y_max) AS bbox
+        FROM annotation a
+        JOIN annotation_geometry g ON g.annotation_id = a.annotation_id
+        WHERE a.set_id = ANY(in_set_ids)
+          AND a.lifecycle_state = 'active'
+          AND g.bbox_x_min IS NOT NULL
+    ), paired AS (
+        SELECT x.subject_id,
+               x.annotation_id, x.set_id, x.label,
+               y.annotation_id AS other_annotation_id, y.set_id AS other_set_id, y.label AS other_label,
+               annotation_box_iou(x.bbox, y.bbox) AS iou
+        FROM boxed x
+        JOIN boxed y
+          ON y.subject_id = x.subject_id
+         AND (x.set_id, x.annotation_id) < (y.set_id, y.annotation_id)
+         AND (x.set_id <> y.set_id OR in_within_set)
+         AND x.bbox && y.bbox
+        WHERE in_same_label IS NULL
+           OR (x.label = y.label) = in_same_label
+    )
+    SELECT *
+    FROM paired
+    WHERE iou >= in_min_iou
+$$;
+
+COMMENT ON FUNCTION annotation_box_conflicts_v1(UUID[], DOUBLE PRECISION, BOOLEAN, BOOLEAN) IS
+    'Active box pairs on the same subject across (or within) the given sets with IoU >= in_min_iou (Schema J).';
+
+CREATE OR REPLACE FUNCTION annotation_flag_box_conflicts(
+    in_set_ids UUID[],
+    in_adjudicated_by VARCHAR,
+    in_min_iou DOUBLE PRECISION DEFAULT 0.5,
+    in_same_label BOOLEAN DEFAULT NULL,
+    in_within_set BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+    conflict_pairs BIGINT,
+    flagged BIGINT,
+    already_adjudicated BIGINT,
+    without_quality BIGINT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF in_adjudicated_by IS NULL OR btrim(in_adjudicated_by) = '' THEN
+        RAISE EXCEPTION 'annotation_flag_box_conflicts: in_adjudicated_by is required';
+    END IF;
+
+    RETURN QUERY
+    WITH pairs AS (
+        SELECT c.annotation_id, c.other_annotation_id, c.iou
+        FROM annotation_box_conflicts_v1(in_set_ids, in_min_iou, in_same_label, in_within_set) c
+    ), sides AS (
+        SELECT p.annotation_id, p.other_annotation_id, p.iou FROM pairs p
+        UNION ALL
+        SELECT p.other_annotation_id, p.annotation_id, p.iou FROM pairs p
+    ), strongest AS (
+        SELECT DISTINCT ON (s.annotation_id) s.annotation_id, s.other_annotation_id, s.iou
+        FROM sides s
+        ORDER BY s.annotation_id, s.iou DESC, s.other_annotation_id
+    ), updated AS (
+        UPDATE annotation_quality q
+        SET review_status = 'conflict',
+            conflict_flag = TRUE,
+            conflict_reason = format('bbox IoU %s with annotation %s',
+                                     round(st.iou::numeric, 3), st.other_annotation_id),
+            adjudicated_by = in_adjudicated_by,
+            adjudicated_at = NOW()
+        FROM strongest st
+        WHERE q.annotation_id = st.annotation_id
+          AND q.review_status IN ('unreviewed', 'needs_review')
+        RETURNING q.annotation_id
+    )
+    SELECT (SELECT COUNT(*) FROM pairs),
+           (SELECT COUNT(*) FROM updated),
+           (SELECT COUNT(*) FROM strongest st
+            JOIN annotation_quality q ON q.annotation_id = st.annotation_id
+            WHERE q.review_status NOT IN ('unreviewed', 'needs_review')),
+           (SELECT COUNT(*) FROM strongest st
+            WHERE NOT EXISTS (SELECT 1 FROM annotation_quality q WHERE q.annotation_id = st.annotation_id));
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_flag_box_conflicts(UUID[], VARCHAR, DOUBLE PRECISION, BOOLEAN, BOOLEAN) IS
+    'Mark unreviewed/needs_review annotations in IoU conflicts as review_status = conflict in one UPDATE; returns summary counts (Schema J).';
+
+ANALYZE annotation_geometry;
+
+COMMIT;
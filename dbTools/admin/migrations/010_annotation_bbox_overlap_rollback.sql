@@ -0,0 +1,14 @@
+-- Rollback for Migration 010 (Schema J)
+-- Drops the bbox GiST index and the IoU / conflict functions.  Conflict flags
+-- already written to annotation_quality are left in place (they are ordinary
+-- adjudications).
+
+BEGIN;
+
+DROP FUNCTION IF EXISTS annotation_flag_box_conflicts(UUID[], VARCHAR, DOUBLE PRECISION, BOOLEAN, BOOLEAN);
+DROP FUNCTION IF EXISTS annotation_box_conflicts_v1(UUID[], DOUBLE PRECISION, BOOLEAN, BOOLEAN);
+DROP INDEX IF EXISTS idx_geometry_bbox_gist;
+DROP FUNCTION IF EXISTS annotation_box_iou(BOX, BOX);
+DROP FUNCTION IF EXISTS annotation_bbox(DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION);
+
+COMMIT;
@@ -0,0 +1,233 @@
+-- Verification script for Migration 010 (Schema J)
+--
+-- Purpose:
+--   Validate bbox overlap search and IoU conflict flagging:
+--     - annotation_box_iou() matches hand-computed values,
+--     - the GiST expression index serves && lookups,
+--     - annotation_box_conflicts_v1() pairs boxes per subject across sets,
+--       honours the IoU threshold, label filter and within-set switch, and
+--       ignores other subjects and inactive annotations,
+--     - annotation_flag_box_conflicts() flags unreviewed rows in one pass,
+--       satisfies the quality constraints, and leaves adjudicated rows alone.
+--
+-- Works on the base layout and on the set_id-partitioned layout (008): child
+-- rows get a set_id only when the column exists.
+--
+-- Usage:
+--   psql -U postgres -d <db_name> -f dbTools/admin/migrations/010_annotation_bbox_overlap_verify.sql
+--
+-- Safety:
+--   Runs in a transaction and ends with ROLLBACK.
+
+BEGIN;
+
+-- ---------------------------------------------------------------------------
+-- 1. IoU arithmetic.
+-- ---------------------------------------------------------------------------
+DO $$
+BEGIN
+    IF abs(annotation_box_iou(annotation_bbox(0.0, 0.0, 0.2, 0.2), annotation_bbox(0.1, 0.0, 0.3, 0.2)) - 1.0 / 3.0) > 1e-12
+       OR annotation_box_iou(annotation_bbox(0.0, 0.0, 0.2, 0.2), annotation_bbox(0.0, 0.0, 0.2, 0.2)) <> 1.0
+       OR annotation_box_iou(annotation_bbox(0.0, 0.0, 0.1, 0.1), annotation_bbox(0.5, 0.5, 0.6, 0.6)) <> 0.0
+       OR annotation_box_iou(annotation_bbox(0.0, 0.0, 0.1, 0.1), annotation_bbox(0.1, 0.0, 0.2, 0.1)) <> 0.0 THEN
+        RAISE EXCEPTION 'annotation_box_iou returned an unexpected value';
+    END IF;
+    RAISE NOTICE 'OK: annotation_box_iou matches hand-computed values';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 2. Fixture: two runs on two subjects.
+--    subject 1: A1 (bee)  [0.10,0.10]-[0.30,0.30]
+--               B1 (bee)  [0.12,0.10]-[0.32,0.30]   IoU(A1,B1) = 0.036/0.044 ~ 0.818
+--               B2 (wasp) [0.20,0.10]-[0.40,0.30]   IoU(A1,B2) = 1/3
+--               A2 (bee)  [0.11,0.10]-[0.31,0.30]   inactive (superseded)
+--    subject 2: A3 (bee)  [0.10,0.10]-[0.30,0.30]   same box as A1, other subject
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_set (set_id, name, source_kind, source_name, source_version, model_id, config_hash, run_id)
+VALUES
+    ('a0000000-0000-0000-0000-000000000010', 'verify-010-a', 'model', 'verify-010', '1', 'verify-model',
+     repeat('d', 64), 'verify-010-run-a'),
+    ('b0000000-0000-0000-0000-000000000010', 'verify-010-b', 'model', 'verify-010', '1', 'verify-model',
+     repeat('d', 64), 'verify-010-run-b');
+
+INSERT INTO annotation_subject (subject_id, asset_uuid, asset_width_px, asset_height_px)
+VALUES
+    ('c1000000-0000-0000-0000-000000000010', 'd1000000-0000-0000-0000-000000000010', 640, 480),
+    ('c2000000-0000-0000-0000-000000000010', 'd2000000-0000-0000-0000-000000000010', 640, 480);
+
+INSERT INTO annotation (annotation_id, subject_id, set_id, label, score, lifecycle_state)
+VALUES
+    ('e1000000-0000-0000-0000-0000000000a1', 'c1000000-0000-0000-0000-000000000010',
+     'a0000000-0000-0000-0000-000000000010', 'verify-bee', 0.9, 'active'),
+    ('e1000000-0000-0000-0000-0000000000a2', 'c1000000-0000-0000-0000-000000000010',
+     'a0000000-0000-0000-0000-000000000010', 'verify-bee', 0.9, 'superseded'),
+    ('e1000000-0000-0000-0000-0000000000a3', 'c2000000-0000-0000-0000-000000000010',
+     'a0000000-0000-0000-0000-000000000010', 'verify-bee', 0.9, 'active'),
+    ('e1000000-0000-0000-0000-0000000000b1', 'c1000000-0000-0000-0000-000000000010',
+     'b0000000-0000-0000-0000-000000000010', 'verify-bee', 0.8, 'active'),
+    ('e1000000-0000-0000-0000-0000000000b2', 'c1000000-0000-0000-0000-000000000010',
+     'b0000000-0000-0000-0000-000000000010', 'verify-wasp', 0.7, 'active');
+
+DO $$
+DECLARE
+    set_col TEXT := '';
+    set_val TEXT := '';
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_attribute
+               WHERE attrelid = 'annotation_geometry'::regclass AND attname = 'set_id' AND NOT attisdropped) THEN
+        set_col := ', set_id';
+        set_val := ', a.set_id';
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO annotation_provenance (annotation_id, source_kind, source_name, source_version, '
+        'model_id, config_hash, run_id%s) '
+        'SELECT a.annotation_id, ''model'', ''verify-010'', ''1'', ''verify-model'', repeat(''d'', 64), '
+        'CASE WHEN a.set_id = ''a0000000-0000-0000-0000-000000000010'' THEN ''verify-010-run-a'' '
+        'ELSE ''verify-010-run-b'' END%s '
+        'FROM annotation a WHERE a.set_id IN (''a0000000-0000-0000-0000-000000000010'', '
+        '''b0000000-0000-0000-0000-000000000010'')',
+        set_col, set_val);
+
+    EXECUTE format(
+        'INSERT INTO annotation_geometry (annotation_id, geometry_kind, bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max%s) '
+        'SELECT a.annotation_id, ''bbox'', v.x0, 0.10, v.x1, 0.30%s '
+        'FROM (VALUES (''e1000000-0000-0000-0000-0000000000a1''::uuid, 0.10, 0.30), '
+        '             (''e1000000-0000-0000-0000-0000000000a2''::uuid, 0.11, 0.31), '
+        '             (''e1000000-0000-0000-0000-0000000000a3''::uuid, 0.10, 0.30), '
+        '             (''e1000000-0000-0000-0000-0000000000b1''::uuid, 0.12, 0.32), '
+        '             (''e1000000-0000-0000-0000-0000000000b2''::uuid, 0.20, 0.40)) AS v(annotation_id, x0, x1) '
+        'JOIN annotation a ON a.annotation_id = v.annotation_id',
+        set_col, set_val);
+
+    EXECUTE format(
+        'INSERT INTO annotation_quality (annotation_id, review_status%s) '
+        'SELECT a.annotation_id, ''unreviewed''%s FROM annotation a '
+        'WHERE a.set_id IN (''a0000000-0000-0000-0000-000000000010'', ''b0000000-0000-0000-0000-000000000010'') '
+        '  AND a.annotation_id <> ''e1000000-0000-0000-0000-0000000000b2''',
+        set_col, set_val);
+    EXECUTE format(
+        'INSERT INTO annotation_quality (annotation_id, review_status, adjudicated_by, adjudicated_at%s) '
+        'SELECT a.annotation_id, ''accepted'', ''verify-reviewer'', NOW()%s FROM annotation a '
+        'WHERE a.annotation_id = ''e1000000-0000-0000-0000-0000000000b2''',
+        set_col, set_val);
+END;
+$$;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+SET CONSTRAINTS ALL DEFERRED;
+
+-- ---------------------------------------------------------------------------
+-- 3. The GiST expression index serves overlap lookups.
+-- ---------------------------------------------------------------------------
+SET LOCAL enable_seqscan = off;
+
+DO $$
+DECLARE
+    plan_line TEXT;
+    uses_index BOOLEAN := FALSE;
+BEGIN
+    FOR plan_line IN
+        EXECUTE 'EXPLAIN SELECT geometry_id FROM annotation_geometry '
+             || 'WHERE annotation_bbox(bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max) '
+             || '&& box ''((0.1,0.1),(0.2,0.2))'' AND bbox_x_min IS NOT NULL'
+    LOOP
+        IF plan_line ~ 'bbox' AND plan_line ~ 'Index' THEN
+            uses_index := TRUE;
+        END IF;
+    END LOOP;
+    IF NOT uses_index THEN
+        RAISE EXCEPTION 'bbox overlap lookup does not use idx_geometry_bbox_gist';
+    END IF;
+    RAISE NOTICE 'OK: bbox overlap lookups use the GiST expression index';
+END;
+$$;
+
+RESET enable_seqscan;
+
+-- ---------------------------------------------------------------------------
+-- 4. Pairwise conflicts.
+-- ---------------------------------------------------------------------------
+DO $$
+DECLARE
+    sets UUID[] := ARRAY['a0000000-0000-0000-0000-000000000010',
+                         'b0000000-0000-0000-0000-000000000010']::uuid[];
+BEGIN
+    IF (SELECT COUNT(*) FROM annotation_box_conflicts_v1(sets, 0.3)) <> 2 THEN
+        RAISE EXCEPTION 'expected A1-B1 and A1-B2 at IoU >= 0.3, got %',
+            (SELECT COUNT(*) FROM annotation_box_conflicts_v1(sets, 0.3));
+    END IF;
+    IF (SELECT COUNT(*) FROM annotation_box_conflicts_v1(sets, 0.5)) <> 1
+       OR NOT EXISTS (
+           SELECT 1 FROM annotation_box_conflicts_v1(sets, 0.5)
+           WHERE annotation_id = 'e1000000-0000-0000-0000-0000000000a1'
+             AND other_annotation_id = 'e1000000-0000-0000-0000-0000000000b1'
+             AND abs(iou - 0.036 / 0.044) < 1e-9) THEN
+        RAISE EXCEPTION 'IoU threshold 0.5 should keep only A1-B1 (IoU ~0.818)';
+    END IF;
+    IF (SELECT COUNT(*) FROM annotation_box_conflicts_v1(sets, 0.3, FALSE)) <> 1
+       OR (SELECT other_label FROM annotation_box_conflicts_v1(sets, 0.3, FALSE)) <> 'verify-wasp' THEN
+        RAISE EXCEPTION 'label-disagreement filter did not return A1-B2 only';
+    END IF;
+    IF EXISTS (SELECT 1 FROM annotation_box_conflicts_v1(sets, 0.0)
+               WHERE 'e1000000-0000-0000-0000-0000000000a2' IN (annotation_id, other_annotation_id)
+                  OR 'e1000000-0000-0000-0000-0000000000a3' IN (annotation_id, other_annotation_id)) THEN
+        RAISE EXCEPTION 'conflicts included an inactive annotation or another subject';
+    END IF;
+    IF EXISTS (SELECT 1 FROM annotation_box_conflicts_v1(ARRAY['b0000000-0000-0000-0000-000000000010']::uuid[], 0.0))
+       OR (SELECT COUNT(*) FROM annotation_box_conflicts_v1(ARRAY['b0000000-0000-0000-0000-000000000010']::uuid[],
+                                                            0.3, NULL, TRUE)) <> 1 THEN
+        RAISE EXCEPTION 'within-set pairing did not follow in_within_set';
+    END IF;
+    RAISE NOTICE 'OK: annotation_box_conflicts_v1 pairs per subject with threshold/label/within-set filters';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 5. Bulk flagging.
+-- ---------------------------------------------------------------------------
+DO $$
+DECLARE
+    result RECORD;
+BEGIN
+    SELECT * INTO result
+    FROM annotation_flag_box_conflicts(
+        ARRAY['a0000000-0000-0000-0000-000000000010', 'b0000000-0000-0000-0000-000000000010']::uuid[],
+        'verify-010-bot', 0.3);
+
+    -- A1 and B1 flagged; B2 was already accepted.
+    IF result.conflict_pairs <> 2 OR result.flagged <> 2
+       OR result.already_adjudicated <> 1 OR result.without_quality <> 0 THEN
+        RAISE EXCEPTION 'unexpected flag summary: %', result;
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM annotation_quality
+        WHERE annotation_id = 'e1000000-0000-0000-0000-0000000000a1'
+          AND review_status = 'conflict' AND conflict_flag
+          AND adjudicated_by = 'verify-010-bot'
+          AND conflict_reason LIKE 'bbox IoU 0.818 with annotation e1000000-0000-0000-0000-0000000000b1'
+    ) THEN
+        RAISE EXCEPTION 'A1 was not flagged against its strongest overlap';
+    END IF;
+    IF (SELECT review_status FROM annotation_quality
+        WHERE annotation_id = 'e1000000-0000-0000-0000-0000000000b2') <> 'accepted' THEN
+        RAISE EXCEPTION 'flagging overwrote an adjudicated row';
+    END IF;
+    RAISE NOTICE 'OK: annotation_flag_box_conflicts flags unreviewed rows and keeps adjudicated ones';
+
+    BEGIN
+        PERFORM annotation_flag_box_conflicts(ARRAY['a0000000-0000-0000-0000-000000000010']::uuid[], NULL);
+        RAISE EXCEPTION 'flagging without in_adjudicated_by succeeded';
+    EXCEPTION WHEN raise_exception THEN
+        IF SQLERRM NOT LIKE '%in_adjudicated_by is required%' THEN
+            RAISE;
+        END IF;
+    END;
+    RAISE NOTICE 'OK: flagging requires an adjudicator identity';
+END;
+$$;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+
+ROLLBACK;
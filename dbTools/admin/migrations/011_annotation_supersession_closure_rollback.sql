@@ -0,0 +1,24 @@
+-- Rollback for Migration 011 (Schema K)
+-- Drops the supersession closure, its maintenance/update-guard triggers and
+-- the resolve/rebuild functions, and reinstalls the per-row lifecycle trigger
+-- from migration 004.  annotation_supersession rows are untouched.
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS trg_supersession_edge_update ON annotation_supersession;
+DROP TRIGGER IF EXISTS trg_supersession_closure_insert ON annotation_supersession;
+
+DROP FUNCTION IF EXISTS forbid_supersession_edge_update();
+DROP FUNCTION IF EXISTS maintain_annotation_supersession_closure();
+DROP FUNCTION IF EXISTS annotation_supersession_closure_rebuild();
+DROP FUNCTION IF EXISTS annotation_supersession_resolve(UUID[]);
+
+DROP TABLE IF EXISTS annotation_supersession_closure;
+
+DROP TRIGGER IF EXISTS trg_sync_lifecycle_on_supersession ON annotation_supersession;
+CREATE TRIGGER trg_sync_lifecycle_on_supersession
+AFTER INSERT ON annotation_supersession
+FOR EACH ROW
+EXECUTE FUNCTION sync_annotation_lifecycle_on_supersession();
+
+COMMIT;
@@ -0,0 +1,223 @@
+-- Verification script for Migration 011 (Schema K)
+--
+-- Purpose:
+--   Validate the maintained supersession closure:
+--     - a multi-edge INSERT resolves whole chains and flips lifecycle_state
+--       in one statement-level trigger (the per-row trigger is gone),
+--     - later statements extend existing chains, merge chains, and attach new
+--       edges to already-superseded annotations,
+--     - annotation_supersession_resolve() maps ids to terminals (self/0 for
+--       unsuperseded ids),
+--     - cycles (against existing chains or within one statement) are rejected,
+--     - edge endpoints cannot be updated; reason can,
+--     - annotation_supersession_closure_rebuild() reproduces the maintained rows.
+--
+-- Works on the base layout and on the set_id-partitioned layout (008): child
+-- rows get a set_id only when the column exists.
+--
+-- Usage:
+--   psql -U postgres -d <db_name> -f dbTools/admin/migrations/011_annotation_supersession_closure_verify.sql
+--
+-- Safety:
+--   Runs in a transaction and ends with ROLLBACK.
+
+BEGIN;
+
+-- ---------------------------------------------------------------------------
+-- 0. Fixture: eight annotations e1..e8 on one subject.
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_set (set_id, name, source_kind, source_name, source_version, run_id)
+VALUES ('a0000000-0000-0000-0000-000000000011', 'verify-011', 'imported_dataset',
+        'verify-011', '1', 'verify-011-run');
+
+INSERT INTO annotation_subject (subject_id, asset_uuid, asset_width_px, asset_height_px)
+VALUES ('c1000000-0000-0000-0000-000000000011', 'd1000000-0000-0000-0000-000000000011', 640, 480);
+
+INSERT INTO annotation (annotation_id, subject_id, set_id, label, lifecycle_state)
+SELECT ('e1000000-0000-0000-0000-00000000000' || i)::uuid,
+       'c1000000-0000-0000-0000-000000000011',
+       'a0000000-0000-0000-0000-000000000011',
+       'verify-rev-' || i, 'active'
+FROM generate_series(1, 8) AS i;
+
+DO $$
+DECLARE
+    set_col TEXT := '';
+    set_val TEXT := '';
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_attribute
+               WHERE attrelid = 'annotation_provenance'::regclass AND attname = 'set_id' AND NOT attisdropped) THEN
+        set_col := ', set_id';
+        set_val := ', a.set_id';
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO annotation_provenance (annotation_id, source_kind, source_name, source_version%s) '
+        'SELECT a.annotation_id, ''imported_dataset'', ''verify-011'', ''1''%s '
+        'FROM annotation a WHERE a.set_id = ''a0000000-0000-0000-0000-000000000011''',
+        set_col, set_val);
+END;
+$$;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+SET CONSTRAINTS ALL DEFERRED;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_trigger
+               WHERE tgrelid = 'annotation_supersession'::regclass
+                 AND tgname = 'trg_sync_lifecycle_on_supersession') THEN
+        RAISE EXCEPTION 'per-row trg_sync_lifecycle_on_supersession is still installed';
+    END IF;
+    RAISE NOTICE 'OK: supersession maintenance is statement-level only';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 1. One statement, a two-edge chain: e1 -> e2 -> e3.
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_supersession (superseded_annotation_id, replacement_annotation_id, reason, created_by)
+VALUES
+    ('e1000000-0000-0000-0000-000000000001', 'e1000000-0000-0000-0000-000000000002', 'verify-011', 'verify-011'),
+    ('e1000000-0000-0000-0000-000000000002', 'e1000000-0000-0000-0000-000000000003', 'verify-011', 'verify-011');
+
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM annotation_supersession_closure
+        WHERE terminal_annotation_id = 'e1000000-0000-0000-0000-000000000003'
+          AND (annotation_id, depth) IN (('e1000000-0000-0000-0000-000000000001'::uuid, 2),
+                                         ('e1000000-0000-0000-0000-000000000002'::uuid, 1))) <> 2 THEN
+        RAISE EXCEPTION 'single-statement chain did not resolve to e3';
+    END IF;
+    IF (SELECT array_agg(lifecycle_state ORDER BY annotation_id) FROM annotation
+        WHERE annotation_id IN ('e1000000-0000-0000-0000-000000000001',
+                                'e1000000-0000-0000-0000-000000000002',
+                                'e1000000-0000-0000-0000-000000000003'))
+       <> ARRAY['superseded', 'superseded', 'active']::varchar[] THEN
+        RAISE EXCEPTION 'lifecycle_state was not flipped for the superseded rows only';
+    END IF;
+    RAISE NOTICE 'OK: one INSERT resolves a whole chain and flips lifecycle_state';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 2. Extend (e3 -> e4), merge (e5 -> e4) and attach to an already superseded
+--    annotation (e6 -> e1) in one statement.
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_supersession (superseded_annotation_id, replacement_annotation_id, reason, created_by)
+VALUES
+    ('e1000000-0000-0000-0000-000000000003', 'e1000000-0000-0000-0000-000000000004', 'verify-011', 'verify-011'),
+    ('e1000000-0000-0000-0000-000000000005', 'e1000000-0000-0000-0000-000000000004', 'verify-011', 'verify-011'),
+    ('e1000000-0000-0000-0000-000000000006', 'e1000000-0000-0000-0000-000000000001', 'verify-011', 'verify-011');
+
+DO $$
+DECLARE
+    resolved TEXT;
+BEGIN
+    SELECT string_agg(right(r.annotation_id::text, 1) || '>' || right(r.terminal_annotation_id::text, 1)
+                      || ':' || r.depth, ',' ORDER BY r.annotation_id)
+      INTO resolved
+    FROM annotation_supersession_resolve(ARRAY(
+        SELECT ('e1000000-0000-0000-0000-00000000000' || i)::uuid FROM generate_series(1, 8) AS i)) r;
+
+    IF resolved <> '1>4:3,2>4:2,3>4:1,4>4:0,5>4:1,6>4:4,7>7:0,8>8:0' THEN
+        RAISE EXCEPTION 'unexpected resolution after extend/merge: %', resolved;
+    END IF;
+    IF (SELECT COUNT(*) FROM annotation_supersession_closure
+        WHERE terminal_annotation_id = 'e1000000-0000-0000-0000-000000000004') <> 5 THEN
+        RAISE EXCEPTION 'closure rows were not moved to the new terminal e4';
+    END IF;
+    RAISE NOTICE 'OK: later statements extend, merge and attach to existing chains';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 3. Cycles are rejected: against an existing chain (e4 -> e6) and within one
+--    statement (e7 -> e8 -> e7).
+-- ---------------------------------------------------------------------------
+DO $$
+BEGIN
+    BEGIN
+        INSERT INTO annotation_supersession (superseded_annotation_id, replacement_annotation_id)
+        VALUES ('e1000000-0000-0000-0000-000000000004', 'e1000000-0000-0000-0000-000000000006');
+        RAISE EXCEPTION 'cycle through an existing chain was accepted';
+    EXCEPTION WHEN check_violation THEN
+        IF SQLERRM NOT LIKE 'annotation_supersession cycle through annotation %' THEN
+            RAISE;
+        END IF;
+    END;
+
+    BEGIN
+        INSERT INTO annotation_supersession (superseded_annotation_id, replacement_annotation_id)
+        VALUES ('e1000000-0000-0000-0000-000000000007', 'e1000000-0000-0000-0000-000000000008'),
+               ('e1000000-0000-0000-0000-000000000008', 'e1000000-0000-0000-0000-000000000007');
+        RAISE EXCEPTION 'cycle within one statement was accepted';
+    EXCEPTION WHEN check_violation THEN
+        IF SQLERRM NOT LIKE 'annotation_supersession cycle through annotation %' THEN
+            RAISE;
+        END IF;
+    END;
+
+    IF EXISTS (SELECT 1 FROM annotation
+               WHERE annotation_id IN ('e1000000-0000-0000-0000-000000000004',
+                                       'e1000000-0000-0000-0000-000000000007')
+                 AND lifecycle_state <> 'active') THEN
+        RAISE EXCEPTION 'a rejected cycle left lifecycle changes behind';
+    END IF;
+    RAISE NOTICE 'OK: cyclic supersessions are rejected';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 4. Edge endpoints are insert-only; reason stays updatable.
+-- ---------------------------------------------------------------------------
+DO $$
+BEGIN
+    UPDATE annotation_supersession
+       SET reason = 'verify-011 relabel'
+     WHERE superseded_annotation_id = 'e1000000-0000-0000-0000-000000000005';
+
+    BEGIN
+        UPDATE annotation_supersession
+           SET replacement_annotation_id = 'e1000000-0000-0000-0000-000000000008'
+         WHERE superseded_annotation_id = 'e1000000-0000-0000-0000-000000000005';
+        RAISE EXCEPTION 'updating an edge endpoint succeeded';
+    EXCEPTION WHEN check_violation THEN
+        IF SQLERRM NOT LIKE 'annotation_supersession edges are insert-only%' THEN
+            RAISE;
+        END IF;
+    END;
+    RAISE NOTICE 'OK: supersession endpoints cannot be updated';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 5. A rebuild reproduces the maintained closure.
+-- ---------------------------------------------------------------------------
+CREATE TEMP TABLE verify_011_closure ON COMMIT DROP AS
+SELECT annotation_id, terminal_annotation_id, depth FROM annotation_supersession_closure;
+
+DO $$
+DECLARE
+    summary RECORD;
+BEGIN
+    SELECT * INTO summary FROM annotation_supersession_closure_rebuild();
+    IF summary.closure_rows <> summary.edges OR summary.max_depth < 4 THEN
+        RAISE EXCEPTION 'unexpected rebuild summary: %', summary;
+    END IF;
+    IF EXISTS (
+        (SELECT * FROM verify_011_closure
+         EXCEPT SELECT annotation_id, terminal_annotation_id, depth FROM annotation_supersession_closure)
+        UNION ALL
+        (SELECT annotation_id, terminal_annotation_id, depth FROM annotation_supersession_closure
+         EXCEPT SELECT * FROM verify_011_closure)
+    ) THEN
+        RAISE EXCEPTION 'rebuilt closure differs from the maintained closure';
+    END IF;
+    RAISE NOTICE 'OK: annotation_supersession_closure_rebuild matches incremental maintenance';
+END;
+$$;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+
+ROLLBACK;
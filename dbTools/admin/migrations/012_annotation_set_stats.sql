@@ -0,0 +1,363 @@
+-- Migration 012: incrementally maintained per-set annotation statistics
+-- Schema L — set / label / review-status counters fed by statement triggers
+-- Mirror note: keep this file byte-identical with its corresponding add/migration pair.
+--
+-- Purpose:
+--   Dashboards and QA tooling read per-set metrics (annotations by label,
+--   review_status distribution, mean confidence, conflict rate) with GROUP BY
+--   queries over the whole annotation / annotation_quality tables on every
+--   refresh.  This migration keeps those metrics as counters:
+--     - annotation_set_stats: per set_id totals (annotations, active
+--       annotations, score and confidence sums/counts, quality rows);
+--     - annotation_set_label_stats: per (set_id, label) annotation counts;
+--     - annotation_set_review_stats: per (set_id, review_status) counts;
+--     - annotation_set_stats_v1: one row per set with mean score, mean
+--       confidence, the review_status distribution and the conflict rate;
+--     - annotation_set_stats_rebuild(set_id): recompute one set (or all).
+--
+-- Context:
+--   Statement-level triggers with transition tables on annotation and
+--   annotation_quality turn each writing statement into signed deltas
+--   (+1 per new row image, -1 per old row image), grouped per set / label /
+--   review_status, and add them to the counters with one upsert per table.
+--   Statements that change none of the tracked columns (touch updates, the
+--   geometry pack trigger) produce all-zero deltas and write nothing.  A bulk
+--   writer batch therefore costs one small upsert per set, independent of the
+--   batch size.
+--
+--   annotation_quality rows are attributed to their annotation's set: through
+--   annotation_quality.set_id on the set_id-partitioned layout (008), through a
+--   join on annotation otherwise.  conflict_flag is equivalent to
+--   review_status = 'conflict' (migration 003), so the conflict rate is the
+--   'conflict' count over quality rows.  Sums are NUMERIC so repeated +/-
+--   deltas do not drift.
+--
+--   Counter rows of one set are updated in place, so concurrent writers to the
+--   same set queue on its annotation_set_stats row until commit.  Writers take
+--   a shared transaction-scoped advisory lock and the rebuild an exclusive
+--   one, so a rebuild never interleaves with in-flight deltas.
+--
+--   Detaching / attaching a run (008) moves whole partitions without firing
+--   row or statement triggers: rebuild that set afterwards
+--   (scripts/annotations/partitions.py does this).
+--
+-- Prerequisites:
+--   - Migrations 001-005
+--   - Works on the base layout and on the set_id-partitioned layout (008).
+--
+-- Safety:
+--   - Idempotent: CREATE TABLE/INDEX IF NOT EXISTS, CREATE OR REPLACE
+--     FUNCTION/VIEW, DROP TRIGGER IF EXISTS + CREATE TRIGGER.
+--   - Non-destructive: new tables, view, functions and triggers only.
+--   - The final rebuild scans annotation and annotation_quality once.
+--
+-- Rollback: see 012_annotation_set_stats_rollback.sql
+-- Verification: see 012_annotation_set_stats_verify.sql
+
+BEGIN;
+
+-- ============================================================================
+-- Counter tables
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS annotation_set_stats (
+    set_id               UUID        NOT NULL REFERENCES annotation_set(set_id),
+    annotations          BIGINT      NOT NULL DEFAULT 0,
+    active_annotations   BIGINT      NOT NULL DEFAULT 0,
+    score_sum            NUMERIC     NOT NULL DEFAULT 0,
+    score_count          BIGINT      NOT NULL DEFAULT 0,
+    quality_rows         BIGINT      NOT NULL DEFAULT 0,
+    confidence_sum       NUMERIC     NOT NULL DEFAULT 0,
+    confidence_count     BIGINT      NOT NULL DEFAULT 0,
+    updated_at           TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT pk_annotation_set_stats PRIMARY KEY (set_id)
+);
+
+COMMENT ON TABLE annotation_set_stats IS
+    'Per-set annotation/quality counters maintained by statement triggers (Schema L); read annotation_set_stats_v1.';
+COMMENT ON COLUMN annotation_set_stats.score_sum IS
+    'Sum of annotation.score over annotations with a score (score_count of them).';
+COMMENT ON COLUMN annotation_set_stats.confidence_sum IS
+    'Sum of annotation_quality.confidence_score over quality rows with a score (confidence_count of them).';
+
+CREATE TABLE IF NOT EXISTS annotation_set_label_stats (
+    set_id               UUID         NOT NULL REFERENCES annotation_set(set_id),
+    label                VARCHAR(255) NOT NULL,
+    annotations          BIGINT       NOT NULL DEFAULT 0,
+    active_annotations   BIGINT       NOT NULL DEFAULT 0,
+
+    CONSTRAINT pk_annotation_set_label_stats PRIMARY KEY (set_id, label)
+);
+
+COMMENT ON TABLE annotation_set_label_stats IS
+    'Per-(set_id, label) annotation counters maintained by statement triggers (Schema L).';
+
+CREATE TABLE IF NOT EXISTS annotation_set_review_stats (
+    set_id               UUID        NOT NULL REFERENCES annotation_set(set_id),
+    review_status        VARCHAR(32) NOT NULL,
+    annotations          BIGINT      NOT NULL DEFAULT 0,
+
+    CONSTRAINT pk_annotation_set_review_stats PRIMARY KEY (set_id, review_status)
+);
+
+COMMENT ON TABLE annotation_set_review_stats IS
+    'Per-(set_id, review_status) annotation_quality counters maintained by statement triggers (Schema L).';
+
+
+-- ============================================================================
+-- Delta triggers
+-- ============================================================================
+-- One function per table serves INSERT (new_rows) and UPDATE (old_rows and
+-- new_rows); the row images are combined with EXECUTE because an INSERT
+-- trigger has no old transition table.
+
+CREATE OR REPLACE FUNCTION maintain_annotation_set_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    row_images TEXT := 'SELECT set_id, label, lifecycle_state, score, 1 AS sign FROM new_rows';
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('annotation_set_stats'));
+
+    IF TG_OP = 'UPDATE' THEN
+        row_images := row_images
+            || ' UNION ALL SELECT set_id, label, lifecycle_state, score, -1 FROM old_rows';
+    END IF;
+
+    EXECUTE format($sql$
+        WITH delta AS (
+            SELECT r.set_id, r.label,
+                   SUM(r.sign) AS annotations,
+                   COALESCE(SUM(r.sign) FILTER (WHERE r.lifecycle_state = 'active'), 0) AS active_annotations,
+                   COALESCE(SUM(r.sign * r.score::numeric), 0) AS score_sum,
+                   COALESCE(SUM(r.sign) FILTER (WHERE r.score IS NOT NULL), 0) AS score_count
+            FROM (%s) r
+            GROUP BY r.set_id, r.label
+            HAVING SUM(r.sign) <> 0
+                OR COALESCE(SUM(r.sign) FILTER (WHERE r.lifecycle_state = 'active'), 0) <> 0
+                OR COALESCE(SUM(r.sign * r.score::numeric), 0) <> 0
+                OR COALESCE(SUM(r.sign) FILTER (WHERE r.score IS NOT NULL), 0) <> 0
+        ), label_upsert AS (
+            INSERT INTO annotation_set_label_stats AS s (set_id, label, annotations, active_annotations)
+            SELECT d.set_id, d.label, d.annotations, d.active_annotations
+            FROM delta d
+            WHERE d.annotations <> 0 OR d.active_annotations <> 0
+            ON CONFLICT (set_id, label) DO UPDATE
+               SET annotations = s.annotations + EXCLUDED.annotations,
+                   active_annotations = s.active_annotations + EXCLUDED.active_annotations
+        )
+        INSERT INTO annotation_set_stats AS s (
+            set_id, annotations, active_annotations, score_sum, score_count
+        )
+        SELECT d.set_id, SUM(d.annotations), SUM(d.active_annotations),
+               SUM(d.score_sum), SUM(d.score_count)
+        FROM delta d
+        GROUP BY d.set_id
+        ON CONFLICT (set_id) DO UPDATE
+           SET annotations = s.annotations + EXCLUDED.annotations,
+               active_annotations = s.active_annotations + EXCLUDED.active_annotations,
+               score_sum = s.score_sum + EXCLUDED.score_sum,
+               score_count = s.score_count + EXCLUDED.score_count,
+               updated_at = NOW()
+    $sql$, row_images);
+
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION maintain_annotation_set_quality_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    image_columns TEXT := 'q.review_status, q.confidence_score';
+    set_source TEXT;
+    row_images TEXT;
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('annotation_set_stats'));
+
+    -- The partitioned layout (008) carries set_id on annotation_quality.
+    IF EXISTS (SELECT 1 FROM pg_attribute
+               WHERE attrelid = TG_RELID AND attname = 'set_id' AND NOT attisdropped) THEN
+        set_source := 'SELECT q.set_id, %s, %s FROM %I q';
+    ELSE
+        set_source := 'SELECT a.set_id, %s, %s FROM %I q JOIN annotation a ON a.annotation_id = q.annotation_id';
+    END IF;
+
+    row_images := format(set_source, image_columns, '1 AS sign', 'new_rows');
+    IF TG_OP = 'UPDATE' THEN
+        row_images := row_images || ' UNION ALL ' || format(set_source, image_columns, '-1', 'old_rows');
+    END IF;
+
+    EXECUTE format($sql$
+        WITH delta AS (
+            SELECT r.set_id, r.review_status,
+                   SUM(r.sign) AS quality_rows,
+                   COALESCE(SUM(r.sign * r.confidence_score::numeric), 0) AS confidence_sum,
+                   COALESCE(SUM(r.sign) FILTER (WHERE r.confidence_score IS NOT NULL), 0) AS confidence_count
+            FROM (%s) r
+            GROUP BY r.set_id, r.review_status
+            HAVING SUM(r.sign) <> 0
+                OR COALESCE(SUM(r.sign * r.confidence_score::numeric), 0) <> 0
+                OR COALESCE(SUM(r.sign) FILTER (WHERE r.confidence_score IS NOT NULL), 0) <> 0
+        ), review_upsert AS (
+            INSERT INTO annotation_set_review_stats AS s (set_id, review_status, annotations)
+            SELECT d.set_id, d.review_status, d.quality_rows
+            FROM delta d
+            WHERE d.quality_rows <> 0
+            ON CONFLICT (set_id, review_status) DO UPDATE
+               SET annotations = s.annotations + EXCLUDED.annotations
+        )
+        INSERT INTO annotation_set_stats AS s (
+            set_id, quality_rows, confidence_sum, confidence_count
+        )
+        SELECT d.set_id, SUM(d.quality_rows), SUM(d.confidence_sum), SUM(d.confidence_count)
+        FROM delta d
+        GROUP BY d.set_id
+        ON CONFLICT (set_id) DO UPDATE
+           SET quality_rows = s.quality_rows + EXCLUDED.quality_rows,
+               confidence_sum = s.confidence_sum + EXCLUDED.confidence_sum,
+               confidence_count = s.confidence_count + EXCLUDED.confidence_count,
+               updated_at = NOW()
+    $sql$, row_images);
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_annotation_set_stats_insert ON annotation;
+CREATE TRIGGER trg_annotation_set_stats_insert
+AFTER INSERT ON annotation
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION maintain_annotation_set_stats();
+
+DROP TRIGGER IF EXISTS trg_annotation_set_stats_update ON annotation;
+CREATE TRIGGER trg_annotation_set_stats_update
+AFTER UPDATE ON annotation
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION maintain_annotation_set_stats();
+
+DROP TRIGGER IF EXISTS trg_quality_set_stats_insert ON annotation_quality;
+CREATE TRIGGER trg_quality_set_stats_insert
+AFTER INSERT ON annotation_quality
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION maintain_annotation_set_quality_stats();
+
+DROP TRIGGER IF EXISTS trg_quality_set_stats_update ON annotation_quality;
+CREATE TRIGGER trg_quality_set_stats_update
+AFTER UPDATE ON annotation_quality
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION maintain_annotation_set_quality_stats();
+
+
+-- ============================================================================
+-- Read surface
+-- ============================================================================
+
+CREATE OR REPLACE VIEW annotation_set_stats_v1 AS
+SELECT
+    s.set_id,
+    s.annotations,
+    s.active_annotations,
+    s.score_sum / NULLIF(s.score_count, 0) AS mean_score,
+    s.quality_rows,
+    s.confidence_sum / NULLIF(s.confidence_count, 0) AS mean_confidence,
+    COALESCE(r.unreviewed, 0) AS unreviewed,
+    COALESCE(r.needs_review, 0) AS needs_review,
+    COALESCE(r.accepted, 0) AS accepted,
+    COALESCE(r.rejected, 0) AS rejected,
+    COALESCE(r.conflict, 0) AS conflict,
+    COALESCE(r.conflict, 0)::numeric / NULLIF(s.quality_rows, 0) AS conflict_rate,
+    s.updated_at
+FROM annotation_set_stats s
+LEFT JOIN LATERAL (
+    SELECT
+        SUM(rs.annotations) FILTER (WHERE rs.review_status = 'unreviewed') AS unreviewed,
+        SUM(rs.annotations) FILTER (WHERE rs.review_status = 'needs_review') AS needs_review,
+        SUM(rs.annotations) FILTER (WHERE rs.review_status = 'accepted') AS accepted,
+        SUM(rs.annotations) FILTER (WHERE rs.review_status = 'rejected') AS rejected,
+        SUM(rs.annotations) FILTER (WHERE rs.review_status = 'conflict') AS conflict
+    FROM annotation_set_review_stats rs
+    WHERE rs.set_id = s.set_id
+) r ON TRUE;
+
+COMMENT ON VIEW annotation_set_stats_v1 IS
+    'Per-set metrics from the Schema L counters: means, review_status distribution and conflict rate.';
+
+
+-- ============================================================================
+-- Rebuild
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION annotation_set_stats_rebuild(in_set_id UUID DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rebuilt INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('annotation_set_stats'));
+
+    DELETE FROM annotation_set_label_stats WHERE in_set_id IS NULL OR set_id = in_set_id;
+    DELETE FROM annotation_set_review_stats WHERE in_set_id IS NULL OR set_id = in_set_id;
+    DELETE FROM annotation_set_stats WHERE in_set_id IS NULL OR set_id = in_set_id;
+
+    INSERT INTO annotation_set_label_stats (set_id, label, annotations, active_annotations)
+    SELECT a.set_id, a.label, COUNT(*), COUNT(*) FILTER (WHERE a.lifecycle_state = 'active')
+    FROM annotation a
+    WHERE in_set_id IS NULL OR a.set_id = in_set_id
+    GROUP BY a.set_id, a.label;
+
+    INSERT INTO annotation_set_review_stats (set_id, review_status, annotations)
+    SELECT a.set_id, q.review_status, COUNT(*)
+    FROM annotation_quality q
+    JOIN annotation a ON a.annotation_id = q.annotation_id
+    WHERE in_set_id IS NULL OR a.set_id = in_set_id
+    GROUP BY a.set_id, q.review_status;
+
+    INSERT INTO annotation_set_stats (
+        set_id, annotations, active_annotations, score_sum, score_count,
+        quality_rows, confidence_sum, confidence_count
+    )
+    SELECT st.set_id,
+           COALESCE(an.annotations, 0), COALESCE(an.active_annotations, 0),
+           COALESCE(an.score_sum, 0), COALESCE(an.score_count, 0),
+           COALESCE(qu.quality_rows, 0), COALESCE(qu.confidence_sum, 0), COALESCE(qu.confidence_count, 0)
+    FROM annotation_set st
+    LEFT JOIN (
+        SELECT a.set_id, COUNT(*) AS annotations,
+               COUNT(*) FILTER (WHERE a.lifecycle_state = 'active') AS active_annotations,
+               SUM(a.score::numeric) AS score_sum, COUNT(a.score) AS score_count
+        FROM annotation a
+        WHERE in_set_id IS NULL OR a.set_id = in_set_id
+        GROUP BY a.set_id
+    ) an ON an.set_id = st.set_id
+    LEFT JOIN (
+        SELECT a.set_id, COUNT(*) AS quality_rows,
+               SUM(q.confidence_score::numeric) AS confidence_sum,
+               COUNT(q.confidence_score) AS confidence_count
+        FROM annotation_quality q
+        JOIN annotation a ON a.annotation_id = q.annotation_id
+        WHERE in_set_id IS NULL OR a.set_id = in_set_id
+        GROUP BY a.set_id
+    ) qu ON qu.set_id = st.set_id
+    WHERE (in_set_id IS NULL OR st.set_id = in_set_id)
+      AND (an.set_id IS NOT NULL OR qu.set_id IS NOT NULL);
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+
+    RETURN rebuilt;
+END;
+$$;
+
+COMMENT ON FUNCTION annotation_set_stats_rebuild(UUID) IS
+    'Recompute the Schema L counters for one set (or all sets when NULL) from annotation/annotation_quality; returns sets written.';
+
+SELECT annotation_set_stats_rebuild();
+
+ANALYZE annotation_set_stats;
+ANALYZE annotation_set_label_stats;
+ANALYZE annotation_set_review_stats;
+
+COMMIT;
@@ -0,0 +1,22 @@
+-- Rollback for Migration 012 (Schema L)
+-- Drops the per-set statistics view, delta triggers, rebuild function and
+-- counter tables.  annotation / annotation_quality rows are untouched.
+
+BEGIN;
+
+DROP VIEW IF EXISTS annotation_set_stats_v1;
+
+DROP TRIGGER IF EXISTS trg_quality_set_stats_update ON annotation_quality;
+DROP TRIGGER IF EXISTS trg_quality_set_stats_insert ON annotation_quality;
+DROP TRIGGER IF EXISTS trg_annotation_set_stats_update ON annotation;
+DROP TRIGGER IF EXISTS trg_annotation_set_stats_insert ON annotation;
+
+DROP FUNCTION IF EXISTS annotation_set_stats_rebuild(UUID);
+DROP FUNCTION IF EXISTS maintain_annotation_set_quality_stats();
+DROP FUNCTION IF EXISTS maintain_annotation_set_stats();
+
+DROP TABLE IF EXISTS annotation_set_review_stats;
+DROP TABLE IF EXISTS annotation_set_label_stats;
+DROP TABLE IF EXISTS annotation_set_stats;
+
+COMMIT;
@@ -0,0 +1,201 @@
+-- Verification script for Migration 012 (Schema L)
+--
+-- Purpose:
+--   Validate the per-set statistics counters:
+--     - a multi-row annotation INSERT and quality INSERT update set, label and
+--       review_status counters and the means in annotation_set_stats_v1,
+--     - quality adjudication moves review_status counts and the conflict rate,
+--     - supersession (lifecycle UPDATE) moves active counts,
+--     - label / score corrections move counters between labels,
+--     - updates that touch no tracked column leave the counters unchanged,
+--     - annotation_set_stats_rebuild() reproduces the incremental counters.
+--
+-- Works on the base layout and on the set_id-partitioned layout (008): child
+-- rows get a set_id only when the column exists.
+--
+-- Usage:
+--   psql -U postgres -d <db_name> -f dbTools/admin/migrations/012_annotation_set_stats_verify.sql
+--
+-- Safety:
+--   Runs in a transaction and ends with ROLLBACK.
+
+BEGIN;
+
+-- ---------------------------------------------------------------------------
+-- 0. Fixture: one run with four annotations written by single statements.
+--    e1 bee  0.9    e2 bee  0.7    e3 wasp 0.5    e4 ant (no score)
+-- ---------------------------------------------------------------------------
+INSERT INTO annotation_set (set_id, name, source_kind, source_name, source_version, run_id)
+VALUES ('a0000000-0000-0000-0000-000000000012', 'verify-012', 'imported_dataset',
+        'verify-012', '1', 'verify-012-run');
+
+INSERT INTO annotation_subject (subject_id, asset_uuid, asset_width_px, asset_height_px)
+VALUES ('c1000000-0000-0000-0000-000000000012', 'd1000000-0000-0000-0000-000000000012', 640, 480);
+
+INSERT INTO annotation (annotation_id, subject_id, set_id, label, score, lifecycle_state)
+VALUES
+    ('e1000000-0000-0000-0000-000000000001', 'c1000000-0000-0000-0000-000000000012',
+     'a0000000-0000-0000-0000-000000000012', 'verify-bee', 0.9, 'active'),
+    ('e1000000-0000-0000-0000-000000000002', 'c1000000-0000-0000-0000-000000000012',
+     'a0000000-0000-0000-0000-000000000012', 'verify-bee', 0.7, 'active'),
+    ('e1000000-0000-0000-0000-000000000003', 'c1000000-0000-0000-0000-000000000012',
+     'a0000000-0000-0000-0000-000000000012', 'verify-wasp', 0.5, 'active'),
+    ('e1000000-0000-0000-0000-000000000004', 'c1000000-0000-0000-0000-000000000012',
+     'a0000000-0000-0000-0000-000000000012', 'verify-ant', NULL, 'active');
+
+DO $$
+DECLARE
+    set_col TEXT := '';
+    set_val TEXT := '';
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_attribute
+               WHERE attrelid = 'annotation_quality'::regclass AND attname = 'set_id' AND NOT attisdropped) THEN
+        set_col := ', set_id';
+        set_val := ', a.set_id';
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO annotation_provenance (annotation_id, source_kind, source_name, source_version%s) '
+        'SELECT a.annotation_id, ''imported_dataset'', ''verify-012'', ''1''%s '
+        'FROM annotation a WHERE a.set_id = ''a0000000-0000-0000-0000-000000000012''',
+        set_col, set_val);
+
+    EXECUTE format(
+        'INSERT INTO annotation_quality (annotation_id, review_status, confidence_score%s) '
+        'SELECT a.annotation_id, ''unreviewed'', a.score%s '
+        'FROM annotation a WHERE a.set_id = ''a0000000-0000-0000-0000-000000000012''',
+        set_col, set_val);
+END;
+$$;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+SET CONSTRAINTS ALL DEFERRED;
+
+-- ---------------------------------------------------------------------------
+-- 1. Inserts update the counters and means.
+-- ---------------------------------------------------------------------------
+DO $$
+DECLARE
+    s RECORD;
+BEGIN
+    SELECT * INTO s FROM annotation_set_stats_v1 WHERE set_id = 'a0000000-0000-0000-0000-000000000012';
+    IF s IS NULL OR s.annotations <> 4 OR s.active_annotations <> 4 OR s.mean_score <> 0.7
+       OR s.quality_rows <> 4 OR s.mean_confidence <> 0.7 OR s.unreviewed <> 4
+       OR s.conflict <> 0 OR s.conflict_rate <> 0 THEN
+        RAISE EXCEPTION 'unexpected stats after insert: %', s;
+    END IF;
+    IF (SELECT string_agg(label || '=' || annotations, ',' ORDER BY label)
+        FROM annotation_set_label_stats WHERE set_id = 'a0000000-0000-0000-0000-000000000012')
+       <> 'verify-ant=1,verify-bee=2,verify-wasp=1' THEN
+        RAISE EXCEPTION 'unexpected label counters after insert';
+    END IF;
+    RAISE NOTICE 'OK: bulk inserts maintain set, label and review counters';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 2. Adjudication moves the review_status distribution and conflict rate.
+-- ---------------------------------------------------------------------------
+UPDATE annotation_quality
+   SET review_status = CASE WHEN annotation_id = 'e1000000-0000-0000-0000-000000000001' THEN 'accepted'
+                            ELSE 'conflict' END,
+       conflict_flag = annotation_id <> 'e1000000-0000-0000-0000-000000000001',
+       conflict_reason = CASE WHEN annotation_id <> 'e1000000-0000-0000-0000-000000000001'
+                              THEN 'verify-012' END,
+       adjudicated_by = 'verify-012',
+       adjudicated_at = NOW()
+ WHERE annotation_id IN ('e1000000-0000-0000-0000-000000000001',
+                         'e1000000-0000-0000-0000-000000000002');
+
+DO $$
+DECLARE
+    s RECORD;
+BEGIN
+    SELECT * INTO s FROM annotation_set_stats_v1 WHERE set_id = 'a0000000-0000-0000-0000-000000000012';
+    IF s.unreviewed <> 2 OR s.accepted <> 1 OR s.conflict <> 1 OR s.quality_rows <> 4
+       OR s.conflict_rate <> 0.25 OR s.mean_confidence <> 0.7 THEN
+        RAISE EXCEPTION 'unexpected stats after adjudication: %', s;
+    END IF;
+    RAISE NOTICE 'OK: quality updates move the review_status distribution and conflict rate';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 3. Lifecycle, label and score changes; no-op updates write nothing.
+-- ---------------------------------------------------------------------------
+UPDATE annotation SET lifecycle_state = 'retracted'
+ WHERE annotation_id = 'e1000000-0000-0000-0000-000000000003';
+UPDATE annotation SET label = 'verify-bee', score = 0.3
+ WHERE annotation_id = 'e1000000-0000-0000-0000-000000000004';
+UPDATE annotation SET label = label
+ WHERE set_id = 'a0000000-0000-0000-0000-000000000012';
+UPDATE annotation_quality SET review_notes = 'verify-012 note'
+ WHERE annotation_id = 'e1000000-0000-0000-0000-000000000004';
+
+DO $$
+DECLARE
+    s RECORD;
+BEGIN
+    SELECT * INTO s FROM annotation_set_stats_v1 WHERE set_id = 'a0000000-0000-0000-0000-000000000012';
+    IF s.annotations <> 4 OR s.active_annotations <> 3 OR s.mean_score <> 0.6 OR s.quality_rows <> 4 THEN
+        RAISE EXCEPTION 'unexpected stats after lifecycle/label changes: %', s;
+    END IF;
+    IF (SELECT string_agg(label || '=' || annotations || '/' || active_annotations, ',' ORDER BY label)
+        FROM annotation_set_label_stats WHERE set_id = 'a0000000-0000-0000-0000-000000000012')
+       <> 'verify-ant=0/0,verify-bee=3/3,verify-wasp=1/0' THEN
+        RAISE EXCEPTION 'unexpected label counters after lifecycle/label changes';
+    END IF;
+    RAISE NOTICE 'OK: lifecycle, label and score updates move counters; no-op updates do not';
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 4. A rebuild reproduces the incremental counters for every set.
+-- ---------------------------------------------------------------------------
+CREATE TEMP TABLE verify_012_stats ON COMMIT DROP AS
+SELECT set_id, annotations, active_annotations, score_sum, score_count,
+       quality_rows, confidence_sum, confidence_count
+FROM annotation_set_stats;
+CREATE TEMP TABLE verify_012_labels ON COMMIT DROP AS
+SELECT set_id, label, annotations, active_annotations
+FROM annotation_set_label_stats WHERE annotations <> 0 OR active_annotations <> 0;
+CREATE TEMP TABLE verify_012_reviews ON COMMIT DROP AS
+SELECT set_id, review_status, annotations
+FROM annotation_set_review_stats WHERE annotations <> 0;
+
+DO $$
+BEGIN
+    PERFORM annotation_set_stats_rebuild();
+    IF EXISTS (
+        (SELECT * FROM verify_012_stats
+         EXCEPT SELECT set_id, annotations, active_annotations, score_sum, score_count,
+                       quality_rows, confidence_sum, confidence_count FROM annotation_set_stats)
+        UNION ALL
+        (SELECT set_id, annotations, active_annotations, score_sum, score_count,
+                quality_rows, confidence_sum, confidence_count FROM annotation_set_stats
+         EXCEPT SELECT * FROM verify_012_stats)
+    ) THEN
+        RAISE EXCEPTION 'rebuilt annotation_set_stats differs from the incremental counters';
+    END IF;
+    IF EXISTS (
+        (SELECT * FROM verify_012_labels
+         EXCEPT SELECT set_id, label, annotations, active_annotations FROM annotation_set_label_stats)
+        UNION ALL
+        (SELECT set_id, label, annotations, active_annotations FROM annotation_set_label_stats
+         EXCEPT SELECT * FROM verify_012_labels)
+    ) OR EXISTS (
+        (SELECT * FROM verify_012_reviews
+         EXCEPT SELECT set_id, review_status, annotations FROM annotation_set_review_stats)
+        UNION ALL
+        (SELECT set_id, review_status, annotations FROM annotation_set_review_stats
+         EXCEPT SELECT * FROM verify_012_reviews)
+    ) THEN
+        RAISE EXCEPTION 'rebuilt label/review counters differ from the incremental counters';
+    END IF;
+    RAISE NOTICE 'OK: annotation_set_stats_rebuild matches incremental maintenance';
+END;
+$$;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+
+ROLLBACK;
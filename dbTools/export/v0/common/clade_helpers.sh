@@ -13,6 +13,9 @@
 #   3) "get_major_rank_floor()" to compute the next-lower major-rank boundary
 #      if user does not want to include minor ranks. Typically used if the root
 #      is e.g. 57 => 50. If user includes minor ranks, we skip the rounding.
+#   4) "get_root_interval()" / "build_interval_condition()" to turn roots into
+#      merged "lft BETWEEN a AND b" ranges using the nested-interval columns
+#      on expanded_taxa (see scripts/add_nested_intervals.py).
 #
 # NOTE: We do not forcibly integrate with existing "get_clade_condition()"
 # in clade_defns.sh. Instead, you can call parse_clade_expression() if you
@@ -32,6 +35,9 @@
 #   - parse_clade_expression()
 #   - check_root_independence()
 #   - get_major_rank_floor()
+#   - get_root_interval()
+#   - build_interval_condition()
+#   - check_root_independence_intervals()
 #
 
 # -------------------------------------------------------------
@@ -316,6 +322,119 @@ function get_major_rank_floor() {
   echo "$base"
 }
 
+# -------------------------------------------------------------
+# E) Nested-interval helpers
+# -------------------------------------------------------------
+# Requires expanded_taxa."lft"/"rgt" (scripts/add_nested_intervals.py).
+# A taxon T lies under root R iff T.lft BETWEEN R.lft AND R.rgt, regardless
+# of R's rank, so we never need to pick an L{rank}_taxonID column.
+
+# get_root_interval <taxonID>
+#   Prints "lft rgt" for the given taxon. Returns 1 if the taxon is missing
+#   or has no interval (i.e. add_nested_intervals.py has not been run).
+function get_root_interval() {
+  local tid="$1"
+  local result
+  result="$(execute_sql "
+COPY (
+  SELECT \"lft\", \"rgt\"
+  FROM expanded_taxa
+  WHERE \"taxonID\" = ${tid}
+    AND \"lft\" IS NOT NULL
+) TO STDOUT WITH CSV;
+" | tail -n1)"
+
+  if [[ ! "$result" =~ ^[0-9]+,[0-9]+$ ]]; then
+    echo "ERROR: get_root_interval: no lft/rgt found for taxonID=${tid}" >&2
+    return 1
+  fi
+  echo "${result/,/ }"
+}
+
+# _merged_root_intervals <rootArray...>
+#   Resolves each "rank=taxonID" root to its interval, sorts by lft and
+#   merges overlapping/adjacent ranges. Prints one "lft rgt" line per range.
+function _merged_root_intervals() {
+  local roots=("$@")
+  local intervals=()
+  local r tid iv
+  for r in "${roots[@]}"; do
+    tid="${r##*=}"
+    iv="$(get_root_interval "$tid")" || return 1
+    intervals+=( "$iv" )
+  done
+
+  printf '%s\n' "${intervals[@]}" | sort -n -k1,1 | awk '
+    NR == 1 { lo = $1; hi = $2; next }
+    $1 <= hi + 1 { if ($2 > hi) hi = $2; next }
+    { print lo, hi; lo = $1; hi = $2 }
+    END { if (NR > 0) print lo, hi }
+  '
+}
+
+# build_interval_condition <column> <rootArray...>
+#   Emits a SQL predicate over <column> (e.g. 'e."lft"' or 'o.taxon_lft')
+#   covering the union of all roots as merged ranges, e.g.
+#     (e."lft" BETWEEN 1200 AND 98000 OR e."lft" BETWEEN 120500 AND 130000)
+#   With no roots, emits TRUE (matches the "no clade" behaviour).
+function build_interval_condition() {
+  local column="$1"
+  shift
+  if [ "$#" -eq 0 ]; then
+    echo "TRUE"
+    return 0
+  fi
+
+  local merged
+  merged="$(_merged_root_intervals "$@")" || return 1
+
+  local parts=()
+  local lo hi
+  while read -r lo hi; do
+    [ -z "$lo" ] && continue
+    parts+=( "${column} BETWEEN ${lo} AND ${hi}" )
+  done <<< "$merged"
+
+  local joined
+  joined="$(printf ' OR %s' "${parts[@]}")"
+  echo "(${joined# OR })"
+}
+
+# check_root_independence_intervals <rootArray...>
+#   Interval-based equivalent of check_root_independence(): two roots are
+#   dependent iff one interval contains the other. Returns 0 if all roots
+#   are disjoint, 1 otherwise.
+function check_root_independence_intervals() {
+  local roots=("$@")
+  if [ "${#roots[@]}" -le 1 ]; then
+    return 0
+  fi
+
+  local lines=()
+  local r tid iv
+  for r in "${roots[@]}"; do
+    tid="${r##*=}"
+    iv="$(get_root_interval "$tid")" || return 1
+    lines+=( "${iv} ${r}" )
+  done
+
+  local overlap
+  overlap="$(printf '%s\n' "${lines[@]}" | sort -n -k1,1 | awk '
+    NR > 1 && $1 <= hi { print prev " and " $3; exit }
+    { if (NR == 1 || $2 > hi) { hi = $2; prev = $3 } }
+  ')"
+
+  if [ -n "$overlap" ]; then
+    echo "ERROR: Overlap detected between roots ${overlap} (nested intervals)" >&2
+    return 1
+  fi
+  return 0
+}
+
 export -f parse_clade_expression
 export -f check_root_independence
+export -f get_root_interval
+export -f _merged_root_intervals
+export -f build_interval_condition
+export -f check_root_independence_intervals
 export -f get_major_rank_floor
\ No newline at end of file
@@ -5,6 +5,11 @@
 # Creates a final observation subset for a user-specified clade/metaclade,
 # referencing the "expanded_taxa" table. The input table for this script is
 # typically provided in ANCESTORS_OBS_TABLE (set by regional_base.sh).
+# With USE_EXPORT_CANDIDATES=true, the input is instead the release-scoped
+# EXPORT_CANDIDATES_TABLE (set by export_candidates.sh), filtered by
+# ANCESTORS_TABLE and the region bounding box; no expanded_taxa join is needed.
+# With USE_NESTED_INTERVALS=true, that filter is also bounded by the clade's
+# merged taxon_lft ranges (CLADE_LFT_CONDITION from regional_base.sh).
 #
 # Steps:
 #   1) Validate environment & drop <EXPORT_GROUP>_observations if it exists
@@ -20,7 +25,8 @@
 #
 # Optional:
 #   RG_FILTER_MODE, MIN_OCCURRENCES_PER_RANK, MAX_RN, PRIMARY_ONLY,
-#   INCLUDE_ELEVATION_EXPORT
+#   INCLUDE_ELEVATION_EXPORT, USE_EXPORT_CANDIDATES,
+#   MAX_PHOTOS_PER_OBS, MAX_PHOTOS_PER_SPECIES
 #
 # Revision highlights:
 #   - All references to columns like L5_taxonID, L10_taxonID, etc. are double-quoted
@@ -30,15 +36,30 @@
 
 set -e
 
-# 1) Source common functions & check ANCESTORS_OBS_TABLE
+# 1) Source common functions & check the input table
 source "${BASE_DIR}/common/functions.sh"
 
-if [ -z "${ANCESTORS_OBS_TABLE:-}" ]; then
+if [ "${USE_EXPORT_CANDIDATES:-false}" = "true" ]; then
+  if [ -z "${EXPORT_CANDIDATES_TABLE:-}" ] || [ -z "${ANCESTORS_TABLE:-}" ]; then
+    echo "ERROR: USE_EXPORT_CANDIDATES=true requires EXPORT_CANDIDATES_TABLE and ANCESTORS_TABLE to be set."
+    exit 1
+  fi
+  print_progress "cladistic.sh: Using export candidates = ${EXPORT_CANDIDATES_TABLE} (taxa from ${ANCESTORS_TABLE})"
+elif [ -z "${ANCESTORS_OBS_TABLE:-}" ]; then
   echo "ERROR: cladistic.sh requires ANCESTORS_OBS_TABLE to be set."
   exit 1
+else
+  print_progress "cladistic.sh: Using ancestor-based table = ${ANCESTORS_OBS_TABLE}"
 fi
 
-print_progress "cladistic.sh: Using ancestor-based table = ${ANCESTORS_OBS_TABLE}"
+# Alias that carries the taxon path columns ("L10_taxonID", etc.):
+#   - e => expanded_taxa joined onto ANCESTORS_OBS_TABLE (default)
+#   - o => export_candidates, which already carries the taxon path
+if [ "${USE_EXPORT_CANDIDATES:-false}" = "true" ]; then
+  TAXON_ALIAS="o"
+else
+  TAXON_ALIAS="e"
+fi
 
 TABLE_NAME="${EXPORT_GROUP}_observations"
 execute_sql "DROP TABLE IF EXISTS \"${TABLE_NAME}\" CASCADE;"
@@ -46,88 +67,109 @@ execute_sql "DROP TABLE IF EXISTS \"${TABLE_NAME}\" CASCADE;"
 # ------------------------------------------------------------------------------
 # 2) Construct RG filter condition & possibly rewrite "L10_taxonID"
 # ------------------------------------------------------------------------------
-rg_where_condition="TRUE"
-rg_l10_col="e.\"L10_taxonID\""  # might become NULL::integer if we do a wipe
-
-case "${RG_FILTER_MODE:-ALL}" in
-  "ONLY_RESEARCH")
-    rg_where_condition="o.quality_grade='research'"
-    ;;
-  "ALL")
-    rg_where_condition="TRUE"
-    ;;
-  "ALL_EXCLUDE_SPECIES_NON_RESEARCH")
-    rg_where_condition="NOT (o.quality_grade!='research' AND e.\"L10_taxonID\" IS NOT NULL)"
-    ;;
-  "ONLY_NONRESEARCH")
-    rg_where_condition="o.quality_grade!='research'"
-    ;;
-  "ONLY_NONRESEARCH_EXCLUDE_SPECIES")
-    rg_where_condition="(o.quality_grade!='research' AND e.\"L10_taxonID\" IS NULL)"
-    ;;
-  "ONLY_NONRESEARCH_WIPE_SPECIES_LABEL")
-    rg_where_condition="o.quality_grade!='research'"
-    rg_l10_col="NULL::integer"
-    ;;
-  *)
-    rg_where_condition="TRUE"
-    ;;
-esac
+rg_where_condition="$(get_rg_where_condition "${TAXON_ALIAS}")"
+rg_l10_col="${TAXON_ALIAS}.\"L10_taxonID\""  # might become NULL::integer if we do a wipe
+
+if [ "${RG_FILTER_MODE:-ALL}" = "ONLY_NONRESEARCH_WIPE_SPECIES_LABEL" ]; then
+  rg_l10_col="NULL::integer"
+fi
 
 # ------------------------------------------------------------------------------
 # 3) Create <EXPORT_GROUP>_observations by joining ANCESTORS_OBS_TABLE + expanded_taxa
+#    (or by filtering EXPORT_CANDIDATES_TABLE when USE_EXPORT_CANDIDATES=true)
 # ------------------------------------------------------------------------------
 OBS_COLUMNS="$(get_obs_columns)"  # e.g. observation_uuid, observer_id, latitude, longitude, etc.
 
 # We explicitly alias each expanded_taxa column in quotes, so that Postgres
 # stores them in mixed-case (e.g. "L5_taxonID") and we can select them reliably.
 EXPANDED_TAXA_COLS="
-    e.\"taxonID\"        AS \"expanded_taxonID\",
-    e.\"rankLevel\"      AS \"expanded_rankLevel\",
-    e.\"name\"           AS \"expanded_name\",
-    e.\"L5_taxonID\"     AS \"L5_taxonID\",
+    ${TAXON_ALIAS}.\"taxonID\"        AS \"expanded_taxonID\",
+    ${TAXON_ALIAS}.\"rankLevel\"      AS \"expanded_rankLevel\",
+    ${TAXON_ALIAS}.\"name\"           AS \"expanded_name\",
+    ${TAXON_ALIAS}.\"L5_taxonID\"     AS \"L5_taxonID\",
     ${rg_l10_col}        AS \"L10_taxonID\",
-    e.\"L11_taxonID\"    AS \"L11_taxonID\",
-    e.\"L12_taxonID\"    AS \"L12_taxonID\",
-    e.\"L13_taxonID\"    AS \"L13_taxonID\",
-    e.\"L15_taxonID\"    AS \"L15_taxonID\",
-    e.\"L20_taxonID\"    AS \"L20_taxonID\",
-    e.\"L24_taxonID\"    AS \"L24_taxonID\",
-    e.\"L25_taxonID\"    AS \"L25_taxonID\",
-    e.\"L26_taxonID\"    AS \"L26_taxonID\",
-    e.\"L27_taxonID\"    AS \"L27_taxonID\",
-    e.\"L30_taxonID\"    AS \"L30_taxonID\",
-    e.\"L32_taxonID\"    AS \"L32_taxonID\",
-    e.\"L33_taxonID\"    AS \"L33_taxonID\",
-    e.\"L33_5_taxonID\"  AS \"L33_5_taxonID\",
-    e.\"L34_taxonID\"    AS \"L34_taxonID\",
-    e.\"L34_5_taxonID\"  AS \"L34_5_taxonID\",
-    e.\"L35_taxonID\"    AS \"L35_taxonID\",
-    e.\"L37_taxonID\"    AS \"L37_taxonID\",
-    e.\"L40_taxonID\"    AS \"L40_taxonID\",
-    e.\"L43_taxonID\"    AS \"L43_taxonID\",
-    e.\"L44_taxonID\"    AS \"L44_taxonID\",
-    e.\"L45_taxonID\"    AS \"L45_taxonID\",
-    e.\"L47_taxonID\"    AS \"L47_taxonID\",
-    e.\"L50_taxonID\"    AS \"L50_taxonID\",
-    e.\"L53_taxonID\"    AS \"L53_taxonID\",
-    e.\"L57_taxonID\"    AS \"L57_taxonID\",
-    e.\"L60_taxonID\"    AS \"L60_taxonID\",
-    e.\"L67_taxonID\"    AS \"L67_taxonID\",
-    e.\"L70_taxonID\"    AS \"L70_taxonID\"
+    ${TAXON_ALIAS}.\"L11_taxonID\"    AS \"L11_taxonID\",
+    ${TAXON_ALIAS}.\"L12_taxonID\"    AS \"L12_taxonID\",
+    ${TAXON_ALIAS}.\"L13_taxonID\"    AS \"L13_taxonID\",
+    ${TAXON_ALIAS}.\"L15_taxonID\"    AS \"L15_taxonID\",
+    ${TAXON_ALIAS}.\"L20_taxonID\"    AS \"L20_taxonID\",
+    ${TAXON_ALIAS}.\"L24_taxonID\"    AS \"L24_taxonID\",
+    ${TAXON_ALIAS}.\"L25_taxonID\"    AS \"L25_taxonID\",
+    ${TAXON_ALIAS}.\"L26_taxonID\"    AS \"L26_taxonID\",
+    ${TAXON_ALIAS}.\"L27_taxonID\"    AS \"L27_taxonID\",
+    ${TAXON_ALIAS}.\"L30_taxonID\"    AS \"L30_taxonID\",
+    ${TAXON_ALIAS}.\"L32_taxonID\"    AS \"L32_taxonID\",
+    ${TAXON_ALIAS}.\"L33_taxonID\"    AS \"L33_taxonID\",
+    ${TAXON_ALIAS}.\"L33_5_taxonID\"  AS \"L33_5_taxonID\",
+    ${TAXON_ALIAS}.\"L34_taxonID\"    AS \"L34_taxonID\",
+    ${TAXON_ALIAS}.\"L34_5_taxonID\"  AS \"L34_5_taxonID\",
+    ${TAXON_ALIAS}.\"L35_taxonID\"    AS \"L35_taxonID\",
+    ${TAXON_ALIAS}.\"L37_taxonID\"    AS \"L37_taxonID\",
+    ${TAXON_ALIAS}.\"L40_taxonID\"    AS \"L40_taxonID\",
+    ${TAXON_ALIAS}.\"L43_taxonID\"    AS \"L43_taxonID\",
+    ${TAXON_ALIAS}.\"L44_taxonID\"    AS \"L44_taxonID\",
+    ${TAXON_ALIAS}.\"L45_taxonID\"    AS \"L45_taxonID\",
+    ${TAXON_ALIAS}.\"L47_taxonID\"    AS \"L47_taxonID\",
+    ${TAXON_ALIAS}.\"L50_taxonID\"    AS \"L50_taxonID\",
+    ${TAXON_ALIAS}.\"L53_taxonID\"    AS \"L53_taxonID\",
+    ${TAXON_ALIAS}.\"L57_taxonID\"    AS \"L57_taxonID\",
+    ${TAXON_ALIAS}.\"L60_taxonID\"    AS \"L60_taxonID\",
+    ${TAXON_ALIAS}.\"L67_taxonID\"    AS \"L67_taxonID\",
+    ${TAXON_ALIAS}.\"L70_taxonID\"    AS \"L70_taxonID\"
 "
 
-execute_sql "
-CREATE TABLE \"${TABLE_NAME}\" AS
-SELECT
-    ${OBS_COLUMNS},        -- these are unquoted columns like observation_uuid, etc.
-    o.in_region,           -- already all-lowercase
-    ${EXPANDED_TAXA_COLS}
-FROM \"${ANCESTORS_OBS_TABLE}\" o
-JOIN expanded_taxa e ON e.\"taxonID\" = o.taxon_id
-WHERE e.\"taxonActive\" = TRUE
-  AND (${rg_where_condition});
-"
+if [ "${USE_EXPORT_CANDIDATES:-false}" = "true" ]; then
+  # Same region semantics as regional_base.sh's ANCESTORS_OBS_TABLE, applied
+  # directly to the pre-joined candidates (active taxa only by construction).
+  CANDIDATE_BBOX="ST_MakeEnvelope(${XMIN}, ${YMIN}, ${XMAX}, ${YMAX}, 4326)"
+  if [ "${INCLUDE_OUT_OF_REGION_OBS}" = "true" ]; then
+    in_region_expr="COALESCE(ST_Within(o.geom, ${CANDIDATE_BBOX}), false)"
+    region_condition="TRUE"
+  else
+    in_region_expr="true"
+    region_condition="o.geom && ${CANDIDATE_BBOX}"
+  fi
+
+  # Clade range scan on the candidates' taxon_lft (CLADE_LFT_CONDITION from
+  # regional_base.sh), only while the table was built from the current
+  # expanded_taxa intervals (a reused table may predate a re-encode).
+  lft_condition="TRUE"
+  if [ "${CLADE_LFT_CONDITION:-TRUE}" != "TRUE" ]; then
+    if lft_reason="$(taxon_lft_complete "${EXPORT_CANDIDATES_TABLE}" "${ANCESTORS_TABLE}")"; then
+      lft_condition="${CLADE_LFT_CONDITION}"
+    else
+      print_progress "${lft_reason} (rebuild with SKIP_EXPORT_CANDIDATES=false); filtering by taxon_id only"
+    fi
+  fi
+
+  execute_sql "
+  CREATE TABLE \"${TABLE_NAME}\" AS
+  SELECT
+      ${OBS_COLUMNS},
+      ${in_region_expr} AS in_region,
+      ${EXPANDED_TAXA_COLS}
+  FROM \"${EXPORT_CANDIDATES_TABLE}\" o
+  WHERE ${lft_condition}
+    AND o.taxon_id IN (
+      SELECT taxon_id
+      FROM \"${ANCESTORS_TABLE}\"
+    )
+    AND ${region_condition}
+    AND (${rg_where_condition});
+  "
+else
+  execute_sql "
+  CREATE TABLE \"${TABLE_NAME}\" AS
+  SELECT
+      ${OBS_COLUMNS},        -- these are unquoted columns like observation_uuid, etc.
+      o.in_region,           -- already all-lowercase
+      ${EXPANDED_TAXA_COLS}
+  FROM \"${ANCESTORS_OBS_TABLE}\" o
+  JOIN expanded_taxa e ON e.\"taxonID\" = o.taxon_id
+  WHERE e.\"taxonActive\" = TRUE
+    AND (${rg_where_condition});
+  "
+fi
 
 # ------------------------------------------------------------------------------
 # 4) Optional partial-rank wipe for L20, L30, L40
@@ -247,6 +289,66 @@ if [ -z "${MAX_RN:-}" ]; then
   MAX_RN=3000
 fi
 
+# Optional photo caps (unset or -1 => no cap), evaluated in-engine by window
+# functions over the final photo rows:
+#   - MAX_PHOTOS_PER_OBS: keep the first N photos of each observation, ordered
+#     by (position, photo_id, photo_uuid). Partitioned by observation_uuid, so
+#     it shares the sort with the final ORDER BY.
+#   - MAX_PHOTOS_PER_SPECIES: keep the first N (post per-obs cap) photo rows per
+#     "L10_taxonID", taking observations in MAX_RN sampling order (rn, then
+#     md5(observation_uuid) for uncapped rows). Rows without a species label
+#     are not capped.
+photo_cap_ctes=""
+capped_source="final_rows"
+
+if [ -n "${MAX_PHOTOS_PER_OBS:-}" ] && [ "${MAX_PHOTOS_PER_OBS}" != "-1" ]; then
+  print_progress "cladistic.sh: Capping photos per observation at ${MAX_PHOTOS_PER_OBS}"
+  photo_cap_ctes="${photo_cap_ctes},
+  obs_photo_capped_rows AS (
+    SELECT *
+    FROM (
+      SELECT
+        f.*,
+        ROW_NUMBER() OVER (
+          PARTITION BY f.\"observation_uuid\"
+          ORDER BY
+            f.\"position\" ASC NULLS LAST,
+            f.\"photo_id\" ASC NULLS LAST,
+            f.\"photo_uuid\" ASC
+        ) AS obs_photo_rank
+      FROM ${capped_source} f
+    ) ranked
+    WHERE obs_photo_rank <= ${MAX_PHOTOS_PER_OBS}
+  )"
+  capped_source="obs_photo_capped_rows"
+fi
+
+if [ -n "${MAX_PHOTOS_PER_SPECIES:-}" ] && [ "${MAX_PHOTOS_PER_SPECIES}" != "-1" ]; then
+  print_progress "cladistic.sh: Capping photos per species (L10_taxonID) at ${MAX_PHOTOS_PER_SPECIES}"
+  photo_cap_ctes="${photo_cap_ctes},
+  species_photo_capped_rows AS (
+    SELECT *
+    FROM (
+      SELECT
+        f.*,
+        ROW_NUMBER() OVER (
+          PARTITION BY f.\"L10_taxonID\"
+          ORDER BY
+            f.rn ASC NULLS LAST,
+            md5(f.\"observation_uuid\"::text),
+            f.\"observation_uuid\",
+            f.\"position\" ASC NULLS LAST,
+            f.\"photo_id\" ASC NULLS LAST,
+            f.\"photo_uuid\" ASC
+        ) AS species_photo_rank
+      FROM ${capped_source} f
+    ) ranked
+    WHERE \"L10_taxonID\" IS NULL
+       OR species_photo_rank <= ${MAX_PHOTOS_PER_SPECIES}
+  )"
+  capped_source="species_photo_capped_rows"
+fi
+
 EXPORT_FILE="${EXPORT_DIR}/${EXPORT_GROUP}_photos.csv"
 
 # Ensure planner has fresh stats on the staging table before the heavy COPY.
@@ -259,7 +361,8 @@ execute_sql "SET work_mem = '512MB';"
 # Final COPY query uses these columns in quotes.
 # Important contract behavior for POL-447:
 #   - MAX_RN caps distinct research observations per species ("L10_taxonID").
-#   - All photos for selected observations are then included.
+#   - All photos for selected observations are then included, subject to the
+#     optional MAX_PHOTOS_PER_OBS / MAX_PHOTOS_PER_SPECIES caps.
 #   - Final CSV rows are deterministically ordered and observation-grouped.
 execute_sql "
 COPY (
@@ -327,9 +430,12 @@ COPY (
       ${CSV_PHOTO_COLS},
       rn
     FROM everything_else
-  )
-  SELECT *
-  FROM final_rows
+  )${photo_cap_ctes}
+  SELECT
+    ${CSV_OBS_COLS},
+    ${CSV_PHOTO_COLS},
+    rn
+  FROM ${capped_source}
   ORDER BY
     \"observation_uuid\" ASC,
     \"position\" ASC NULLS LAST,
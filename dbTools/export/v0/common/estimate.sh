@@ -0,0 +1,279 @@
+#!/bin/bash
+# ------------------------------------------------------------------------------
+# estimate.sh
+# ------------------------------------------------------------------------------
+# Dry-run cost estimator for an export job (DRY_RUN_ESTIMATE=true in main.sh).
+#
+# Predicts, per pipeline stage, the number of rows, the bytes written and the
+# runtime, WITHOUT creating any table. Nothing here writes to the database:
+# every query is either an EXPLAIN (planner estimate only, never executed) or
+# a read of the per-taxon rollup built by export_candidates.sh.
+#
+# Stages estimated:
+#   1) <REGION_TAG>_min<MIN_OBS>_all_sp         (planner)
+#   2) clade observations in region              (planner; upper bound, since
+#                                                 the MIN_OBS species filter is
+#                                                 not visible to the planner)
+#   3) <EXPORT_GROUP>_observations after RG mode (planner)
+#   4) <EXPORT_GROUP>_photos.csv photo rows      (rollup, MAX_RN-capped, when
+#                                                 export_taxon_counts_<RELEASE>
+#                                                 exists; planner upper bound
+#                                                 otherwise)
+#
+# Runtime is derived from the planner's total cost for stages 1-3 and from
+# the row count for the COPY stage. Both rates are site-specific; calibrate
+# them from the "Timing:" block of a previous export summary:
+#   ESTIMATE_COST_PER_SEC       planner cost units processed per second (default 2000000)
+#   ESTIMATE_COPY_ROWS_PER_SEC  CSV rows written per second           (default 150000)
+#
+# Output:
+#   ${HOST_EXPORT_DIR}/${EXPORT_GROUP}_estimate.txt (also echoed to stdout)
+# ------------------------------------------------------------------------------
+
+source "${BASE_DIR}/common/functions.sh"
+source "${BASE_DIR}/common/clade_defns.sh"
+source "${BASE_DIR}/common/region_defns.sh"
+
+ESTIMATE_COST_PER_SEC="${ESTIMATE_COST_PER_SEC:-2000000}"
+ESTIMATE_COPY_ROWS_PER_SEC="${ESTIMATE_COPY_ROWS_PER_SEC:-150000}"
+
+print_progress "=== estimate.sh: Dry-run estimate for ${EXPORT_GROUP} (no tables will be created) ==="
+
+get_region_coordinates || {
+  echo "Failed to retrieve bounding box for REGION_TAG=${REGION_TAG}" >&2
+  exit 1
+}
+BBOX="ST_MakeEnvelope(${XMIN}, ${YMIN}, ${XMAX}, ${YMAX}, 4326)"
+
+CLADE_CONDITION="$(get_clade_condition)"
+RG_CONDITION="$(get_rg_where_condition "e")"
+
+# ------------------------------------------------------------------------------
+# explain_estimate <sql>
+#   Prints "<rows> <width> <total_cost>" from the top plan node of
+#   EXPLAIN (FORMAT JSON) <sql>. The statement is planned, never executed.
+# ------------------------------------------------------------------------------
+explain_estimate() {
+  local sql="$1"
+  local plan
+  plan="$(query_sql "EXPLAIN (FORMAT JSON) ${sql}")"
+  local rows width cost
+  rows="$(echo "$plan" | grep -o '"Plan Rows": [0-9.e+]*' | head -1 | awk '{print $3}')"
+  width="$(echo "$plan" | grep -o '"Plan Width": [0-9]*' | head -1 | awk '{print $3}')"
+  cost="$(echo "$plan" | grep -o '"Total Cost": [0-9.e+]*' | head -1 | awk '{print $3}')"
+  echo "${rows:-0} ${width:-0} ${cost:-0}"
+}
+
+# human_bytes <n>
+human_bytes() {
+  awk -v b="$1" 'BEGIN {
+    split("B KB MB GB TB", u, " "); i = 1
+    while (b >= 1024 && i < 5) { b /= 1024; i++ }
+    printf "%.1f %s", b, u[i]
+  }'
+}
+
+# seconds_from <numerator> <rate>
+seconds_from() {
+  awk -v n="$1" -v r="$2" 'BEGIN { if (r <= 0) print 0; else printf "%.0f", n / r }'
+}
+
+OBS_COLUMNS="$(get_obs_columns | sed 's/\([a-z_]\+\)/o.\1/g')"
+
+if [ "${INCLUDE_OUT_OF_REGION_OBS}" = "true" ]; then
+  region_condition="TRUE"
+else
+  region_condition="o.geom && ${BBOX}"
+fi
+
+# ------------------------------------------------------------------------------
+# Stage 1: regional species list
+# ------------------------------------------------------------------------------
+read -r s1_rows s1_width s1_cost <<< "$(explain_estimate "
+  SELECT s.taxon_id
+  FROM observations s
+  JOIN taxa t ON t.taxon_id = s.taxon_id
+  WHERE t.rank_level = 10
+    AND s.quality_grade = 'research'
+    AND s.geom && ${BBOX}
+  GROUP BY s.taxon_id
+  HAVING COUNT(s.observation_uuid) >= ${MIN_OBS}
+")"
+
+# ------------------------------------------------------------------------------
+# Stage 2: clade observations (ancestors_obs / export_candidates filter)
+# ------------------------------------------------------------------------------
+read -r s2_rows s2_width s2_cost <<< "$(explain_estimate "
+  SELECT ${OBS_COLUMNS}
+  FROM observations o
+  JOIN expanded_taxa e ON e.\"taxonID\" = o.taxon_id
+  WHERE e.\"taxonActive\" = TRUE
+    AND ${CLADE_CONDITION}
+    AND ${region_condition}
+")"
+
+# ------------------------------------------------------------------------------
+# Stage 3: <EXPORT_GROUP>_observations after RG_FILTER_MODE
+# ------------------------------------------------------------------------------
+read -r s3_rows s3_width s3_cost <<< "$(explain_estimate "
+  SELECT ${OBS_COLUMNS}, e.*
+  FROM observations o
+  JOIN expanded_taxa e ON e.\"taxonID\" = o.taxon_id
+  WHERE e.\"taxonActive\" = TRUE
+    AND ${CLADE_CONDITION}
+    AND ${region_condition}
+    AND (${RG_CONDITION})
+")"
+
+# ------------------------------------------------------------------------------
+# Stage 4: final photo rows (CSV)
+# ------------------------------------------------------------------------------
+pos_condition="TRUE"
+if [ "${PRIMARY_ONLY:-false}" = "true" ]; then
+  pos_condition="p.position=0"
+fi
+
+# Uncapped planner estimate; also gives the per-row width and join cost.
+read -r s4_plan_rows s4_width s4_cost <<< "$(explain_estimate "
+  SELECT ${OBS_COLUMNS}, e.*, p.photo_uuid, p.photo_id, p.extension,
+         p.license, p.width, p.height, p.position
+  FROM observations o
+  JOIN expanded_taxa e ON e.\"taxonID\" = o.taxon_id
+  JOIN photos p ON p.observation_uuid = o.observation_uuid
+  WHERE e.\"taxonActive\" = TRUE
+    AND ${CLADE_CONDITION}
+    AND ${region_condition}
+    AND (${RG_CONDITION})
+    AND ${pos_condition}
+")"
+
+s4_rows="${s4_plan_rows}"
+s4_method="planner (uncapped upper bound; build export_taxon_counts_${RELEASE_VALUE} via USE_EXPORT_CANDIDATES for MAX_RN-capped estimates)"
+
+ROLLUP_TABLE="export_taxon_counts_${RELEASE_VALUE}"
+rollup_exists="$(query_sql "
+  SELECT 1 FROM pg_catalog.pg_tables
+  WHERE schemaname='public' AND tablename='${ROLLUP_TABLE}'
+  LIMIT 1;
+")"
+
+if [ "${rollup_exists}" = "1" ]; then
+  # Which (quality, has-species-label) buckets survive RG_FILTER_MODE, and
+  # which of them are subject to the MAX_RN cap (research + species label).
+  inc_rs=1; inc_ro=1; inc_ns=1; inc_no=1
+  case "${RG_FILTER_MODE:-ALL}" in
+    "ONLY_RESEARCH")                       inc_ns=0; inc_no=0 ;;
+    "ALL_EXCLUDE_SPECIES_NON_RESEARCH")    inc_ns=0 ;;
+    "ONLY_NONRESEARCH"|"ONLY_NONRESEARCH_WIPE_SPECIES_LABEL")
+                                           inc_rs=0; inc_ro=0 ;;
+    "ONLY_NONRESEARCH_EXCLUDE_SPECIES")    inc_rs=0; inc_ro=0; inc_ns=0 ;;
+  esac
+
+  # Fraction of observations inside the bounding box (planner estimate),
+  # applied only when out-of-region observations are excluded.
+  region_fraction=1
+  if [ "${INCLUDE_OUT_OF_REGION_OBS}" != "true" ]; then
+    read -r bbox_rows _ _ <<< "$(explain_estimate "SELECT 1 FROM observations o WHERE o.geom && ${BBOX}")"
+    total_rows="$(query_sql "SELECT GREATEST(reltuples, 1)::bigint FROM pg_class WHERE relname = 'observations';")"
+    region_fraction="$(awk -v a="${bbox_rows}" -v b="${total_rows}" 'BEGIN { f = a / b; if (f > 1) f = 1; printf "%.6f", f }')"
+  fi
+
+  # Photos-per-observation factor: 1 when PRIMARY_ONLY, else the bucket mean,
+  # bounded by MAX_PHOTOS_PER_OBS (mean-based, so an approximation).
+  ppo_cap="${MAX_PHOTOS_PER_OBS:--1}"
+  if [ "${PRIMARY_ONLY:-false}" = "true" ]; then
+    ppo_cap=1
+  fi
+  if [ "${ppo_cap}" = "-1" ]; then
+    rs_ppo="photos::numeric / NULLIF(obs, 0)"
+    ro_rows="r_photos"
+    nr_rows="n_photos"
+  else
+    rs_ppo="LEAST(photos::numeric / NULLIF(obs, 0), ${ppo_cap})"
+    ro_rows="LEAST(r_obs * ${ppo_cap}, r_photos)"
+    nr_rows="LEAST(n_obs * ${ppo_cap}, n_photos)"
+  fi
+
+  # Per-species photo cap on the MAX_RN-capped research rows.
+  species_cap_expr="rows"
+  if [ -n "${MAX_PHOTOS_PER_SPECIES:-}" ] && [ "${MAX_PHOTOS_PER_SPECIES}" != "-1" ]; then
+    species_cap_expr="LEAST(rows, ${MAX_PHOTOS_PER_SPECIES})"
+  fi
+
+  s4_rows="$(query_sql "
+    WITH per_taxon AS (
+      SELECT
+        e.\"L10_taxonID\" AS sp,
+        r.research_obs_count                      AS r_obs,
+        r.research_photo_count                    AS r_photos,
+        r.obs_count - r.research_obs_count        AS n_obs,
+        r.photo_count - r.research_photo_count    AS n_photos
+      FROM \"${ROLLUP_TABLE}\" r
+      JOIN expanded_taxa e ON e.\"taxonID\" = r.taxon_id
+      WHERE ${CLADE_CONDITION}
+    ),
+    research_species AS (
+      SELECT sp, SUM(r_obs) * ${region_fraction} AS obs, SUM(r_photos) * ${region_fraction} AS photos
+      FROM per_taxon
+      WHERE sp IS NOT NULL
+      GROUP BY sp
+    ),
+    capped AS (
+      SELECT COALESCE(SUM(${species_cap_expr}), 0) AS rows
+      FROM (
+        SELECT LEAST(obs, ${MAX_RN}) * COALESCE(${rs_ppo}, 0) AS rows
+        FROM research_species
+      ) per_species
+    ),
+    uncapped AS (
+      SELECT
+        COALESCE(SUM(CASE WHEN sp IS NULL THEN ${inc_ro} ELSE 0 END * ${ro_rows}), 0)
+      + COALESCE(SUM(CASE WHEN sp IS NULL THEN ${inc_no} ELSE ${inc_ns} END * ${nr_rows}), 0)
+        AS rows
+      FROM per_taxon
+    )
+    SELECT ROUND(${inc_rs} * capped.rows + uncapped.rows * ${region_fraction})::bigint
+    FROM capped, uncapped;
+  ")"
+  s4_method="rollup ${ROLLUP_TABLE} (MAX_RN=${MAX_RN}-capped; region fraction=${region_fraction})"
+fi
+
+# ------------------------------------------------------------------------------
+# Assemble report
+# ------------------------------------------------------------------------------
+s1_bytes="$(awk -v r="$s1_rows" -v w="$s1_width" 'BEGIN { printf "%.0f", r * w }')"
+s2_bytes="$(awk -v r="$s2_rows" -v w="$s2_width" 'BEGIN { printf "%.0f", r * w }')"
+s3_bytes="$(awk -v r="$s3_rows" -v w="$s3_width" 'BEGIN { printf "%.0f", r * w }')"
+s4_bytes="$(awk -v r="$s4_rows" -v w="$s4_width" 'BEGIN { printf "%.0f", r * w }')"
+
+s1_secs="$(seconds_from "$s1_cost" "$ESTIMATE_COST_PER_SEC")"
+s2_secs="$(seconds_from "$s2_cost" "$ESTIMATE_COST_PER_SEC")"
+s3_secs="$(seconds_from "$s3_cost" "$ESTIMATE_COST_PER_SEC")"
+s4_secs="$(( $(seconds_from "$s4_cost" "$ESTIMATE_COST_PER_SEC") + $(seconds_from "$s4_rows" "$ESTIMATE_COPY_ROWS_PER_SEC") ))"
+total_secs="$(( s1_secs + s2_secs + s3_secs + s4_secs ))"
+
+ESTIMATE_FILE="${HOST_EXPORT_DIR}/${EXPORT_GROUP}_estimate.txt"
+{
+  echo "Export Estimate (dry run; no tables created)"
+  echo "Export Group: ${EXPORT_GROUP}"
+  echo "Database: ${DB_NAME}"
+  echo "Region: ${REGION_TAG} (${XMIN}, ${YMIN}, ${XMAX}, ${YMAX})"
+  echo "Clade Condition: ${CLADE_CONDITION}"
+  echo "RG_FILTER_MODE: ${RG_FILTER_MODE:-ALL}"
+  echo "MIN_OBS: ${MIN_OBS}  MAX_RN: ${MAX_RN}  PRIMARY_ONLY: ${PRIMARY_ONLY:-false}"
+  echo "MAX_PHOTOS_PER_OBS: ${MAX_PHOTOS_PER_OBS:--1}  MAX_PHOTOS_PER_SPECIES: ${MAX_PHOTOS_PER_SPECIES:--1}"
+  echo "INCLUDE_OUT_OF_REGION_OBS: ${INCLUDE_OUT_OF_REGION_OBS}"
+  echo "Date: $(date)"
+  echo ""
+  echo "Stage estimates (rows / bytes / runtime):"
+  echo " 1) Regional species list:     ${s1_rows} rows / $(human_bytes "$s1_bytes") / ~${s1_secs}s"
+  echo " 2) Clade observations:        ${s2_rows} rows / $(human_bytes "$s2_bytes") / ~${s2_secs}s (upper bound)"
+  echo " 3) ${EXPORT_GROUP}_observations: ${s3_rows} rows / $(human_bytes "$s3_bytes") / ~${s3_secs}s"
+  echo " 4) ${EXPORT_GROUP}_photos.csv: ${s4_rows} photo rows / $(human_bytes "$s4_bytes") / ~${s4_secs}s"
+  echo "    method: ${s4_method}"
+  echo ""
+  echo "Estimated total runtime: ~${total_secs}s"
+  echo "Rates: ESTIMATE_COST_PER_SEC=${ESTIMATE_COST_PER_SEC}, ESTIMATE_COPY_ROWS_PER_SEC=${ESTIMATE_COPY_ROWS_PER_SEC}"
+} | tee "${ESTIMATE_FILE}"
+
+print_progress "=== estimate.sh: Wrote ${ESTIMATE_FILE} ==="
@@ -0,0 +1,179 @@
+#!/bin/bash
+# ------------------------------------------------------------------------------
+# export_candidates.sh
+# ------------------------------------------------------------------------------
+# Builds (or reuses) a release-scoped, pre-joined export_candidates table:
+#
+#   export_candidates_<RELEASE_VALUE>
+#
+# One row per observation of an active taxon, carrying:
+#   - every observation column any export may select (see get_obs_columns),
+#     plus geom for region predicates
+#   - the taxon path from expanded_taxa ("taxonID", "rankLevel", "name",
+#     "L5_taxonID" .. "L70_taxonID"), using the same quoted column names as
+#     expanded_taxa so cladistic.sh can reference them with a table alias
+#   - taxon_lft (nested-interval lft) when expanded_taxa has been encoded
+#   - photo_count (number of photos attached to the observation)
+#
+# The table is physically sorted and CLUSTERed on taxon_id, so that each
+# export's "taxon_id IN (<ancestors>)" filter reads contiguous heap pages
+# instead of redoing the wide observations x expanded_taxa join per job.
+#
+# It is built once per release and reused by every export job against that
+# release; set SKIP_EXPORT_CANDIDATES=false to force a rebuild (e.g. after
+# re-ingesting observations or regenerating expanded_taxa).
+#
+# A small per-taxon rollup, export_taxon_counts_<RELEASE_VALUE>, is rebuilt
+# alongside it (observation/photo counts split by quality grade). estimate.sh
+# uses it to predict capped row counts without touching observations.
+#
+# Requires:
+#   - environment variables: DB_NAME, DB_CONTAINER, DB_USER, RELEASE_VALUE
+#
+# Exports:
+#   EXPORT_CANDIDATES_TABLE
+#   EXPORT_TAXON_COUNTS_TABLE
+# ------------------------------------------------------------------------------
+
+source "${BASE_DIR}/common/functions.sh"
+
+: "${RELEASE_VALUE:?Error: RELEASE_VALUE is not set}"
+
+export SKIP_EXPORT_CANDIDATES="${SKIP_EXPORT_CANDIDATES:-true}"
+export EXPORT_CANDIDATES_TABLE="export_candidates_${RELEASE_VALUE}"
+export EXPORT_TAXON_COUNTS_TABLE="export_taxon_counts_${RELEASE_VALUE}"
+
+print_progress "=== export_candidates.sh: ${EXPORT_CANDIDATES_TABLE} (SKIP_EXPORT_CANDIDATES=${SKIP_EXPORT_CANDIDATES}) ==="
+
+check_and_build_export_candidates() {
+  local table_exists
+  table_exists="$(execute_sql "
+    SELECT 1 FROM pg_catalog.pg_tables
+    WHERE schemaname='public'
+      AND tablename='${EXPORT_CANDIDATES_TABLE}'
+    LIMIT 1;
+  ")"
+
+  if [[ "${table_exists}" =~ 1 ]]; then
+    local row_count
+    row_count="$(execute_sql "
+      SELECT count(*) FROM \"${EXPORT_CANDIDATES_TABLE}\";
+    ")"
+    local numeric_count
+    numeric_count="$(echo "${row_count}" | awk '/[0-9]/{print $1}' | head -1)"
+
+    if [[ -n "${numeric_count}" && "${numeric_count}" -gt 0 ]]; then
+      print_progress "Table ${EXPORT_CANDIDATES_TABLE} exists with ${numeric_count} rows"
+      if [ "${SKIP_EXPORT_CANDIDATES}" = "true" ]; then
+        print_progress "SKIP_EXPORT_CANDIDATES=true => reusing existing export_candidates table"
+        return 0
+      else
+        print_progress "Not skipping => dropping and recreating"
+      fi
+    fi
+  fi
+
+  # Observation columns: the superset of what get_obs_columns() can emit for
+  # this release, regardless of INCLUDE_ELEVATION_EXPORT (jobs prune later).
+  local obs_cols="o.observation_uuid, o.observer_id, o.latitude, o.longitude"
+  if [ "${RELEASE_VALUE}" != "r0" ]; then
+    obs_cols="${obs_cols}, o.elevation_meters"
+  fi
+  obs_cols="${obs_cols}, o.positional_accuracy, o.taxon_id, o.quality_grade, o.observed_on"
+  if [ "${RELEASE_VALUE}" != "r0" ]; then
+    obs_cols="${obs_cols}, o.anomaly_score"
+  fi
+
+  # Carry the nested-interval lft if add_nested_intervals.py has been run,
+  # recording the encoding it came from (see interval_fingerprint).
+  local lft_col="NULL::integer AS taxon_lft"
+  local lft_fingerprint=""
+  local has_lft
+  has_lft="$(execute_sql "
+    SELECT 1 FROM information_schema.columns
+    WHERE table_name='expanded_taxa' AND column_name='lft'
+    LIMIT 1;
+  ")"
+  if [[ "${has_lft}" =~ 1 ]]; then
+    lft_col="e.\"lft\" AS taxon_lft"
+    lft_fingerprint="$(interval_fingerprint)"
+  fi
+
+  print_progress "Creating table \"${EXPORT_CANDIDATES_TABLE}\""
+  execute_sql "DROP TABLE IF EXISTS \"${EXPORT_CANDIDATES_TABLE}\" CASCADE;"
+
+  # Boost work_mem for the photo-count aggregate and the taxon sort.
+  execute_sql "
+  SET work_mem = '1GB';
+
+  CREATE TABLE \"${EXPORT_CANDIDATES_TABLE}\" AS
+  WITH photo_counts AS (
+    SELECT observation_uuid, COUNT(*)::integer AS photo_count
+    FROM photos
+    GROUP BY observation_uuid
+  )
+  SELECT
+    ${obs_cols},
+    o.geom,
+    e.\"taxonID\",
+    e.\"rankLevel\",
+    e.\"name\",
+    e.\"L5_taxonID\",  e.\"L10_taxonID\", e.\"L11_taxonID\", e.\"L12_taxonID\",
+    e.\"L13_taxonID\", e.\"L15_taxonID\", e.\"L20_taxonID\", e.\"L24_taxonID\",
+    e.\"L25_taxonID\", e.\"L26_taxonID\", e.\"L27_taxonID\", e.\"L30_taxonID\",
+    e.\"L32_taxonID\", e.\"L33_taxonID\", e.\"L33_5_taxonID\", e.\"L34_taxonID\",
+    e.\"L34_5_taxonID\", e.\"L35_taxonID\", e.\"L37_taxonID\", e.\"L40_taxonID\",
+    e.\"L43_taxonID\", e.\"L44_taxonID\", e.\"L45_taxonID\", e.\"L47_taxonID\",
+    e.\"L50_taxonID\", e.\"L53_taxonID\", e.\"L57_taxonID\", e.\"L60_taxonID\",
+    e.\"L67_taxonID\", e.\"L70_taxonID\",
+    ${lft_col},
+    COALESCE(pc.photo_count, 0) AS photo_count
+  FROM observations o
+  JOIN expanded_taxa e ON e.\"taxonID\" = o.taxon_id
+  LEFT JOIN photo_counts pc ON pc.observation_uuid = o.observation_uuid
+  WHERE e.\"taxonActive\" = TRUE
+  ORDER BY o.taxon_id, o.observation_uuid;
+  "
+
+  print_progress "Indexing and clustering \"${EXPORT_CANDIDATES_TABLE}\" by taxon_id"
+  execute_sql "
+  CREATE INDEX \"${EXPORT_CANDIDATES_TABLE}_taxon_id_idx\"
+    ON \"${EXPORT_CANDIDATES_TABLE}\" (taxon_id);
+  CREATE INDEX \"${EXPORT_CANDIDATES_TABLE}_taxon_lft_idx\"
+    ON \"${EXPORT_CANDIDATES_TABLE}\" (taxon_lft);
+  CREATE INDEX \"${EXPORT_CANDIDATES_TABLE}_geom_idx\"
+    ON \"${EXPORT_CANDIDATES_TABLE}\" USING GIST (geom);
+  CLUSTER \"${EXPORT_CANDIDATES_TABLE}\" USING \"${EXPORT_CANDIDATES_TABLE}_taxon_id_idx\";
+  ANALYZE \"${EXPORT_CANDIDATES_TABLE}\";
+  "
+  if [ -n "${lft_fingerprint}" ]; then
+    execute_sql "COMMENT ON COLUMN \"${EXPORT_CANDIDATES_TABLE}\".taxon_lft IS '${lft_fingerprint}';"
+  fi
+
+  build_export_taxon_counts
+}
+
+build_export_taxon_counts() {
+  print_progress "Creating per-taxon rollup \"${EXPORT_TAXON_COUNTS_TABLE}\""
+  execute_sql "
+  DROP TABLE IF EXISTS \"${EXPORT_TAXON_COUNTS_TABLE}\" CASCADE;
+
+  CREATE TABLE \"${EXPORT_TAXON_COUNTS_TABLE}\" AS
+  SELECT
+    taxon_id,
+    COUNT(*)::bigint                                                   AS obs_count,
+    COUNT(*) FILTER (WHERE quality_grade = 'research')::bigint         AS research_obs_count,
+    COALESCE(SUM(photo_count), 0)::bigint                              AS photo_count,
+    COALESCE(SUM(photo_count) FILTER (WHERE quality_grade = 'research'), 0)::bigint
+                                                                       AS research_photo_count
+  FROM \"${EXPORT_CANDIDATES_TABLE}\"
+  GROUP BY taxon_id;
+
+  ALTER TABLE \"${EXPORT_TAXON_COUNTS_TABLE}\" ADD PRIMARY KEY (taxon_id);
+  ANALYZE \"${EXPORT_TAXON_COUNTS_TABLE}\";
+  "
+}
+
+check_and_build_export_candidates
+
+print_progress "=== export_candidates.sh: ${EXPORT_CANDIDATES_TABLE} ready ==="
@@ -8,6 +8,13 @@ execute_sql() {
     docker exec ${DB_CONTAINER} psql -U ${DB_USER} -d "${DB_NAME}" -c "$sql"
 }
 
+# Function to run a query and return bare, unaligned values (no header/footer).
+# Useful for capturing a single scalar or an EXPLAIN (FORMAT JSON) document.
+query_sql() {
+    local sql="$1"
+    docker exec ${DB_CONTAINER} psql -U ${DB_USER} -d "${DB_NAME}" -At -c "$sql"
+}
+
 # Function to print progress
 print_progress() {
     echo "======================================"
@@ -35,6 +42,85 @@ get_obs_columns() {
     echo "$cols"
 }
 
+# Function to map RG_FILTER_MODE to the observation WHERE condition used by
+# cladistic.sh. Takes the alias of the relation carrying "L10_taxonID"
+# (e.g. "e" for expanded_taxa); observations are always aliased "o".
+get_rg_where_condition() {
+    local taxon_alias="${1:-e}"
+    case "${RG_FILTER_MODE:-ALL}" in
+        "ONLY_RESEARCH")
+            echo "o.quality_grade='research'"
+            ;;
+        "ALL")
+            echo "TRUE"
+            ;;
+        "ALL_EXCLUDE_SPECIES_NON_RESEARCH")
+            echo "NOT (o.quality_grade!='research' AND ${taxon_alias}.\"L10_taxonID\" IS NOT NULL)"
+            ;;
+        "ONLY_NONRESEARCH")
+            echo "o.quality_grade!='research'"
+            ;;
+        "ONLY_NONRESEARCH_EXCLUDE_SPECIES")
+            echo "(o.quality_grade!='research' AND ${taxon_alias}.\"L10_taxonID\" IS NULL)"
+            ;;
+        "ONLY_NONRESEARCH_WIPE_SPECIES_LABEL")
+            echo "o.quality_grade!='research'"
+            ;;
+        *)
+            echo "TRUE"
+            ;;
+    esac
+}
+
+# Function to fingerprint the expanded_taxa nested-interval encoding.
+# Every copy of a taxon's lft (observations.taxon_lft from
+# scripts/add_nested_intervals.py --denormalize-observations, and
+# export_candidates_<RELEASE>.taxon_lft) stores the fingerprint it was built
+# from as its column comment; the copy is only current while they match.
+interval_fingerprint() {
+    query_sql "
+      SELECT 'nested_intervals:' || md5(string_agg(
+        \"taxonID\" || ':' || COALESCE(\"lft\"::text, '') || ':' || COALESCE(\"rgt\"::text, ''),
+        ',' ORDER BY \"taxonID\"))
+      FROM expanded_taxa;
+    "
+}
+
+# Function to check whether <table>.taxon_lft can stand in for the taxon_id
+# filter over the taxa in <ancestors_table>: its fingerprint comment must match
+# the current encoding (INTERVAL_FINGERPRINT, else computed), and no row of
+# those taxa may have a NULL taxon_lft (rows added after the copy was made).
+# Returns 1 and prints the reason otherwise.
+taxon_lft_complete() {
+    local table="$1"
+    local ancestors_table="$2"
+    local stored
+    stored="$(query_sql "
+      SELECT col_description(attrelid, attnum)
+      FROM pg_attribute
+      WHERE attrelid = to_regclass('\"${table}\"')
+        AND attname = 'taxon_lft'
+        AND NOT attisdropped;
+    ")"
+    if [ -z "${stored}" ]; then
+        echo "${table}.taxon_lft is missing or carries no interval fingerprint"
+        return 1
+    fi
+    if [ "${stored}" != "${INTERVAL_FINGERPRINT:-$(interval_fingerprint)}" ]; then
+        echo "${table}.taxon_lft predates the current expanded_taxa intervals"
+        return 1
+    fi
+    if [ -n "$(query_sql "
+      SELECT 1 FROM \"${table}\"
+      WHERE taxon_lft IS NULL
+        AND taxon_id IN (SELECT taxon_id FROM \"${ancestors_table}\")
+      LIMIT 1;
+    ")" ]; then
+        echo "${table} has clade rows with NULL taxon_lft"
+        return 1
+    fi
+    return 0
+}
 
 # Function to ensure directory exists with proper permissions
 ensure_directory() {
@@ -58,7 +144,11 @@ send_notification() {
 
 # Export the functions
 export -f execute_sql
+export -f query_sql
 export -f print_progress
 export -f get_obs_columns
+export -f get_rg_where_condition
+export -f interval_fingerprint
+export -f taxon_lft_complete
 export -f ensure_directory
 export -f send_notification
\ No newline at end of file
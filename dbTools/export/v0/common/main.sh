@@ -36,8 +36,20 @@
 #   INCLUDE_OUT_OF_REGION_OBS -> Whether to keep out-of-region observations for a region-based species.
 #   RG_FILTER_MODE    -> One of: ONLY_RESEARCH, ALL, ALL_EXCLUDE_SPECIES_NON_RESEARCH, etc.
 #   PRIMARY_ONLY      -> If true, only the primary (position=0) photo is included.
+#   MAX_PHOTOS_PER_OBS -> Max photos kept per observation, by position (unset or -1 => no cap).
+#   MAX_PHOTOS_PER_SPECIES -> Max photo rows kept per species (L10_taxonID) (unset or -1 => no cap).
 #   SKIP_REGIONAL_BASE-> If true, we skip regeneration of base tables if they exist.
 #   INCLUDE_ELEVATION_EXPORT -> If "true", we include the 'elevation_meters' column (provided the DB has it, e.g. not "r0").
+#   USE_EXPORT_CANDIDATES -> If "true", build/reuse the release-scoped export_candidates_<RELEASE_VALUE>
+#                         table and let cladistic.sh filter it instead of re-joining expanded_taxa.
+#   SKIP_EXPORT_CANDIDATES -> If "false", force a rebuild of export_candidates_<RELEASE_VALUE> (default: true => reuse).
+#   WRITE_EXPORT_SNAPSHOT -> If "true", write <EXPORT_GROUP>_snapshot.tsv.gz (observation_uuid, photo_uuid,
+#                        row hash) via scripts/export_snapshot.py.
+#   PREVIOUS_SNAPSHOT -> Optional path to a prior snapshot; with WRITE_EXPORT_SNAPSHOT=true, also writes
+#                        <EXPORT_GROUP>_added.csv and <EXPORT_GROUP>_removed.tsv (incremental diff).
+#   DRY_RUN_ESTIMATE  -> If "true", run estimate.sh (planner + rollup based row/byte/runtime
+#                        predictions per stage), write <EXPORT_GROUP>_estimate.txt and exit
+#                        before any table is created.
 #
 # All these environment variables are typically set in the release-specific wrapper (e.g. r1/wrapper_amphibia_all_exc_nonrg_sp.sh).
 #
@@ -81,6 +93,16 @@ EXPORT_DIR="${CONTAINER_EXPORT_BASE_PATH}/${EXPORT_SUBDIR}"
 HOST_EXPORT_DIR="${HOST_EXPORT_BASE_PATH}/${EXPORT_SUBDIR}"
 ensure_directory "${HOST_EXPORT_DIR}"
 
+# ------------------------------------------------------------------------------
+# 2b) Dry-run Estimate Mode (read-only; exits before any CREATE TABLE)
+# ------------------------------------------------------------------------------
+if [ "${DRY_RUN_ESTIMATE:-false}" = "true" ]; then
+    print_progress "DRY_RUN_ESTIMATE=true => estimating job cost without building tables"
+    source "${BASE_DIR}/common/estimate.sh"
+    send_notification "Estimate for ${EXPORT_GROUP} complete. See ${ESTIMATE_FILE}"
+    exit 0
+fi
+
 # ------------------------------------------------------------------------------
 # 3) Create PostgreSQL Extension & Role if needed (once per container, safe to run again)
 # ------------------------------------------------------------------------------
@@ -107,6 +129,18 @@ fi
 # ------------------------------------------------------------------------------
 overall_start=$(date +%s)
 
+# ------------------------------------------------------------------------------
+# 3b) Optionally Build/Reuse the Release-Scoped export_candidates Table
+# ------------------------------------------------------------------------------
+candidates_secs=0
+if [ "${USE_EXPORT_CANDIDATES:-false}" = "true" ]; then
+  candidates_start=$(date +%s)
+  print_progress "USE_EXPORT_CANDIDATES=true => invoking export_candidates.sh"
+  source "${BASE_DIR}/common/export_candidates.sh"
+  candidates_end=$(date +%s)
+  candidates_secs=$(( candidates_end - candidates_start ))
+fi
+
 # ------------------------------------------------------------------------------
 # 4) Always Invoke regional_base.sh
 # ------------------------------------------------------------------------------
@@ -219,6 +253,47 @@ csv_avg_photos_per_observation="$(awk -v rows="${csv_total_photo_rows}" -v obs="
   }
 ')"
 
+# ------------------------------------------------------------------------------
+# 6b) Optional Snapshot Index + Incremental Diff vs. PREVIOUS_SNAPSHOT
+# ------------------------------------------------------------------------------
+snapshot_secs=0
+snapshot_report=""
+if [ "${WRITE_EXPORT_SNAPSHOT:-false}" = "true" ]; then
+  snapshot_start=$(date +%s)
+  REPO_ROOT="${REPO_ROOT:-$(cd "${BASE_DIR}/../../.." && pwd)}"
+  SNAPSHOT_FILE="${HOST_EXPORT_DIR}/${EXPORT_GROUP}_snapshot.tsv.gz"
+  # Write to a temp path and only replace SNAPSHOT_FILE once the script succeeds,
+  # so a failed run leaves the existing snapshot (and a rerun) intact.
+  SNAPSHOT_TMP="${SNAPSHOT_FILE%.tsv.gz}_tmp.tsv.gz"
+  snapshot_args=( --export-csv "${EXPORT_CSV_FILE}" --snapshot-out "${SNAPSHOT_TMP}" )
+
+  if [ -n "${PREVIOUS_SNAPSHOT:-}" ]; then
+    snapshot_args+=(
+      --previous-snapshot "${PREVIOUS_SNAPSHOT}"
+      --added-out "${HOST_EXPORT_DIR}/${EXPORT_GROUP}_added.csv"
+      --removed-out "${HOST_EXPORT_DIR}/${EXPORT_GROUP}_removed.tsv"
+    )
+  fi
+
+  print_progress "Writing export snapshot ${SNAPSHOT_FILE}"
+  snapshot_report="$(python3 "${REPO_ROOT}/scripts/export_snapshot.py" "${snapshot_args[@]}")" || {
+    echo "Error: export snapshot failed"
+    echo "${snapshot_report}"
+    rm -f "${SNAPSHOT_TMP}"
+    exit 1
+  }
+  if [ "${PREVIOUS_SNAPSHOT:-}" = "${SNAPSHOT_FILE}" ]; then
+    # Re-exporting into the same directory: keep the snapshot we diffed against.
+    mv "${SNAPSHOT_FILE}" "${SNAPSHOT_FILE%.tsv.gz}_previous.tsv.gz"
+    PREVIOUS_SNAPSHOT="${SNAPSHOT_FILE%.tsv.gz}_previous.tsv.gz"
+  fi
+  mv "${SNAPSHOT_TMP}" "${SNAPSHOT_FILE}"
+  snapshot_report="${snapshot_report//${SNAPSHOT_TMP}/${SNAPSHOT_FILE}}"
+  echo "${snapshot_report}"
+  snapshot_end=$(date +%s)
+  snapshot_secs=$(( snapshot_end - snapshot_start ))
+fi
+
 SUMMARY_FILE="${HOST_EXPORT_DIR}/${EXPORT_GROUP}_export_summary.txt"
 {
   echo "Export Summary"
@@ -228,6 +303,8 @@ SUMMARY_FILE="${HOST_EXPORT_DIR}/${EXPORT_GROUP}_export_summary.txt"
   echo "Region: ${REGION_TAG}"
   echo "Minimum Observations (species): ${MIN_OBS}"
   echo "Maximum Observation Cap (MAX_RN): ${MAX_RN}"
+  echo "Max Photos per Observation (MAX_PHOTOS_PER_OBS): ${MAX_PHOTOS_PER_OBS:--1}"
+  echo "Max Photos per Species (MAX_PHOTOS_PER_SPECIES): ${MAX_PHOTOS_PER_SPECIES:--1}"
   echo "Export Group: ${EXPORT_GROUP}"
   echo "Date: $(date)"
   echo "SKIP_REGIONAL_BASE: ${SKIP_REGIONAL_BASE}"
@@ -238,9 +315,11 @@ SUMMARY_FILE="${HOST_EXPORT_DIR}/${EXPORT_GROUP}_export_summary.txt"
   echo "RG_FILTER_MODE: ${RG_FILTER_MODE}"
   echo "MIN_OCCURRENCES_PER_RANK: ${MIN_OCCURRENCES_PER_RANK}"
   echo "INCLUDE_ELEVATION_EXPORT: ${INCLUDE_ELEVATION_EXPORT}"
+  echo "USE_EXPORT_CANDIDATES: ${USE_EXPORT_CANDIDATES:-false}"
   echo ""
   echo "Contract Notes:"
-  echo "MAX_RN semantics: observation-capped for research observations per species (L10_taxonID); all photos for selected observations are included."
+  echo "MAX_RN semantics: observation-capped for research observations per species (L10_taxonID); all photos for selected observations are included unless a photo cap applies."
+  echo "Photo caps: MAX_PHOTOS_PER_OBS keeps the lowest-position photos per observation; MAX_PHOTOS_PER_SPECIES then keeps the first photo rows per L10_taxonID in MAX_RN sampling order (-1 = no cap)."
   echo "Final ordering: observation_uuid ASC, position ASC, photo_id ASC, photo_uuid ASC."
   echo "Split key: deferred to downstream materialization lane (POL-448)."
   echo ""
@@ -254,8 +333,15 @@ SUMMARY_FILE="${HOST_EXPORT_DIR}/${EXPORT_GROUP}_export_summary.txt"
   echo "Max Photos per Observation: ${csv_max_photos_per_observation}"
   echo "Avg Photos per Observation: ${csv_avg_photos_per_observation}"
   echo ""
+  if [ -n "${snapshot_report}" ]; then
+    echo "Snapshot (previous: ${PREVIOUS_SNAPSHOT:-none}):"
+    echo "${snapshot_report}"
+    echo ""
+  fi
   echo "Timing:"
+  echo " - Export Candidates: ${candidates_secs} seconds"
   echo " - Regional Base: ${regional_secs} seconds"
+  echo " - Snapshot: ${snapshot_secs} seconds"
 } > "${SUMMARY_FILE}"
 
 stats_end=$(date +%s)
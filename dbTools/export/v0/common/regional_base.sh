@@ -18,6 +18,15 @@
 #   - script variables: REGION_TAG, MIN_OBS, SKIP_REGIONAL_BASE,
 #     INCLUDE_OUT_OF_REGION_OBS, INCLUDE_MINOR_RANKS_IN_ANCESTORS,
 #     etc.
+#   - optional: USE_EXPORT_CANDIDATES=true to skip step 5; cladistic.sh then
+#     filters the release-scoped export_candidates table directly.
+#   - optional: USE_NESTED_INTERVALS=true to resolve clade membership via
+#     expanded_taxa."lft"/"rgt" range scans (scripts/add_nested_intervals.py)
+#     instead of the per-rank L{XX}_taxonID columns, and to restrict the
+#     observation scans to the roots' merged observations.taxon_lft ranges.
+#
+# Exports:
+#   ANCESTORS_TABLE, ANCESTORS_OBS_TABLE, CLADE_LFT_CONDITION
 #
 # ------------------------------------------------------------------------------
 
@@ -42,6 +51,7 @@ source "${BASE_DIR}/common/region_defns.sh"
 # This maintains backward compatibility
 export SKIP_ALL_SP_TABLE="${SKIP_ALL_SP_TABLE:-$SKIP_REGIONAL_BASE}"
 export SKIP_ANCESTORS_TABLE="${SKIP_ANCESTORS_TABLE:-$SKIP_REGIONAL_BASE}"
+export USE_NESTED_INTERVALS="${USE_NESTED_INTERVALS:-false}"
 
 print_progress "=== regional_base.sh: Starting Ancestor-Aware Regional Base Generation ==="
 print_progress "Using granular control flags: SKIP_ALL_SP_TABLE=${SKIP_ALL_SP_TABLE}, SKIP_ANCESTORS_TABLE=${SKIP_ANCESTORS_TABLE}"
@@ -138,7 +148,11 @@ CLADE_ID="${CLADE_ID// /_}"
 # If multi-root => check overlap
 if [ "${root_count}" -gt 1 ]; then
   print_progress "Multiple roots => checking independence"
-  check_root_independence "${DB_NAME}" "${root_list[@]}"
+  if [ "${USE_NESTED_INTERVALS}" = "true" ]; then
+    check_root_independence_intervals "${root_list[@]}"
+  else
+    check_root_independence "${DB_NAME}" "${root_list[@]}"
+  fi
   if [ $? -ne 0 ]; then
     echo "ERROR: Overlap detected among metaclade roots. Aborting."
     exit 1
@@ -146,6 +160,33 @@ if [ "${root_count}" -gt 1 ]; then
   print_progress "All roots are mutually independent"
 fi
 
+# ---------------------------------------------------------------------------
+# 2b) Nested-interval clade ranges on observation-level taxon_lft
+# ---------------------------------------------------------------------------
+# With USE_NESTED_INTERVALS=true the roots become merged
+#   o.taxon_lft BETWEEN root.lft AND root.rgt
+# ranges, i.e. btree range scans on observations.taxon_lft (and
+# export_candidates.taxon_lft in cladistic.sh). Every taxon in the ancestors
+# table lies inside some root's interval (ancestors are cut below the root
+# rank), so the ranges narrow the scan without changing the result -- provided
+# each row's taxon_lft is its taxon's current lft. taxon_lft is a copy, so it
+# is only used when taxon_lft_complete (functions.sh) finds its fingerprint
+# equal to INTERVAL_FINGERPRINT and no NULL taxon_lft among the clade's rows;
+# otherwise the export falls back to the taxon_id filter alone. The taxon_id
+# filter always applies MIN_OBS and the rank boundary.
+CLADE_LFT_CONDITION="TRUE"
+INTERVAL_FINGERPRINT=""
+if [ "${USE_NESTED_INTERVALS}" = "true" ] && [ "${root_count}" -gt 0 ]; then
+  CLADE_LFT_CONDITION="$(build_interval_condition 'o.taxon_lft' "${root_list[@]}")" || {
+    echo "ERROR: USE_NESTED_INTERVALS=true but the clade roots have no lft/rgt intervals" >&2
+    exit 1
+  }
+  INTERVAL_FINGERPRINT="$(interval_fingerprint)"
+  print_progress "Nested-interval clade ranges: ${CLADE_LFT_CONDITION}"
+fi
+export CLADE_LFT_CONDITION
+export INTERVAL_FINGERPRINT
+
 # Decide majorOrMinor string
 if [ "${INCLUDE_MINOR_RANKS_IN_ANCESTORS}" = "true" ]; then
   RANK_MODE="inclMinor"
@@ -205,6 +246,16 @@ check_and_build_ancestors() {
 
     local col_name="L${rank_part}_taxonID"
 
+    # Root membership predicate: rank-specific column, or a single range scan
+    # on the nested-interval encoding when enabled.
+    local member_condition="e.\"${col_name}\" = ${root_taxid}"
+    if [ "${USE_NESTED_INTERVALS}" = "true" ]; then
+      member_condition="$(build_interval_condition 'e."lft"' "${root_pair}")" || {
+        echo "ERROR: USE_NESTED_INTERVALS=true but no interval for taxonID=${root_taxid}" >&2
+        exit 1
+      }
+    fi
+
     # Decide boundary (majorOnly vs. inclMinor)
     local boundary_rank="$rank_part"
     if [ "${INCLUDE_MINOR_RANKS_IN_ANCESTORS}" = "false" ]; then
@@ -220,7 +271,7 @@ check_and_build_ancestors() {
     SELECT s.taxon_id
     FROM \"${ALL_SP_TABLE}\" s
     JOIN expanded_taxa e ON e.\"taxonID\" = s.taxon_id
-    WHERE e.\"${col_name}\" = ${root_taxid};
+    WHERE ${member_condition};
 
     ----------------------------------------------------------------
     -- 2) Unroll each species's ancestor IDs (L5..L70) and filter by rank
@@ -365,14 +416,27 @@ check_and_build_ancestors_obs() {
 
   local BBOX="ST_MakeEnvelope(${XMIN}, ${YMIN}, ${XMAX}, ${YMAX}, 4326)"
 
+  # Clade range scan on observations.taxon_lft (see 2b), only while the copy
+  # made by add_nested_intervals.py --denormalize-observations is complete.
+  local lft_condition="TRUE"
+  if [ "${CLADE_LFT_CONDITION}" != "TRUE" ]; then
+    local lft_reason
+    if lft_reason="$(taxon_lft_complete observations "${ANCESTORS_TABLE}")"; then
+      lft_condition="${CLADE_LFT_CONDITION}"
+    else
+      print_progress "${lft_reason} (rerun add_nested_intervals.py --skip-populate --denormalize-observations); filtering by taxon_id only"
+    fi
+  fi
+
   if [ "${INCLUDE_OUT_OF_REGION_OBS}" = "true" ]; then
     execute_sql "
     CREATE TABLE \"${ANCESTORS_OBS_TABLE}\" AS
     SELECT
       ${OBS_COLUMNS},
       COALESCE(ST_Within(geom, ${BBOX}), false) AS in_region
-    FROM observations
-    WHERE taxon_id IN (
+    FROM observations o
+    WHERE ${lft_condition}
+    AND taxon_id IN (
       SELECT taxon_id
       FROM \"${ANCESTORS_TABLE}\"
     );
@@ -383,8 +447,9 @@ check_and_build_ancestors_obs() {
     SELECT
       ${OBS_COLUMNS},
       true AS in_region
-    FROM observations
-    WHERE taxon_id IN (
+    FROM observations o
+    WHERE ${lft_condition}
+    AND taxon_id IN (
       SELECT taxon_id
       FROM \"${ANCESTORS_TABLE}\"
     )
@@ -393,8 +458,13 @@ check_and_build_ancestors_obs() {
   fi
 }
 
-check_and_build_ancestors_obs
+if [ "${USE_EXPORT_CANDIDATES:-false}" = "true" ]; then
+  print_progress "USE_EXPORT_CANDIDATES=true => skipping ${ANCESTORS_OBS_TABLE}; cladistic.sh filters ${EXPORT_CANDIDATES_TABLE} instead"
+else
+  check_and_build_ancestors_obs
+fi
 
+export ANCESTORS_TABLE="${ANCESTORS_TABLE}" # for cladistic.sh (export_candidates mode)
 export ANCESTORS_OBS_TABLE="${ANCESTORS_OBS_TABLE}" # for cladistic.sh
 
 print_progress "=== regional_base.sh: Completed building base tables for ${REGION_TAG}, minObs=${MIN_OBS}, clade=${CLADE_ID}, mode=${RANK_MODE} ==="
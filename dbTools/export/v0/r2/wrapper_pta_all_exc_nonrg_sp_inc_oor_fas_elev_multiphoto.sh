@@ -33,6 +33,9 @@ export REGION_TAG="NAfull"
 export MIN_OBS=50
 export MAX_RN=2750
 export PRIMARY_ONLY=false
+# Bound multi-photo output: at most 8 photos per observation, no species photo cap.
+export MAX_PHOTOS_PER_OBS=8
+export MAX_PHOTOS_PER_SPECIES=-1
 
 export METACLADE="pta" # primary_terrestrial_arthropoda
 export EXPORT_GROUP="pta_all_exc_nonrg_sp_inc_oor_fas_elev_multiphoto"
@@ -51,6 +54,8 @@ echo "Region: ${REGION_TAG}"
 echo "Min Observations: ${MIN_OBS}"
 echo "Max Observation Cap (MAX_RN): ${MAX_RN}"
 echo "Primary Only: ${PRIMARY_ONLY}"
+echo "Max Photos per Observation: ${MAX_PHOTOS_PER_OBS}"
+echo "Max Photos per Species: ${MAX_PHOTOS_PER_SPECIES}"
 echo "Export Group: ${EXPORT_GROUP}"
 echo "Skip Regional Base Creation: ${SKIP_REGIONAL_BASE}"
 echo "Include Out-of-Region Obs: ${INCLUDE_OUT_OF_REGION_OBS}"
@@ -1,12 +1,19 @@
 from .annotation_models import (
     Annotation,
     AnnotationExportPolicy,
+    AnnotationExportSelection,
+    AnnotationExportSelectionPolicy,
     AnnotationGeometry,
     AnnotationProvenance,
     AnnotationQuality,
+    AnnotationSelectionChangeLog,
     AnnotationSet,
+    AnnotationSetLabelStats,
+    AnnotationSetReviewStats,
+    AnnotationSetStats,
     AnnotationSubject,
     AnnotationSupersession,
+    AnnotationSupersessionClosure,
 )
 from .base import Base
 from .coldp_models import (
@@ -30,10 +37,17 @@ __all__ = [
     "ColdpTypeMaterial",
     "Annotation",
     "AnnotationExportPolicy",
+    "AnnotationExportSelection",
+    "AnnotationExportSelectionPolicy",
     "AnnotationGeometry",
     "AnnotationProvenance",
     "AnnotationQuality",
+    "AnnotationSelectionChangeLog",
     "AnnotationSet",
+    "AnnotationSetLabelStats",
+    "AnnotationSetReviewStats",
+    "AnnotationSetStats",
     "AnnotationSubject",
     "AnnotationSupersession",
+    "AnnotationSupersessionClosure",
 ]
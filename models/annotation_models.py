@@ -22,17 +22,57 @@ Schema E (POL-1423):
         timestamps maintained by the touch_updated_at() BEFORE UPDATE trigger.
     annotation.source_annotation_key — deterministic per-set idempotency key,
         unique within set_id, for typed duplicate-import detection.
+
+Schema G (migration 007):
+    annotation_export_selection_policy — policies whose global selection is materialized.
+    annotation_export_selection        — materialized annotation_export_select_v1 winners.
+    annotation_selection_change_log    — append-only queue of subjects to re-rank.
+
+Schema H (migration 008, optional layout):
+    annotation / annotation_geometry / annotation_provenance / annotation_quality
+        LIST-partitioned by set_id, one partition per annotation_set.  The child
+        tables gain a set_id partition key and keys become (id, set_id); the
+        classes below keep mapping the base layout, so use them for reads only
+        once that layout is applied.
+
+Schema I (migration 009):
+    annotation_geometry.polygon_packed / mask_rle_packed — compact bytea
+        payloads (int32 fixed-point vertices, fixed-width RLE counts).  A trigger
+        moves packable polygon_vertices / mask_rle JSONB into them on write;
+        scripts/annotations/codec.py decodes them into NumPy arrays.
+
+Schema J (migration 010):
+    idx_geometry_bbox_gist — GiST index on annotation_bbox(bbox_*), the bbox
+        columns as a native box, behind annotation_box_conflicts_v1() and
+        annotation_flag_box_conflicts() (per-subject IoU conflicts between sets).
+
+Schema K (migration 011):
+    annotation_supersession_closure — terminal replacement and chain depth of
+        every superseded annotation, maintained by one statement-level trigger
+        on annotation_supersession (which also rejects cycles).
+
+Schema L (migration 012):
+    annotation_set_stats        — per-set annotation / quality counters and sums.
+    annotation_set_label_stats  — per-(set_id, label) annotation counts.
+    annotation_set_review_stats — per-(set_id, review_status) quality counts.
+        All three are maintained by statement-level delta triggers on
+        annotation and annotation_quality; annotation_set_stats_v1 derives the
+        means, review distribution and conflict rate.
 """
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     CheckConstraint,
     Column,
     DateTime,
     Float,
     ForeignKey,
+    ForeignKeyConstraint,
     Index,
     Integer,
+    LargeBinary,
+    Numeric,
     String,
     Text,
     UniqueConstraint,
@@ -273,6 +313,11 @@ class AnnotationGeometry(Base):
 
     Supports bbox, polygon, mask, and point representations without coercion.
     Canonical coordinate space is normalized [0,1] with top-left origin.
+
+    Polygon and RLE mask payloads live in exactly one of the JSONB column
+    (polygon_vertices / mask_rle) or its packed bytea counterpart; writes to
+    the JSONB columns are packed by trg_annotation_geometry_pack_payloads
+    when the payload fits the packed format (migration 009).
     """
 
     __tablename__ = "annotation_geometry"
@@ -309,6 +354,10 @@ class AnnotationGeometry(Base):
     point_x = Column(Float)
     point_y = Column(Float)
 
+    # packed payloads (migration 009, see scripts/annotations/codec.py)
+    polygon_packed = Column(LargeBinary)
+    mask_rle_packed = Column(LargeBinary)
+
     sidecar = Column(JSONB)
     created_at = Column(
         DateTime(timezone=True), nullable=False, server_default=func.now()
@@ -348,7 +397,8 @@ class AnnotationGeometry(Base):
             name="chk_point_normalized",
         ),
         CheckConstraint(
-            "geometry_kind != 'mask' OR mask_rle IS NOT NULL OR mask_uri IS NOT NULL",
+            "geometry_kind != 'mask' OR mask_rle IS NOT NULL "
+            "OR mask_rle_packed IS NOT NULL OR mask_uri IS NOT NULL",
             name="chk_mask_payload",
         ),
         CheckConstraint(
@@ -363,9 +413,36 @@ class AnnotationGeometry(Base):
             name="chk_point_complete",
         ),
         CheckConstraint(
-            "geometry_kind != 'polygon' OR polygon_vertices IS NOT NULL",
+            "geometry_kind != 'polygon' OR polygon_vertices IS NOT NULL "
+            "OR polygon_packed IS NOT NULL",
             name="chk_polygon_complete",
         ),
+        CheckConstraint(
+            "polygon_packed IS NULL OR ("
+            "length(polygon_packed) > 1 "
+            "AND (length(polygon_packed) - 1) % 8 = 0 "
+            "AND get_byte(polygon_packed, 0) = 1"
+            ")",
+            name="chk_polygon_packed_format",
+        ),
+        CheckConstraint(
+            "mask_rle_packed IS NULL OR ("
+            "length(mask_rle_packed) >= 4 "
+            "AND get_byte(mask_rle_packed, 0) = 1 "
+            "AND get_byte(mask_rle_packed, 1) IN (1, 2, 4, 8) "
+            "AND (length(mask_rle_packed) - 2) % get_byte(mask_rle_packed, 1) = 0 "
+            "AND length(mask_rle_packed) - 2 >= 2 * get_byte(mask_rle_packed, 1)"
+            ")",
+            name="chk_mask_rle_packed_format",
+        ),
+        CheckConstraint(
+            "polygon_vertices IS NULL OR polygon_packed IS NULL",
+            name="chk_polygon_single_payload",
+        ),
+        CheckConstraint(
+            "mask_rle IS NULL OR mask_rle_packed IS NULL",
+            name="chk_mask_rle_single_payload",
+        ),
         Index("idx_geometry_annotation", "annotation_id"),
         Index("idx_geometry_kind", "geometry_kind"),
         Index("idx_geometry_annotation_kind", "annotation_id", "geometry_kind"),
@@ -388,6 +465,12 @@ class AnnotationGeometry(Base):
             postgresql_using="gin",
             postgresql_where=mask_rle.isnot(None),
         ),
+        Index(
+            "idx_geometry_bbox_gist",
+            func.annotation_bbox(bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max),
+            postgresql_using="gist",
+            postgresql_where=bbox_x_min.isnot(None),
+        ),
     )
 
 
@@ -658,3 +741,162 @@ class AnnotationExportPolicy(Base):
         ),
         Index("idx_export_policy_lookup", "policy_name", "policy_version"),
     )
+
+
+class AnnotationExportSelectionPolicy(Base):
+    """
+    Registry of export policies whose global selection is materialized.
+
+    Rows are created by annotation_export_selection_rebuild(); needs_rebuild is
+    flagged by the policy UPDATE trigger and cleared by the next refresh.
+    """
+
+    __tablename__ = "annotation_export_selection_policy"
+
+    policy_name = Column(String(64), primary_key=True)
+    policy_version = Column(Integer, primary_key=True)
+    needs_rebuild = Column(Boolean, nullable=False, server_default="false")
+    rebuilt_at = Column(DateTime(timezone=True))
+    refreshed_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["policy_name", "policy_version"],
+            ["annotation_export_policy.policy_name", "annotation_export_policy.policy_version"],
+            name="fk_annotation_export_selection_policy",
+        ),
+    )
+
+
+class AnnotationExportSelection(Base):
+    """
+    Materialized global export-selection winner per (policy, subject_id, label).
+
+    Maintained incrementally by annotation_export_selection_refresh(), which
+    re-ranks only subjects queued in annotation_selection_change_log.
+    Set-scoped selections are not cached; use annotation_export_select_v1.
+    """
+
+    __tablename__ = "annotation_export_selection"
+
+    policy_name = Column(String(64), primary_key=True)
+    policy_version = Column(Integer, primary_key=True)
+    strategy = Column(String(32), nullable=False)
+    subject_id = Column(UUID(as_uuid=True), primary_key=True)
+    label = Column(String(255), primary_key=True)
+    annotation_id = Column(UUID(as_uuid=True), nullable=False)
+    source_kind = Column(String(32), nullable=False)
+    trust_rank = Column(Integer, nullable=False)
+    confidence_score = Column(Float)
+    review_status = Column(String(32), nullable=False)
+    conflict_flag = Column(Boolean, nullable=False)
+    source_priority = Column(Integer, nullable=False)
+    selected_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["policy_name", "policy_version"],
+            [
+                "annotation_export_selection_policy.policy_name",
+                "annotation_export_selection_policy.policy_version",
+            ],
+            name="fk_export_selection_registry",
+        ),
+        Index("idx_export_selection_subject", "subject_id"),
+        Index("idx_export_selection_annotation", "annotation_id"),
+    )
+
+
+class AnnotationSelectionChangeLog(Base):
+    """Append-only queue of subjects whose export selection may have changed."""
+
+    __tablename__ = "annotation_selection_change_log"
+
+    change_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    subject_id = Column(UUID(as_uuid=True), nullable=False)
+    logged_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class AnnotationSupersessionClosure(Base):
+    """
+    Terminal replacement of a superseded annotation (end of its chain).
+
+    Maintained by trg_supersession_closure_insert; read it through
+    annotation_supersession_resolve(), which also maps unsuperseded ids to
+    themselves.  Rebuild with annotation_supersession_closure_rebuild().
+    """
+
+    __tablename__ = "annotation_supersession_closure"
+
+    annotation_id = Column(UUID(as_uuid=True), primary_key=True)
+    terminal_annotation_id = Column(UUID(as_uuid=True), nullable=False)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("depth >= 1", name="chk_supersession_closure_depth"),
+        CheckConstraint(
+            "annotation_id <> terminal_annotation_id",
+            name="chk_supersession_closure_distinct_ids",
+        ),
+        Index("idx_supersession_closure_terminal", "terminal_annotation_id"),
+    )
+
+
+class AnnotationSetStats(Base):
+    """
+    Per-set counters maintained by the Schema L statement triggers.
+
+    Read means and rates from annotation_set_stats_v1; recompute with
+    annotation_set_stats_rebuild(set_id).
+    """
+
+    __tablename__ = "annotation_set_stats"
+
+    set_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("annotation_set.set_id"),
+        primary_key=True,
+    )
+    annotations = Column(BigInteger, nullable=False, server_default="0")
+    active_annotations = Column(BigInteger, nullable=False, server_default="0")
+    score_sum = Column(Numeric, nullable=False, server_default="0")
+    score_count = Column(BigInteger, nullable=False, server_default="0")
+    quality_rows = Column(BigInteger, nullable=False, server_default="0")
+    confidence_sum = Column(Numeric, nullable=False, server_default="0")
+    confidence_count = Column(BigInteger, nullable=False, server_default="0")
+    updated_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class AnnotationSetLabelStats(Base):
+    """Per-(set_id, label) annotation counters (Schema L)."""
+
+    __tablename__ = "annotation_set_label_stats"
+
+    set_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("annotation_set.set_id"),
+        primary_key=True,
+    )
+    label = Column(String(255), primary_key=True)
+    annotations = Column(BigInteger, nullable=False, server_default="0")
+    active_annotations = Column(BigInteger, nullable=False, server_default="0")
+
+
+class AnnotationSetReviewStats(Base):
+    """Per-(set_id, review_status) annotation_quality counters (Schema L)."""
+
+    __tablename__ = "annotation_set_review_stats"
+
+    set_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("annotation_set.set_id"),
+        primary_key=True,
+    )
+    review_status = Column(String(32), primary_key=True)
+    annotations = Column(BigInteger, nullable=False, server_default="0")
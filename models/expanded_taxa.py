@@ -21,6 +21,11 @@ class ExpandedTaxa(Base):
     These columns enable O(1) parent lookups instead of scanning all L* columns.
     When immediate parent is already at a major rank, both sets of columns will have the same values.
     Root taxa (e.g., Animalia) will have NULL values for all ancestor columns.
+
+    Nested-interval columns (populated by scripts/add_nested_intervals.py):
+    - lft / rgt: DFS pre/post-order numbers over the immediateAncestor tree.
+      A taxon T lies under root R iff R.lft <= T.lft <= R.rgt, so clade
+      filtering is a single range scan regardless of the root's rank.
     """
     __tablename__ = "expanded_taxa"
 
@@ -37,6 +42,10 @@ class ExpandedTaxa(Base):
     immediateAncestor_taxonID = Column(Integer, index=True)  # NEW
     immediateAncestor_rankLevel = Column(Float)  # NEW
 
+    # Nested-interval encoding for rank-independent clade filtering # NEW
+    lft = Column(Integer)  # NEW
+    rgt = Column(Integer)  # NEW
+
     # Ancestral columns
     # Each rank level has three columns: taxonID, name, and commonName
     # The commonName columns are NEW - populated from ColDP integration
@@ -136,3 +145,5 @@ class ExpandedTaxa(Base):
 Index("idx_expanded_taxa_L10_taxonID", ExpandedTaxa.L10_taxonID)
 Index("idx_immediate_ancestor_taxon_id", ExpandedTaxa.immediateAncestor_taxonID)  # NEW
 Index("idx_immediate_major_ancestor_taxon_id", ExpandedTaxa.immediateMajorAncestor_taxonID)  # NEW
+Index("idx_expanded_taxa_lft", ExpandedTaxa.lft, unique=True)  # NEW
+Index("idx_expanded_taxa_lft_rgt", ExpandedTaxa.lft, ExpandedTaxa.rgt)  # NEW
@@ -1,38 +1,273 @@
+#!/usr/bin/env python3
+"""
+Single-pass analysis of a GBIF Darwin Core Archive (occurrence.txt + multimedia.txt).
+
+Each file is scanned exactly once with Polars' batched CSV reader, reading only
+the requested columns. From that one pass we accumulate:
+  - value counts for any number of columns per file (top-N printed, full
+    counts optionally written to JSON)
+  - the gbifID join keys, used to report how occurrences and multimedia rows
+    line up (occurrences with/without media, orphan media rows, media per
+    occurrence distribution, duplicate occurrence ids)
+
+GBIF text files are tab-separated with no quoting, so quote handling is off
+and ragged lines are truncated rather than aborting a multi-GB scan.
+
+Usage:
+  python3 preprocess/gbif/analyze_meta.py \
+    --archive-dir /pond/Polli/Datasets/anthophila/GBIF_occurences \
+    --multimedia-columns publisher,license,type,format \
+    --occurrence-columns basisOfRecord,taxonRank,genus,countryCode \
+    --output-json gbif_meta_summary.json
+"""
+
+import argparse
+import json
 import os
-import csv
-from collections import Counter
+import sys
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import polars as pl
 from tqdm import tqdm
 
 # Base directory path
 base_directory = "/pond/Polli/Datasets/anthophila/GBIF_occurences"
 
-# Function to process the file and count unique values in a specified column
-def count_unique_values(base_directory, source_file, column):
+JOIN_KEY = "gbifID"
+DEFAULT_MULTIMEDIA_COLUMNS = ["publisher", "license", "type", "format"]
+DEFAULT_OCCURRENCE_COLUMNS = ["basisOfRecord", "taxonRank", "genus", "countryCode", "institutionCode"]
+
+# Per-column partial counts are folded together once this many batches pile up,
+# bounding memory for high-cardinality columns.
+REDUCE_EVERY = 16
+
+
+def read_header(file_path: str) -> List[str]:
+    with open(file_path, "r", encoding="utf-8") as handle:
+        return handle.readline().rstrip("\r\n").split("\t")
+
+
+def iter_batches(file_path: str, columns: List[str], batch_size: int) -> Iterator[pl.DataFrame]:
+    """Stream string-typed batches of the selected columns."""
+    if hasattr(pl.LazyFrame, "collect_batches"):
+        lazy = pl.scan_csv(
+            file_path,
+            separator="\t",
+            quote_char=None,
+            infer_schema_length=0,
+            truncate_ragged_lines=True,
+        ).select(columns)
+        yield from lazy.collect_batches(chunk_size=batch_size)
+        return
+
+    # Older Polars (< 1.x) only exposes the eager batched reader.
+    reader = pl.read_csv_batched(
+        file_path,
+        separator="\t",
+        quote_char=None,
+        columns=columns,
+        infer_schema_length=0,
+        batch_size=batch_size,
+        truncate_ragged_lines=True,
+    )
+    while True:
+        batches = reader.next_batches(1)
+        if not batches:
+            return
+        yield from batches
+
+
+class ValueCounter:
+    """Accumulate value counts for one column from per-batch group_by results."""
+
+    def __init__(self, column: str):
+        self.column = column
+        self.partials: List[pl.DataFrame] = []
+
+    def update(self, batch: pl.DataFrame):
+        counts = (
+            batch.select(self.column)
+            .filter(pl.col(self.column).is_not_null() & (pl.col(self.column) != ""))
+            .group_by(self.column)
+            .agg(pl.col(self.column).count().cast(pl.UInt64).alias("n"))
+        )
+        self.partials.append(counts)
+        if len(self.partials) >= REDUCE_EVERY:
+            self.partials = [self.result()]
+
+    def result(self) -> pl.DataFrame:
+        if not self.partials:
+            return pl.DataFrame(
+                {self.column: [], "n": []},
+                schema={self.column: pl.Utf8, "n": pl.UInt64},
+            )
+        return (
+            pl.concat(self.partials)
+            .group_by(self.column)
+            .agg(pl.col("n").sum())
+            .sort(["n", self.column], descending=[True, False])
+        )
+
+
+def scan_file(
+    base_directory: str,
+    source_file: str,
+    columns: List[str],
+    batch_size: int,
+    collect_keys: bool = True,
+) -> Dict:
+    """One pass over <source_file>.txt: value counts for columns + gbifID keys."""
     file_path = os.path.join(base_directory, f"{source_file}.txt")
-    value_counter = Counter()
+    header = read_header(file_path)
+
+    missing = [c for c in columns if c not in header]
+    if missing:
+        print(f"Warning: {source_file}.txt has no column(s) {missing}; skipping them")
+    count_columns = [c for c in columns if c in header]
+
+    collect_keys = collect_keys and JOIN_KEY in header
+    read_columns = list(dict.fromkeys(count_columns + ([JOIN_KEY] if collect_keys else [])))
+    if not read_columns:
+        return {"rows": 0, "counts": {}, "keys": None}
+
+    counters = {c: ValueCounter(c) for c in count_columns}
+    key_chunks: List[np.ndarray] = []
+    rows = 0
+
+    with tqdm(desc=f"Scanning {source_file}.txt", unit="rows", unit_scale=True) as progress:
+        for batch in iter_batches(file_path, read_columns, batch_size):
+            rows += batch.height
+            for counter in counters.values():
+                counter.update(batch)
+            if collect_keys:
+                keys = batch.get_column(JOIN_KEY).cast(pl.Int64, strict=False).drop_nulls()
+                key_chunks.append(keys.to_numpy())
+            progress.update(batch.height)
+
+    keys = np.concatenate(key_chunks) if key_chunks else (np.empty(0, dtype=np.int64) if collect_keys else None)
+    return {
+        "rows": rows,
+        "counts": {c: counter.result() for c, counter in counters.items()},
+        "keys": keys,
+    }
+
+
+def join_statistics(occurrence_keys: np.ndarray, multimedia_keys: np.ndarray) -> Dict:
+    """How multimedia rows map onto occurrences via gbifID."""
+    occ_ids, occ_counts = np.unique(occurrence_keys, return_counts=True)
+    media_ids, media_counts = np.unique(multimedia_keys, return_counts=True)
+
+    media_has_occ = np.isin(media_ids, occ_ids, assume_unique=True)
+    matched_counts = media_counts[media_has_occ]
+
+    stats = {
+        "occurrence_rows_with_key": int(occurrence_keys.size),
+        "occurrence_distinct_ids": int(occ_ids.size),
+        "occurrence_duplicate_ids": int((occ_counts > 1).sum()),
+        "multimedia_rows_with_key": int(multimedia_keys.size),
+        "multimedia_distinct_ids": int(media_ids.size),
+        "occurrences_with_media": int(media_has_occ.sum()),
+        "occurrences_without_media": int(occ_ids.size - media_has_occ.sum()),
+        "orphan_multimedia_ids": int((~media_has_occ).sum()),
+        "orphan_multimedia_rows": int(media_counts[~media_has_occ].sum()),
+    }
+    if matched_counts.size:
+        stats["media_per_occurrence"] = {
+            "min": int(matched_counts.min()),
+            "median": float(np.median(matched_counts)),
+            "mean": round(float(matched_counts.mean()), 3),
+            "max": int(matched_counts.max()),
+            "histogram": {
+                **{str(n): int((matched_counts == n).sum()) for n in range(1, 5)},
+                "5+": int((matched_counts >= 5).sum()),
+            },
+        }
+    return stats
+
+
+def print_counts(source_file: str, counts: Dict[str, pl.DataFrame], top: int):
+    for column, frame in counts.items():
+        print(f"\nUnique value counts for column '{column}' in file '{source_file}.txt' "
+              f"({frame.height} distinct):")
+        for value, count in frame.head(top).iter_rows():
+            print(f"{value}: {count}")
+        if frame.height > top:
+            print(f"... {frame.height - top} more")
+
+
+def parse_columns(value: str) -> List[str]:
+    return [c.strip() for c in value.split(",") if c.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Single-pass value counts and gbifID join stats for a GBIF DwC-A export."
+    )
+    parser.add_argument("--archive-dir", default=base_directory,
+                        help="Directory containing occurrence.txt / multimedia.txt")
+    parser.add_argument("--multimedia-columns", type=parse_columns,
+                        default=DEFAULT_MULTIMEDIA_COLUMNS,
+                        help="Comma-separated multimedia.txt columns to count")
+    parser.add_argument("--occurrence-columns", type=parse_columns,
+                        default=DEFAULT_OCCURRENCE_COLUMNS,
+                        help="Comma-separated occurrence.txt columns to count")
+    parser.add_argument("--skip-occurrence", action="store_true",
+                        help="Only scan multimedia.txt (no join statistics)")
+    parser.add_argument("--batch-size", type=int, default=500_000,
+                        help="Rows per scanned batch")
+    parser.add_argument("--top", type=int, default=25,
+                        help="Values printed per column")
+    parser.add_argument("--output-json",
+                        help="Write full value counts and join stats to this JSON file")
+    args = parser.parse_args(argv)
+
+    sources = {"multimedia": args.multimedia_columns}
+    if not args.skip_occurrence:
+        sources["occurrence"] = args.occurrence_columns
+
+    for source_file in sources:
+        path = os.path.join(args.archive_dir, f"{source_file}.txt")
+        if not os.path.exists(path):
+            print(f"Error: {path} not found")
+            return 1
+
+    results = {
+        source_file: scan_file(args.archive_dir, source_file, columns, args.batch_size,
+                               collect_keys=not args.skip_occurrence)
+        for source_file, columns in sources.items()
+    }
 
-    with open(file_path, 'r', newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file, delimiter='\t')
-        total_rows = sum(1 for _ in open(file_path, 'r', encoding='utf-8')) - 1  # Subtract 1 for header
-        file.seek(0)  # Reset file pointer to the beginning
-        next(reader)  # Skip header row
+    summary: Dict = {"archive_dir": args.archive_dir, "files": {}}
+    for source_file, result in results.items():
+        print(f"\n=== {source_file}.txt: {result['rows']} rows ===")
+        print_counts(source_file, result["counts"], args.top)
+        summary["files"][source_file] = {
+            "rows": result["rows"],
+            "value_counts": {
+                column: dict(frame.iter_rows()) for column, frame in result["counts"].items()
+            },
+        }
 
-        for row in tqdm(reader, total=total_rows, desc="Processing rows"):
-            value = row.get(column)
-            if value:
-                value_counter[value] += 1
+    if not args.skip_occurrence:
+        occ_keys = results["occurrence"]["keys"]
+        media_keys = results["multimedia"]["keys"]
+        if occ_keys is None or media_keys is None:
+            print(f"\nJoin statistics skipped: {JOIN_KEY} missing from one of the files")
+        else:
+            stats = join_statistics(occ_keys, media_keys)
+            summary["join"] = stats
+            print(f"\n=== {JOIN_KEY} join: occurrence.txt <-> multimedia.txt ===")
+            for key, value in stats.items():
+                print(f"{key}: {value}")
 
-    return value_counter
+    if args.output_json:
+        with open(args.output_json, "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2)
+        print(f"\nSummary written to {args.output_json}")
 
-# Parameters
-source_file = "multimedia"
-column = "publisher"
-operation = ["count_unique"]
+    return 0
 
-# Process the file and count unique values in the specified column
-unique_value_counts = count_unique_values(base_directory, source_file, column)
 
-# Print the results
-print(f"Unique value counts for column '{column}' in file '{source_file}.txt':")
-for value, count in unique_value_counts.items():
-    print(f"{value}: {count}")
+if __name__ == "__main__":
+    sys.exit(main())
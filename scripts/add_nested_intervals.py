@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Add nested-interval (DFS pre/post-order) columns to expanded_taxa.
+
+Every taxon gets an integer interval [lft, rgt] such that a taxon T lies under
+root R exactly when R.lft <= T.lft AND T.lft <= R.rgt. Clade membership then
+becomes a btree range scan on a single column, independent of the root's rank
+(no need to pick the right "L{rank}_taxonID" column).
+
+The tree is read from "immediateAncestor_taxonID" (see add_immediate_ancestors.py),
+so that script must have been run first. Taxa whose parent is missing from
+expanded_taxa are treated as roots. Children are visited in ascending taxonID
+order, so intervals are deterministic for a given taxonomy release.
+
+Optionally denormalizes the taxon's lft onto observations.taxon_lft so that
+observation-level clade filters can skip the expanded_taxa join entirely. The
+copy is not maintained by a trigger: its column comment records a fingerprint
+of the encoding it was made from (INTERVAL_FINGERPRINT_SQL, computed the same
+way by interval_fingerprint in dbTools/export/v0/common/functions.sh), and the
+exports only range-scan it while that fingerprint is current and no clade
+observation has a NULL taxon_lft. Rerun with --denormalize-observations after
+re-encoding or ingesting observations.
+"""
+
+import argparse
+import io
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+INTERVAL_FINGERPRINT_SQL = """
+    SELECT 'nested_intervals:' || md5(string_agg(
+        "taxonID" || ':' || COALESCE("lft"::text, '') || ':' || COALESCE("rgt"::text, ''),
+        ',' ORDER BY "taxonID"))
+    FROM expanded_taxa
+"""
+
+def get_db_engine(db_user, db_password, db_host, db_port, db_name):
+    connection_string = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+    return create_engine(connection_string)
+
+def add_columns_if_not_exists(session):
+    """Add the lft/rgt interval columns to expanded_taxa if missing."""
+    logger.info("Checking if nested-interval columns exist...")
+
+    check_sql = text("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name = 'expanded_taxa'
+        AND column_name IN ('lft', 'rgt', 'immediateAncestor_taxonID');
+    """)
+    existing_columns = [row[0] for row in session.execute(check_sql)]
+
+    if 'immediateAncestor_taxonID' not in existing_columns:
+        raise RuntimeError(
+            "expanded_taxa is missing immediateAncestor_taxonID; "
+            "run scripts/add_immediate_ancestors.py first"
+        )
+
+    alter_statements = []
+    if 'lft' not in existing_columns:
+        alter_statements.append('ADD COLUMN "lft" INTEGER')
+    if 'rgt' not in existing_columns:
+        alter_statements.append('ADD COLUMN "rgt" INTEGER')
+
+    if not alter_statements:
+        logger.info("Nested-interval columns already exist.")
+        return False
+
+    session.execute(text(f"ALTER TABLE expanded_taxa {', '.join(alter_statements)};"))
+    session.commit()
+    logger.info("Added nested-interval columns to expanded_taxa.")
+    return True
+
+def compute_nested_intervals(
+    parent_of: Dict[int, Optional[int]]
+) -> Dict[int, Tuple[int, int]]:
+    """
+    Assign DFS (lft, rgt) numbers to every taxon in a single traversal.
+
+    parent_of maps taxonID -> parent taxonID (or None for roots). Parents that
+    are not themselves keys of parent_of are treated as absent, so their
+    children become roots. Raises ValueError if the parent graph has a cycle.
+    """
+    children: Dict[Optional[int], List[int]] = defaultdict(list)
+    for taxon_id, parent_id in parent_of.items():
+        if parent_id is None or parent_id not in parent_of or parent_id == taxon_id:
+            parent_id = None
+        children[parent_id].append(taxon_id)
+    for child_list in children.values():
+        child_list.sort()
+
+    intervals: Dict[int, Tuple[int, int]] = {}
+    lft_of: Dict[int, int] = {}
+    counter = 0
+
+    # Iterative DFS: (taxon_id, next_child_index). The virtual root None is
+    # never numbered; its children are the forest roots.
+    stack: List[Tuple[Optional[int], int]] = [(None, 0)]
+    while stack:
+        node, child_idx = stack[-1]
+        node_children = children.get(node, [])
+        if child_idx < len(node_children):
+            stack[-1] = (node, child_idx + 1)
+            child = node_children[child_idx]
+            counter += 1
+            lft_of[child] = counter
+            stack.append((child, 0))
+        else:
+            stack.pop()
+            if node is not None:
+                counter += 1
+                intervals[node] = (lft_of[node], counter)
+
+    if len(intervals) != len(parent_of):
+        unreachable = len(parent_of) - len(intervals)
+        raise ValueError(
+            f"{unreachable} taxa are unreachable from any root; "
+            "the immediateAncestor_taxonID graph contains a cycle"
+        )
+
+    return intervals
+
+def load_parent_map(session) -> Dict[int, Optional[int]]:
+    """Load taxonID -> immediateAncestor_taxonID for all rows."""
+    result = session.execute(text("""
+        SELECT "taxonID", "immediateAncestor_taxonID"
+        FROM expanded_taxa
+    """))
+    return {
+        int(taxon_id): (int(parent_id) if parent_id is not None else None)
+        for taxon_id, parent_id in result
+    }
+
+def write_intervals(engine, intervals: Dict[int, Tuple[int, int]]):
+    """COPY intervals into a temp table and apply them with one UPDATE."""
+    buffer = io.StringIO()
+    for taxon_id, (lft, rgt) in intervals.items():
+        buffer.write(f"{taxon_id}\t{lft}\t{rgt}\n")
+    buffer.seek(0)
+
+    raw_conn = engine.raw_connection()
+    try:
+        with raw_conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE temp_nested_intervals (
+                    "taxonID" INTEGER PRIMARY KEY,
+                    "lft" INTEGER NOT NULL,
+                    "rgt" INTEGER NOT NULL
+                ) ON COMMIT DROP
+            """)
+            cursor.copy_expert(
+                'COPY temp_nested_intervals ("taxonID", "lft", "rgt") FROM STDIN',
+                buffer,
+            )
+            cursor.execute("""
+                UPDATE expanded_taxa et
+                SET "lft" = t."lft",
+                    "rgt" = t."rgt"
+                FROM temp_nested_intervals t
+                WHERE et."taxonID" = t."taxonID"
+            """)
+            updated = cursor.rowcount
+        raw_conn.commit()
+    finally:
+        raw_conn.close()
+
+    logger.info(f"Wrote intervals for {updated} taxa")
+
+def populate_nested_intervals(session, engine):
+    """Compute and store lft/rgt for every expanded_taxa row."""
+    start_time = time.time()
+    parent_of = load_parent_map(session)
+    logger.info(f"Loaded parent links for {len(parent_of)} taxa")
+
+    intervals = compute_nested_intervals(parent_of)
+    roots = sum(
+        1 for taxon_id, parent_id in parent_of.items()
+        if parent_id is None or parent_id not in parent_of
+    )
+    logger.info(
+        f"Computed intervals for {len(intervals)} taxa across {roots} roots "
+        f"in {time.time() - start_time:.1f}s"
+    )
+
+    write_intervals(engine, intervals)
+
+def create_indexes(session):
+    """Create the range-scan indexes on expanded_taxa."""
+    logger.info("Creating indexes on nested-interval columns...")
+    index_statements = [
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_expanded_taxa_lft ON expanded_taxa("lft")',
+        'CREATE INDEX IF NOT EXISTS idx_expanded_taxa_lft_rgt ON expanded_taxa("lft", "rgt")',
+    ]
+    for stmt in index_statements:
+        session.execute(text(stmt))
+    session.commit()
+    logger.info("Indexes created successfully.")
+
+def denormalize_observations(session):
+    """Copy each taxon's lft onto observations.taxon_lft and index it."""
+    logger.info("Denormalizing expanded_taxa.lft onto observations.taxon_lft...")
+    session.execute(text("ALTER TABLE observations ADD COLUMN IF NOT EXISTS taxon_lft INTEGER"))
+    session.commit()
+
+    start_time = time.time()
+    fingerprint = session.execute(text(INTERVAL_FINGERPRINT_SQL)).scalar()
+    result = session.execute(text("""
+        UPDATE observations o
+        SET taxon_lft = e."lft"
+        FROM expanded_taxa e
+        WHERE e."taxonID" = o.taxon_id
+          AND o.taxon_lft IS DISTINCT FROM e."lft"
+    """))
+    session.execute(text(f"COMMENT ON COLUMN observations.taxon_lft IS '{fingerprint}'"))
+    session.commit()
+    logger.info(f"Updated taxon_lft on {result.rowcount} observations in {time.time() - start_time:.1f}s")
+    logger.info(f"observations.taxon_lft fingerprint: {fingerprint}")
+
+    session.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_observations_taxon_lft ON observations(taxon_lft)"
+    ))
+    session.commit()
+    logger.info("Index idx_observations_taxon_lft created.")
+
+def verify_results(session):
+    """Sanity-check interval invariants against the L-column hierarchy."""
+    logger.info("Verifying results...")
+
+    counts = session.execute(text("""
+        SELECT
+            COUNT(*) AS total,
+            COUNT("lft") AS with_interval,
+            COUNT(*) FILTER (WHERE "rgt" <= "lft") AS bad_ordering,
+            COUNT(*) FILTER (WHERE ("rgt" - "lft" + 1) % 2 <> 0) AS bad_width
+        FROM expanded_taxa
+    """)).fetchone()
+    logger.info(f"Total taxa: {counts[0]}, with interval: {counts[1]}")
+    if counts[2] or counts[3]:
+        logger.error(f"Interval invariant violations: ordering={counts[2]}, width={counts[3]}")
+
+    # Each child interval must nest strictly inside its parent's interval.
+    not_nested = session.execute(text("""
+        SELECT COUNT(*)
+        FROM expanded_taxa c
+        JOIN expanded_taxa p ON p."taxonID" = c."immediateAncestor_taxonID"
+        WHERE NOT (c."lft" > p."lft" AND c."rgt" < p."rgt")
+    """)).scalar()
+    if not_nested:
+        logger.error(f"{not_nested} taxa are not nested inside their immediate ancestor")
+    else:
+        logger.info("All child intervals nest inside their immediate ancestor.")
+
+    # Spot-check: interval membership agrees with the L50 column for Insecta.
+    mismatch = session.execute(text("""
+        WITH root AS (
+            SELECT "lft", "rgt" FROM expanded_taxa WHERE "taxonID" = 47158
+        )
+        SELECT COUNT(*)
+        FROM expanded_taxa e, root r
+        WHERE (e."lft" BETWEEN r."lft" AND r."rgt")
+           <> (e."L50_taxonID" = 47158 OR e."taxonID" = 47158)
+    """)).scalar()
+    logger.info(f"Insecta interval/L50 disagreement count: {mismatch}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Add and populate nested-interval (lft/rgt) columns in expanded_taxa.")
+    parser.add_argument("--db-user", default=os.getenv("DB_USER", "postgres"))
+    parser.add_argument("--db-password", default=os.getenv("DB_PASSWORD", "password"))
+    parser.add_argument("--db-host", default=os.getenv("DB_HOST", "localhost"))
+    parser.add_argument("--db-port", default=os.getenv("DB_PORT", "5432"))
+    parser.add_argument("--db-name", default=os.getenv("DB_NAME", "ibrida-v0"))
+    parser.add_argument("--skip-add-columns", action="store_true", help="Skip adding columns if they already exist")
+    parser.add_argument("--skip-populate", action="store_true", help="Skip computing and writing intervals")
+    parser.add_argument("--skip-indexes", action="store_true", help="Skip creating indexes")
+    parser.add_argument("--denormalize-observations", action="store_true",
+                        help="Also populate and index observations.taxon_lft")
+    parser.add_argument("--verify-only", action="store_true", help="Only verify existing data")
+
+    args = parser.parse_args()
+
+    engine = get_db_engine(args.db_user, args.db_password, args.db_host, args.db_port, args.db_name)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+
+    try:
+        if args.verify_only:
+            verify_results(session)
+        else:
+            if not args.skip_add_columns:
+                add_columns_if_not_exists(session)
+
+            if not args.skip_populate:
+                populate_nested_intervals(session, engine)
+
+            if not args.skip_indexes:
+                create_indexes(session)
+
+            if args.denormalize_observations:
+                denormalize_observations(session)
+
+            verify_results(session)
+
+        logger.info("Process completed successfully!")
+
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
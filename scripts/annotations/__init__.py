@@ -0,0 +1,93 @@
+"""
+Bulk read/write tooling for the annotation lineage tables (migrations 001-006).
+
+The ORM in models/annotation_models.py describes the schema; these modules are
+the high-volume paths around it: COPY-staged, set-wise SQL instead of per-row
+ORM inserts.
+
+  writer.py  Arrow/Parquet batches -> subject/annotation/geometry/provenance/
+             quality rows, one transaction per batch, idempotent on
+             uq_annotation_source_key.
+  export.py  selector output -> sharded COCO / YOLO / Parquet through a
+             server-side cursor, optionally scoped to annotation sets or read
+             from the materialized selection (migration 007).
+  partitions.py  list/detach/attach whole runs under the set_id-partitioned
+             layout (migration 008).
+  codec.py   packed polygon / RLE mask payloads (migration 009) <-> NumPy;
+             codec_benchmark.py compares them with JSONB.
+  conflicts.py  per-subject box IoU conflicts between sets, bulk conflict
+             flagging in annotation_quality (migration 010).
+  supersession.py  COPY-staged bulk supersession and terminal-replacement
+             lookups over the maintained closure (migration 011).
+  adjudication.py  review decisions -> annotation_quality through one COPY
+             and one UPDATE ... FROM, with old -> new status counts.
+  subjects.py  bulk find-or-create of annotation_subject rows (INSERT ...
+             ON CONFLICT ... RETURNING) behind an LRU cache shared across
+             the writer's batches.
+  stats.py   per-set counts, review distribution and conflict rate from the
+             trigger-maintained counters (migration 012).
+
+Run as a module from the repository root:
+  uv run python3 -m scripts.annotations ingest --set-id <uuid> detections/*.parquet
+  uv run python3 -m scripts.annotations export --format coco --out-dir /tmp/coco
+  uv run python3 -m scripts.annotations partitions detach --set-id <uuid>
+  uv run python3 -m scripts.annotations codec-benchmark --with-db
+  uv run python3 -m scripts.annotations conflicts --set-id <a> --set-id <b> --min-iou 0.5
+  uv run python3 -m scripts.annotations supersession load --pairs relabel.csv --created-by <who>
+  uv run python3 -m scripts.annotations stats --set-id <uuid> --labels 20
+  uv run python3 -m scripts.annotations adjudicate --decisions review.csv --adjudicated-by <who>
+"""
+
+from .adjudication import REVIEW_STATUSES, adjudicate
+from .codec import (
+    GeometryCodecError,
+    pack_polygon,
+    pack_rle,
+    rle_to_mask,
+    unpack_mask,
+    unpack_polygon,
+    unpack_rle,
+)
+from .conflicts import find_box_conflicts, flag_box_conflicts
+from .export import EXPORT_FORMATS, build_export_query, export_annotations
+from .partitions import attach_set, detach_set, list_partitions
+from .stats import label_stats, rebuild_set_stats, set_stats
+from .subjects import SubjectResolver
+from .supersession import rebuild_closure, resolve_terminals, supersede_annotations
+from .writer import (
+    AnnotationWriteError,
+    BulkAnnotationWriter,
+    ensure_annotation_set,
+    iter_parquet_batches,
+)
+
+__all__ = [
+    "AnnotationWriteError",
+    "BulkAnnotationWriter",
+    "EXPORT_FORMATS",
+    "GeometryCodecError",
+    "REVIEW_STATUSES",
+    "SubjectResolver",
+    "adjudicate",
+    "attach_set",
+    "build_export_query",
+    "detach_set",
+    "export_annotations",
+    "find_box_conflicts",
+    "flag_box_conflicts",
+    "ensure_annotation_set",
+    "iter_parquet_batches",
+    "label_stats",
+    "list_partitions",
+    "pack_polygon",
+    "pack_rle",
+    "rebuild_closure",
+    "rebuild_set_stats",
+    "resolve_terminals",
+    "rle_to_mask",
+    "set_stats",
+    "supersede_annotations",
+    "unpack_mask",
+    "unpack_polygon",
+    "unpack_rle",
+]
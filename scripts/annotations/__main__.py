@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""CLI for annotation bulk tooling (python -m scripts.annotations)."""
+
+import argparse
+import csv
+import os
+import sys
+from pathlib import Path
+
+import psycopg2
+
+from .adjudication import adjudicate
+from .codec_benchmark import run_codec_benchmark
+from .conflicts import conflict_summary, find_box_conflicts, flag_box_conflicts
+from .export import EXPORT_FORMATS, export_annotations
+from .partitions import attach_set, detach_set, is_partitioned, list_partitions, partition_table_names
+from .stats import label_stats, rebuild_set_stats, set_stats
+from .subjects import SubjectResolver
+from .supersession import rebuild_closure, resolve_terminals, supersede_annotations
+from .writer import (
+    AnnotationWriteError,
+    BulkAnnotationWriter,
+    ensure_annotation_set,
+    iter_parquet_batches,
+    summarize,
+)
+
+
+def add_db_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--db-connection",
+        default=os.getenv("IBRIDADB_DSN", "postgresql://postgres@localhost/ibrida-v0"),
+        help="PostgreSQL connection string (prefer env/.pgpass over inline passwords)",
+    )
+
+
+def run_ingest(args) -> int:
+    missing = [p for p in args.parquet if not Path(p).exists()]
+    if missing:
+        print(f"Error: input file(s) not found: {missing}")
+        return 1
+    if not args.set_id and not (args.source_kind and args.source_name):
+        print("Error: pass --set-id, or --source-kind and --source-name to create/reuse a set")
+        return 1
+
+    conn = psycopg2.connect(args.db_connection)
+    try:
+        set_id = args.set_id or ensure_annotation_set(
+            conn,
+            source_kind=args.source_kind,
+            source_name=args.source_name,
+            source_version=args.source_version,
+            run_id=args.run_id,
+            model_id=args.model_id,
+            config_hash=args.config_hash,
+            prompt_hash=args.prompt_hash,
+            name=args.set_name,
+            dataset=args.dataset,
+            release=args.release,
+            created_by=args.created_by,
+        )
+        print(f"Writing into annotation_set {set_id}")
+
+        writer = BulkAnnotationWriter(
+            conn,
+            set_id,
+            with_quality=args.with_quality,
+            derive_keys=args.derive_keys,
+            subject_resolver=SubjectResolver(conn, args.subject_cache) if args.subject_cache else None,
+        )
+        try:
+            totals = writer.write(iter_parquet_batches(args.parquet, args.batch_size))
+        finally:
+            writer.close()
+    except (AnnotationWriteError, psycopg2.Error) as exc:
+        print(f"Error: {exc}")
+        return 1
+    finally:
+        conn.close()
+
+    for line in summarize(totals):
+        print(line)
+    return 0
+
+
+def run_export(args) -> int:
+    conn = psycopg2.connect(args.db_connection)
+    try:
+        stats = export_annotations(
+            conn,
+            Path(args.out_dir),
+            args.format,
+            policy_name=args.policy_name,
+            policy_version=args.policy_version,
+            set_ids=args.set_id,
+            use_cache=args.use_selection_cache,
+            refresh_cache=not args.no_refresh,
+            shard_images=args.shard_images,
+            fetch_size=args.fetch_size,
+        )
+    except psycopg2.Error as exc:
+        print(f"Error: {exc}")
+        return 1
+    finally:
+        conn.close()
+
+    print(f"Images: {stats['images']}")
+    print(f"Annotations: {stats['annotations']}")
+    print(f"Skipped (no usable geometry/dimensions): {stats['skipped']}")
+    print(f"Shards written to {args.out_dir}: {stats['shards']}")
+    return 0
+
+
+def run_partitions(args) -> int:
+    conn = psycopg2.connect(args.db_connection)
+    try:
+        if not is_partitioned(conn):
+            print("Error: annotation is not partitioned (apply migration 008 first)")
+            return 1
+
+        if args.action == "list":
+            for row in list_partitions(conn):
+                state = "attached" if row["attached"] else ("detached" if row["partition_exists"] else "missing")
+                rows = row["estimated_rows"] if row["estimated_rows"] is not None else "-"
+                print(f"{row['set_id']}  {state:<9} ~{rows} rows  "
+                      f"{row['source_kind']}/{row['source_name']} run={row['run_id']}")
+            return 0
+
+        if not args.set_id:
+            print(f"Error: {args.action} needs --set-id")
+            return 1
+        if args.action == "detach":
+            count = detach_set(conn, args.set_id)
+            print(f"Detached annotation_set {args.set_id} ({count} annotations)")
+            print("Tables left in place (archive, or DROP TABLE to discard the run):")
+            for name in partition_table_names(conn, args.set_id):
+                print(f"  {name}")
+        else:
+            count = attach_set(conn, args.set_id)
+            print(f"Attached annotation_set {args.set_id} ({count} annotations)")
+    except psycopg2.Error as exc:
+        print(f"Error: {exc}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+def run_conflicts(args) -> int:
+    if args.flag and not args.adjudicated_by:
+        print("Error: --flag needs --adjudicated-by")
+        return 1
+    if len(args.set_id) < 2 and not args.within_set:
+        print("Error: pass two or more --set-id values, or --within-set")
+        return 1
+    same_label = {"same": True, "different": False, "any": None}[args.labels]
+
+    conn = psycopg2.connect(args.db_connection)
+    try:
+        if args.flag:
+            summary = flag_box_conflicts(
+                conn, args.set_id, args.adjudicated_by,
+                min_iou=args.min_iou, same_label=same_label, within_set=args.within_set,
+            )
+            print(f"Conflict pairs: {summary['conflict_pairs']}")
+            print(f"Flagged as conflict: {summary['flagged']}")
+            print(f"Already adjudicated (left unchanged): {summary['already_adjudicated']}")
+            print(f"Without annotation_quality row: {summary['without_quality']}")
+            return 0
+
+        for row in conflict_summary(conn, args.set_id, args.min_iou, same_label, args.within_set):
+            kind = "same label" if row["same_label"] else "label disagreement"
+            print(f"{row['set_id']} x {row['other_set_id']}  {kind:<18} "
+                  f"pairs={row['pairs']} subjects={row['subjects']} mean_iou={row['mean_iou']:.3f}")
+        if args.show:
+            print()
+            for row in find_box_conflicts(conn, args.set_id, args.min_iou, same_label,
+                                          args.within_set, limit=args.show):
+                print(f"{row['subject_id']}  {row['annotation_id']} ({row['label']}) ~ "
+                      f"{row['other_annotation_id']} ({row['other_label']})  iou={row['iou']:.3f}")
+    except psycopg2.Error as exc:
+        print(f"Error: {exc}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+def read_supersession_pairs(path: str):
+    with open(path, newline="") as handle:
+        for row in csv.DictReader(handle):
+            yield row["superseded_annotation_id"], row["replacement_annotation_id"]
+
+
+def run_supersession(args) -> int:
+    if args.action == "load" and not args.pairs:
+        print("Error: load needs --pairs")
+        return 1
+    if args.action == "resolve" and not args.annotation_id:
+        print("Error: resolve needs --annotation-id")
+        return 1
+
+    conn = psycopg2.connect(args.db_connection)
+    try:
+        if args.action == "load":
+            stats = supersede_annotations(
+                conn, read_supersession_pairs(args.pairs),
+                reason=args.reason, created_by=args.created_by,
+            )
+            print(f"Pairs read: {stats['staged']}")
+            print(f"Supersessions inserted: {stats['inserted']}")
+            print(f"Skipped (already superseded): {stats['skipped']}")
+        elif args.action == "resolve":
+            for row in resolve_terminals(conn, args.annotation_id):
+                print(f"{row['annotation_id']} -> {row['terminal_annotation_id']}  depth={row['depth']}")
+        else:
+            summary = rebuild_closure(conn)
+            print(f"Supersession edges: {summary['edges']}")
+            print(f"Closure rows: {summary['closure_rows']}")
+            print(f"Longest chain: {summary['max_depth']}")
+    except (psycopg2.Error, KeyError) as exc:
+        print(f"Error: {exc}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+def run_stats(args) -> int:
+    conn = psycopg2.connect(args.db_connection)
+    try:
+        if args.rebuild:
+            set_ids = args.set_id or [None]
+            rebuilt = sum(rebuild_set_stats(conn, set_id) for set_id in set_ids)
+            print(f"Rebuilt statistics for {rebuilt} set(s)")
+
+        for row in set_stats(conn, args.set_id):
+            mean_score = f"{row['mean_score']:.3f}" if row["mean_score"] is not None else "-"
+            mean_conf = f"{row['mean_confidence']:.3f}" if row["mean_confidence"] is not None else "-"
+            conflict_rate = f"{row['conflict_rate']:.3f}" if row["conflict_rate"] is not None else "-"
+            print(f"{row['set_id']}  {row['source_kind']}/{row['source_name']} run={row['run_id']}")
+            print(f"  annotations={row['annotations']} active={row['active_annotations']} "
+                  f"mean_score={mean_score}")
+            print(f"  quality={row['quality_rows']} mean_confidence={mean_conf} "
+                  f"unreviewed={row['unreviewed']} needs_review={row['needs_review']} "
+                  f"accepted={row['accepted']} rejected={row['rejected']} "
+                  f"conflict={row['conflict']} conflict_rate={conflict_rate}")
+            if args.labels:
+                for label in label_stats(conn, row["set_id"], limit=args.labels):
+                    print(f"    {label['label']:<32} {label['annotations']:>10} "
+                          f"(active {label['active_annotations']})")
+    except psycopg2.Error as exc:
+        print(f"Error: {exc}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+def read_adjudication_decisions(path: str):
+    with open(path, newline="") as handle:
+        for row in csv.DictReader(handle):
+            yield row["annotation_id"], row["review_status"], row.get("notes") or None
+
+
+def run_adjudicate(args) -> int:
+    conn = psycopg2.connect(args.db_connection)
+    try:
+        summary = adjudicate(conn, read_adjudication_decisions(args.decisions), args.adjudicated_by)
+    except (psycopg2.Error, AnnotationWriteError, KeyError) as exc:
+        print(f"Error: {exc}")
+        return 1
+    finally:
+        conn.close()
+
+    print(f"Decisions read: {summary['decisions']} ({summary['duplicates']} superseded by a later line)")
+    print(f"Updated: {summary['updated']}")
+    print(f"Unchanged (same status and notes): {summary['unchanged']}")
+    print(f"Without annotation_quality row: {summary['missing']}")
+    for (old_status, new_status), rows in sorted(summary["transitions"].items()):
+        print(f"  {old_status} -> {new_status}: {rows}")
+    return 0
+
+
+def run_codec_bench(args) -> int:
+    if not args.with_db:
+        return run_codec_benchmark(args.count, args.polygon_vertices, args.mask_size, args.seed)
+    conn = psycopg2.connect(args.db_connection)
+    try:
+        return run_codec_benchmark(args.count, args.polygon_vertices, args.mask_size, args.seed, conn=conn)
+    except psycopg2.Error as exc:
+        print(f"Error: {exc}")
+        return 1
+    finally:
+        conn.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Annotation lineage bulk tooling")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Bulk-load Parquet annotation batches")
+    ingest.add_argument("parquet", nargs="+", help="Parquet files (see writer.py for columns)")
+    ingest.add_argument("--set-id", help="Existing annotation_set.set_id to write into")
+    ingest.add_argument("--source-kind", choices=["human", "model", "imported_dataset"],
+                        help="Create/reuse a set with this source kind (when --set-id is absent)")
+    ingest.add_argument("--source-name")
+    ingest.add_argument("--source-version")
+    ingest.add_argument("--run-id")
+    ingest.add_argument("--model-id")
+    ingest.add_argument("--config-hash")
+    ingest.add_argument("--prompt-hash")
+    ingest.add_argument("--set-name")
+    ingest.add_argument("--dataset", default="ibrida")
+    ingest.add_argument("--release")
+    ingest.add_argument("--created-by", help="Also used as operator_identity for human sets")
+    ingest.add_argument("--batch-size", type=int, default=100_000, help="Rows per transaction")
+    ingest.add_argument("--with-quality", action="store_true",
+                        help="Also write annotation_quality rows (confidence_score defaults to score)")
+    ingest.add_argument("--derive-keys", action="store_true",
+                        help="Derive source_annotation_key from asset/frame/label/geometry when absent")
+    ingest.add_argument("--subject-cache", type=int, default=200_000,
+                        help="Subjects kept in the in-process resolver cache across batches "
+                             "(0: resolve subjects in SQL after each COPY)")
+    add_db_argument(ingest)
+    ingest.set_defaults(func=run_ingest)
+
+    export = subparsers.add_parser("export", help="Stream selected annotations to COCO/YOLO/Parquet")
+    export.add_argument("--format", choices=EXPORT_FORMATS, required=True)
+    export.add_argument("--out-dir", required=True)
+    export.add_argument("--policy-name", default="human_first")
+    export.add_argument("--policy-version", type=int, default=1)
+    export.add_argument("--set-id", action="append",
+                        help="Restrict selection to this annotation set (repeatable; ranks within the sets)")
+    export.add_argument("--use-selection-cache", action="store_true",
+                        help="Read materialized winners from annotation_export_selection (migration 007)")
+    export.add_argument("--no-refresh", action="store_true",
+                        help="Do not refresh the selection cache before exporting")
+    export.add_argument("--shard-images", type=int, default=50_000, help="Images per output shard")
+    export.add_argument("--fetch-size", type=int, default=50_000, help="Rows per server-side cursor fetch")
+    add_db_argument(export)
+    export.set_defaults(func=run_export)
+
+    partitions = subparsers.add_parser(
+        "partitions", help="List/detach/attach per-set partitions (migration 008 layout)"
+    )
+    partitions.add_argument("action", choices=["list", "detach", "attach"])
+    partitions.add_argument("--set-id", help="annotation_set to detach or attach")
+    add_db_argument(partitions)
+    partitions.set_defaults(func=run_partitions)
+
+    conflicts = subparsers.add_parser(
+        "conflicts", help="Find/flag overlapping boxes between annotation sets (migration 010)"
+    )
+    conflicts.add_argument("--set-id", action="append", required=True,
+                           help="annotation_set to compare (repeatable)")
+    conflicts.add_argument("--min-iou", type=float, default=0.5, help="IoU threshold (default: 0.5)")
+    conflicts.add_argument("--labels", choices=["any", "same", "different"], default="any",
+                           help="same = duplicate detections, different = label disagreements")
+    conflicts.add_argument("--within-set", action="store_true",
+                           help="Also pair boxes from the same set (NMS-style duplicates)")
+    conflicts.add_argument("--show", type=int, default=0, help="Print the N strongest conflicting pairs")
+    conflicts.add_argument("--flag", action="store_true",
+                           help="Mark unreviewed/needs_review annotations as review_status=conflict")
+    conflicts.add_argument("--adjudicated-by", help="Operator identity recorded on flagged rows")
+    add_db_argument(conflicts)
+    conflicts.set_defaults(func=run_conflicts)
+
+    supersession = subparsers.add_parser(
+        "supersession", help="Bulk-supersede annotations / resolve terminal replacements (migration 011)"
+    )
+    supersession.add_argument("action", choices=["load", "resolve", "rebuild"])
+    supersession.add_argument("--pairs",
+                              help="CSV with superseded_annotation_id,replacement_annotation_id columns (load)")
+    supersession.add_argument("--reason", help="Recorded on every loaded supersession")
+    supersession.add_argument("--created-by", help="Recorded on every loaded supersession")
+    supersession.add_argument("--annotation-id", action="append",
+                              help="Annotation to resolve to its terminal replacement (repeatable)")
+    add_db_argument(supersession)
+    supersession.set_defaults(func=run_supersession)
+
+    adjudication = subparsers.add_parser(
+        "adjudicate", help="Apply review decisions to annotation_quality in one UPDATE"
+    )
+    adjudication.add_argument("--decisions", required=True,
+                              help="CSV with annotation_id,review_status[,notes] columns")
+    adjudication.add_argument("--adjudicated-by", required=True, help="Reviewer identity recorded on every row")
+    add_db_argument(adjudication)
+    adjudication.set_defaults(func=run_adjudicate)
+
+    stats = subparsers.add_parser("stats", help="Per-set annotation statistics (migration 012)")
+    stats.add_argument("--set-id", action="append", help="Only this annotation set (repeatable)")
+    stats.add_argument("--labels", type=int, default=0, help="Also print the N most frequent labels per set")
+    stats.add_argument("--rebuild", action="store_true",
+                       help="Recompute the counters (for --set-id, or all sets) before printing")
+    add_db_argument(stats)
+    stats.set_defaults(func=run_stats)
+
+    codec_bench = subparsers.add_parser(
+        "codec-benchmark", help="Compare JSONB vs packed polygon/mask payloads (migration 009)"
+    )
+    codec_bench.add_argument("--count", type=int, default=20_000,
+                             help="Synthetic polygons (masks: count / 10) (default: 20000)")
+    codec_bench.add_argument("--polygon-vertices", type=int, default=32)
+    codec_bench.add_argument("--mask-size", type=int, default=256, help="Mask height/width in pixels")
+    codec_bench.add_argument("--seed", type=int, default=42)
+    codec_bench.add_argument("--with-db", action="store_true",
+                             help="Also report pg_column_size() via the migration 009 SQL codec")
+    add_db_argument(codec_bench)
+    codec_bench.set_defaults(func=run_codec_bench)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Bulk adjudication of annotation_quality rows.
+
+Review tools submit thousands of (annotation_id, review_status, notes)
+decisions at once.  adjudicate() COPYs them into a temp table and applies them
+with a single UPDATE ... FROM, joined to the pre-update quality rows so the
+RETURNING clause reports every old -> new review_status transition.  The
+touch_updated_at row trigger still stamps updated_at; the statement-level
+triggers (selection change log, set statistics) fire once for the whole batch.
+
+Decisions follow the migration 003 constraints: every decision records
+adjudicated_by / adjudicated_at, 'conflict' sets conflict_flag with the notes
+(or the existing reason) as conflict_reason, and every other status clears
+conflict_flag.  A later decision for the same annotation_id in one batch wins;
+decisions that would not change status or notes are counted, not written.
+"""
+
+import csv
+import io
+from typing import Dict, Iterable, Optional, Tuple
+
+from .writer import AnnotationWriteError
+
+REVIEW_STATUSES = ("unreviewed", "needs_review", "accepted", "rejected", "conflict")
+
+STAGE_TABLE = "annotation_adjudication_stage"
+
+
+def adjudicate(
+    conn,
+    decisions: Iterable[Tuple[str, str, Optional[str]]],
+    adjudicated_by: str,
+) -> Dict:
+    """
+    Apply (annotation_id, review_status, notes) decisions in one transaction.
+
+    Returns counts (decisions, duplicates, updated, unchanged, missing) and
+    transitions, a {(old_status, new_status): rows} map of what was written.
+    """
+    if not adjudicated_by or not adjudicated_by.strip():
+        raise AnnotationWriteError("adjudicated_by is required")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for seq, (annotation_id, review_status, notes) in enumerate(decisions):
+        if review_status not in REVIEW_STATUSES:
+            raise AnnotationWriteError(
+                f"decision {seq + 1} ({annotation_id}): unknown review_status {review_status!r}"
+            )
+        writer.writerow((seq, annotation_id, review_status, notes))
+        count += 1
+    buffer.seek(0)
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE {STAGE_TABLE} (
+                    seq BIGINT NOT NULL,
+                    annotation_id UUID NOT NULL,
+                    review_status VARCHAR(32) NOT NULL,
+                    notes TEXT
+                ) ON COMMIT DROP
+                """
+            )
+            cursor.copy_expert(
+                f"COPY {STAGE_TABLE} (seq, annotation_id, review_status, notes) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(f"ANALYZE {STAGE_TABLE}")
+            cursor.execute(
+                f"""
+                WITH decision AS (
+                    SELECT DISTINCT ON (annotation_id) annotation_id, review_status, notes
+                    FROM {STAGE_TABLE}
+                    ORDER BY annotation_id, seq DESC
+                ), updated AS (
+                    UPDATE annotation_quality q
+                       SET review_status = d.review_status,
+                           review_notes = COALESCE(d.notes, old.review_notes),
+                           conflict_flag = d.review_status = 'conflict',
+                           conflict_reason = CASE
+                               WHEN d.review_status = 'conflict'
+                                   THEN COALESCE(d.notes, old.conflict_reason, 'adjudicated as conflict')
+                               ELSE old.conflict_reason
+                           END,
+                           adjudicated_by = %(adjudicated_by)s,
+                           adjudicated_at = NOW()
+                      FROM decision d
+                      JOIN annotation_quality old ON old.annotation_id = d.annotation_id
+                     WHERE q.quality_id = old.quality_id
+                       AND (old.review_status, old.review_notes)
+                           IS DISTINCT FROM (d.review_status, COALESCE(d.notes, old.review_notes))
+                    RETURNING old.review_status AS old_status, q.review_status AS new_status
+                )
+                SELECT 'transition', old_status, new_status, COUNT(*) FROM updated GROUP BY old_status, new_status
+                UNION ALL
+                SELECT 'distinct', NULL, NULL, COUNT(*) FROM decision
+                UNION ALL
+                SELECT 'missing', NULL, NULL, COUNT(*) FROM decision d
+                WHERE NOT EXISTS (SELECT 1 FROM annotation_quality q WHERE q.annotation_id = d.annotation_id)
+                """,
+                {"adjudicated_by": adjudicated_by},
+            )
+            rows = cursor.fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    transitions = {(old, new): n for kind, old, new, n in rows if kind == "transition"}
+    distinct = next(n for kind, _, _, n in rows if kind == "distinct")
+    missing = next(n for kind, _, _, n in rows if kind == "missing")
+    updated = sum(transitions.values())
+    return {
+        "decisions": count,
+        "duplicates": count - distinct,
+        "updated": updated,
+        "unchanged": distinct - missing - updated,
+        "missing": missing,
+        "transitions": transitions,
+    }
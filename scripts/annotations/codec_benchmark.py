@@ -0,0 +1,134 @@
+"""
+Storage size and decode throughput: JSONB payloads vs the packed codec (migration 009).
+
+Synthetic polygons (full-precision float vertices, as model outputs write them)
+and blob masks (COCO RLE of random ellipses) are encoded both ways:
+  - size: JSON text bytes vs packed bytes; with a database, also
+    pg_column_size() of the JSONB datum vs the packed bytea (uncompressed
+    datum sizes, as stored inline before any TOAST compression);
+  - decode: json.loads -> NumPy vs codec.unpack_* -> NumPy, payloads/second.
+
+  uv run python3 -m scripts.annotations codec-benchmark --count 20000
+  uv run python3 -m scripts.annotations codec-benchmark --with-db
+"""
+
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .codec import mask_to_rle, pack_polygon, pack_rle, rle_to_mask, unpack_polygon, unpack_rle
+
+
+def synthetic_polygons(rng: np.random.Generator, count: int, vertices: int) -> List[List[List[float]]]:
+    """Star-shaped rings around random centres, normalized coordinates."""
+    polygons = []
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    for _ in range(count):
+        centre = rng.uniform(0.2, 0.8, size=2)
+        radius = rng.uniform(0.05, 0.2) * rng.uniform(0.7, 1.0, size=vertices)
+        ring = centre + np.column_stack((np.cos(angles), np.sin(angles))) * radius[:, None]
+        polygons.append(np.clip(ring, 0.0, 1.0).tolist())
+    return polygons
+
+
+def synthetic_masks(rng: np.random.Generator, count: int, size: int) -> List[Dict]:
+    """COCO uncompressed RLE dicts of one or two random ellipses per mask."""
+    yy, xx = np.mgrid[0:size, 0:size]
+    masks = []
+    for _ in range(count):
+        mask = np.zeros((size, size), dtype=bool)
+        for _ in range(rng.integers(1, 3)):
+            cy, cx = rng.uniform(0.2, 0.8, size=2) * size
+            ry, rx = rng.uniform(0.05, 0.25, size=2) * size
+            mask |= ((yy - cy) / ry) ** 2 + ((xx - cx) / rx) ** 2 <= 1.0
+        counts, shape = mask_to_rle(mask)
+        masks.append({"size": list(shape), "counts": counts.tolist()})
+    return masks
+
+
+def timed_rate(func, payloads: List) -> float:
+    start = time.perf_counter()
+    for payload in payloads:
+        func(payload)
+    elapsed = time.perf_counter() - start
+    return len(payloads) / elapsed if elapsed > 0 else float("inf")
+
+
+def db_column_sizes(conn, json_texts: List[str], pack_function: str) -> Tuple[float, float]:
+    """Mean pg_column_size of the JSONB datum and of its packed bytea."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT avg(pg_column_size(j.payload)), avg(pg_column_size({pack_function}(j.payload)))
+            FROM (SELECT payload::jsonb AS payload FROM unnest(%s::text[]) AS payload) j
+            """,
+            (json_texts,),
+        )
+        json_size, packed_size = cursor.fetchone()
+    conn.rollback()
+    return float(json_size), float(packed_size)
+
+
+def run_codec_benchmark(
+    count: int = 20_000,
+    polygon_vertices: int = 32,
+    mask_size: int = 256,
+    seed: int = 42,
+    conn=None,
+) -> int:
+    rng = np.random.default_rng(seed)
+
+    polygons = synthetic_polygons(rng, count, polygon_vertices)
+    polygon_json = [json.dumps(polygon) for polygon in polygons]
+    polygon_packed = [pack_polygon(polygon) for polygon in polygons]
+
+    n_masks = max(1, count // 10)
+    masks = synthetic_masks(rng, n_masks, mask_size)
+    mask_json = [json.dumps(mask) for mask in masks]
+    mask_packed = [pack_rle(mask["counts"], mask["size"]) for mask in masks]
+
+    print(f"=== Geometry payload codec benchmark (seed={seed}) ===")
+    print(f"{'payload':<28} {'n':>7} {'json_B':>8} {'packed_B':>9} {'ratio':>6} "
+          f"{'db_json_B':>10} {'db_packed_B':>12}")
+
+    rows: List[Tuple[str, int, List[str], List[bytes], Optional[Tuple[float, float]]]] = [
+        (f"polygon ({polygon_vertices} vertices)", count, polygon_json, polygon_packed,
+         db_column_sizes(conn, polygon_json, "annotation_polygon_pack") if conn is not None else None),
+        (f"mask RLE ({mask_size}x{mask_size})", n_masks, mask_json, mask_packed,
+         db_column_sizes(conn, mask_json, "annotation_rle_pack") if conn is not None else None),
+    ]
+    for name, n, as_json, as_packed, db_sizes in rows:
+        json_bytes = sum(len(text.encode("utf-8")) for text in as_json) / n
+        packed_bytes = sum(len(buf) for buf in as_packed) / n
+        db_json, db_packed = (f"{db_sizes[0]:.0f}", f"{db_sizes[1]:.0f}") if db_sizes else ("-", "-")
+        print(f"{name:<28} {n:>7,} {json_bytes:>8.0f} {packed_bytes:>9.0f} "
+              f"{json_bytes / packed_bytes:>5.1f}x {db_json:>10} {db_packed:>12}")
+
+    print()
+    print(f"{'decode':<40} {'json/s':>10} {'packed/s':>10} {'speedup':>8}")
+    cases = [
+        ("polygon -> (N, 2) float64",
+         lambda text: np.asarray(json.loads(text), dtype=np.float64), polygon_json,
+         unpack_polygon, polygon_packed),
+        ("mask RLE -> counts int64",
+         lambda text: np.asarray(json.loads(text)["counts"], dtype=np.int64), mask_json,
+         unpack_rle, mask_packed),
+        ("mask RLE -> (h, w) bool mask",
+         lambda text: _json_mask(text), mask_json,
+         lambda buf: rle_to_mask(*unpack_rle(buf)), mask_packed),
+    ]
+    for name, json_decode, json_payloads, packed_decode, packed_payloads in cases:
+        json_rate = timed_rate(json_decode, json_payloads)
+        packed_rate = timed_rate(packed_decode, packed_payloads)
+        print(f"{name:<40} {json_rate:>10,.0f} {packed_rate:>10,.0f} {packed_rate / json_rate:>7.1f}x")
+
+    print("\nNote: db_*_B are per-datum sizes before TOAST compression; run the query in "
+          "docs/annotation_migration_notes.md section 12 for on-disk table sizes.")
+    return 0
+
+
+def _json_mask(text: str) -> np.ndarray:
+    rle = json.loads(text)
+    return rle_to_mask(np.asarray(rle["counts"], dtype=np.int64), tuple(rle["size"]))
@@ -0,0 +1,83 @@
+"""
+Box overlap conflicts between annotation sets (migration 010).
+
+Wraps annotation_box_conflicts_v1() and annotation_flag_box_conflicts(): both
+pair active boxes per subject inside the database in one set-based query, so
+no candidate rows travel to the client.  Flagging adjudicates the affected
+unreviewed / needs_review quality rows as review_status = 'conflict' in a
+single UPDATE.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+
+def conflict_summary(
+    conn,
+    set_ids: Sequence[str],
+    min_iou: float = 0.5,
+    same_label: Optional[bool] = None,
+    within_set: bool = False,
+) -> List[Dict]:
+    """Conflict pair counts per (set_id, other_set_id, same label?)."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT set_id::text, other_set_id::text, label = other_label AS same_label,
+                   COUNT(*) AS pairs, COUNT(DISTINCT subject_id) AS subjects,
+                   AVG(iou) AS mean_iou
+            FROM annotation_box_conflicts_v1(%s::uuid[], %s, %s, %s)
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3 DESC
+            """,
+            (list(set_ids), min_iou, same_label, within_set),
+        )
+        columns = [desc[0] for desc in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    conn.rollback()
+    return rows
+
+
+def find_box_conflicts(
+    conn,
+    set_ids: Sequence[str],
+    min_iou: float = 0.5,
+    same_label: Optional[bool] = None,
+    within_set: bool = False,
+    limit: Optional[int] = None,
+) -> List[Dict]:
+    """Conflicting box pairs, strongest overlap first."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT subject_id::text, annotation_id::text, set_id::text, label,
+                   other_annotation_id::text, other_set_id::text, other_label, iou
+            FROM annotation_box_conflicts_v1(%s::uuid[], %s, %s, %s)
+            ORDER BY iou DESC, annotation_id, other_annotation_id
+            LIMIT %s
+            """,
+            (list(set_ids), min_iou, same_label, within_set, limit),
+        )
+        columns = [desc[0] for desc in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    conn.rollback()
+    return rows
+
+
+def flag_box_conflicts(
+    conn,
+    set_ids: Sequence[str],
+    adjudicated_by: str,
+    min_iou: float = 0.5,
+    same_label: Optional[bool] = None,
+    within_set: bool = False,
+) -> Dict[str, int]:
+    """Flag conflicting annotations in one transaction; returns the summary counts."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT * FROM annotation_flag_box_conflicts(%s::uuid[], %s, %s, %s, %s)",
+            (list(set_ids), adjudicated_by, min_iou, same_label, within_set),
+        )
+        columns = [desc[0] for desc in cursor.description]
+        summary = dict(zip(columns, cursor.fetchone()))
+    conn.commit()
+    return summary
@@ -0,0 +1,542 @@
+"""
+Streaming annotation export: selector output -> COCO / YOLO / Parquet shards.
+
+Rows come from one of three selection sources, all joined to annotation,
+annotation_subject and annotation_geometry and read through a named
+(server-side) cursor, so client memory stays bounded by the fetch size plus
+one output shard:
+  - annotation_export_select_v1(policy, version, set_ids) for set-scoped
+    exports (set_ids ranks within the requested sets, migration 006);
+  - annotation_export_selection (migration 007) with use_cache=True, after an
+    optional incremental refresh;
+  - annotation_export_select_v1(policy, version) otherwise.
+
+Rows are ordered by (asset_uuid, frame_index, time window), so every image's
+annotations arrive contiguously and a shard never splits an image.
+
+Migration 002 only requires bbox columns for geometry_kind='bbox'; polygon and
+mask rows without them get a bbox derived from their vertices / RLE runs, so
+COCO still carries them (with their segmentation) and YOLO their boxes.
+
+With migration 009 polygons and RLE masks are read from the packed bytea
+columns and decoded by codec.py (NumPy, no JSON parse); JSONB payloads that
+were not packable are still read as before.
+
+Output layouts (under out_dir):
+  coco     coco-00000.json ... (images/annotations/categories per shard; ids
+           are global across shards) + categories.json
+  yolo     shard-00000/labels/<image>.txt ("class cx cy w h", normalized)
+           + classes.txt
+  parquet  part-00000.parquet ... (one row per selected geometry)
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .codec import rle_bbox, row_polygon, row_rle
+
+EXPORT_FORMATS = ("coco", "yolo", "parquet")
+
+EXPORT_COLUMNS = [
+    "annotation_id",
+    "subject_id",
+    "asset_uuid",
+    "observation_uuid",
+    "frame_index",
+    "time_start_ms",
+    "time_end_ms",
+    "asset_width_px",
+    "asset_height_px",
+    "label",
+    "label_id",
+    "taxon_id",
+    "score",
+    "source_kind",
+    "trust_rank",
+    "review_status",
+    "geometry_kind",
+    "bbox_x_min",
+    "bbox_y_min",
+    "bbox_x_max",
+    "bbox_y_max",
+    "polygon_vertices",
+    "mask_rle",
+    "mask_uri",
+    "point_x",
+    "point_y",
+    "polygon_packed",
+    "mask_rle_packed",
+]
+
+PARQUET_SCHEMA = pa.schema([
+    ("annotation_id", pa.string()),
+    ("subject_id", pa.string()),
+    ("asset_uuid", pa.string()),
+    ("observation_uuid", pa.string()),
+    ("frame_index", pa.int32()),
+    ("time_start_ms", pa.int32()),
+    ("time_end_ms", pa.int32()),
+    ("asset_width_px", pa.int32()),
+    ("asset_height_px", pa.int32()),
+    ("label", pa.string()),
+    ("label_id", pa.int32()),
+    ("taxon_id", pa.int32()),
+    ("score", pa.float64()),
+    ("source_kind", pa.string()),
+    ("trust_rank", pa.int32()),
+    ("review_status", pa.string()),
+    ("geometry_kind", pa.string()),
+    ("bbox_x_min", pa.float64()),
+    ("bbox_y_min", pa.float64()),
+    ("bbox_x_max", pa.float64()),
+    ("bbox_y_max", pa.float64()),
+    ("polygon_vertices", pa.string()),
+    ("mask_rle", pa.string()),
+    ("mask_uri", pa.string()),
+    ("point_x", pa.float64()),
+    ("point_y", pa.float64()),
+])
+
+
+def build_export_query(
+    policy_name: str,
+    policy_version: int,
+    set_ids: Optional[Sequence[str]] = None,
+    use_cache: bool = False,
+    geometry_kinds: Optional[Sequence[str]] = None,
+    packed_payloads: bool = False,
+) -> Tuple[str, Dict]:
+    """SQL + params for the ordered export stream.
+
+    packed_payloads selects the migration 009 bytea columns; without it they
+    are returned as NULL.
+    """
+    params: Dict = {"policy_name": policy_name, "policy_version": policy_version}
+    if set_ids:
+        selection = (
+            "annotation_export_select_v1(%(policy_name)s, %(policy_version)s, %(set_ids)s::uuid[])"
+        )
+        params["set_ids"] = list(set_ids)
+    elif use_cache:
+        selection = (
+            "(SELECT * FROM annotation_export_selection "
+            "WHERE policy_name = %(policy_name)s AND policy_version = %(policy_version)s)"
+        )
+    else:
+        selection = "annotation_export_select_v1(%(policy_name)s, %(policy_version)s)"
+
+    geometry_filter = ""
+    if geometry_kinds:
+        geometry_filter = "WHERE g.geometry_kind = ANY(%(geometry_kinds)s)"
+        params["geometry_kinds"] = list(geometry_kinds)
+
+    if packed_payloads:
+        packed_columns = "g.polygon_packed,\n            g.mask_rle_packed"
+    else:
+        packed_columns = "NULL::bytea AS polygon_packed,\n            NULL::bytea AS mask_rle_packed"
+
+    sql = f"""
+        SELECT
+            sel.annotation_id::text,
+            sel.subject_id::text,
+            subj.asset_uuid::text,
+            subj.observation_uuid::text,
+            subj.frame_index,
+            subj.time_start_ms,
+            subj.time_end_ms,
+            subj.asset_width_px,
+            subj.asset_height_px,
+            sel.label,
+            a.label_id,
+            a.taxon_id,
+            a.score,
+            sel.source_kind,
+            sel.trust_rank,
+            sel.review_status,
+            g.geometry_kind,
+            g.bbox_x_min,
+            g.bbox_y_min,
+            g.bbox_x_max,
+            g.bbox_y_max,
+            g.polygon_vertices::text,
+            g.mask_rle::text,
+            g.mask_uri,
+            g.point_x,
+            g.point_y,
+            {packed_columns}
+        FROM {selection} sel
+        JOIN annotation a ON a.annotation_id = sel.annotation_id
+        JOIN annotation_subject subj ON subj.subject_id = sel.subject_id
+        JOIN annotation_geometry g ON g.annotation_id = sel.annotation_id
+        {geometry_filter}
+        ORDER BY subj.asset_uuid,
+                 COALESCE(subj.frame_index, -1),
+                 COALESCE(subj.time_start_ms, -1),
+                 COALESCE(subj.time_end_ms, -1),
+                 sel.label,
+                 sel.annotation_id
+    """
+    return sql, params
+
+
+def stream_export_rows(conn, sql: str, params: Dict, fetch_size: int = 50_000) -> Iterator[Dict]:
+    """Yield rows as dicts from a named cursor; only fetch_size rows are held."""
+    with conn.cursor(name="annotation_export_stream") as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(EXPORT_COLUMNS, row))
+
+
+def has_packed_payloads(conn) -> bool:
+    """True when migration 009 added polygon_packed / mask_rle_packed."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_attribute
+                WHERE attrelid = 'annotation_geometry'::regclass
+                  AND attname = 'polygon_packed'
+                  AND NOT attisdropped
+            )
+            """
+        )
+        packed = cursor.fetchone()[0]
+    conn.commit()
+    return packed
+
+
+def image_key(row: Dict) -> Tuple:
+    return (row["asset_uuid"], row["frame_index"], row["time_start_ms"], row["time_end_ms"])
+
+
+def image_file_stem(row: Dict) -> str:
+    stem = row["asset_uuid"]
+    if row["frame_index"] is not None:
+        stem += f"_f{row['frame_index']:06d}"
+    if row["time_start_ms"] is not None:
+        stem += f"_t{row['time_start_ms']}-{row['time_end_ms'] if row['time_end_ms'] is not None else ''}"
+    return stem
+
+
+def group_by_image(rows: Iterator[Dict]) -> Iterator[List[Dict]]:
+    """Group an image-ordered row stream into per-image lists."""
+    current_key = None
+    group: List[Dict] = []
+    for row in rows:
+        key = image_key(row)
+        if group and key != current_key:
+            yield group
+            group = []
+        current_key = key
+        group.append(row)
+    if group:
+        yield group
+
+
+class CategoryMap:
+    """Stable label -> contiguous id assignment in first-seen order."""
+
+    def __init__(self, start: int = 0):
+        self.start = start
+        self.ids: Dict[str, int] = {}
+
+    def get(self, label: str) -> int:
+        if label not in self.ids:
+            self.ids[label] = self.start + len(self.ids)
+        return self.ids[label]
+
+
+class ShardWriter(ABC):
+    """Base class: receives one image's rows at a time, rotates shards."""
+
+    def __init__(self, out_dir: Path, shard_images: int):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_images = shard_images
+        self.shard_index = 0
+        self.images_in_shard = 0
+        self.stats = {"images": 0, "annotations": 0, "skipped": 0, "shards": 0}
+
+    def add_image(self, rows: List[Dict]):
+        if self.images_in_shard >= self.shard_images:
+            self.flush()
+            self.shard_index += 1
+            self.images_in_shard = 0
+        self.write_image(rows)
+        self.images_in_shard += 1
+        self.stats["images"] += 1
+
+    @abstractmethod
+    def write_image(self, rows: List[Dict]):
+        """Buffer or write one image's annotation rows into the current shard."""
+
+    @abstractmethod
+    def flush(self):
+        """Finish the current shard."""
+
+    def close(self):
+        if self.images_in_shard:
+            self.flush()
+
+
+def row_geometry(row: Dict) -> Tuple[Optional[np.ndarray], Optional[dict]]:
+    """Decoded polygon vertices / RLE dict of a row (None where not applicable)."""
+    if row["geometry_kind"] == "polygon":
+        return row_polygon(row["polygon_packed"], row["polygon_vertices"]), None
+    if row["geometry_kind"] == "mask":
+        return None, row_rle(row["mask_rle_packed"], row["mask_rle"])
+    return None, None
+
+
+def normalized_bbox(
+    row: Dict,
+    vertices: Optional[np.ndarray] = None,
+    rle: Optional[dict] = None,
+) -> Optional[Tuple[float, float, float, float]]:
+    """(x_min, y_min, x_max, y_max) normalized: bbox columns, else polygon / RLE extent."""
+    if row["bbox_x_min"] is not None:
+        return row["bbox_x_min"], row["bbox_y_min"], row["bbox_x_max"], row["bbox_y_max"]
+    if vertices is not None and len(vertices):
+        (x_min, y_min), (x_max, y_max) = vertices.min(axis=0), vertices.max(axis=0)
+        return float(x_min), float(y_min), float(x_max), float(y_max)
+    if rle is not None and isinstance(rle.get("counts"), list):
+        height, width = rle["size"]
+        bounds = rle_bbox(np.asarray(rle["counts"], dtype=np.int64), (height, width))
+        if bounds is not None and width:
+            x_min, y_min, x_max, y_max = bounds
+            return x_min / width, y_min / height, x_max / width, y_max / height
+    return None
+
+
+def pixel_bbox(row: Dict, bbox: Optional[Tuple[float, float, float, float]]) -> Optional[List[float]]:
+    width, height = row["asset_width_px"], row["asset_height_px"]
+    if bbox is None or not width or not height:
+        return None
+    x_min = bbox[0] * width
+    y_min = bbox[1] * height
+    return [
+        round(x_min, 2),
+        round(y_min, 2),
+        round(bbox[2] * width - x_min, 2),
+        round(bbox[3] * height - y_min, 2),
+    ]
+
+
+class CocoShardWriter(ShardWriter):
+    """COCO detection/segmentation JSON, one file per shard."""
+
+    def __init__(self, out_dir: Path, shard_images: int):
+        super().__init__(out_dir, shard_images)
+        self.categories = CategoryMap(start=1)
+        self.next_image_id = 1
+        self.next_annotation_id = 1
+        self.images: List[Dict] = []
+        self.annotations: List[Dict] = []
+
+    def write_image(self, rows: List[Dict]):
+        first = rows[0]
+        image_id = self.next_image_id
+        self.next_image_id += 1
+        self.images.append({
+            "id": image_id,
+            "file_name": f"{image_file_stem(first)}.jpg",
+            "width": first["asset_width_px"],
+            "height": first["asset_height_px"],
+            "asset_uuid": first["asset_uuid"],
+            "observation_uuid": first["observation_uuid"],
+            "frame_index": first["frame_index"],
+        })
+
+        for row in rows:
+            vertices, rle = row_geometry(row)
+            bbox = pixel_bbox(row, normalized_bbox(row, vertices, rle))
+            if bbox is None:
+                self.stats["skipped"] += 1
+                continue
+            entry = {
+                "id": self.next_annotation_id,
+                "image_id": image_id,
+                "category_id": self.categories.get(row["label"]),
+                "bbox": bbox,
+                "area": round(bbox[2] * bbox[3], 2),
+                "iscrowd": 0,
+                "score": row["score"],
+                "annotation_uuid": row["annotation_id"],
+            }
+            if vertices is not None:
+                scale = np.array([row["asset_width_px"], row["asset_height_px"]], dtype=np.float64)
+                entry["segmentation"] = [np.round(vertices * scale, 2).ravel().tolist()]
+            elif rle is not None:
+                entry["segmentation"] = rle
+                entry["iscrowd"] = 1
+            self.annotations.append(entry)
+            self.next_annotation_id += 1
+            self.stats["annotations"] += 1
+
+    def category_list(self) -> List[Dict]:
+        return [{"id": cid, "name": label} for label, cid in self.categories.ids.items()]
+
+    def flush(self):
+        path = self.out_dir / f"coco-{self.shard_index:05d}.json"
+        tmp = path.with_suffix(".json.partial")
+        with open(tmp, "w", encoding="utf-8") as handle:
+            json.dump(
+                {
+                    "images": self.images,
+                    "annotations": self.annotations,
+                    "categories": self.category_list(),
+                },
+                handle,
+            )
+        os.replace(tmp, path)
+        self.images = []
+        self.annotations = []
+        self.stats["shards"] += 1
+
+    def close(self):
+        super().close()
+        with open(self.out_dir / "categories.json", "w", encoding="utf-8") as handle:
+            json.dump(self.category_list(), handle, indent=2)
+
+
+class YoloShardWriter(ShardWriter):
+    """YOLO txt labels (class cx cy w h, normalized), one directory per shard."""
+
+    def __init__(self, out_dir: Path, shard_images: int):
+        super().__init__(out_dir, shard_images)
+        self.categories = CategoryMap(start=0)
+
+    def write_image(self, rows: List[Dict]):
+        labels_dir = self.out_dir / f"shard-{self.shard_index:05d}" / "labels"
+        if self.images_in_shard == 0:
+            labels_dir.mkdir(parents=True, exist_ok=True)
+        lines = []
+        for row in rows:
+            bbox = normalized_bbox(row, *row_geometry(row))
+            if bbox is None:
+                self.stats["skipped"] += 1
+                continue
+            x_min, y_min, x_max, y_max = bbox
+            width = x_max - x_min
+            height = y_max - y_min
+            lines.append(
+                f"{self.categories.get(row['label'])} "
+                f"{x_min + width / 2:.6f} {y_min + height / 2:.6f} "
+                f"{width:.6f} {height:.6f}\n"
+            )
+        with open(labels_dir / f"{image_file_stem(rows[0])}.txt", "w", encoding="utf-8") as handle:
+            handle.writelines(lines)
+        self.stats["annotations"] += len(lines)
+
+    def flush(self):
+        self.stats["shards"] += 1
+
+    def close(self):
+        super().close()
+        with open(self.out_dir / "classes.txt", "w", encoding="utf-8") as handle:
+            for label in self.categories.ids:
+                handle.write(f"{label}\n")
+
+
+class ParquetShardWriter(ShardWriter):
+    """Flat Parquet rows, one file per shard, row groups of buffered rows."""
+
+    def __init__(self, out_dir: Path, shard_images: int, row_group_rows: int = 100_000):
+        super().__init__(out_dir, shard_images)
+        self.row_group_rows = row_group_rows
+        self.buffer: Dict[str, List] = {name: [] for name in PARQUET_SCHEMA.names}
+        self.buffered = 0
+        self.writer: Optional[pq.ParquetWriter] = None
+
+    def _flush_row_group(self):
+        if not self.buffered:
+            return
+        if self.writer is None:
+            path = self.out_dir / f"part-{self.shard_index:05d}.parquet"
+            self.writer = pq.ParquetWriter(path, PARQUET_SCHEMA, compression="zstd")
+        self.writer.write_table(pa.Table.from_pydict(self.buffer, schema=PARQUET_SCHEMA))
+        self.buffer = {name: [] for name in PARQUET_SCHEMA.names}
+        self.buffered = 0
+
+    def write_image(self, rows: List[Dict]):
+        for row in rows:
+            # Packed payloads are written back out as the JSON text the
+            # polygon_vertices / mask_rle columns have always carried.
+            if row["polygon_packed"] is not None:
+                row["polygon_vertices"] = json.dumps(row_polygon(row["polygon_packed"], None).tolist())
+            if row["mask_rle_packed"] is not None:
+                row["mask_rle"] = json.dumps(row_rle(row["mask_rle_packed"], None))
+            for name in PARQUET_SCHEMA.names:
+                self.buffer[name].append(row[name])
+        self.buffered += len(rows)
+        self.stats["annotations"] += len(rows)
+        if self.buffered >= self.row_group_rows:
+            self._flush_row_group()
+
+    def flush(self):
+        self._flush_row_group()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.stats["shards"] += 1
+
+
+WRITERS = {
+    "coco": CocoShardWriter,
+    "yolo": YoloShardWriter,
+    "parquet": ParquetShardWriter,
+}
+
+
+def export_annotations(
+    conn,
+    out_dir: Path,
+    export_format: str,
+    policy_name: str = "human_first",
+    policy_version: int = 1,
+    set_ids: Optional[Sequence[str]] = None,
+    use_cache: bool = False,
+    refresh_cache: bool = True,
+    shard_images: int = 50_000,
+    fetch_size: int = 50_000,
+) -> Dict[str, int]:
+    """Stream the selected annotations for a policy into sharded files."""
+    if export_format not in WRITERS:
+        raise ValueError(f"Unknown export format {export_format!r}; choose from {EXPORT_FORMATS}")
+
+    if use_cache and not set_ids and refresh_cache:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT annotation_export_selection_refresh()")
+            refreshed = cursor.fetchone()[0]
+        conn.commit()
+        print(f"Refreshed export selection cache ({refreshed} subjects)")
+
+    geometry_kinds = ("bbox", "polygon") if export_format == "yolo" else None
+    sql, params = build_export_query(
+        policy_name,
+        policy_version,
+        set_ids=set_ids,
+        use_cache=use_cache,
+        geometry_kinds=geometry_kinds,
+        packed_payloads=has_packed_payloads(conn),
+    )
+    writer = WRITERS[export_format](out_dir, shard_images)
+    try:
+        for image_rows in group_by_image(stream_export_rows(conn, sql, params, fetch_size)):
+            writer.add_image(image_rows)
+    finally:
+        writer.close()
+        conn.rollback()
+    return writer.stats
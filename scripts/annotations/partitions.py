@@ -0,0 +1,78 @@
+"""
+Run-level partition management for the set_id-partitioned layout (migration 008).
+
+Each annotation_set owns one partition in annotation, annotation_geometry,
+annotation_provenance and annotation_quality. These helpers wrap the SQL
+functions from the migration: detaching a set takes the whole run out of the
+live tables (its tables stay behind for archiving or DROP TABLE), attaching
+puts it back.  Partition moves fire no triggers, so the set's statistics
+counters (migration 012) are rebuilt in the same transaction when present.
+"""
+
+from typing import Dict, List
+
+PARTITIONED_TABLES = (
+    "annotation",
+    "annotation_geometry",
+    "annotation_provenance",
+    "annotation_quality",
+)
+
+
+def is_partitioned(conn) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'annotation'::regclass)"
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(conn) -> List[Dict]:
+    """One row per annotation_set from annotation_set_partition_v1."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT set_id, name, source_kind, source_name, run_id,
+                   partition_exists, attached, estimated_rows
+            FROM annotation_set_partition_v1
+            ORDER BY source_name, run_id NULLS LAST, set_id
+            """
+        )
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def detach_set(conn, set_id: str) -> int:
+    """Detach one set's partitions; returns the number of annotation rows detached."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT annotation_partition_detach(%s)", (set_id,))
+        detached = cursor.fetchone()[0]
+        rebuild_set_stats_if_present(cursor, set_id)
+    conn.commit()
+    return detached
+
+
+def attach_set(conn, set_id: str) -> int:
+    """Re-attach one set's detached partitions; returns the annotation row count."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT annotation_partition_attach(%s)", (set_id,))
+        attached = cursor.fetchone()[0]
+        rebuild_set_stats_if_present(cursor, set_id)
+    conn.commit()
+    return attached
+
+
+def rebuild_set_stats_if_present(cursor, set_id: str):
+    cursor.execute("SELECT to_regprocedure('annotation_set_stats_rebuild(uuid)') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        cursor.execute("SELECT annotation_set_stats_rebuild(%s)", (set_id,))
+
+
+def partition_table_names(conn, set_id: str) -> List[str]:
+    """Names of the four per-set tables, e.g. for DROP TABLE after a detach."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT annotation_partition_name(t, %s) FROM unnest(%s::text[]) AS t",
+            (set_id, list(PARTITIONED_TABLES)),
+        )
+        return [row[0] for row in cursor.fetchall()]
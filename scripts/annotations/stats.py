@@ -0,0 +1,60 @@
+"""
+Per-set annotation statistics from the maintained counters (migration 012).
+
+The counters are kept current by statement-level triggers on annotation and
+annotation_quality, so these reads never aggregate the annotation tables:
+set_stats() reads annotation_set_stats_v1 and label_stats() the per-label
+counters.  rebuild_set_stats() recomputes them after a manual repair.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+
+def set_stats(conn, set_ids: Optional[Sequence[str]] = None) -> List[Dict]:
+    """One row per set: counts, mean score/confidence, review distribution, conflict rate."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT st.set_id::text, s.name, s.source_kind, s.source_name, s.run_id,
+                   st.annotations, st.active_annotations, st.mean_score, st.quality_rows,
+                   st.mean_confidence, st.unreviewed, st.needs_review, st.accepted,
+                   st.rejected, st.conflict, st.conflict_rate, st.updated_at
+            FROM annotation_set_stats_v1 st
+            JOIN annotation_set s ON s.set_id = st.set_id
+            WHERE %(set_ids)s::uuid[] IS NULL OR st.set_id = ANY(%(set_ids)s::uuid[])
+            ORDER BY s.source_name, s.run_id NULLS LAST, st.set_id
+            """,
+            {"set_ids": list(set_ids) if set_ids else None},
+        )
+        columns = [desc[0] for desc in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    conn.rollback()
+    return rows
+
+
+def label_stats(conn, set_id: str, limit: Optional[int] = None) -> List[Dict]:
+    """Annotation counts per label within one set, most frequent first."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT label, annotations, active_annotations
+            FROM annotation_set_label_stats
+            WHERE set_id = %s AND annotations > 0
+            ORDER BY annotations DESC, label
+            LIMIT %s
+            """,
+            (set_id, limit),
+        )
+        columns = [desc[0] for desc in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    conn.rollback()
+    return rows
+
+
+def rebuild_set_stats(conn, set_id: Optional[str] = None) -> int:
+    """Recompute the counters for one set (or all); returns the number of sets written."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT annotation_set_stats_rebuild(%s)", (set_id,))
+        rebuilt = cursor.fetchone()[0]
+    conn.commit()
+    return rebuilt
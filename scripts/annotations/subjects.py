@@ -0,0 +1,190 @@
+"""
+Bulk find-or-create for annotation_subject with an in-process LRU cache.
+
+A subject is identified by uq_annotation_subject_asset_frame:
+(asset_uuid, frame_index, time_start_ms, time_end_ms), NULLs compared as -1.
+SubjectResolver.resolve() maps a sequence of subject tuples to subject_ids:
+  1. keys already in the LRU cache (or created earlier in the current
+     transaction) are answered without a round trip;
+  2. the remaining distinct keys go to the database in chunks, one statement
+     per chunk: INSERT ... SELECT FROM unnest(...) ON CONFLICT DO NOTHING
+     RETURNING for new subjects, joined with a lookup of the existing ones
+     through the same unique index;
+  3. keys inserted by a concurrent writer after the statement's snapshot are
+     picked up by one follow-up SELECT.
+
+Subjects created in the current transaction are held apart from the cache
+until the caller reports the commit (mark_committed) or the rollback
+(discard_uncommitted), so a rolled-back batch never leaves dangling ids.
+The resolver never commits on its own.
+
+Subject tuples follow writer.SUBJECT_FIELDS (asset_uuid, observation_uuid,
+frame_index, time_start_ms, time_end_ms, asset_width_px, asset_height_px);
+only asset_uuid is required.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .writer import AnnotationWriteError
+
+SubjectKey = Tuple[str, int, int, int]
+
+# One unique-index probe per input key.  A plain join lets the planner hash
+# the whole of annotation_subject for every chunk.
+PROBE_SQL = """
+    SELECT subject_id, asset_uuid, frame_index, time_start_ms, time_end_ms
+    FROM annotation_subject
+    WHERE asset_uuid = i.asset_uuid
+      AND COALESCE(frame_index, -1) = COALESCE(i.frame_index, -1)
+      AND COALESCE(time_start_ms, -1) = COALESCE(i.time_start_ms, -1)
+      AND COALESCE(time_end_ms, -1) = COALESCE(i.time_end_ms, -1)
+    LIMIT 1
+"""
+
+UPSERT_SQL = f"""
+WITH input AS (
+    SELECT *
+    FROM unnest(%s::uuid[], %s::uuid[], %s::int[], %s::int[], %s::int[], %s::int[], %s::int[])
+        AS t(asset_uuid, observation_uuid, frame_index, time_start_ms, time_end_ms,
+             asset_width_px, asset_height_px)
+), created AS (
+    INSERT INTO annotation_subject (
+        asset_uuid, observation_uuid, frame_index, time_start_ms, time_end_ms,
+        asset_width_px, asset_height_px
+    )
+    SELECT asset_uuid, observation_uuid, frame_index, time_start_ms, time_end_ms,
+           asset_width_px, asset_height_px
+    FROM input
+    ON CONFLICT (
+        asset_uuid, (COALESCE(frame_index, -1)),
+        (COALESCE(time_start_ms, -1)), (COALESCE(time_end_ms, -1))
+    ) DO NOTHING
+    RETURNING subject_id, asset_uuid, frame_index, time_start_ms, time_end_ms
+)
+SELECT subject_id, asset_uuid, frame_index, time_start_ms, time_end_ms, TRUE FROM created
+UNION ALL
+SELECT subj.subject_id, subj.asset_uuid, subj.frame_index, subj.time_start_ms, subj.time_end_ms, FALSE
+FROM input i
+CROSS JOIN LATERAL ({PROBE_SQL}) subj
+"""
+
+SELECT_SQL = f"""
+SELECT subj.subject_id, subj.asset_uuid, subj.frame_index, subj.time_start_ms, subj.time_end_ms
+FROM unnest(%s::uuid[], %s::int[], %s::int[], %s::int[])
+    AS i(asset_uuid, frame_index, time_start_ms, time_end_ms)
+CROSS JOIN LATERAL ({PROBE_SQL}) subj
+"""
+
+
+def subject_key(
+    asset_uuid,
+    frame_index: Optional[int] = None,
+    time_start_ms: Optional[int] = None,
+    time_end_ms: Optional[int] = None,
+) -> SubjectKey:
+    """Cache key matching uq_annotation_subject_asset_frame (NULL -> -1)."""
+    return (
+        str(asset_uuid).lower(),
+        -1 if frame_index is None else int(frame_index),
+        -1 if time_start_ms is None else int(time_start_ms),
+        -1 if time_end_ms is None else int(time_end_ms),
+    )
+
+
+class SubjectResolver:
+    """
+    Find-or-create annotation_subject rows in bulk, caching resolved ids.
+
+    cache_size bounds the LRU of committed subject_ids (0 disables caching);
+    batch_size bounds the distinct subjects sent per statement.
+    """
+
+    def __init__(self, conn, cache_size: int = 200_000, batch_size: int = 50_000):
+        self.conn = conn
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.cache: "OrderedDict[SubjectKey, str]" = OrderedDict()
+        self.uncommitted: Dict[SubjectKey, str] = {}
+        self.stats = {"lookups": 0, "cache_hits": 0, "queried": 0, "created": 0}
+
+    def resolve(self, subjects: Sequence[Tuple]) -> List[str]:
+        """subject_id for every tuple (SUBJECT_FIELDS order), in input order."""
+        keys = [subject_key(s[0], *s[2:5]) for s in subjects]
+        resolved: Dict[SubjectKey, str] = {}
+        missing: Dict[SubjectKey, Tuple] = {}
+        for key, subject in zip(keys, subjects):
+            if key in resolved or key in missing:
+                continue
+            subject_id = self._cached(key)
+            if subject_id is not None:
+                resolved[key] = subject_id
+            else:
+                missing[key] = subject
+
+        self.stats["lookups"] += len(keys)
+        self.stats["cache_hits"] += len(resolved)
+        self.stats["queried"] += len(missing)
+
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            resolved.update(self._upsert(dict(pending[start:start + self.batch_size])))
+        return [resolved[key] for key in keys]
+
+    def mark_committed(self):
+        """The caller committed: subjects created since the last commit become cacheable."""
+        for key, subject_id in self.uncommitted.items():
+            self._remember(key, subject_id)
+        self.uncommitted.clear()
+
+    def discard_uncommitted(self):
+        """The caller rolled back: forget subjects created in that transaction."""
+        self.uncommitted.clear()
+
+    def _cached(self, key: SubjectKey) -> Optional[str]:
+        subject_id = self.uncommitted.get(key)
+        if subject_id is not None:
+            return subject_id
+        subject_id = self.cache.get(key)
+        if subject_id is not None:
+            self.cache.move_to_end(key)
+        return subject_id
+
+    def _remember(self, key: SubjectKey, subject_id: str):
+        if self.cache_size <= 0:
+            return
+        self.cache[key] = subject_id
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _upsert(self, chunk: Dict[SubjectKey, Tuple]) -> Dict[SubjectKey, str]:
+        columns = list(zip(*chunk.values()))
+        resolved: Dict[SubjectKey, str] = {}
+        with self.conn.cursor() as cursor:
+            cursor.execute(UPSERT_SQL, [list(values) for values in columns])
+            for subject_id, asset_uuid, frame_index, start_ms, end_ms, created in cursor.fetchall():
+                key = subject_key(asset_uuid, frame_index, start_ms, end_ms)
+                resolved[key] = str(subject_id)
+                if created:
+                    self.uncommitted[key] = str(subject_id)
+                    self.stats["created"] += 1
+                else:
+                    self._remember(key, str(subject_id))
+
+            # Rows committed by a concurrent writer after this statement's
+            # snapshot were skipped by ON CONFLICT and are not visible to the
+            # join above; a new statement sees them.
+            late = [chunk[key] for key in chunk if key not in resolved]
+            if late:
+                late_columns = [list(values) for values in zip(*late)]
+                cursor.execute(SELECT_SQL, [late_columns[0]] + late_columns[2:5])
+                for subject_id, asset_uuid, frame_index, start_ms, end_ms in cursor.fetchall():
+                    key = subject_key(asset_uuid, frame_index, start_ms, end_ms)
+                    resolved[key] = str(subject_id)
+                    self._remember(key, str(subject_id))
+
+        unresolved = [key for key in chunk if key not in resolved]
+        if unresolved:
+            raise AnnotationWriteError(f"could not resolve annotation_subject for {unresolved[0]}")
+        return resolved
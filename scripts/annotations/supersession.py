@@ -0,0 +1,98 @@
+"""
+Bulk supersession writes and terminal resolution (migration 011).
+
+Re-labeling runs supersede many annotations at once.  supersede_annotations()
+COPYs the (superseded, replacement) pairs into a temp table and inserts them
+with one INSERT ... SELECT, so the statement-level closure trigger runs once
+for the whole batch: it flips lifecycle_state, extends the supersession
+closure and rejects cycles.  resolve_terminals() maps annotation_ids to the
+end of their supersession chain through annotation_supersession_resolve().
+"""
+
+import csv
+import io
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+STAGE_TABLE = "annotation_supersession_stage"
+
+
+def supersede_annotations(
+    conn,
+    pairs: Iterable[Tuple[str, str]],
+    reason: Optional[str] = None,
+    created_by: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Insert (superseded_annotation_id, replacement_annotation_id) edges in one
+    transaction; returns staged / inserted / skipped counts.
+
+    Annotations that already have a replacement are skipped
+    (uq_superseded_annotation), so re-running a batch is safe.  A cycle or an
+    unknown annotation_id fails the whole batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    staged = 0
+    for superseded_id, replacement_id in pairs:
+        writer.writerow((superseded_id, replacement_id))
+        staged += 1
+    buffer.seek(0)
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE {STAGE_TABLE} (
+                    superseded_annotation_id UUID NOT NULL,
+                    replacement_annotation_id UUID NOT NULL
+                ) ON COMMIT DROP
+                """
+            )
+            cursor.copy_expert(
+                f"COPY {STAGE_TABLE} (superseded_annotation_id, replacement_annotation_id) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO annotation_supersession (
+                    superseded_annotation_id, replacement_annotation_id, reason, created_by
+                )
+                SELECT superseded_annotation_id, replacement_annotation_id, %s, %s
+                FROM {STAGE_TABLE}
+                ON CONFLICT (superseded_annotation_id) DO NOTHING
+                """,
+                (reason, created_by),
+            )
+            inserted = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"staged": staged, "inserted": inserted, "skipped": staged - inserted}
+
+
+def resolve_terminals(conn, annotation_ids: Sequence[str]) -> List[Dict]:
+    """annotation_id -> terminal_annotation_id and chain depth (0 when not superseded)."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT annotation_id::text, terminal_annotation_id::text, depth
+            FROM annotation_supersession_resolve(%s::uuid[])
+            """,
+            (list(annotation_ids),),
+        )
+        columns = [desc[0] for desc in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    conn.rollback()
+    return rows
+
+
+def rebuild_closure(conn) -> Dict[str, int]:
+    """Recompute annotation_supersession_closure from the edges; returns the summary counts."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM annotation_supersession_closure_rebuild()")
+        columns = [desc[0] for desc in cursor.description]
+        summary = dict(zip(columns, cursor.fetchone()))
+    conn.commit()
+    return summary
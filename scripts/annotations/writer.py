@@ -0,0 +1,519 @@
+"""
+Bulk annotation writer: Arrow/Parquet batches -> annotation lineage tables.
+
+One transaction per batch:
+  1. COPY the batch (CSV, rendered by pyarrow) into a session temp table.
+  2. Upsert the batch's distinct subjects in one INSERT ... ON CONFLICT against
+     uq_annotation_subject_asset_frame, then fill stage.subject_id with a join.
+     With a SubjectResolver (subjects.py) the ids are resolved before the COPY
+     instead, through its LRU cache and RETURNING upserts, and copied with the
+     batch; streaming writers then skip the database for subjects already
+     seen in earlier batches.
+  3. One statement with data-modifying CTEs inserts annotation rows
+     (ON CONFLICT on uq_annotation_source_key DO NOTHING) and, for exactly the
+     rows that were inserted, their geometry, provenance and optional quality
+     rows.
+
+Re-running a batch is safe whenever source_annotation_key is populated (or
+derived with derive_keys=True): rows whose key already exists in the set are
+skipped together with their child rows. Provenance comes from the
+annotation_set row, so the deferred provenance trigger from migration 003 is
+satisfied before each commit.
+
+With the set_id-partitioned layout (migration 008) the child tables carry
+set_id as their partition key; the writer detects the layout and fills it, so
+every row of a batch lands in the set's own partitions.
+
+Input batch columns (only asset_uuid and label are required):
+  subject:    asset_uuid, observation_uuid, frame_index, time_start_ms,
+              time_end_ms, asset_width_px, asset_height_px
+  annotation: label, label_id, taxon_id, score, is_primary,
+              source_annotation_key, sidecar (JSON text)
+  geometry:   geometry_kind, bbox_x_min/y_min/x_max/y_max (normalized),
+              bbox_*_px, polygon_vertices / mask_rle (JSON text; packed to
+              bytea by the migration 009 trigger), mask_uri, mask_format,
+              point_x, point_y
+  provenance: operator_identity (per-row override for human sets)
+  quality:    review_status, confidence_score (written when with_quality)
+
+Imported accepted / rejected / conflict statuses satisfy the migration 003
+adjudication constraints the same way provenance does: adjudicated_by is the
+row's operator_identity, else the set's created_by, stamped at NOW(); a
+'conflict' row also gets conflict_flag and a fixed conflict_reason.
+"""
+
+import io
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+STAGE_TABLE = "annotation_write_stage"
+
+# (column, stage SQL type, arrow type used when the batch lacks the column)
+STAGE_COLUMNS = [
+    ("asset_uuid", "UUID", pa.string()),
+    ("observation_uuid", "UUID", pa.string()),
+    ("frame_index", "INTEGER", pa.int32()),
+    ("time_start_ms", "INTEGER", pa.int32()),
+    ("time_end_ms", "INTEGER", pa.int32()),
+    ("asset_width_px", "INTEGER", pa.int32()),
+    ("asset_height_px", "INTEGER", pa.int32()),
+    ("label", "VARCHAR(255)", pa.string()),
+    ("label_id", "INTEGER", pa.int32()),
+    ("taxon_id", "INTEGER", pa.int32()),
+    ("score", "DOUBLE PRECISION", pa.float64()),
+    ("is_primary", "BOOLEAN", pa.bool_()),
+    ("source_annotation_key", "VARCHAR(255)", pa.string()),
+    ("sidecar", "JSONB", pa.string()),
+    ("geometry_kind", "VARCHAR(16)", pa.string()),
+    ("bbox_x_min", "DOUBLE PRECISION", pa.float64()),
+    ("bbox_y_min", "DOUBLE PRECISION", pa.float64()),
+    ("bbox_x_max", "DOUBLE PRECISION", pa.float64()),
+    ("bbox_y_max", "DOUBLE PRECISION", pa.float64()),
+    ("bbox_x_min_px", "INTEGER", pa.int32()),
+    ("bbox_y_min_px", "INTEGER", pa.int32()),
+    ("bbox_x_max_px", "INTEGER", pa.int32()),
+    ("bbox_y_max_px", "INTEGER", pa.int32()),
+    ("polygon_vertices", "JSONB", pa.string()),
+    ("mask_rle", "JSONB", pa.string()),
+    ("mask_uri", "TEXT", pa.string()),
+    ("mask_format", "VARCHAR(32)", pa.string()),
+    ("point_x", "DOUBLE PRECISION", pa.float64()),
+    ("point_y", "DOUBLE PRECISION", pa.float64()),
+    ("operator_identity", "VARCHAR(128)", pa.string()),
+    ("review_status", "VARCHAR(32)", pa.string()),
+    ("confidence_score", "DOUBLE PRECISION", pa.float64()),
+]
+STAGE_COLUMN_NAMES = [name for name, _, _ in STAGE_COLUMNS]
+REQUIRED_COLUMNS = ("asset_uuid", "label")
+# Stage columns describing the annotation_subject row (SubjectResolver tuples).
+SUBJECT_FIELDS = STAGE_COLUMN_NAMES[:7]
+
+# Deterministic candidate key for model rows (see migration 005): asset/frame
+# slot, label and geometry rounded to 1e-6, hashed with SHA-256.
+DERIVED_KEY_SQL = """
+encode(sha256(convert_to(concat_ws('|',
+    s.asset_uuid::text,
+    COALESCE(s.frame_index, -1)::text,
+    COALESCE(s.time_start_ms, -1)::text,
+    COALESCE(s.time_end_ms, -1)::text,
+    s.label,
+    s.resolved_kind,
+    round(s.bbox_x_min::numeric, 6)::text,
+    round(s.bbox_y_min::numeric, 6)::text,
+    round(s.bbox_x_max::numeric, 6)::text,
+    round(s.bbox_y_max::numeric, 6)::text,
+    round(s.point_x::numeric, 6)::text,
+    round(s.point_y::numeric, 6)::text,
+    md5(s.polygon_vertices::text),
+    md5(s.mask_rle::text),
+    s.mask_uri
+), 'UTF8')), 'hex')
+"""
+
+
+class AnnotationWriteError(RuntimeError):
+    """Raised when a batch or target annotation set cannot be written."""
+
+
+def ensure_annotation_set(
+    conn,
+    source_kind: str,
+    source_name: str,
+    source_version: Optional[str] = None,
+    run_id: Optional[str] = None,
+    model_id: Optional[str] = None,
+    config_hash: Optional[str] = None,
+    prompt_hash: Optional[str] = None,
+    name: Optional[str] = None,
+    dataset: str = "ibrida",
+    release: Optional[str] = None,
+    created_by: Optional[str] = None,
+) -> str:
+    """
+    Return the set_id for (source_name, source_version, run_id), creating the
+    annotation_set row if needed. With run_id set this is idempotent through
+    uq_annotation_set_run; without it every call creates a new set.
+    """
+    with conn.cursor() as cursor:
+        if run_id is not None:
+            cursor.execute(
+                """
+                SELECT set_id FROM annotation_set
+                WHERE source_name = %s
+                  AND source_version IS NOT DISTINCT FROM %s
+                  AND run_id = %s
+                """,
+                (source_name, source_version, run_id),
+            )
+            row = cursor.fetchone()
+            if row:
+                return str(row[0])
+
+        cursor.execute(
+            """
+            INSERT INTO annotation_set (
+                name, dataset, release, source_kind, source_name, source_version,
+                model_id, prompt_hash, config_hash, run_id, created_by
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING set_id
+            """,
+            (name, dataset, release, source_kind, source_name, source_version,
+             model_id, prompt_hash, config_hash, run_id, created_by),
+        )
+        set_id = cursor.fetchone()[0]
+    conn.commit()
+    return str(set_id)
+
+
+def iter_parquet_batches(paths: Sequence[str], batch_size: int = 100_000) -> Iterator[pa.RecordBatch]:
+    """Stream record batches from one or more Parquet files."""
+    for path in paths:
+        parquet_file = pq.ParquetFile(path)
+        wanted = [c for c in parquet_file.schema_arrow.names if c in STAGE_COLUMN_NAMES]
+        yield from parquet_file.iter_batches(batch_size=batch_size, columns=wanted)
+
+
+def stage_table(batch: pa.RecordBatch) -> pa.Table:
+    """Project a batch onto STAGE_COLUMNS order, filling absent columns with nulls."""
+    names = set(batch.schema.names)
+    missing = [c for c in REQUIRED_COLUMNS if c not in names]
+    if missing:
+        raise AnnotationWriteError(f"batch is missing required column(s): {missing}")
+
+    arrays = []
+    for name, _, arrow_type in STAGE_COLUMNS:
+        if name in names:
+            column = batch.column(name)
+            if pa.types.is_dictionary(column.type):
+                column = column.dictionary_decode()
+            arrays.append(column)
+        else:
+            arrays.append(pa.nulls(batch.num_rows, type=arrow_type))
+    return pa.Table.from_arrays(arrays, names=STAGE_COLUMN_NAMES)
+
+
+class BulkAnnotationWriter:
+    """
+    Write annotation batches into one annotation_set.
+
+    The set's provenance fields are validated up front against the
+    chk_provenance_required_by_kind rules so a bad set fails before any COPY.
+    """
+
+    def __init__(
+        self,
+        conn,
+        set_id: str,
+        with_quality: bool = False,
+        derive_keys: bool = False,
+        subject_resolver=None,
+    ):
+        self.conn = conn
+        self.set_id = set_id
+        self.with_quality = with_quality
+        self.derive_keys = derive_keys
+        self.subject_resolver = subject_resolver
+        self.totals = {
+            "batches": 0,
+            "rows": 0,
+            "subjects_created": 0,
+            "annotations": 0,
+            "skipped_existing": 0,
+            "geometry": 0,
+            "provenance": 0,
+            "quality": 0,
+            "seconds": 0.0,
+        }
+        self.source_kind = self._check_set()
+        self.partitioned = self._detect_partitioned_layout()
+        self._create_stage()
+
+    def _check_set(self) -> str:
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT source_kind, source_version, model_id, config_hash, run_id
+                FROM annotation_set WHERE set_id = %s
+                """,
+                (self.set_id,),
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise AnnotationWriteError(f"annotation_set {self.set_id} does not exist")
+        source_kind, source_version, model_id, config_hash, run_id = row
+        if source_kind == "model" and not (model_id and config_hash and run_id):
+            raise AnnotationWriteError(
+                f"model set {self.set_id} needs model_id, config_hash and run_id for provenance"
+            )
+        if source_kind == "imported_dataset" and not source_version:
+            raise AnnotationWriteError(
+                f"imported_dataset set {self.set_id} needs source_version for provenance"
+            )
+        return source_kind
+
+    def _detect_partitioned_layout(self) -> bool:
+        """True when migration 008 has partitioned annotation by set_id."""
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_partitioned_table
+                    WHERE partrelid = 'annotation'::regclass
+                )
+                """
+            )
+            partitioned = cursor.fetchone()[0]
+        self.conn.commit()
+        return partitioned
+
+    def _create_stage(self):
+        column_defs = ",\n    ".join(f"{name} {sql_type}" for name, sql_type, _ in STAGE_COLUMNS)
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+                    annotation_id UUID NOT NULL DEFAULT gen_random_uuid(),
+                    subject_id UUID,
+                    {column_defs}
+                ) ON COMMIT DELETE ROWS
+                """
+            )
+        self.conn.commit()
+
+    def _copy_stage(self, cursor, table: pa.Table):
+        buffer = io.BytesIO()
+        pa_csv.write_csv(table, buffer, write_options=pa_csv.WriteOptions(include_header=False))
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {STAGE_TABLE} ({', '.join(table.column_names)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        cursor.execute(f"ANALYZE {STAGE_TABLE}")
+
+    def _resolve_subjects(self, cursor) -> int:
+        cursor.execute(
+            f"""
+            INSERT INTO annotation_subject (
+                asset_uuid, observation_uuid, frame_index, time_start_ms, time_end_ms,
+                asset_width_px, asset_height_px
+            )
+            SELECT DISTINCT ON (
+                asset_uuid, COALESCE(frame_index, -1),
+                COALESCE(time_start_ms, -1), COALESCE(time_end_ms, -1)
+            )
+                asset_uuid, observation_uuid, frame_index, time_start_ms, time_end_ms,
+                asset_width_px, asset_height_px
+            FROM {STAGE_TABLE}
+            ORDER BY asset_uuid, COALESCE(frame_index, -1),
+                     COALESCE(time_start_ms, -1), COALESCE(time_end_ms, -1)
+            ON CONFLICT (
+                asset_uuid, (COALESCE(frame_index, -1)),
+                (COALESCE(time_start_ms, -1)), (COALESCE(time_end_ms, -1))
+            ) DO NOTHING
+            """
+        )
+        created = cursor.rowcount
+        cursor.execute(
+            f"""
+            UPDATE {STAGE_TABLE} s
+            SET subject_id = subj.subject_id
+            FROM annotation_subject subj
+            WHERE subj.asset_uuid = s.asset_uuid
+              AND COALESCE(subj.frame_index, -1) = COALESCE(s.frame_index, -1)
+              AND COALESCE(subj.time_start_ms, -1) = COALESCE(s.time_start_ms, -1)
+              AND COALESCE(subj.time_end_ms, -1) = COALESCE(s.time_end_ms, -1)
+            """
+        )
+        return created
+
+    def _attach_subject_ids(self, table: pa.Table) -> pa.Table:
+        subjects = zip(*[table.column(name).to_pylist() for name in SUBJECT_FIELDS])
+        subject_ids = self.subject_resolver.resolve(list(subjects))
+        return table.append_column("subject_id", pa.array(subject_ids, type=pa.string()))
+
+    def _insert_annotations(self, cursor) -> Dict[str, int]:
+        key_sql = (
+            f"COALESCE(s.source_annotation_key, {DERIVED_KEY_SQL})"
+            if self.derive_keys
+            else "s.source_annotation_key"
+        )
+        # Partition key of the child tables under migration 008.
+        set_col, set_val = (", set_id", ", %(set_id)s") if self.partitioned else ("", "")
+        quality_cte = (
+            f""",
+            qual AS (
+                INSERT INTO annotation_quality (
+                    annotation_id, review_status, confidence_score, conflict_flag,
+                    conflict_reason, adjudicated_by, adjudicated_at{set_col}
+                )
+                SELECT s.annotation_id, st.review_status,
+                       COALESCE(s.confidence_score, s.score),
+                       st.review_status = 'conflict',
+                       CASE WHEN st.review_status = 'conflict' THEN 'imported as conflict' END,
+                       CASE WHEN st.adjudicated THEN COALESCE(s.operator_identity, aset.created_by) END,
+                       CASE WHEN st.adjudicated THEN NOW() END{set_val}
+                FROM ins
+                JOIN {STAGE_TABLE} s USING (annotation_id)
+                CROSS JOIN annotation_set aset
+                CROSS JOIN LATERAL (
+                    SELECT COALESCE(s.review_status, 'unreviewed') AS review_status,
+                           COALESCE(s.review_status, 'unreviewed') IN ('accepted', 'rejected', 'conflict')
+                               AS adjudicated
+                ) st
+                WHERE aset.set_id = %(set_id)s
+                RETURNING 1
+            )"""
+            if self.with_quality
+            else ""
+        )
+        quality_count = "(SELECT count(*) FROM qual)" if self.with_quality else "0"
+
+        cursor.execute(
+            f"""
+            WITH geom_stage AS (
+                SELECT s.*,
+                       COALESCE(s.geometry_kind, CASE
+                           WHEN s.bbox_x_min IS NOT NULL THEN 'bbox'
+                           WHEN s.polygon_vertices IS NOT NULL THEN 'polygon'
+                           WHEN s.mask_rle IS NOT NULL OR s.mask_uri IS NOT NULL THEN 'mask'
+                           WHEN s.point_x IS NOT NULL THEN 'point'
+                       END) AS resolved_kind
+                FROM {STAGE_TABLE} s
+            ),
+            ins AS (
+                INSERT INTO annotation (
+                    annotation_id, subject_id, set_id, label, label_id, taxon_id, score,
+                    is_primary, source_annotation_key, sidecar
+                )
+                SELECT s.annotation_id, s.subject_id, %(set_id)s, s.label, s.label_id,
+                       s.taxon_id, s.score, COALESCE(s.is_primary, FALSE), {key_sql}, s.sidecar
+                FROM geom_stage s
+                ON CONFLICT (set_id, source_annotation_key)
+                    WHERE source_annotation_key IS NOT NULL
+                    DO NOTHING
+                RETURNING annotation_id
+            ),
+            geo AS (
+                INSERT INTO annotation_geometry (
+                    annotation_id, geometry_kind,
+                    bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max,
+                    bbox_x_min_px, bbox_y_min_px, bbox_x_max_px, bbox_y_max_px,
+                    polygon_vertices, mask_rle, mask_uri, mask_format, point_x, point_y{set_col}
+                )
+                SELECT s.annotation_id, s.resolved_kind,
+                       s.bbox_x_min, s.bbox_y_min, s.bbox_x_max, s.bbox_y_max,
+                       s.bbox_x_min_px, s.bbox_y_min_px, s.bbox_x_max_px, s.bbox_y_max_px,
+                       s.polygon_vertices, s.mask_rle, s.mask_uri, s.mask_format,
+                       s.point_x, s.point_y{set_val}
+                FROM ins JOIN geom_stage s USING (annotation_id)
+                WHERE s.resolved_kind IS NOT NULL
+                RETURNING 1
+            ),
+            prov AS (
+                INSERT INTO annotation_provenance (
+                    annotation_id, source_kind, source_name, source_version,
+                    model_id, prompt_hash, config_hash, run_id, operator_identity{set_col}
+                )
+                SELECT s.annotation_id, aset.source_kind, aset.source_name, aset.source_version,
+                       aset.model_id, aset.prompt_hash, aset.config_hash, aset.run_id,
+                       COALESCE(s.operator_identity, aset.created_by){set_val}
+                FROM ins
+                JOIN {STAGE_TABLE} s USING (annotation_id)
+                CROSS JOIN annotation_set aset
+                WHERE aset.set_id = %(set_id)s
+                RETURNING 1
+            ){quality_cte}
+            SELECT
+                (SELECT count(*) FROM ins),
+                (SELECT count(*) FROM geo),
+                (SELECT count(*) FROM prov),
+                {quality_count}
+            """,
+            {"set_id": self.set_id},
+        )
+        annotations, geometry, provenance, quality = cursor.fetchone()
+        return {
+            "annotations": annotations,
+            "geometry": geometry,
+            "provenance": provenance,
+            "quality": quality,
+        }
+
+    def write_batch(self, batch: pa.RecordBatch) -> Dict[str, float]:
+        """Write one batch in its own transaction; returns per-batch counts."""
+        started = time.perf_counter()
+        table = stage_table(batch)
+        resolver = self.subject_resolver
+        try:
+            if resolver is not None:
+                created_before = resolver.stats["created"]
+                table = self._attach_subject_ids(table)
+                subjects_created = resolver.stats["created"] - created_before
+            with self.conn.cursor() as cursor:
+                self._copy_stage(cursor, table)
+                if resolver is None:
+                    subjects_created = self._resolve_subjects(cursor)
+                counts = self._insert_annotations(cursor)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            if resolver is not None:
+                resolver.discard_uncommitted()
+            raise
+        if resolver is not None:
+            resolver.mark_committed()
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "rows": table.num_rows,
+            "subjects_created": subjects_created,
+            "skipped_existing": table.num_rows - counts["annotations"],
+            "seconds": elapsed,
+            **counts,
+        }
+        self.totals["batches"] += 1
+        for key, value in stats.items():
+            self.totals[key] += value
+        return stats
+
+    def write(self, batches: Iterable[pa.RecordBatch], log_every: int = 1) -> Dict[str, float]:
+        """Write every batch, printing rows/s as it goes; returns running totals."""
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            stats = self.write_batch(batch)
+            if log_every and self.totals["batches"] % log_every == 0:
+                rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+                total_rate = self.totals["rows"] / self.totals["seconds"] if self.totals["seconds"] else 0.0
+                print(
+                    f"  batch {self.totals['batches']}: {stats['rows']} rows, "
+                    f"{stats['annotations']} inserted, {stats['skipped_existing']} skipped, "
+                    f"{stats['subjects_created']} new subjects, "
+                    f"{rate:,.0f} rows/s (overall {total_rate:,.0f} rows/s)"
+                )
+        return dict(self.totals)
+
+    def close(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGE_TABLE}")
+        self.conn.commit()
+
+
+def summarize(totals: Dict[str, float]) -> List[str]:
+    rate = totals["rows"] / totals["seconds"] if totals["seconds"] else 0.0
+    return [
+        f"Batches: {totals['batches']}",
+        f"Rows read: {totals['rows']}",
+        f"Annotations inserted: {totals['annotations']}",
+        f"Skipped (existing source_annotation_key): {totals['skipped_existing']}",
+        f"Subjects created: {totals['subjects_created']}",
+        f"Geometry rows: {totals['geometry']}",
+        f"Provenance rows: {totals['provenance']}",
+        f"Quality rows: {totals['quality']}",
+        f"Throughput: {rate:,.0f} rows/s over {totals['seconds']:.1f}s",
+    ]
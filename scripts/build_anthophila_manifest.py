@@ -9,12 +9,31 @@ Scans /datasets/dataZoo/anthophila/ tree and computes:
 - Extract numeric IDs from filename (if present)
 - Deterministic IDs (asset_uuid from sha256; asset_row_uuid from path)
 - Flat filename keyed by sha256
+
+Each file is read from disk exactly once; SHA-256, dimensions and pHash are
+all derived from that in-memory buffer. Files are processed on a process pool
+(--workers) and results are emitted in sorted (species dir, filename) order,
+so the manifest is byte-identical regardless of worker count.
+
+pHash decoding uses PIL's JPEG draft mode (DCT-domain downscale to >= 256px
+before the 32x32 pHash resize), which is several times faster than a full
+decode. Hashes can differ from a full-resolution decode by a bit or two;
+pass --phash-full-decode to reproduce legacy values exactly.
+
+Rescans are incremental: a SQLite sidecar cache (default <output>.cache.sqlite)
+stores sha256/width/height/phash keyed by (path, size, mtime_ns, inode). Only
+files whose stat signature changed are re-read and hashed; the cache hit rate
+is reported at the end of the scan. Use --no-cache to force a full rehash.
 """
 
+import io
+import os
 import re
 import csv
 import hashlib
+import sqlite3
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import argparse
 from typing import Dict, List, Optional, Tuple
@@ -47,32 +66,37 @@ def extract_id_from_filename(filename: str) -> Tuple[Optional[int], Optional[int
 
     return None, None, "no_id_found"
 
-def compute_sha256(file_path: Path) -> str:
-    """Compute SHA-256 hash of file."""
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(chunk)
-    return sha256_hash.hexdigest()
+PHASH_DRAFT_SIZE = 256
 
-def get_image_dimensions(file_path: Path) -> Tuple[Optional[int], Optional[int]]:
-    """Get image width and height using PIL."""
-    try:
-        with Image.open(file_path) as img:
-            return img.width, img.height
-    except Exception as e:
-        print(f"Warning: Could not get dimensions for {file_path}: {e}")
-        return None, None
+def compute_sha256(data: bytes) -> str:
+    """Compute SHA-256 hash of an in-memory file buffer."""
+    return hashlib.sha256(data).hexdigest()
 
-def compute_phash(file_path: Path) -> str:
-    """Compute perceptual hash using imagehash."""
+def analyze_image_bytes(
+    data: bytes, phash_draft: bool = True
+) -> Tuple[Optional[int], Optional[int], str, List[str]]:
+    """
+    Get (width, height, phash, warnings) from an in-memory image buffer.
+
+    Dimensions come from the header of the original image, before any draft
+    downscale. The pHash decode uses JPEG draft mode when phash_draft is set.
+    """
+    warnings = []
+    width = height = None
+    phash = ""
     try:
-        with Image.open(file_path) as img:
-            phash = imagehash.phash(img)
-            return str(phash)
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.width, img.height
+            try:
+                if phash_draft:
+                    img.draft("L", (PHASH_DRAFT_SIZE, PHASH_DRAFT_SIZE))
+                phash = str(imagehash.phash(img))
+            except Exception as e:
+                warnings.append(f"Could not compute pHash: {e}")
     except Exception as e:
-        print(f"Warning: Could not compute pHash for {file_path}: {e}")
-        return ""
+        warnings.append(f"Could not get dimensions: {e}")
+        warnings.append(f"Could not compute pHash: {e}")
+    return width, height, phash, warnings
 
 def normalize_scientific_name(directory_name: str) -> str:
     """
@@ -105,90 +129,252 @@ def generate_flat_name(sha256_hex: str, extension: str) -> str:
 ASSET_UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "polli/anthophila/asset")
 ASSET_ROW_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "polli/anthophila/asset-row")
 
-def scan_anthophila_directory(anthophila_dir: Path) -> List[Dict]:
-    """Scan anthophila directory and build manifest data."""
-    
-    manifest_data = []
-    processed_count = 0
-    error_count = 0
-    
-    print(f"Scanning {anthophila_dir}")
-    
-    # Walk through all subdirectories
-    for species_dir in anthophila_dir.iterdir():
+def collect_image_files(anthophila_dir: Path) -> List[Tuple[Path, str]]:
+    """List (jpg_path, species_dir_name) pairs in sorted, deterministic order."""
+    files = []
+    for species_dir in sorted(anthophila_dir.iterdir()):
         if not species_dir.is_dir():
             continue
-            
+
         if species_dir.name == "GBIF_occurences":
             print(f"Skipping metadata directory: {species_dir.name}")
             continue
-            
-        print(f"Processing {species_dir.name}...")
-        
-        # Process all JPG files in species directory
-        jpg_files = list(species_dir.glob("*.jpg"))
-        
-        for jpg_file in jpg_files:
+
+        for jpg_file in sorted(species_dir.glob("*.jpg")):
+            files.append((jpg_file, species_dir.name))
+    return files
+
+def make_manifest_entry(
+    jpg_file: Path,
+    species_dir_name: str,
+    sha256: str,
+    width: Optional[int],
+    height: Optional[int],
+    phash: str,
+    file_bytes: int,
+) -> Dict:
+    """Assemble a manifest row from per-file content metadata."""
+    # Extract ID(s) from filename
+    id_core, id_suffix, id_type = extract_id_from_filename(jpg_file.name)
+
+    # Get scientific name from directory
+    scientific_name_raw = species_dir_name
+    scientific_name = normalize_scientific_name(species_dir_name)
+    rank_guess = guess_rank(scientific_name)
+
+    # Deterministic asset identifiers
+    asset_uuid = str(uuid.uuid5(ASSET_UUID_NAMESPACE, sha256))
+    asset_row_uuid = str(uuid.uuid5(ASSET_ROW_NAMESPACE, str(jpg_file)))
+
+    # Generate flat filename (sha256-based)
+    flat_name = generate_flat_name(sha256, jpg_file.suffix)
+
+    return {
+        'asset_uuid': asset_uuid,
+        'asset_row_uuid': asset_row_uuid,
+        'original_path': str(jpg_file),
+        'original_filename': jpg_file.name,
+        'flat_name': flat_name,
+        'scientific_name_raw': scientific_name_raw,
+        'scientific_name_norm': scientific_name,
+        'rank_guess': rank_guess,
+        'id_core': id_core if id_core is not None else '',
+        'id_suffix': id_suffix if id_suffix is not None else '',
+        'id_type_guess': id_type,
+        'width': width if width else '',
+        'height': height if height else '',
+        'sha256': sha256,
+        'phash': phash,
+        'source_tag': 'expert-taxonomist',
+        'license_guess': 'unknown',
+        'file_bytes': file_bytes,
+        'keep_flag': True  # Will be updated by deduplication step
+    }
+
+def build_manifest_entry(task: Tuple[Path, str, bool]) -> Tuple[Optional[Dict], List[str], Optional[str]]:
+    """
+    Process one image file (process-pool worker).
+
+    Returns (manifest_entry, warnings, error). On error the entry is None.
+    """
+    jpg_file, species_dir_name, phash_draft = task
+    try:
+        # Single read: everything below is computed from this buffer
+        data = jpg_file.read_bytes()
+
+        # Compute file hash (used for deterministic IDs + filenames)
+        sha256 = compute_sha256(data)
+
+        # Get image dimensions and pHash
+        width, height, phash, warnings = analyze_image_bytes(data, phash_draft)
+
+        entry = make_manifest_entry(
+            jpg_file, species_dir_name, sha256, width, height, phash, len(data)
+        )
+        return entry, warnings, None
+    except Exception as e:
+        return None, [], str(e)
+
+class ManifestCache:
+    """
+    SQLite sidecar cache of per-file content metadata.
+
+    A row is reused only if the file's (size, mtime_ns, inode) signature and
+    the pHash decode mode match what was stored; anything else is a miss.
+    """
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = cache_path
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(cache_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_cache (
+                path        TEXT PRIMARY KEY,
+                size        INTEGER NOT NULL,
+                mtime_ns    INTEGER NOT NULL,
+                inode       INTEGER NOT NULL,
+                phash_mode  TEXT NOT NULL,
+                sha256      TEXT NOT NULL,
+                width       INTEGER,
+                height      INTEGER,
+                phash       TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self._rows = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                "SELECT path, size, mtime_ns, inode, phash_mode, sha256, width, height, phash "
+                "FROM file_cache"
+            )
+        }
+
+    def lookup(self, path: Path, stat: os.stat_result, phash_mode: str) -> Optional[Tuple]:
+        """Return (sha256, width, height, phash) if the cached row is still valid."""
+        row = self._rows.get(str(path))
+        if row is None:
+            return None
+        size, mtime_ns, inode, cached_mode, sha256, width, height, phash = row
+        if (size, mtime_ns, inode, cached_mode) != (
+            stat.st_size, stat.st_mtime_ns, stat.st_ino, phash_mode
+        ):
+            return None
+        return sha256, width, height, phash
+
+    def store(self, records: List[Tuple]):
+        """Upsert (path, size, mtime_ns, inode, phash_mode, sha256, width, height, phash) rows."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO file_cache "
+            "(path, size, mtime_ns, inode, phash_mode, sha256, width, height, phash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            records,
+        )
+        self.conn.commit()
+
+    def prune(self, live_paths: List[str]) -> int:
+        """Drop rows for files that no longer exist in the scanned tree."""
+        stale = [(p,) for p in self._rows.keys() - set(live_paths)]
+        self.conn.executemany("DELETE FROM file_cache WHERE path = ?", stale)
+        self.conn.commit()
+        return len(stale)
+
+    def close(self):
+        self.conn.close()
+
+def scan_anthophila_directory(
+    anthophila_dir: Path,
+    workers: Optional[int] = None,
+    phash_draft: bool = True,
+    cache: Optional[ManifestCache] = None,
+) -> List[Dict]:
+    """Scan anthophila directory and build manifest data."""
+
+    processed_count = 0
+    error_count = 0
+    phash_mode = "draft" if phash_draft else "full"
+
+    print(f"Scanning {anthophila_dir}")
+    files = collect_image_files(anthophila_dir)
+    print(f"Found {len(files)} files")
+
+    # Resolve cache hits up front (stat only, no reads); the rest are hashed.
+    entries: List[Optional[Dict]] = [None] * len(files)
+    miss_indices = []
+    file_stats = {}
+    hit_count = 0
+    for idx, (jpg_file, species_name) in enumerate(files):
+        cached = None
+        if cache is not None:
             try:
-                # Extract ID(s) from filename
-                id_core, id_suffix, id_type = extract_id_from_filename(jpg_file.name)
-
-                # Get scientific name from directory
-                scientific_name_raw = species_dir.name
-                scientific_name = normalize_scientific_name(species_dir.name)
-                rank_guess = guess_rank(scientific_name)
-
-                # Compute file hash (used for deterministic IDs + filenames)
-                sha256 = compute_sha256(jpg_file)
-
-                # Deterministic asset identifiers
-                asset_uuid = str(uuid.uuid5(ASSET_UUID_NAMESPACE, sha256))
-                asset_row_uuid = str(uuid.uuid5(ASSET_ROW_NAMESPACE, str(jpg_file)))
-
-                # Get image dimensions and pHash
-                width, height = get_image_dimensions(jpg_file)
-                phash = compute_phash(jpg_file)
-
-                # Generate flat filename (sha256-based)
-                flat_name = generate_flat_name(sha256, jpg_file.suffix)
-                
-                # File stats
-                file_stats = jpg_file.stat()
-                file_bytes = file_stats.st_size
-                
-                manifest_entry = {
-                    'asset_uuid': asset_uuid,
-                    'asset_row_uuid': asset_row_uuid,
-                    'original_path': str(jpg_file),
-                    'original_filename': jpg_file.name,
-                    'flat_name': flat_name,
-                    'scientific_name_raw': scientific_name_raw,
-                    'scientific_name_norm': scientific_name,
-                    'rank_guess': rank_guess,
-                    'id_core': id_core if id_core is not None else '',
-                    'id_suffix': id_suffix if id_suffix is not None else '',
-                    'id_type_guess': id_type,
-                    'width': width if width else '',
-                    'height': height if height else '',
-                    'sha256': sha256,
-                    'phash': phash,
-                    'source_tag': 'expert-taxonomist',
-                    'license_guess': 'unknown',
-                    'file_bytes': file_bytes,
-                    'keep_flag': True  # Will be updated by deduplication step
-                }
-                
-                manifest_data.append(manifest_entry)
-                processed_count += 1
-                
-                if processed_count % 1000 == 0:
-                    print(f"  Processed {processed_count} files...")
-                    
-            except Exception as e:
+                stat = jpg_file.stat()
+            except OSError as e:
                 print(f"Error processing {jpg_file}: {e}")
                 error_count += 1
-    
-    print(f"Scan complete: {processed_count} files processed, {error_count} errors")
+                continue
+            file_stats[idx] = stat
+            cached = cache.lookup(jpg_file, stat, phash_mode)
+        if cached is not None:
+            sha256, width, height, phash = cached
+            entries[idx] = make_manifest_entry(
+                jpg_file, species_name, sha256, width, height, phash, stat.st_size
+            )
+            hit_count += 1
+        else:
+            miss_indices.append(idx)
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Cache hits: {hit_count}; hashing {len(miss_indices)} file(s) with {workers} worker(s)")
+
+    tasks = [(files[i][0], files[i][1], phash_draft) for i in miss_indices]
+
+    if workers == 1:
+        results = map(build_manifest_entry, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # map() preserves input order, so output is deterministic
+        results = executor.map(build_manifest_entry, tasks, chunksize=64)
+
+    cache_records = []
+    try:
+        for idx, (entry, warnings, error) in zip(miss_indices, results):
+            jpg_file = files[idx][0]
+            for warning in warnings:
+                print(f"Warning: {jpg_file}: {warning}")
+            if error is not None:
+                print(f"Error processing {jpg_file}: {error}")
+                error_count += 1
+                continue
+
+            entries[idx] = entry
+            processed_count += 1
+            if cache is not None and idx in file_stats:
+                stat = file_stats[idx]
+                cache_records.append((
+                    str(jpg_file), stat.st_size, stat.st_mtime_ns, stat.st_ino, phash_mode,
+                    entry['sha256'], entry['width'] or None, entry['height'] or None,
+                    entry['phash'],
+                ))
+
+            if processed_count % 1000 == 0:
+                print(f"  Processed {processed_count} files...")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if cache is not None:
+        cache.store(cache_records)
+        pruned = cache.prune([str(f) for f, _ in files])
+        total = hit_count + len(miss_indices)
+        hit_rate = (hit_count / total * 100) if total else 0.0
+        print(f"Manifest cache: {hit_count}/{total} hits ({hit_rate:.1f}%), "
+              f"{len(cache_records)} stored, {pruned} stale rows pruned ({cache.cache_path})")
+
+    manifest_data = [entry for entry in entries if entry is not None]
+    print(f"Scan complete: {hit_count + processed_count} files in manifest "
+          f"({processed_count} hashed, {hit_count} cached), {error_count} errors")
     return manifest_data
 
 def write_manifest_csv(manifest_data: List[Dict], output_path: Path):
@@ -253,6 +439,27 @@ def main():
         default="/home/caleb/repo/ibridaDB/anthophila_manifest.csv",
         help="Output CSV path"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for hashing (default: CPU count; 1 = serial)"
+    )
+    parser.add_argument(
+        "--phash-full-decode",
+        action="store_true",
+        help="Compute pHash from a full-resolution decode instead of JPEG draft mode"
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="SQLite manifest cache path (default: <output>.cache.sqlite)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore the manifest cache and rehash every file"
+    )
     
     args = parser.parse_args()
     
@@ -264,7 +471,21 @@ def main():
         return 1
     
     # Scan directory and build manifest
-    manifest_data = scan_anthophila_directory(anthophila_dir)
+    cache = None
+    if not args.no_cache:
+        cache_path = Path(args.cache) if args.cache else output_path.with_name(output_path.name + ".cache.sqlite")
+        cache = ManifestCache(cache_path)
+
+    try:
+        manifest_data = scan_anthophila_directory(
+            anthophila_dir,
+            workers=args.workers,
+            phash_draft=not args.phash_full_decode,
+            cache=cache,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
     
     if not manifest_data:
         print("No files found to process")
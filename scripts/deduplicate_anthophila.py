@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """
-Two-pass deduplication for anthophila dataset.
+Multi-pass deduplication for anthophila dataset.
 
 Pass A: ID-based matching (candidate IDs vs photos.photo_id)
-Pass B: Hash-based matching against existing media + within-anthophila duplicates
+Pass B: Hash-based matching against existing media (exact sha256)
+Pass C: pHash near-duplicates against existing media (opt-in, --phash-max-distance;
+        requires dbTools/admin/add_media_phash_search_ddl.sql)
+Pass D: Within-anthophila sha256 duplicates
 
 Usage: 
   uv run python3 scripts/deduplicate_anthophila.py \
@@ -13,13 +16,11 @@ Usage:
 """
 
 import argparse
+import io
 import os
 from pathlib import Path
-from typing import Dict, List, Tuple, Set
 import pandas as pd
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from tqdm import tqdm
 
 def connect_to_database(connection_string: str):
     """Connect to PostgreSQL database."""
@@ -38,45 +39,68 @@ def load_manifest(manifest_path: Path) -> pd.DataFrame:
     return df
 
 ROW_ID_COL = "asset_row_uuid"
+DUP_COLUMNS = [ROW_ID_COL, 'dup_reason', 'matched_key']
 
 
-def pass_a_id_matching(manifest_df: pd.DataFrame, db_conn) -> Dict[str, Tuple[str, str]]:
-    """
-    Pass A: Match candidate IDs from filenames against photos.photo_id.
+def empty_duplicates() -> pd.DataFrame:
+    """Empty pass result with the standard (row_id, dup_reason, matched_key) columns."""
+    return pd.DataFrame({col: pd.Series(dtype=str) for col in DUP_COLUMNS})
 
-    Returns: dict mapping row_id to (dup_reason, matched_key)
+def copy_keys_to_temp(cursor, table_name: str, columns_ddl: str, keys_df: pd.DataFrame):
     """
-    duplicates: Dict[str, Tuple[str, str]] = {}
+    COPY a key DataFrame into a transaction-scoped temp table and ANALYZE it.
 
-    id_series = manifest_df['id_core'].dropna()
-    if id_series.empty:
-        print("No numeric IDs found for Pass A matching")
-        return duplicates
+    The caller's transaction owns the table (ON COMMIT DROP), so each pass
+    commits when done.
+    """
+    cursor.execute(f"CREATE TEMP TABLE {table_name} ({columns_ddl}) ON COMMIT DROP")
+    buffer = io.StringIO()
+    keys_df.to_csv(buffer, sep='\t', header=False, index=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table_name} FROM STDIN", buffer)
+    cursor.execute(f"ANALYZE {table_name}")
+
+def fetch_duplicates(cursor, dup_reason: str) -> pd.DataFrame:
+    """Build a pass result DataFrame from a (row_id, matched_key) result set."""
+    rows = cursor.fetchall()
+    if not rows:
+        return empty_duplicates()
+    result = pd.DataFrame(rows, columns=[ROW_ID_COL, 'matched_key'])
+    result['matched_key'] = result['matched_key'].astype(str)
+    result['dup_reason'] = dup_reason
+    return result[DUP_COLUMNS]
+
+def remaining_rows(manifest_df: pd.DataFrame, existing_duplicates: pd.DataFrame) -> pd.DataFrame:
+    """Manifest rows not already claimed by an earlier pass."""
+    return manifest_df[~manifest_df[ROW_ID_COL].isin(existing_duplicates[ROW_ID_COL])]
+
+def pass_a_id_matching(manifest_df: pd.DataFrame, db_conn) -> pd.DataFrame:
+    """
+    Pass A: Match candidate IDs from filenames against photos.photo_id.
 
-    candidate_ids = sorted({int(x) for x in id_series if str(x).strip() != ""})
-    if not candidate_ids:
+    Returns: DataFrame of (row_id, dup_reason, matched_key)
+    """
+    id_core = pd.to_numeric(manifest_df['id_core'], errors='coerce')
+    valid = id_core.notna() & (id_core >= 0) & (id_core < 2**63)
+    keys_df = pd.DataFrame({
+        'row_id': manifest_df.loc[valid, ROW_ID_COL],
+        'id_core': id_core[valid].astype('int64'),
+    })
+    if keys_df.empty:
         print("No numeric IDs found for Pass A matching")
-        return duplicates
-
-    print(f"Pass A: Checking {len(candidate_ids)} candidate IDs against photos.photo_id...")
-
-    with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-        cursor.execute(
-            "SELECT photo_id FROM photos WHERE photo_id = ANY(%s)",
-            (candidate_ids,),
-        )
-        existing_photo_ids = {row['photo_id'] for row in cursor.fetchall()}
+        return empty_duplicates()
 
-    print(f"Found {len(existing_photo_ids)} matching photo_ids in database")
+    print(f"Pass A: Checking {keys_df['id_core'].nunique()} candidate IDs against photos.photo_id...")
 
-    for _, row in manifest_df.iterrows():
-        if pd.notna(row['id_core']):
-            try:
-                id_core = int(row['id_core'])
-            except Exception:
-                continue
-            if id_core in existing_photo_ids:
-                duplicates[row[ROW_ID_COL]] = ('photo_id', str(id_core))
+    with db_conn.cursor() as cursor:
+        copy_keys_to_temp(cursor, "dedup_pass_a_keys", "row_id TEXT, id_core BIGINT", keys_df)
+        cursor.execute("""
+            SELECT k.row_id, k.id_core
+            FROM dedup_pass_a_keys k
+            WHERE EXISTS (SELECT 1 FROM photos p WHERE p.photo_id = k.id_core)
+        """)
+        duplicates = fetch_duplicates(cursor, 'photo_id')
+    db_conn.commit()
 
     print(f"Pass A complete: Found {len(duplicates)} ID-based duplicates")
     return duplicates
@@ -84,93 +108,162 @@ def pass_a_id_matching(manifest_df: pd.DataFrame, db_conn) -> Dict[str, Tuple[st
 def pass_b_hash_matching(
     manifest_df: pd.DataFrame,
     db_conn,
-    existing_duplicates: Set[str]
-) -> Dict[str, Tuple[str, str]]:
+    existing_duplicates: pd.DataFrame
+) -> pd.DataFrame:
     """
     Pass B: Match anthophila hashes against existing media table.
 
     Only processes entries not already marked as duplicates from Pass A.
-    Returns: dict mapping row_id to (dup_reason, matched_key)
+    Returns: DataFrame of (row_id, dup_reason, matched_key)
     """
-    duplicates: Dict[str, Tuple[str, str]] = {}
-
-    remaining_df = manifest_df[~manifest_df[ROW_ID_COL].isin(existing_duplicates)]
+    remaining_df = remaining_rows(manifest_df, existing_duplicates)
+    remaining_df = remaining_df[remaining_df['sha256'].notna() & (remaining_df['sha256'] != "")]
     if remaining_df.empty:
-        print("Pass B: No remaining entries to check after Pass A")
-        return duplicates
-
-    sha256_hashes = remaining_df[remaining_df['sha256'].notna()]['sha256'].unique().tolist()
-    if not sha256_hashes:
         print("Pass B: No SHA256 hashes found")
-        return duplicates
+        return empty_duplicates()
 
-    with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-        cursor.execute("SELECT to_regclass('public.media') AS media_tbl;")
-        media_tbl = cursor.fetchone().get("media_tbl")
+    with db_conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('public.media')")
+        media_tbl = cursor.fetchone()[0]
 
     if not media_tbl:
         print("Pass B: media table not found; skipping media hash matching")
-        return duplicates
-
-    print(f"Pass B: Checking {len(sha256_hashes)} hashes against media.sha256_hex...")
-    batch_size = 1000
-    with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-        for i in tqdm(range(0, len(sha256_hashes), batch_size), desc="Checking media hashes"):
-            batch_hashes = sha256_hashes[i:i + batch_size]
-            cursor.execute(
-                "SELECT sha256_hex FROM media WHERE sha256_hex = ANY(%s)",
-                (batch_hashes,),
-            )
-            existing_hashes = {row["sha256_hex"] for row in cursor.fetchall()}
+        return empty_duplicates()
 
-            if not existing_hashes:
-                continue
+    keys_df = pd.DataFrame({'row_id': remaining_df[ROW_ID_COL], 'sha256': remaining_df['sha256']})
+    print(f"Pass B: Checking {keys_df['sha256'].nunique()} hashes against media.sha256_hex...")
 
-            for _, entry in remaining_df[remaining_df['sha256'].isin(existing_hashes)].iterrows():
-                duplicates[entry[ROW_ID_COL]] = ('media_sha256', entry['sha256'])
+    with db_conn.cursor() as cursor:
+        copy_keys_to_temp(cursor, "dedup_pass_b_keys", "row_id TEXT, sha256 CHAR(64)", keys_df)
+        cursor.execute("""
+            SELECT k.row_id, k.sha256
+            FROM dedup_pass_b_keys k
+            JOIN media m ON m.sha256_hex = k.sha256
+        """)
+        duplicates = fetch_duplicates(cursor, 'media_sha256')
+    db_conn.commit()
 
     print(f"Pass B complete: Found {len(duplicates)} media hash duplicates")
     return duplicates
 
-def dedup_within_dataset(manifest_df: pd.DataFrame, existing_duplicates: Set[str]) -> Dict[str, Tuple[str, str]]:
-    """Mark duplicates within anthophila by sha256 (keep largest file)."""
-    duplicates: Dict[str, Tuple[str, str]] = {}
+def phash_hex_to_bigint(value):
+    """Parse a hex pHash string into signed int64 (media.phash_64 encoding)."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    text = str(value).strip().lower()
+    if text.startswith("0x"):
+        text = text[2:]
+    if not text:
+        return None
+    try:
+        raw = int(text, 16)
+    except ValueError:
+        return None
+    if raw >= (1 << 64):
+        return None
+    if raw >= (1 << 63):
+        raw -= (1 << 64)
+    return raw
+
+def pass_c_phash_matching(
+    manifest_df: pd.DataFrame,
+    db_conn,
+    existing_duplicates: pd.DataFrame,
+    max_distance: int,
+    exclude_dataset: str = None,
+) -> pd.DataFrame:
+    """
+    Pass C: Match anthophila pHashes against media.phash_64 within Hamming distance.
 
-    working_df = manifest_df[~manifest_df[ROW_ID_COL].isin(existing_duplicates)].copy()
-    if working_df.empty:
-        return duplicates
+    Uses media_phash_candidates() so neighbours are found with band-index probes
+    in the database instead of pulling media hashes into Python.
+    Returns: DataFrame of (row_id, dup_reason, matched_key); matched_key is the
+    nearest media_id.
+    """
+    if 'phash' not in manifest_df.columns:
+        print("Pass C: manifest has no phash column; skipping")
+        return empty_duplicates()
+
+    remaining_df = remaining_rows(manifest_df, existing_duplicates)
+    # Drop unparseable hashes before building the frame: an int64 column with
+    # missing values would be upcast to float and lose the low bits.
+    pairs = [
+        (row_id, phash_64)
+        for row_id, phash_64 in zip(
+            remaining_df[ROW_ID_COL], map(phash_hex_to_bigint, remaining_df['phash'])
+        )
+        if phash_64 is not None
+    ]
+    keys_df = pd.DataFrame(pairs, columns=['row_id', 'phash_64'])
+    if keys_df.empty:
+        print("Pass C: No pHashes to check")
+        return empty_duplicates()
+
+    with db_conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT to_regprocedure('media_phash_candidates(bigint[], integer, text)')"
+        )
+        if not cursor.fetchone()[0]:
+            print("Pass C: media_phash_candidates() not found; "
+                  "run dbTools/admin/apply_media_phash_search_ddl.sh. Skipping")
+            return empty_duplicates()
 
-    working_df = working_df[working_df['sha256'].notna() & (working_df['sha256'] != "")]
+    print(f"Pass C: Checking {keys_df['phash_64'].nunique()} pHashes against media.phash_64 "
+          f"(max distance {max_distance})...")
+
+    with db_conn.cursor() as cursor:
+        copy_keys_to_temp(cursor, "dedup_pass_c_keys", "row_id TEXT, phash_64 BIGINT", keys_df)
+        cursor.execute(
+            """
+            WITH nearest AS (
+                SELECT DISTINCT ON (c.query_hash) c.query_hash, c.media_id
+                FROM media_phash_candidates(
+                    (SELECT array_agg(DISTINCT phash_64) FROM dedup_pass_c_keys), %s, %s
+                ) c
+                ORDER BY c.query_hash, c.hamming_distance, c.media_id
+            )
+            SELECT k.row_id, n.media_id
+            FROM dedup_pass_c_keys k
+            JOIN nearest n ON n.query_hash = k.phash_64
+            """,
+            (max_distance, exclude_dataset),
+        )
+        duplicates = fetch_duplicates(cursor, 'media_phash')
+    db_conn.commit()
+
+    print(f"Pass C complete: Found {len(duplicates)} pHash near-duplicates")
+    return duplicates
+
+def dedup_within_dataset(manifest_df: pd.DataFrame, existing_duplicates: pd.DataFrame) -> pd.DataFrame:
+    """Mark duplicates within anthophila by sha256 (keep largest file)."""
+    working_df = remaining_rows(manifest_df, existing_duplicates)
+    working_df = working_df[working_df['sha256'].notna() & (working_df['sha256'] != "")].copy()
     if working_df.empty:
-        return duplicates
+        return empty_duplicates()
 
     # Prefer larger files when keeping a representative
     working_df['file_bytes'] = pd.to_numeric(working_df['file_bytes'], errors='coerce').fillna(0)
     working_df = working_df.sort_values(by=['sha256', 'file_bytes'], ascending=[True, False])
 
-    dup_mask = working_df.duplicated(subset=['sha256'], keep='first')
-    dup_rows = working_df[dup_mask]
-
-    for _, row in dup_rows.iterrows():
-        duplicates[row[ROW_ID_COL]] = ('sha256_within', row['sha256'])
-
-    return duplicates
+    dup_rows = working_df[working_df.duplicated(subset=['sha256'], keep='first')]
+    return pd.DataFrame({
+        ROW_ID_COL: dup_rows[ROW_ID_COL],
+        'dup_reason': 'sha256_within',
+        'matched_key': dup_rows['sha256'],
+    })[DUP_COLUMNS]
 
 def write_dedup_results(manifest_df: pd.DataFrame, 
-                       all_duplicates: Dict[str, Tuple[str, str]], 
+                       all_duplicates: pd.DataFrame, 
                        output_path: Path):
     """Write deduplication results to CSV."""
     
-    # Add duplicate info to manifest
-    manifest_df['dup_reason'] = manifest_df[ROW_ID_COL].map(
-        lambda row_id: all_duplicates.get(row_id, ('', ''))[0]
-    )
-    manifest_df['matched_key'] = manifest_df[ROW_ID_COL].map(
-        lambda row_id: all_duplicates.get(row_id, ('', ''))[1]
-    )
-    manifest_df['keep_flag'] = manifest_df[ROW_ID_COL].map(
-        lambda row_id: row_id not in all_duplicates
-    )
+    # Add duplicate info to manifest (left merge keeps manifest row order)
+    all_duplicates = all_duplicates.drop_duplicates(subset=[ROW_ID_COL], keep='first')
+    manifest_df = manifest_df.drop(columns=['dup_reason', 'matched_key', 'keep_flag'], errors='ignore')
+    manifest_df = manifest_df.merge(all_duplicates, on=ROW_ID_COL, how='left')
+    manifest_df['keep_flag'] = manifest_df['dup_reason'].isna()
+    manifest_df['dup_reason'] = manifest_df['dup_reason'].fillna('')
+    manifest_df['matched_key'] = manifest_df['matched_key'].fillna('')
     
     # Write to CSV
     print(f"Writing deduplication results to {output_path}")
@@ -178,7 +271,7 @@ def write_dedup_results(manifest_df: pd.DataFrame,
     
     # Print summary statistics
     total_entries = len(manifest_df)
-    duplicates_count = len(all_duplicates)
+    duplicates_count = int((~manifest_df['keep_flag']).sum())
     keep_count = total_entries - duplicates_count
     
     print(f"\n=== DEDUPLICATION SUMMARY ===")
@@ -210,9 +303,24 @@ def main():
         default=os.getenv("IBRIDADB_DSN", "postgresql://postgres@localhost/ibrida-v0"),
         help="PostgreSQL connection string (prefer env/.pgpass over inline passwords)"
     )
+    parser.add_argument(
+        "--phash-max-distance",
+        type=int,
+        default=None,
+        help="Enable Pass C: flag rows whose pHash is within this Hamming distance (0-7) of existing media"
+    )
+    parser.add_argument(
+        "--phash-exclude-dataset",
+        default=None,
+        help="Ignore media rows from this dataset in Pass C (e.g. a previous load of the same dataset)"
+    )
     
     args = parser.parse_args()
     
+    if args.phash_max_distance is not None and not 0 <= args.phash_max_distance <= 7:
+        print("Error: --phash-max-distance must be between 0 and 7")
+        return 1
+
     manifest_path = Path(args.manifest)
     output_path = Path(args.output)
     
@@ -240,19 +348,26 @@ def main():
     
     try:
         # Pass A: ID-based matching (photo_id)
-        pass_a_duplicates = pass_a_id_matching(manifest_df, db_conn)
+        all_duplicates = pass_a_id_matching(manifest_df, db_conn)
 
         # Pass B: Hash-based matching against existing media
-        pass_b_duplicates = pass_b_hash_matching(
-            manifest_df, db_conn, set(pass_a_duplicates.keys())
-        )
-
-        # Pass C: Within-anthophila sha256 duplicates
-        pass_c_duplicates = dedup_within_dataset(
-            manifest_df, set(pass_a_duplicates.keys()) | set(pass_b_duplicates.keys())
-        )
+        pass_b_duplicates = pass_b_hash_matching(manifest_df, db_conn, all_duplicates)
+        all_duplicates = pd.concat([all_duplicates, pass_b_duplicates], ignore_index=True)
+
+        # Pass C: pHash near-duplicates against existing media (opt-in)
+        if args.phash_max_distance is not None:
+            pass_c_duplicates = pass_c_phash_matching(
+                manifest_df,
+                db_conn,
+                all_duplicates,
+                args.phash_max_distance,
+                exclude_dataset=args.phash_exclude_dataset,
+            )
+            all_duplicates = pd.concat([all_duplicates, pass_c_duplicates], ignore_index=True)
 
-        all_duplicates = {**pass_a_duplicates, **pass_b_duplicates, **pass_c_duplicates}
+        # Pass D: Within-anthophila sha256 duplicates
+        pass_d_duplicates = dedup_within_dataset(manifest_df, all_duplicates)
+        all_duplicates = pd.concat([all_duplicates, pass_d_duplicates], ignore_index=True)
         
         # Write results
         write_dedup_results(manifest_df, all_duplicates, output_path)
@@ -172,6 +172,24 @@ docker exec $CONTAINER psql -U $DB_USER -d $DB_NAME -c "
     WHERE o.taxon_id = r.old_taxon_id
       AND r.confidence = 'HIGH'
       AND r.old_taxon_id != r.new_taxon_id;  -- Skip RANK_CHANGE_ONLY
+
+    -- Keep the denormalized nested-interval lft (add_nested_intervals.py
+    -- --denormalize-observations) in step with the new taxon_id.
+    DO \$\$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'observations' AND column_name = 'taxon_lft') THEN
+            UPDATE observations o
+            SET taxon_lft = e.\"lft\"
+            FROM r1_r2_remap_rules r, expanded_taxa e
+            WHERE o.taxon_id = r.new_taxon_id
+              AND r.confidence = 'HIGH'
+              AND r.old_taxon_id != r.new_taxon_id
+              AND e.\"taxonID\" = o.taxon_id
+              AND o.taxon_lft IS DISTINCT FROM e.\"lft\";
+        END IF;
+    END
+    \$\$;
     
     SELECT 'Remapped', COUNT(*), 'observations with HIGH confidence'
     FROM observations o
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Write a compact snapshot index for an export CSV and diff it against a
+previous snapshot.
+
+The export CSV is the tab-delimited <EXPORT_GROUP>_photos.csv produced by
+dbTools/export/v0/common/cladistic.sh. Its rows are ordered by
+observation_uuid first (the export ordering contract), so both the new export
+and the previous snapshot can be streamed and merge-joined one observation
+group at a time. Neither side is ever loaded into memory in full.
+
+Snapshot format (gzip TSV, header included):
+    observation_uuid    photo_uuid    row_hash
+
+row_hash is a 128-bit BLAKE2b digest over every exported column except the
+sampling rank "rn", so re-sampling alone does not register as a change but a
+relabelled taxon, moved coordinate or new license does.
+
+Diff outputs (only when --previous-snapshot is given):
+    --added-out    full export rows (same header) that are new or changed
+    --removed-out  observation_uuid/photo_uuid keys no longer exported
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import itertools
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SNAPSHOT_HEADER = ["observation_uuid", "photo_uuid", "row_hash"]
+EXCLUDED_HASH_COLUMNS = {"rn"}
+FIELD_SEPARATOR = "\x1f"
+
+csv.field_size_limit(sys.maxsize)
+
+
+class UnsortedInputError(ValueError):
+    """Raised when a stream is not grouped/sorted by observation_uuid."""
+
+
+def open_text(path: Path, mode: str = "rt"):
+    """Open plain or gzip-compressed text files transparently."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode, newline="", encoding="utf-8")
+    return open(path, mode.replace("t", ""), newline="", encoding="utf-8")
+
+
+def compute_row_hash(row: List[str], hash_indices: List[int]) -> str:
+    """BLAKE2b-128 over the selected columns, unit-separator joined."""
+    payload = FIELD_SEPARATOR.join(row[i] for i in hash_indices)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def iter_export_rows(
+    export_csv: Path,
+) -> Tuple[List[str], Iterator[Tuple[str, str, str, List[str]]]]:
+    """
+    Stream (observation_uuid, photo_uuid, row_hash, raw_row) from an export CSV.
+
+    Returns the header alongside the iterator so callers can write diff rows
+    with the same column layout.
+    """
+    handle = open_text(export_csv)
+    reader = csv.reader(handle, delimiter="\t")
+    try:
+        header = next(reader)
+    except StopIteration:
+        handle.close()
+        raise ValueError(f"{export_csv} is empty")
+
+    try:
+        obs_idx = header.index("observation_uuid")
+        photo_idx = header.index("photo_uuid")
+    except ValueError as exc:
+        handle.close()
+        raise ValueError(f"{export_csv} is missing a required column: {exc}") from exc
+
+    hash_indices = [i for i, name in enumerate(header) if name not in EXCLUDED_HASH_COLUMNS]
+
+    def rows() -> Iterator[Tuple[str, str, str, List[str]]]:
+        previous = None
+        try:
+            for row in reader:
+                if not row:
+                    continue
+                obs_uuid = row[obs_idx]
+                if previous is not None and obs_uuid < previous:
+                    raise UnsortedInputError(
+                        f"{export_csv} is not sorted by observation_uuid "
+                        f"({obs_uuid} follows {previous})"
+                    )
+                previous = obs_uuid
+                yield obs_uuid, row[photo_idx], compute_row_hash(row, hash_indices), row
+        finally:
+            handle.close()
+
+    return header, rows()
+
+
+def iter_snapshot_rows(snapshot_path: Path) -> Iterator[Tuple[str, str, str]]:
+    """Stream (observation_uuid, photo_uuid, row_hash) from a snapshot file."""
+    with open_text(snapshot_path) as handle:
+        reader = csv.reader(handle, delimiter="\t")
+        header = next(reader, None)
+        if header != SNAPSHOT_HEADER:
+            raise ValueError(f"{snapshot_path} is not an export snapshot (header={header})")
+        previous = None
+        for row in reader:
+            if not row:
+                continue
+            if previous is not None and row[0] < previous:
+                raise UnsortedInputError(
+                    f"{snapshot_path} is not sorted by observation_uuid "
+                    f"({row[0]} follows {previous})"
+                )
+            previous = row[0]
+            yield row[0], row[1], row[2]
+
+
+def group_by_observation(rows: Iterator[tuple]) -> Iterator[Tuple[str, List[tuple]]]:
+    """Yield (observation_uuid, rows) groups from an observation-sorted stream."""
+    for obs_uuid, group in itertools.groupby(rows, key=lambda r: r[0]):
+        yield obs_uuid, list(group)
+
+
+def build_snapshot(
+    export_csv: Path,
+    snapshot_out: Path,
+    previous_snapshot: Optional[Path] = None,
+    added_out: Optional[Path] = None,
+    removed_out: Optional[Path] = None,
+) -> Dict[str, int]:
+    """
+    Write the snapshot for export_csv and, optionally, the diff against
+    previous_snapshot. Both inputs are consumed in a single streaming pass.
+    """
+    header, export_rows = iter_export_rows(export_csv)
+    stats = {"rows": 0, "added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+
+    snapshot_out.parent.mkdir(parents=True, exist_ok=True)
+    snap_handle = open_text(snapshot_out, "wt")
+    snap_writer = csv.writer(snap_handle, delimiter="\t", lineterminator="\n")
+    snap_writer.writerow(SNAPSHOT_HEADER)
+
+    diffing = previous_snapshot is not None
+    added_handle = removed_handle = None
+    added_writer = removed_writer = None
+    if diffing:
+        if added_out is None or removed_out is None:
+            raise ValueError("--added-out and --removed-out are required with --previous-snapshot")
+        added_handle = open_text(added_out, "wt")
+        added_writer = csv.writer(added_handle, delimiter="\t", lineterminator="\n")
+        added_writer.writerow(header)
+        removed_handle = open_text(removed_out, "wt")
+        removed_writer = csv.writer(removed_handle, delimiter="\t", lineterminator="\n")
+        removed_writer.writerow(["observation_uuid", "photo_uuid"])
+
+    try:
+        new_groups = group_by_observation(export_rows)
+        old_groups = (
+            group_by_observation(iter_snapshot_rows(previous_snapshot))
+            if diffing
+            else iter(())
+        )
+
+        new_group = next(new_groups, None)
+        old_group = next(old_groups, None)
+
+        while new_group is not None or old_group is not None:
+            if old_group is None or (new_group is not None and new_group[0] < old_group[0]):
+                # Observation only in the new export.
+                for obs_uuid, photo_uuid, row_hash, row in new_group[1]:
+                    snap_writer.writerow([obs_uuid, photo_uuid, row_hash])
+                    stats["rows"] += 1
+                    if diffing:
+                        added_writer.writerow(row)
+                        stats["added"] += 1
+                new_group = next(new_groups, None)
+
+            elif new_group is None or old_group[0] < new_group[0]:
+                # Observation dropped entirely.
+                for obs_uuid, photo_uuid, _ in old_group[1]:
+                    removed_writer.writerow([obs_uuid, photo_uuid])
+                    stats["removed"] += 1
+                old_group = next(old_groups, None)
+
+            else:
+                # Same observation on both sides: compare photo by photo.
+                old_hashes = {photo_uuid: row_hash for _, photo_uuid, row_hash in old_group[1]}
+                for obs_uuid, photo_uuid, row_hash, row in new_group[1]:
+                    snap_writer.writerow([obs_uuid, photo_uuid, row_hash])
+                    stats["rows"] += 1
+                    previous_hash = old_hashes.pop(photo_uuid, None)
+                    if previous_hash is None:
+                        added_writer.writerow(row)
+                        stats["added"] += 1
+                    elif previous_hash != row_hash:
+                        added_writer.writerow(row)
+                        stats["changed"] += 1
+                    else:
+                        stats["unchanged"] += 1
+                for photo_uuid in old_hashes:
+                    removed_writer.writerow([old_group[0], photo_uuid])
+                    stats["removed"] += 1
+                new_group = next(new_groups, None)
+                old_group = next(old_groups, None)
+    finally:
+        snap_handle.close()
+        if added_handle:
+            added_handle.close()
+        if removed_handle:
+            removed_handle.close()
+
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Write an export snapshot index and optional incremental diff."
+    )
+    parser.add_argument("--export-csv", type=Path, required=True,
+                        help="Tab-delimited <EXPORT_GROUP>_photos.csv")
+    parser.add_argument("--snapshot-out", type=Path, required=True,
+                        help="Snapshot output path (.tsv or .tsv.gz)")
+    parser.add_argument("--previous-snapshot", type=Path,
+                        help="Snapshot of the previous export to diff against")
+    parser.add_argument("--added-out", type=Path,
+                        help="Rows new or changed since the previous snapshot")
+    parser.add_argument("--removed-out", type=Path,
+                        help="Keys present in the previous snapshot but not this export")
+    args = parser.parse_args()
+
+    if not args.export_csv.exists():
+        print(f"Error: export CSV not found: {args.export_csv}")
+        return 1
+    if args.previous_snapshot and not args.previous_snapshot.exists():
+        print(f"Error: previous snapshot not found: {args.previous_snapshot}")
+        return 1
+
+    try:
+        stats = build_snapshot(
+            args.export_csv,
+            args.snapshot_out,
+            previous_snapshot=args.previous_snapshot,
+            added_out=args.added_out,
+            removed_out=args.removed_out,
+        )
+    except (UnsortedInputError, ValueError) as exc:
+        print(f"Error: {exc}")
+        return 1
+
+    print(f"Snapshot rows: {stats['rows']}")
+    print(f"Snapshot written to {args.snapshot_out}")
+    if args.previous_snapshot:
+        print(f"Added: {stats['added']}")
+        print(f"Changed: {stats['changed']}")
+        print(f"Removed: {stats['removed']}")
+        print(f"Unchanged: {stats['unchanged']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
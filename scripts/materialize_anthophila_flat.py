@@ -14,21 +14,40 @@ Usage:
 """
 
 import argparse
+import errno
+import fcntl
+import hashlib
+import io
 import json
 import os
 import shutil
+import sys
 import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
+import numpy as np
 import pandas as pd
 import psycopg2
 from psycopg2.extras import RealDictCursor, execute_values
 from tqdm import tqdm
 
+try:
+    import orjson
+except ImportError:  # optional: pip install ibridaDB[anthophila]
+    orjson = None
+
 OBSERVATION_UUID_NAMESPACE = uuid.UUID("6f1d9c3a-84e5-4c6a-9a53-46b773a1d57c")
 
+
+def dumps_json(obj) -> str:
+    """Serialize to a JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
 def connect_to_database(connection_string: str):
     """Connect to PostgreSQL database."""
     try:
@@ -88,63 +107,58 @@ def get_column_type(conn, table_name: str, column_name: str) -> str:
         row = cursor.fetchone()
         return row["data_type"] if row else ""
 
+def uuid5_column(names: List[str], namespace: uuid.UUID = OBSERVATION_UUID_NAMESPACE) -> List[str]:
+    """
+    uuid.uuid5(namespace, name) for a whole column of names.
+
+    Hashes the namespace prefix once and copies the SHA-1 state per name,
+    instead of building a UUID object per row. Output is identical to
+    str(uuid.uuid5(namespace, name)).
+    """
+    base = hashlib.sha1(namespace.bytes)
+    out = []
+    for name in names:
+        h = base.copy()
+        h.update(name.encode("utf-8"))
+        raw = bytearray(h.digest()[:16])
+        raw[6] = (raw[6] & 0x0F) | 0x50  # version 5
+        raw[8] = (raw[8] & 0x3F) | 0x80  # RFC 4122 variant
+        hx = raw.hex()
+        out.append(f"{hx[:8]}-{hx[8:12]}-{hx[12:16]}-{hx[16:20]}-{hx[20:]}")
+    return out
+
 def add_observation_keys(kept_df: pd.DataFrame) -> pd.DataFrame:
     """Assign deterministic observation_uuid based on name+id_core or asset_uuid."""
-    obs_keys = []
-    obs_uuids = []
-
-    for _, row in kept_df.iterrows():
-        id_core = row.get("id_core", "")
-        scientific_name = str(row.get("scientific_name_norm", "")).strip()
-        if not scientific_name:
-            raise ValueError("scientific_name_norm missing or empty; cannot build observation_key safely")
-        obs_key = None
-        if pd.notna(id_core) and str(id_core).strip() != "":
-            try:
-                obs_key = f"name:{scientific_name}|id:{int(float(id_core))}"
-            except Exception:
-                obs_key = f"asset:{row['asset_uuid']}"
-        else:
-            obs_key = f"asset:{row['asset_uuid']}"
+    scientific_names = kept_df["scientific_name_norm"].fillna("").astype(str).str.strip()
+    if (scientific_names == "").any():
+        raise ValueError("scientific_name_norm missing or empty; cannot build observation_key safely")
 
-        obs_uuid = str(uuid.uuid5(OBSERVATION_UUID_NAMESPACE, obs_key))
-        obs_keys.append(obs_key)
-        obs_uuids.append(obs_uuid)
+    id_core = np.trunc(pd.to_numeric(kept_df["id_core"], errors="coerce"))
+    has_id = id_core.notna()
+    id_text = id_core.where(has_id, 0).astype("int64").astype(str)
+    name_keys = "name:" + scientific_names + "|id:" + id_text
+    asset_keys = "asset:" + kept_df["asset_uuid"].astype(str)
+    obs_keys = name_keys.where(has_id, asset_keys)
 
     kept_df = kept_df.copy()
     kept_df["observation_key"] = obs_keys
-    kept_df["observation_uuid"] = obs_uuids
+    kept_df["observation_uuid"] = uuid5_column(obs_keys.tolist())
 
     # Sanity check: prevent cross-taxon merges
-    if "scientific_name_norm" in kept_df.columns:
-        collisions = (
-            kept_df.groupby("observation_key")["scientific_name_norm"]
-            .nunique()
-            .reset_index()
+    collisions = kept_df.groupby("observation_key")["scientific_name_norm"].nunique()
+    bad_keys = collisions[collisions > 1].index
+    if len(bad_keys):
+        sample_keys = list(bad_keys[:5])
+        sample_rows = kept_df[kept_df["observation_key"].isin(sample_keys)][
+            ["observation_key", "scientific_name_norm"]
+        ].drop_duplicates()
+        raise ValueError(
+            "Observation key collision across taxa detected; aborting.\n"
+            f"Sample:\n{sample_rows.to_string(index=False)}"
         )
-        bad = collisions[collisions["scientific_name_norm"] > 1]
-        if not bad.empty:
-            sample_keys = bad["observation_key"].head(5).tolist()
-            sample_rows = kept_df[kept_df["observation_key"].isin(sample_keys)][
-                ["observation_key", "scientific_name_norm"]
-            ].drop_duplicates()
-            raise ValueError(
-                "Observation key collision across taxa detected; aborting.\n"
-                f"Sample:\n{sample_rows.to_string(index=False)}"
-            )
 
     return kept_df
 
-def safe_int(value):
-    try:
-        if value is None:
-            return None
-        if isinstance(value, str) and value.strip() == "":
-            return None
-        return int(float(value))
-    except Exception:
-        return None
-
 def parse_phash_64(value):
     """Parse a hex pHash string into signed int64 for PostgreSQL BIGINT storage."""
     if value is None:
@@ -285,6 +299,32 @@ def fetch_media_id_map(db_conn, sha256_list: List[str]) -> Dict[str, int]:
         )
         return {row["sha256_hex"]: row["media_id"] for row in cursor.fetchall()}
 
+def copy_dataframe(cursor, table_name: str, df: pd.DataFrame):
+    """COPY a DataFrame into an existing table (CSV, \\N as NULL so '' stays '')."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table_name} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer,
+    )
+
+def text_column(df: pd.DataFrame, column: str, default: str = "") -> pd.Series:
+    """String column with missing values (or a missing column) as `default`."""
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[column].where(df[column].notna(), default).astype(str)
+
+def int_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """Nullable Int64 column; unparseable values become <NA>."""
+    if column not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype="Int64")
+    return np.trunc(pd.to_numeric(df[column], errors="coerce")).astype("Int64")
+
+def int_values(series: pd.Series) -> List[Optional[int]]:
+    """Python ints/None from a nullable Int64 series (JSON-encoder friendly)."""
+    return [None if pd.isna(v) else int(v) for v in series.tolist()]
+
 def insert_observation_media(
     kept_df: pd.DataFrame,
     media_id_map: Dict[str, int],
@@ -307,171 +347,294 @@ def insert_observation_media(
         print("Warning: observation_media table not found; skipping observation_media insert")
         return 0
 
-    obs_uuid_type = get_column_type(db_conn, "observations", "observation_uuid")
-    any_param = "%s::uuid[]" if obs_uuid_type == "uuid" else "%s"
-    candidate_obs_uuids = sorted({str(value) for value in kept_df["observation_uuid"].dropna().tolist()})
-    existing_obs_uuids = set()
-    if candidate_obs_uuids:
-        with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(
-                f"SELECT observation_uuid FROM observations WHERE observation_uuid = ANY({any_param})",
-                (candidate_obs_uuids,),
-            )
-            existing_obs_uuids = {
-                str(row["observation_uuid"])
-                for row in cursor.fetchall()
-                if row.get("observation_uuid") is not None
-            }
-
-    records = []
-    seen = set()
-    skipped_missing_observation = 0
-    for _, row in kept_df.iterrows():
-        sha256 = row.get("sha256", "")
-        media_id = media_id_map.get(sha256)
-        if not media_id:
-            continue
-        obs_uuid = str(row["observation_uuid"])
-        if obs_uuid not in existing_obs_uuids:
-            skipped_missing_observation += 1
-            continue
-        key = (obs_uuid, media_id)
-        if key in seen:
-            continue
-        seen.add(key)
-        records.append((obs_uuid, media_id, role))
-
-    if not records:
+    links = pd.DataFrame({
+        "observation_uuid": kept_df["observation_uuid"].astype(str),
+        "media_id": kept_df["sha256"].map(media_id_map),
+    })
+    links = links[links["media_id"].notna()].drop_duplicates()
+    if links.empty:
         return 0
+    links["media_id"] = links["media_id"].astype("int64")
+    links["role"] = role
 
+    obs_uuid_type = "UUID" if get_column_type(db_conn, "observations", "observation_uuid") == "uuid" else "TEXT"
     with db_conn.cursor() as cursor:
-        execute_values(
-            cursor,
-            "INSERT INTO observation_media (observation_uuid, media_id, role) VALUES %s ON CONFLICT DO NOTHING",
-            records,
-        )
+        cursor.execute(f"""
+            CREATE TEMP TABLE observation_media_stage (
+                observation_uuid {obs_uuid_type},
+                media_id BIGINT,
+                role VARCHAR(32)
+            ) ON COMMIT DROP
+        """)
+        copy_dataframe(cursor, "observation_media_stage", links)
+        # Only link observations that exist (FK target); count the rest.
+        cursor.execute("""
+            SELECT COUNT(*) FROM observation_media_stage s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM observations o WHERE o.observation_uuid = s.observation_uuid
+            )
+        """)
+        skipped_missing_observation = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO observation_media (observation_uuid, media_id, role)
+            SELECT s.observation_uuid, s.media_id, s.role
+            FROM observation_media_stage s
+            WHERE EXISTS (
+                SELECT 1 FROM observations o WHERE o.observation_uuid = s.observation_uuid
+            )
+            ON CONFLICT DO NOTHING
+        """)
+        inserted = cursor.rowcount
     db_conn.commit()
     if skipped_missing_observation:
         print(
             f"Skipped {skipped_missing_observation} observation_media candidate rows "
             "because observation_uuid was not present in observations"
         )
-    print(f"Inserted {len(records)} observation_media rows")
-    return len(records)
-
-def create_sidecar_metadata(
-    row: pd.Series,
-    observation_uuid: str,
-    obs_key: str,
-    remote_key: str = "",
-    remote_uri: str = "",
-) -> Dict:
-    """Create sidecar JSONB metadata for media table."""
-    taxon_id = None
-    id_core = None
-    id_suffix = None
-
-    try:
-        if pd.notna(row.get('taxon_id')):
-            taxon_id = int(row['taxon_id'])
-    except Exception:
-        taxon_id = None
+    print(f"Inserted {inserted} observation_media rows")
+    return inserted
+
+def build_sidecars(
+    media_df: pd.DataFrame,
+    remote_keys: pd.Series,
+    remote_uris: pd.Series,
+) -> List[str]:
+    """
+    Build the media.sidecar JSON payload for every row, column-wise.
+
+    Columns are normalized once (missing text -> '', unparseable ints -> null)
+    and zipped into dicts; serialization uses orjson when installed.
+    """
+    columns = {
+        "original_path": text_column(media_df, "original_path").tolist(),
+        "original_filename": text_column(media_df, "original_filename").tolist(),
+        "source_tag": text_column(media_df, "source_tag").tolist(),
+        "sha256": text_column(media_df, "sha256").tolist(),
+        "phash": text_column(media_df, "phash").tolist(),
+        "scientific_name_norm": text_column(media_df, "scientific_name_norm").tolist(),
+        "taxon_id": int_values(int_column(media_df, "taxon_id")),
+        "width": int_values(int_column(media_df, "width")),
+        "height": int_values(int_column(media_df, "height")),
+        "file_bytes": int_values(int_column(media_df, "file_bytes")),
+        "id_core": int_values(int_column(media_df, "id_core")),
+        "id_suffix": int_values(int_column(media_df, "id_suffix")),
+        "id_type_guess": text_column(media_df, "id_type_guess").tolist(),
+        "observation_uuid": text_column(media_df, "observation_uuid").tolist(),
+        "observation_key": text_column(media_df, "observation_key").tolist(),
+    }
+    keys = list(columns)
+    sidecars = []
+    for values, remote_key, remote_uri in zip(
+        zip(*columns.values()), remote_keys.tolist(), remote_uris.tolist()
+    ):
+        sidecar = dict(zip(keys, values))
+        if remote_key:
+            sidecar["remote_key"] = remote_key
+        if remote_uri:
+            sidecar["remote_uri"] = remote_uri
+        sidecars.append(dumps_json(sidecar))
+    return sidecars
+
+LINK_STRATEGIES = ("auto", "hardlink", "reflink", "copy_file_range", "copy")
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+
+class StrategyUnsupported(OSError):
+    """Raised when a link/copy strategy is not available for this source/target pair."""
+
+
+def _reflink(src: Path, dst: Path):
+    if not hasattr(fcntl, "ioctl") or sys.platform != "linux":
+        raise StrategyUnsupported("reflink requires Linux FICLONE")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError as e:
+            if e.errno in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY):
+                raise StrategyUnsupported(str(e)) from e
+            raise
+
+
+def _copy_file_range(src: Path, dst: Path):
+    if not hasattr(os, "copy_file_range"):
+        raise StrategyUnsupported("os.copy_file_range unavailable")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            try:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            except OSError as e:
+                if e.errno in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+                    raise StrategyUnsupported(str(e)) from e
+                raise
+            if copied == 0:
+                break
+            remaining -= copied
+
+
+def _copy(src: Path, dst: Path):
+    shutil.copyfile(src, dst)
+
+
+_COPY_FUNCS = {
+    "reflink": _reflink,
+    "copy_file_range": _copy_file_range,
+    "copy": _copy,
+}
+
+
+class FileMaterializer:
+    """
+    Place one file into the flat directory using the configured strategy.
+
+    Hardlinks are atomic. Every copy-style strategy writes to a hidden
+    ".<name>.partial" file and renames it into place, so an interrupted run
+    never leaves a truncated file under its final name. With strategy "auto",
+    strategies are tried in order hardlink -> reflink -> copy_file_range ->
+    copy, and any strategy found unsupported is skipped for the rest of the run.
+    """
+
+    def __init__(self, strategy: str):
+        if strategy not in LINK_STRATEGIES:
+            raise ValueError(f"Unknown link strategy: {strategy}")
+        if strategy == "auto":
+            self.chain = ["hardlink", "reflink", "copy_file_range", "copy"]
+        elif strategy == "copy":
+            self.chain = ["copy"]
+        else:
+            # Explicit strategies still fall back to a plain copy, as the
+            # hardlink path always has.
+            self.chain = [strategy, "copy"]
+        self.unsupported: Set[str] = set()
+
+    def materialize(self, src: Path, dst: Path) -> str:
+        """Create dst from src; returns the strategy that succeeded."""
+        last_error: Optional[Exception] = None
+        for method in self.chain:
+            if method in self.unsupported:
+                continue
+            try:
+                if method == "hardlink":
+                    self._hardlink(src, dst)
+                else:
+                    self._copy_atomic(_COPY_FUNCS[method], src, dst)
+                return method
+            except StrategyUnsupported as e:
+                self.unsupported.add(method)
+                last_error = e
+        raise last_error or OSError(f"No usable strategy for {src}")
+
+    @staticmethod
+    def _hardlink(src: Path, dst: Path):
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            raise
+        except OSError as e:
+            if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP):
+                raise StrategyUnsupported(str(e)) from e
+            raise
+
+    @staticmethod
+    def _copy_atomic(copy_func, src: Path, dst: Path):
+        tmp = dst.with_name(f".{dst.name}.partial")
+        try:
+            copy_func(src, tmp)
+            shutil.copystat(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
 
-    try:
-        if pd.notna(row.get('id_core')):
-            id_core = int(float(row['id_core']))
-    except Exception:
-        id_core = None
 
-    try:
-        if pd.notna(row.get('id_suffix')):
-            id_suffix = int(float(row['id_suffix']))
-    except Exception:
-        id_suffix = None
-
-    sidecar = {
-        "original_path": row['original_path'],
-        "original_filename": row.get('original_filename', ''),
-        "source_tag": row.get('source_tag', ''),
-        "sha256": row.get('sha256', ''),
-        "phash": row.get('phash', ''),
-        "scientific_name_norm": row.get('scientific_name_norm', ''),
-        "taxon_id": taxon_id,
-        "width": safe_int(row.get('width')),
-        "height": safe_int(row.get('height')),
-        "file_bytes": safe_int(row.get('file_bytes')),
-        "id_core": id_core,
-        "id_suffix": id_suffix,
-        "id_type_guess": row.get('id_type_guess', ''),
-        "observation_uuid": observation_uuid,
-        "observation_key": obs_key,
-    }
-    if remote_key:
-        sidecar["remote_key"] = remote_key
-    if remote_uri:
-        sidecar["remote_uri"] = remote_uri
-    return sidecar
-
-def materialize_files(kept_df: pd.DataFrame, flat_dir: Path, use_hardlinks: bool = True):
-    """Copy or hardlink files to flat directory."""
-    
+def materialize_files(
+    kept_df: pd.DataFrame,
+    flat_dir: Path,
+    strategy: str = "auto",
+    workers: int = 16,
+):
+    """
+    Hardlink/reflink/copy kept files into the flat directory in parallel.
+
+    Existing targets are detected from a single directory listing rather than
+    an exists() probe per file. Targets only appear under their final name
+    once complete (temp file + rename), so a rerun after an interruption only
+    schedules files that are not already present.
+    """
     materialized_files = []
     failed_files = []
-    created_count = 0
-    existing_count = 0
-    
+    method_counts: Dict[str, int] = defaultdict(int)
+
     print(f"Materializing {len(kept_df)} files to {flat_dir}")
-    print(f"Using {'hardlinks' if use_hardlinks else 'copies'}")
-    
-    for _, row in tqdm(kept_df.iterrows(), total=len(kept_df), desc="Materializing"):
-        original_path = Path(row['original_path'])
-        flat_name = row['flat_name']
-        target_path = flat_dir / flat_name
-        
+    print(f"Strategy: {strategy}, workers: {workers}")
+
+    present_names = {entry.name for entry in os.scandir(flat_dir)}
+
+    def record(asset_uuid: str, original_path: str, flat_name: str):
+        materialized_files.append({
+            'asset_uuid': asset_uuid,
+            'original_path': original_path,
+            'flat_path': str(flat_dir / flat_name),
+            'flat_name': flat_name,
+        })
+
+    pending = []
+    existing_count = 0
+    for asset_uuid, original_path, flat_name in zip(
+        kept_df['asset_uuid'], kept_df['original_path'], kept_df['flat_name']
+    ):
+        if flat_name in present_names:
+            existing_count += 1
+            record(asset_uuid, str(original_path), flat_name)
+        else:
+            pending.append((asset_uuid, str(original_path), flat_name))
+
+    print(f"Already present: {existing_count}; to materialize: {len(pending)}")
+
+    materializer = FileMaterializer(strategy)
+
+    def work(item):
+        asset_uuid, original_path, flat_name = item
         try:
-            if not original_path.exists():
+            method = materializer.materialize(Path(original_path), flat_dir / flat_name)
+        except FileExistsError:
+            # Same flat_name scheduled twice (identical sha256) or a concurrent run.
+            method = "existing"
+        return item, method
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(work, item): item for item in pending}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Materializing"):
+            asset_uuid, original_path, flat_name = futures[future]
+            try:
+                _, method = future.result()
+            except FileNotFoundError:
                 print(f"Warning: Original file not found: {original_path}")
-                failed_files.append(row['asset_uuid'])
+                failed_files.append(asset_uuid)
                 continue
-                
-            if target_path.exists():
-                existing_count += 1
-                materialized_files.append({
-                    'asset_uuid': row['asset_uuid'],
-                    'original_path': str(original_path),
-                    'flat_path': str(target_path),
-                    'flat_name': flat_name
-                })
+            except Exception as e:
+                print(f"Error materializing {original_path}: {e}")
+                failed_files.append(asset_uuid)
                 continue
-            
-            if use_hardlinks:
-                try:
-                    os.link(str(original_path), str(target_path))
-                except OSError as e:
-                    # Fallback to copy if hardlink fails (different filesystems)
-                    print(f"Hardlink failed, copying instead: {e}")
-                    shutil.copy2(str(original_path), str(target_path))
-            else:
-                shutil.copy2(str(original_path), str(target_path))
-            
-            materialized_files.append({
-                'asset_uuid': row['asset_uuid'],
-                'original_path': str(original_path),
-                'flat_path': str(target_path),
-                'flat_name': flat_name
-            })
-            created_count += 1
-            
-        except Exception as e:
-            print(f"Error materializing {original_path}: {e}")
-            failed_files.append(row['asset_uuid'])
-    
+
+            method_counts[method] += 1
+            record(asset_uuid, original_path, flat_name)
+
+    created_count = sum(count for method, count in method_counts.items() if method != "existing")
+    breakdown = ", ".join(f"{method}={count}" for method, count in sorted(method_counts.items()))
     print(
         "Materialization complete: "
         f"{len(materialized_files)} ready "
         f"({created_count} created, {existing_count} already present), "
         f"{len(failed_files)} failed"
     )
+    if breakdown:
+        print(f"Methods used: {breakdown}")
+    if materializer.unsupported:
+        print(f"Unsupported on this filesystem: {', '.join(sorted(materializer.unsupported))}")
     return materialized_files, failed_files
 
 def insert_media_records(
@@ -484,78 +647,79 @@ def insert_media_records(
     remote_key_prefix: str = "",
     remote_uri_prefix: str = "",
 ):
-    """Insert media records into database."""
+    """Insert media records into database (columnar build + COPY + one upsert)."""
     
     print(f"Inserting {len(materialized_files)} media records...")
     
-    # Create mapping of asset_uuid to materialized file info
-    materialized_map = {f['asset_uuid']: f for f in materialized_files}
-    
-    # Prepare insert data
-    insert_data = []
-    
-    for _, row in kept_df.iterrows():
-        if row['asset_uuid'] not in materialized_map:
-            continue  # Skip files that failed to materialize
-            
-        mat_file = materialized_map[row['asset_uuid']]
-        
-        # Create file:// URI
-        file_uri = f"file://{mat_file['flat_path']}"
-        
-        remote_key = ""
-        remote_uri = ""
-        flat_name = mat_file["flat_name"]
-        if remote_key_prefix:
-            remote_key = f"{remote_key_prefix.rstrip('/')}/{flat_name}"
-        if remote_uri_prefix:
-            base = remote_uri_prefix.rstrip("/")
-            key_part = remote_key if remote_key else flat_name
-            remote_uri = f"{base}/{key_part}"
-
-        # Create sidecar metadata
-        sidecar = create_sidecar_metadata(
-            row,
-            row["observation_uuid"],
-            row["observation_key"],
-            remote_key=remote_key,
-            remote_uri=remote_uri,
-        )
-
-        phash_64 = parse_phash_64(row.get("phash"))
-        
-        media_record = {
-            'dataset': dataset,
-            'release': release,
-            'source_tag': row.get('source_tag', ''),
-            'uri': file_uri,
-            'license': row.get('license_guess', 'unknown'),
-            'sha256_hex': row.get('sha256', ''),
-            'phash_64': phash_64,
-            'width_px': safe_int(row.get('width')),
-            'height_px': safe_int(row.get('height')),
-            'mime_type': 'image/jpeg',
-            'file_bytes': safe_int(row.get('file_bytes')),
-            'sidecar': json.dumps(sidecar),
-        }
-        
-        insert_data.append(media_record)
-    
-    if not insert_data:
+    # Skip files that failed to materialize; the materialized path/name win over
+    # any manifest columns of the same name (a merge would suffix both).
+    materialized_df = pd.DataFrame(materialized_files, columns=["asset_uuid", "flat_path", "flat_name"])
+    media_df = kept_df.drop(columns=["flat_path", "flat_name"], errors="ignore").merge(
+        materialized_df, on="asset_uuid", how="inner"
+    )
+    if media_df.empty:
         print("No records to insert")
         return 0
-    
-    # Batch insert into media table
+
+    flat_names = media_df["flat_name"].astype(str)
+    remote_keys = pd.Series("", index=media_df.index, dtype=object)
+    remote_uris = pd.Series("", index=media_df.index, dtype=object)
+    if remote_key_prefix:
+        remote_keys = f"{remote_key_prefix.rstrip('/')}/" + flat_names
+    if remote_uri_prefix:
+        key_part = remote_keys if remote_key_prefix else flat_names
+        remote_uris = f"{remote_uri_prefix.rstrip('/')}/" + key_part
+
+    stage_df = pd.DataFrame({
+        "dataset": dataset,
+        "release": release,
+        "source_tag": text_column(media_df, "source_tag"),
+        "uri": "file://" + media_df["flat_path"].astype(str),
+        "license": text_column(media_df, "license_guess", default="unknown"),
+        "sha256_hex": text_column(media_df, "sha256"),
+        "phash_64": pd.Series(
+            [parse_phash_64(v) for v in media_df["phash"].tolist()] if "phash" in media_df.columns
+            else [None] * len(media_df),
+            index=media_df.index,
+            dtype=object,
+        ),
+        "width_px": int_column(media_df, "width"),
+        "height_px": int_column(media_df, "height"),
+        "mime_type": "image/jpeg",
+        "file_bytes": int_column(media_df, "file_bytes"),
+        "sidecar": build_sidecars(media_df, remote_keys, remote_uris),
+    })
+
     with db_conn.cursor() as cursor:
-        insert_query = """
+        cursor.execute("""
+            CREATE TEMP TABLE media_stage (
+                dataset VARCHAR(64),
+                release VARCHAR(16),
+                source_tag VARCHAR(128),
+                uri TEXT,
+                license VARCHAR(128),
+                sha256_hex CHAR(64),
+                phash_64 BIGINT,
+                width_px INTEGER,
+                height_px INTEGER,
+                mime_type VARCHAR(64),
+                file_bytes BIGINT,
+                sidecar JSONB
+            ) ON COMMIT DROP
+        """)
+        copy_dataframe(cursor, "media_stage", stage_df)
+
+        # DISTINCT ON: an upsert may not touch the same sha256 twice per statement.
+        cursor.execute("""
         INSERT INTO media (
             dataset, release, source_tag, uri, license,
             sha256_hex, phash_64, width_px, height_px, mime_type, file_bytes, sidecar
         )
-        VALUES (
-            %(dataset)s, %(release)s, %(source_tag)s, %(uri)s, %(license)s,
-            %(sha256_hex)s, %(phash_64)s, %(width_px)s, %(height_px)s, %(mime_type)s, %(file_bytes)s, %(sidecar)s
-        )
+        SELECT DISTINCT ON (sha256_hex)
+            dataset, release, source_tag, uri, license,
+            sha256_hex, phash_64, width_px, height_px, mime_type, file_bytes, sidecar
+        FROM media_stage
+        ORDER BY sha256_hex, uri
         ON CONFLICT (sha256_hex) DO UPDATE SET
             dataset = EXCLUDED.dataset,
             release = EXCLUDED.release,
@@ -568,12 +732,9 @@ def insert_media_records(
             mime_type = EXCLUDED.mime_type,
             file_bytes = EXCLUDED.file_bytes,
             sidecar = EXCLUDED.sidecar
-        """
-        
-        cursor.executemany(insert_query, insert_data)
-        db_conn.commit()
-        
+        """)
         inserted_count = cursor.rowcount
+    db_conn.commit()
     
     print(f"Inserted/updated {inserted_count} media records")
     return inserted_count
@@ -657,7 +818,19 @@ def main():
     parser.add_argument(
         "--use-copies",
         action="store_true",
-        help="Use file copies instead of hardlinks"
+        help="Use file copies instead of hardlinks (same as --link-strategy copy)"
+    )
+    parser.add_argument(
+        "--link-strategy",
+        choices=LINK_STRATEGIES,
+        default="auto",
+        help="How to place files: auto tries hardlink, reflink, copy_file_range, then copy (default: auto)"
+    )
+    parser.add_argument(
+        "--materialize-workers",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) * 4),
+        help="Threads used for linking/copying files"
     )
     
     args = parser.parse_args()
@@ -691,9 +864,12 @@ def main():
         create_flat_directory(flat_dir)
         
         # Materialize files
-        use_hardlinks = not args.use_copies
+        strategy = "copy" if args.use_copies else args.link_strategy
         materialized_files, failed_files = materialize_files(
-            kept_df, flat_dir, use_hardlinks
+            kept_df,
+            flat_dir,
+            strategy=strategy,
+            workers=args.materialize_workers,
         )
         
         if not materialized_files:
@@ -0,0 +1,56 @@
+"""
+Dataset-agnostic media ingest: adapter -> hash -> dedup -> resolve ->
+materialize -> register, streamed over Arrow record batches.
+
+This generalizes the anthophila CSV pipeline (build_anthophila_manifest.py,
+deduplicate_anthophila.py, resolve_anthophila_taxa.py,
+materialize_anthophila_flat.py) and reuses their per-record logic. The stage
+order and output tables are the same; what changes is that stages share one
+in-memory typed manifest (schema.MANIFEST_SCHEMA) instead of re-reading CSVs,
+and every batch is checkpointed per stage so interrupted runs resume.
+
+New datasets plug in through a directory-layout adapter (adapters.py).
+
+Run as a module from the repository root:
+  uv run python3 -m scripts.media_ingest --adapter anthophila \
+    --root /datasets/dataZoo/anthophila --workdir /tmp/anthophila_ingest \
+    --flat-dir /datasets/ibrida-data/media/anthophila/r2/flat
+"""
+
+from .adapters import (
+    ADAPTERS,
+    AnthophilaAdapter,
+    DatasetAdapter,
+    TaxonDirectoryAdapter,
+    available_adapters,
+    get_adapter,
+    register_adapter,
+)
+from .pipeline import Pipeline
+from .schema import MANIFEST_SCHEMA
+from .stages import (
+    DedupStage,
+    HashStage,
+    MaterializeStage,
+    RegisterStage,
+    ResolveStage,
+    Stage,
+)
+
+__all__ = [
+    "ADAPTERS",
+    "AnthophilaAdapter",
+    "DatasetAdapter",
+    "DedupStage",
+    "HashStage",
+    "MANIFEST_SCHEMA",
+    "MaterializeStage",
+    "Pipeline",
+    "RegisterStage",
+    "ResolveStage",
+    "Stage",
+    "TaxonDirectoryAdapter",
+    "available_adapters",
+    "get_adapter",
+    "register_adapter",
+]
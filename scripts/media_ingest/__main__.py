@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""CLI for the generic media ingest pipeline (python -m scripts.media_ingest)."""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import psycopg2
+
+from scripts.materialize_anthophila_flat import LINK_STRATEGIES
+
+from .adapters import available_adapters, get_adapter
+from .pipeline import Pipeline
+from .stages import DedupStage, HashStage, MaterializeStage, RegisterStage, ResolveStage
+
+STAGE_ORDER = ["hash", "dedup", "resolve", "materialize", "register"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stream a media dataset into ibridaDB")
+    parser.add_argument("--adapter", required=True, choices=available_adapters(),
+                        help="Directory-layout adapter for the dataset")
+    parser.add_argument("--root", required=True, help="Dataset root directory")
+    parser.add_argument("--dataset", help="Dataset label (default: adapter name)")
+    parser.add_argument("--workdir", required=True,
+                        help="Checkpoint directory; reuse it to resume an interrupted run")
+    parser.add_argument("--flat-dir", help="Flat media directory (required for materialize)")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Rows per record batch")
+    parser.add_argument("--hash-workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes for hashing/pHash")
+    parser.add_argument("--phash-full-decode", action="store_true",
+                        help="Full-resolution decode for pHash (see build_anthophila_manifest.py)")
+    parser.add_argument("--link-strategy", choices=LINK_STRATEGIES, default="auto")
+    parser.add_argument("--materialize-workers", type=int, default=16)
+    parser.add_argument("--stop-after", choices=STAGE_ORDER, default="register",
+                        help="Last stage to run (e.g. 'dedup' for a dry look at duplicates)")
+    parser.add_argument("--skip-photo-id-check", action="store_true",
+                        help="Do not match filename IDs against photos.photo_id")
+    parser.add_argument("--origin", help="Origin tag for observations (default: dataset)")
+    parser.add_argument("--version", default="v0", help="Version tag for observations")
+    parser.add_argument("--release", default="r2", help="Release tag for observations/media")
+    parser.add_argument("--remote-key-prefix", default="")
+    parser.add_argument("--remote-uri-prefix", default="")
+    parser.add_argument(
+        "--db-connection",
+        default=os.getenv("IBRIDADB_DSN", "postgresql://postgres@localhost/ibrida-v0"),
+        help="PostgreSQL connection string (prefer env/.pgpass over inline passwords)",
+    )
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    if not root.is_dir():
+        print(f"Error: dataset root not found: {root}")
+        return 1
+    last_stage = STAGE_ORDER.index(args.stop_after)
+    if last_stage >= STAGE_ORDER.index("materialize") and not args.flat_dir:
+        print("Error: --flat-dir is required for the materialize/register stages")
+        return 1
+
+    adapter = get_adapter(args.adapter, root, dataset=args.dataset)
+
+    try:
+        db_conn = psycopg2.connect(args.db_connection)
+    except psycopg2.Error as e:
+        print(f"Error connecting to database: {e}")
+        return 1
+
+    try:
+        stages = [
+            HashStage(workers=args.hash_workers, phash_draft=not args.phash_full_decode),
+            DedupStage(db_conn, check_photo_ids=not args.skip_photo_id_check),
+            ResolveStage(db_conn),
+            MaterializeStage(Path(args.flat_dir), args.link_strategy, args.materialize_workers)
+            if last_stage >= STAGE_ORDER.index("materialize") else None,
+            RegisterStage(
+                db_conn,
+                origin=args.origin or adapter.dataset,
+                version=args.version,
+                release=args.release,
+                remote_key_prefix=args.remote_key_prefix,
+                remote_uri_prefix=args.remote_uri_prefix,
+            ) if last_stage >= STAGE_ORDER.index("register") else None,
+        ][: last_stage + 1]
+
+        print(f"==> Ingesting {adapter.dataset} from {root} via adapter '{args.adapter}'")
+        print(f"    Stages: {' -> '.join(s.name for s in stages)}")
+        print(f"    Workdir: {args.workdir}  Batch size: {args.batch_size}")
+
+        pipeline = Pipeline(adapter, stages, Path(args.workdir), batch_size=args.batch_size)
+        summary = pipeline.run()
+    finally:
+        db_conn.close()
+
+    print("\n=== MEDIA INGEST SUMMARY ===")
+    print(f"Rows: {summary['rows']} in {summary['batches']} batches "
+          f"({summary['resumed_batches']} fully resumed from checkpoints)")
+    print(f"Kept after dedup: {summary['kept']}")
+    for name, secs in summary["stage_secs"].items():
+        print(f"  {name}: {secs}s")
+    if "register" in summary["stage_secs"]:
+        for table, count in stages[-1].totals.items():
+            print(f"  inserted {table}: {count}")
+    print(f"Elapsed: {summary['elapsed_secs']}s (summary.json in {args.workdir})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
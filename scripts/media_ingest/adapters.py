@@ -0,0 +1,146 @@
+"""
+Directory-layout adapters: turn a dataset's on-disk layout into manifest rows.
+
+An adapter only describes *where files are and what their layout says about
+them* (taxon name from the directory, IDs from the filename, provenance tag).
+Hashing, dedup, taxon resolution, materialization and registration are shared
+stages, so a new dataset needs only a new adapter class registered in
+ADAPTERS.
+
+Adapters must yield files in a deterministic order: the pipeline numbers
+batches by position, and resume relies on the same file landing in the same
+batch on every run.
+"""
+
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Type
+
+from scripts.build_anthophila_manifest import (
+    collect_image_files,
+    extract_id_from_filename,
+    guess_rank,
+    normalize_scientific_name,
+)
+
+
+def asset_row_namespace(dataset: str) -> uuid.UUID:
+    """Per-dataset namespace for asset_row_uuid (path-derived)."""
+    return uuid.uuid5(uuid.NAMESPACE_DNS, f"polli/{dataset}/asset-row")
+
+
+def asset_namespace(dataset: str) -> uuid.UUID:
+    """Per-dataset namespace for asset_uuid (sha256-derived)."""
+    return uuid.uuid5(uuid.NAMESPACE_DNS, f"polli/{dataset}/asset")
+
+
+class DatasetAdapter(ABC):
+    """Base class. Subclasses implement iter_records()."""
+
+    name = "base"
+    source_tag = "unknown"
+    license_guess = "unknown"
+
+    def __init__(self, root: Path, dataset: Optional[str] = None):
+        self.root = Path(root)
+        self.dataset = dataset or self.name
+        self._row_namespace = asset_row_namespace(self.dataset)
+
+    @abstractmethod
+    def iter_records(self) -> Iterator[Dict]:
+        """Yield manifest records (see make_record) in a deterministic order."""
+
+    def make_record(
+        self,
+        path: Path,
+        scientific_name_raw: str,
+        scientific_name_norm: str,
+        id_core: Optional[int] = None,
+        id_suffix: Optional[int] = None,
+        id_type_guess: str = "none",
+    ) -> Dict:
+        return {
+            "dataset": self.dataset,
+            "asset_row_uuid": str(uuid.uuid5(self._row_namespace, str(path))),
+            "original_path": str(path),
+            "original_filename": path.name,
+            "scientific_name_raw": scientific_name_raw,
+            "scientific_name_norm": scientific_name_norm,
+            "rank_guess": guess_rank(scientific_name_norm),
+            "id_core": id_core,
+            "id_suffix": id_suffix,
+            "id_type_guess": id_type_guess,
+            "source_tag": self.source_tag,
+            "license_guess": self.license_guess,
+        }
+
+
+class AnthophilaAdapter(DatasetAdapter):
+    """
+    <root>/<Genus_species>/<Genus_species>_<id>[_<idx>].jpg
+
+    Matches build_anthophila_manifest.py exactly (same namespaces, same
+    id parsing), so asset_uuid/asset_row_uuid agree with the CSV pipeline.
+    """
+
+    name = "anthophila"
+    source_tag = "expert-taxonomist"
+
+    def iter_records(self) -> Iterator[Dict]:
+        for jpg_file, species_dir_name in collect_image_files(self.root):
+            id_core, id_suffix, id_type = extract_id_from_filename(jpg_file.name)
+            yield self.make_record(
+                jpg_file,
+                species_dir_name,
+                normalize_scientific_name(species_dir_name),
+                id_core=id_core,
+                id_suffix=id_suffix,
+                id_type_guess=id_type,
+            )
+
+
+class TaxonDirectoryAdapter(DatasetAdapter):
+    """
+    <root>/<Taxon name>/**/<image>  (e.g. museum specimen photo dumps)
+
+    The first directory level names the taxon ('Bombus_terrestris' or
+    'Bombus terrestris'); files may be nested below it. Filenames carry no
+    trusted source IDs, so id_core stays null and observations are keyed by
+    content (asset_uuid) rather than by name+id.
+    """
+
+    name = "taxon-dirs"
+    source_tag = "museum-specimen"
+    extensions = (".jpg", ".jpeg", ".png")
+
+    def iter_records(self) -> Iterator[Dict]:
+        for taxon_dir in sorted(p for p in self.root.iterdir() if p.is_dir()):
+            scientific_name = " ".join(taxon_dir.name.replace("_", " ").split())
+            for path in sorted(taxon_dir.rglob("*")):
+                if path.is_file() and path.suffix.lower() in self.extensions:
+                    yield self.make_record(path, taxon_dir.name, scientific_name)
+
+
+ADAPTERS: Dict[str, Type[DatasetAdapter]] = {
+    AnthophilaAdapter.name: AnthophilaAdapter,
+    TaxonDirectoryAdapter.name: TaxonDirectoryAdapter,
+}
+
+
+def register_adapter(adapter_cls: Type[DatasetAdapter]) -> Type[DatasetAdapter]:
+    """Class decorator for adapters defined outside this module."""
+    ADAPTERS[adapter_cls.name] = adapter_cls
+    return adapter_cls
+
+
+def get_adapter(name: str, root: Path, dataset: Optional[str] = None) -> DatasetAdapter:
+    try:
+        adapter_cls = ADAPTERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown adapter {name!r}; available: {', '.join(sorted(ADAPTERS))}")
+    return adapter_cls(root, dataset=dataset)
+
+
+def available_adapters() -> List[str]:
+    return sorted(ADAPTERS)
@@ -0,0 +1,142 @@
+"""
+Batch-streaming pipeline runner with per-batch, per-stage checkpoints.
+
+Source records from an adapter are cut into fixed-size RecordBatches,
+numbered in order. Each batch flows through every stage before the next
+batch is read, so memory stays bounded by batch_size regardless of dataset
+size. After each stage the batch is written to
+
+    <workdir>/<NN>_<stage>/batch-<index>.arrow   (Arrow IPC, atomic rename)
+
+On rerun, a batch resumes from the deepest stage that has a checkpoint for
+it; earlier stages are skipped (stateful stages get restore() instead), so an
+interruption costs at most one batch of work per stage.
+"""
+
+import json
+import os
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pyarrow as pa
+
+from .adapters import DatasetAdapter
+from .schema import MANIFEST_SCHEMA, batch_from_records
+from .stages import Stage
+
+
+def iter_source_batches(adapter: DatasetAdapter, batch_size: int) -> Iterator[pa.RecordBatch]:
+    records = adapter.iter_records()
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            return
+        yield batch_from_records(chunk)
+
+
+def write_batch(path: Path, batch: pa.RecordBatch):
+    tmp = path.with_name(path.name + ".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, MANIFEST_SCHEMA) as writer:
+        writer.write_batch(batch)
+    os.replace(tmp, path)
+
+
+def read_batch(path: Path) -> pa.RecordBatch:
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.combine_chunks().to_batches()[0] if table.num_rows else pa.RecordBatch.from_pylist([], schema=MANIFEST_SCHEMA)
+
+
+class Pipeline:
+    def __init__(
+        self,
+        adapter: DatasetAdapter,
+        stages: List[Stage],
+        workdir: Path,
+        batch_size: int = 2000,
+    ):
+        self.adapter = adapter
+        self.stages = stages
+        self.workdir = Path(workdir)
+        self.batch_size = batch_size
+        self.stage_dirs = [
+            self.workdir / f"{i + 1:02d}_{stage.name}" for i, stage in enumerate(stages)
+        ]
+        for stage_dir in self.stage_dirs:
+            stage_dir.mkdir(parents=True, exist_ok=True)
+        self.timings: Dict[str, float] = {stage.name: 0.0 for stage in stages}
+        self.counts: Dict[str, int] = {stage.name: 0 for stage in stages}
+
+    def checkpoint_path(self, stage_idx: int, batch_idx: int) -> Path:
+        return self.stage_dirs[stage_idx] / f"batch-{batch_idx:06d}.arrow"
+
+    def resume_point(self, batch_idx: int) -> int:
+        """Index of the deepest stage already checkpointed for batch_idx (-1 if none)."""
+        for stage_idx in range(len(self.stages) - 1, -1, -1):
+            if self.checkpoint_path(stage_idx, batch_idx).exists():
+                return stage_idx
+        return -1
+
+    def run_batch(self, batch_idx: int, source: pa.RecordBatch) -> pa.RecordBatch:
+        done_through = self.resume_point(batch_idx)
+        batch = source
+        if done_through >= 0:
+            # Replay state for completed stages from their own checkpoints.
+            for stage_idx in range(done_through + 1):
+                checkpoint = read_batch(self.checkpoint_path(stage_idx, batch_idx))
+                self.stages[stage_idx].restore(checkpoint)
+            batch = checkpoint
+            if checkpoint.num_rows != source.num_rows:
+                raise RuntimeError(
+                    f"Checkpoint for batch {batch_idx} has {checkpoint.num_rows} rows but the "
+                    f"source batch has {source.num_rows}; the source changed since the last "
+                    "run. Use a fresh --workdir."
+                )
+
+        for stage_idx in range(done_through + 1, len(self.stages)):
+            stage = self.stages[stage_idx]
+            start = time.time()
+            batch = stage.process(batch)
+            self.timings[stage.name] += time.time() - start
+            self.counts[stage.name] += batch.num_rows
+            write_batch(self.checkpoint_path(stage_idx, batch_idx), batch)
+        return batch
+
+    def run(self) -> Dict:
+        summary = {"batches": 0, "rows": 0, "resumed_batches": 0, "kept": 0}
+        start = time.time()
+        try:
+            for batch_idx, source in enumerate(iter_source_batches(self.adapter, self.batch_size)):
+                if self.resume_point(batch_idx) == len(self.stages) - 1:
+                    summary["resumed_batches"] += 1
+                batch = self.run_batch(batch_idx, source)
+                summary["batches"] += 1
+                summary["rows"] += batch.num_rows
+                if "keep_flag" in batch.schema.names:
+                    summary["kept"] += sum(1 for k in batch.column("keep_flag").to_pylist() if k)
+                elapsed = time.time() - start
+                rate = summary["rows"] / elapsed if elapsed > 0 else 0.0
+                print(f"Batch {batch_idx}: {batch.num_rows} rows "
+                      f"(total {summary['rows']}, {rate:,.0f} rows/s)")
+        finally:
+            for stage in self.stages:
+                stage.close()
+
+        summary["elapsed_secs"] = round(time.time() - start, 1)
+        summary["stage_secs"] = {name: round(secs, 1) for name, secs in self.timings.items()}
+        summary["stage_rows"] = dict(self.counts)
+        with open(self.workdir / "summary.json", "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2)
+        return summary
+
+    def read_manifest(self, stage_name: Optional[str] = None) -> pa.Table:
+        """Concatenate the checkpoints of one stage (default: last) into a table."""
+        stage_idx = len(self.stages) - 1
+        if stage_name is not None:
+            stage_idx = [s.name for s in self.stages].index(stage_name)
+        paths = sorted(self.stage_dirs[stage_idx].glob("batch-*.arrow"))
+        if not paths:
+            return MANIFEST_SCHEMA.empty_table()
+        return pa.Table.from_batches([read_batch(p) for p in paths], schema=MANIFEST_SCHEMA)
@@ -0,0 +1,91 @@
+"""
+Typed in-memory manifest shared by every media-ingest stage.
+
+All stages read and write pyarrow RecordBatches with MANIFEST_SCHEMA. The
+adapter fills the source columns; each stage only replaces the columns it
+owns (see STAGE_COLUMNS), so a batch checkpointed after any stage can be fed
+to the next stage directly.
+"""
+
+from typing import Dict, List
+
+import pyarrow as pa
+
+MANIFEST_SCHEMA = pa.schema([
+    # Source (adapter)
+    ("dataset", pa.string()),
+    ("asset_row_uuid", pa.string()),
+    ("original_path", pa.string()),
+    ("original_filename", pa.string()),
+    ("scientific_name_raw", pa.string()),
+    ("scientific_name_norm", pa.string()),
+    ("rank_guess", pa.string()),
+    ("id_core", pa.int64()),
+    ("id_suffix", pa.int64()),
+    ("id_type_guess", pa.string()),
+    ("source_tag", pa.string()),
+    ("license_guess", pa.string()),
+    # hash
+    ("asset_uuid", pa.string()),
+    ("flat_name", pa.string()),
+    ("sha256", pa.string()),
+    ("phash", pa.string()),
+    ("width", pa.int32()),
+    ("height", pa.int32()),
+    ("file_bytes", pa.int64()),
+    ("error", pa.string()),
+    # dedup
+    ("dup_reason", pa.string()),
+    ("matched_key", pa.string()),
+    ("keep_flag", pa.bool_()),
+    # resolve
+    ("taxon_id", pa.int64()),
+    ("taxon_rank", pa.string()),
+    ("taxon_rank_level", pa.float64()),
+    ("taxonomy_status", pa.string()),
+    # materialize
+    ("flat_path", pa.string()),
+    ("materialize_method", pa.string()),
+    # register
+    ("observation_key", pa.string()),
+    ("observation_uuid", pa.string()),
+])
+
+SOURCE_COLUMNS = [
+    "dataset", "asset_row_uuid", "original_path", "original_filename",
+    "scientific_name_raw", "scientific_name_norm", "rank_guess",
+    "id_core", "id_suffix", "id_type_guess", "source_tag", "license_guess",
+]
+
+STAGE_COLUMNS: Dict[str, List[str]] = {
+    "hash": ["asset_uuid", "flat_name", "sha256", "phash", "width", "height", "file_bytes", "error"],
+    "dedup": ["dup_reason", "matched_key", "keep_flag"],
+    "resolve": ["taxon_id", "taxon_rank", "taxon_rank_level", "taxonomy_status"],
+    "materialize": ["flat_path", "materialize_method"],
+    "register": ["observation_key", "observation_uuid"],
+}
+
+
+def batch_from_records(records: List[Dict]) -> pa.RecordBatch:
+    """Build a manifest batch from source-column dicts; other columns are null."""
+    arrays = []
+    for field in MANIFEST_SCHEMA:
+        if field.name in SOURCE_COLUMNS:
+            arrays.append(pa.array([r.get(field.name) for r in records], type=field.type))
+        else:
+            arrays.append(pa.nulls(len(records), type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=MANIFEST_SCHEMA)
+
+
+def with_columns(batch: pa.RecordBatch, **columns) -> pa.RecordBatch:
+    """Return a copy of batch with the named columns replaced (types per schema)."""
+    arrays = list(batch.columns)
+    for name, values in columns.items():
+        idx = MANIFEST_SCHEMA.get_field_index(name)
+        if idx < 0:
+            raise KeyError(f"{name} is not a manifest column")
+        field_type = MANIFEST_SCHEMA.field(idx).type
+        if not isinstance(values, (pa.Array, pa.ChunkedArray)):
+            values = pa.array(values, type=field_type)
+        arrays[idx] = values.cast(field_type)
+    return pa.RecordBatch.from_arrays(arrays, schema=MANIFEST_SCHEMA)
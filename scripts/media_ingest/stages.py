@@ -0,0 +1,357 @@
+"""
+Pipeline stages. Each stage maps one manifest RecordBatch to the next.
+
+Stages hold their own parallelism (process pool for hashing, thread pool for
+file placement) and any cross-batch state (seen sha256s, resolved names).
+Stateful stages implement restore(), which the pipeline calls with the
+stage's checkpointed output for batches that are skipped on resume, so the
+state is rebuilt without redoing the work.
+"""
+
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from scripts.build_anthophila_manifest import (
+    analyze_image_bytes,
+    compute_sha256,
+    generate_flat_name,
+)
+from scripts.deduplicate_anthophila import copy_keys_to_temp
+from scripts.materialize_anthophila_flat import (
+    FileMaterializer,
+    add_observation_keys,
+    fetch_media_id_map,
+    insert_media_records,
+    insert_observation_media,
+    insert_observations,
+)
+from scripts.resolve_anthophila_taxa import choose_best_candidate, fetch_name_map
+
+from .adapters import asset_namespace
+from .schema import with_columns
+
+
+class Stage(ABC):
+    """Base stage: subclasses set `name` and implement process()."""
+
+    name = "stage"
+
+    @abstractmethod
+    def process(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        """Map one manifest batch to the next."""
+
+    def restore(self, batch: pa.RecordBatch):
+        """Rebuild cross-batch state from this stage's checkpointed output."""
+
+    def close(self):
+        pass
+
+
+def hash_file(task: Tuple[str, bool]) -> Tuple[Optional[str], Optional[int], Optional[int], str, Optional[int], Optional[str]]:
+    """Process-pool worker: one read -> (sha256, width, height, phash, bytes, error)."""
+    path, phash_draft = task
+    try:
+        data = Path(path).read_bytes()
+    except Exception as e:
+        return None, None, None, "", None, str(e)
+    width, height, phash, _ = analyze_image_bytes(data, phash_draft)
+    return compute_sha256(data), width, height, phash, len(data), None
+
+
+class HashStage(Stage):
+    """sha256 + dimensions + pHash per file, on a process pool."""
+
+    name = "hash"
+
+    def __init__(self, workers: int = 1, phash_draft: bool = True):
+        self.phash_draft = phash_draft
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def process(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        paths = batch.column("original_path").to_pylist()
+        tasks = [(path, self.phash_draft) for path in paths]
+        if self.pool is not None:
+            results = list(self.pool.map(hash_file, tasks, chunksize=64))
+        else:
+            results = [hash_file(task) for task in tasks]
+
+        datasets = batch.column("dataset").to_pylist()
+        namespaces: Dict[str, uuid.UUID] = {}
+        asset_uuids, flat_names = [], []
+        for dataset, path, (sha256, *_rest) in zip(datasets, paths, results):
+            if sha256 is None:
+                asset_uuids.append(None)
+                flat_names.append(None)
+                continue
+            namespace = namespaces.setdefault(dataset, asset_namespace(dataset))
+            asset_uuids.append(str(uuid.uuid5(namespace, sha256)))
+            flat_names.append(generate_flat_name(sha256, Path(path).suffix))
+
+        sha256s, widths, heights, phashes, sizes, errors = (list(col) for col in zip(*results)) if results else ([],) * 6
+        return with_columns(
+            batch,
+            asset_uuid=asset_uuids,
+            flat_name=flat_names,
+            sha256=sha256s,
+            phash=phashes,
+            width=[w or None for w in widths],
+            height=[h or None for h in heights],
+            file_bytes=sizes,
+            error=errors,
+        )
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class DedupStage(Stage):
+    """
+    Pass A (id_core vs photos.photo_id), Pass B (sha256 vs media) and
+    within-run sha256 dedup. Each pass COPYs the batch's distinct keys into a
+    temp table and joins it, as deduplicate_anthophila.py does.
+
+    Within-run dedup keeps the first file seen (batches are ordered), not the
+    largest as deduplicate_anthophila.py does, because later batches are not
+    yet known when a batch is processed.
+    """
+
+    name = "dedup"
+
+    def __init__(self, db_conn, check_photo_ids: bool = True):
+        self.db_conn = db_conn
+        self.check_photo_ids = check_photo_ids
+        self.seen_sha256: Set[str] = set()
+        with db_conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('public.media')")
+            self.has_media = cursor.fetchone()[0] is not None
+
+    def restore(self, batch: pa.RecordBatch):
+        kept = pc.fill_null(batch.column("keep_flag"), False)
+        self.seen_sha256.update(
+            s for s in pc.filter(batch.column("sha256"), kept).to_pylist() if s
+        )
+
+    def process(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        id_cores = batch.column("id_core").to_pylist()
+        sha256s = batch.column("sha256").to_pylist()
+        errors = batch.column("error").to_pylist()
+
+        existing_ids: Set[int] = set()
+        existing_hashes: Set[str] = set()
+        with self.db_conn.cursor() as cursor:
+            candidate_ids = sorted({i for i in id_cores if i is not None})
+            if self.check_photo_ids and candidate_ids:
+                copy_keys_to_temp(
+                    cursor, "dedup_stage_ids", "id_core BIGINT", pd.DataFrame({"id_core": candidate_ids})
+                )
+                cursor.execute("""
+                    SELECT k.id_core
+                    FROM dedup_stage_ids k
+                    WHERE EXISTS (SELECT 1 FROM photos p WHERE p.photo_id = k.id_core)
+                """)
+                existing_ids = {row[0] for row in cursor.fetchall()}
+            candidate_hashes = sorted({s for s in sha256s if s})
+            if self.has_media and candidate_hashes:
+                copy_keys_to_temp(
+                    cursor, "dedup_stage_hashes", "sha256 CHAR(64)", pd.DataFrame({"sha256": candidate_hashes})
+                )
+                cursor.execute("""
+                    SELECT k.sha256
+                    FROM dedup_stage_hashes k
+                    JOIN media m ON m.sha256_hex = k.sha256
+                """)
+                existing_hashes = {row[0] for row in cursor.fetchall()}
+        self.db_conn.commit()
+
+        reasons, keys, keep = [], [], []
+        for id_core, sha256, error in zip(id_cores, sha256s, errors):
+            if error or not sha256:
+                reason, key = "unreadable", ""
+            elif id_core is not None and id_core in existing_ids:
+                reason, key = "photo_id", str(id_core)
+            elif sha256 in existing_hashes:
+                reason, key = "media_sha256", sha256
+            elif sha256 in self.seen_sha256:
+                reason, key = "sha256_within", sha256
+            else:
+                reason, key = "", ""
+                self.seen_sha256.add(sha256)
+            reasons.append(reason)
+            keys.append(key)
+            keep.append(reason == "")
+
+        return with_columns(batch, dup_reason=reasons, matched_key=keys, keep_flag=keep)
+
+
+class ResolveStage(Stage):
+    """Scientific name -> taxon_id, caching every looked-up name across batches."""
+
+    name = "resolve"
+
+    def __init__(self, db_conn, table_name: Optional[str] = None):
+        self.db_conn = db_conn
+        if table_name is None:
+            with db_conn.cursor() as cursor:
+                cursor.execute("SELECT to_regclass('public.expanded_taxa')")
+                table_name = "expanded_taxa" if cursor.fetchone()[0] else "taxa"
+        self.table_name = table_name
+        self.name_map: Dict[str, List[Dict]] = {}
+        self.chosen: Dict[Tuple[str, str], Dict] = {}
+
+    def process(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        names = [(n or "").lower() for n in batch.column("scientific_name_norm").to_pylist()]
+        rank_guesses = [r or "unknown" for r in batch.column("rank_guess").to_pylist()]
+
+        new_names = sorted({n for n in names if n and n not in self.name_map})
+        if new_names:
+            fetched = fetch_name_map(self.db_conn, new_names, self.table_name)
+            for name in new_names:
+                self.name_map[name] = fetched.get(name, [])
+
+        taxon_ids, ranks, levels, statuses = [], [], [], []
+        for name, rank_guess in zip(names, rank_guesses):
+            candidates = self.name_map.get(name, [])
+            if not candidates:
+                taxon_ids.append(None)
+                ranks.append(None)
+                levels.append(None)
+                statuses.append("no_match")
+                continue
+            key = (name, rank_guess)
+            if key not in self.chosen:
+                self.chosen[key] = choose_best_candidate(candidates, rank_guess)
+            chosen = self.chosen[key]
+            taxon_ids.append(chosen.get("taxon_id"))
+            ranks.append(chosen.get("rank"))
+            level = chosen.get("rank_level")
+            levels.append(float(level) if level is not None else None)
+            statuses.append("multiple_match" if len(candidates) > 1 else "exact_match")
+
+        return with_columns(
+            batch,
+            taxon_id=taxon_ids,
+            taxon_rank=ranks,
+            taxon_rank_level=levels,
+            taxonomy_status=statuses,
+        )
+
+
+class MaterializeStage(Stage):
+    """Place kept files into the flat directory (hardlink/reflink/copy) on a thread pool."""
+
+    name = "materialize"
+
+    def __init__(self, flat_dir: Path, strategy: str = "auto", workers: int = 16):
+        self.flat_dir = Path(flat_dir)
+        self.flat_dir.mkdir(parents=True, exist_ok=True)
+        self.materializer = FileMaterializer(strategy)
+        self.present = {entry.name for entry in self.flat_dir.iterdir()}
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    def _place(self, item: Tuple[str, str]) -> Optional[str]:
+        original_path, flat_name = item
+        try:
+            return self.materializer.materialize(Path(original_path), self.flat_dir / flat_name)
+        except FileExistsError:
+            return "existing"
+        except OSError as e:
+            print(f"Error materializing {original_path}: {e}")
+            return None
+
+    def process(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        keep = batch.column("keep_flag").to_pylist()
+        paths = batch.column("original_path").to_pylist()
+        flat_names = batch.column("flat_name").to_pylist()
+
+        methods: List[Optional[str]] = [None] * len(keep)
+        todo = []
+        for i, (kept, flat_name) in enumerate(zip(keep, flat_names)):
+            if not kept or not flat_name:
+                continue
+            if flat_name in self.present:
+                methods[i] = "existing"
+            else:
+                todo.append(i)
+
+        for i, method in zip(todo, self.pool.map(self._place, [(paths[i], flat_names[i]) for i in todo])):
+            methods[i] = method
+            if method is not None:
+                self.present.add(flat_names[i])
+
+        flat_paths = [
+            str(self.flat_dir / flat_name) if method else None
+            for flat_name, method in zip(flat_names, methods)
+        ]
+        return with_columns(batch, flat_path=flat_paths, materialize_method=methods)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class RegisterStage(Stage):
+    """Insert observations, media and observation_media for materialized rows."""
+
+    name = "register"
+
+    def __init__(
+        self,
+        db_conn,
+        origin: str,
+        version: str,
+        release: str,
+        remote_key_prefix: str = "",
+        remote_uri_prefix: str = "",
+        role: str = "primary",
+    ):
+        self.db_conn = db_conn
+        self.origin = origin
+        self.version = version
+        self.release = release
+        self.remote_key_prefix = remote_key_prefix
+        self.remote_uri_prefix = remote_uri_prefix
+        self.role = role
+        self.totals = {"observations": 0, "media": 0, "observation_media": 0}
+
+    def process(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        ready = pc.is_valid(batch.column("flat_path"))
+        if not pc.any(ready).as_py():
+            return batch
+
+        df = batch.filter(ready).to_pandas()
+        df = add_observation_keys(df)
+        dataset = df["dataset"].iloc[0]
+
+        self.totals["observations"] += insert_observations(
+            df, self.db_conn, origin=self.origin, version=self.version, release=self.release
+        )
+        materialized_files = df[["asset_uuid", "original_path", "flat_path", "flat_name"]].to_dict("records")
+        self.totals["media"] += insert_media_records(
+            df,
+            materialized_files,
+            None,
+            self.db_conn,
+            dataset=dataset,
+            release=self.release,
+            remote_key_prefix=self.remote_key_prefix,
+            remote_uri_prefix=self.remote_uri_prefix,
+        )
+        media_id_map = fetch_media_id_map(self.db_conn, df["sha256"].dropna().tolist())
+        self.totals["observation_media"] += insert_observation_media(
+            df, media_id_map, self.db_conn, role=self.role
+        )
+
+        keys = dict(zip(df["asset_row_uuid"], zip(df["observation_key"], df["observation_uuid"])))
+        row_ids = batch.column("asset_row_uuid").to_pylist()
+        return with_columns(
+            batch,
+            observation_key=[keys.get(r, (None, None))[0] for r in row_ids],
+            observation_uuid=[keys.get(r, (None, None))[1] for r in row_ids],
+        )
@@ -16,6 +16,10 @@ MANIFEST_DIR="${MANIFEST_DIR:-/datasets/ibrida-data/media/anthophila/r2/manifest
 MANIFEST_CSV="${MANIFEST_CSV:-${MANIFEST_DIR}/anthophila_manifest.csv}"
 DEDUP_CSV="${DEDUP_CSV:-${MANIFEST_DIR}/anthophila_duplicates.csv}"
 RESOLVED_CSV="${RESOLVED_CSV:-${MANIFEST_DIR}/anthophila_duplicates_resolved.csv}"
+MANIFEST_WORKERS="${MANIFEST_WORKERS:-$(nproc 2>/dev/null || echo 1)}"
+LINK_STRATEGY="${LINK_STRATEGY:-auto}"  # auto|hardlink|reflink|copy_file_range|copy
+MATERIALIZE_WORKERS="${MATERIALIZE_WORKERS:-16}"
+PHASH_MAX_DISTANCE="${PHASH_MAX_DISTANCE:-}"  # empty disables pHash near-duplicate Pass C
 DB_CONNECTION="${DB_CONNECTION:-postgresql://postgres@localhost/ibrida-v0}"
 DATASET="${DATASET:-anthophila}"
 ORIGIN="${ORIGIN:-anthophila}"
@@ -141,7 +145,10 @@ echo "    Anthophila dir: $ANTHOPHILA_DIR"
 echo "    Flat dir: $FLAT_DIR" 
 echo "    Manifest dir: $MANIFEST_DIR"
 echo "    Manifest CSV: $MANIFEST_CSV"
+echo "    Manifest workers: $MANIFEST_WORKERS"
+echo "    Link strategy: $LINK_STRATEGY  Materialize workers: $MATERIALIZE_WORKERS"
 echo "    Dedup CSV: $DEDUP_CSV"
+echo "    pHash max distance: ${PHASH_MAX_DISTANCE:-disabled}"
 echo "    Resolved CSV: $RESOLVED_CSV"
 echo "    DB connection: $DB_CONNECTION_DISPLAY"
 echo "    Dataset: $DATASET  Origin: $ORIGIN  Version: $VERSION  Release: $RELEASE"
@@ -159,7 +166,8 @@ echo "==> Step 1: Building anthophila manifest"
 if [[ ! -f "$MANIFEST_CSV" ]] || [[ "$MANIFEST_CSV" -ot "$ANTHOPHILA_DIR" ]]; then
     run_cmd uv run python3 "${SCRIPT_DIR}/build_anthophila_manifest.py" \
         --anthophila-dir "$ANTHOPHILA_DIR" \
-        --output "$MANIFEST_CSV"
+        --output "$MANIFEST_CSV" \
+        --workers "$MANIFEST_WORKERS"
 else
     echo "    Manifest already exists and is up to date: $MANIFEST_CSV"
 fi
@@ -167,14 +175,22 @@ fi
 # Step 2: Apply media catalog DDL (if not already applied)
 echo "==> Step 2: Ensuring media catalog tables exist"
 run_cmd "${REPO_ROOT}/dbTools/admin/apply_media_catalog_ddl.sh"
+if [[ -n "$PHASH_MAX_DISTANCE" ]]; then
+    run_cmd "${REPO_ROOT}/dbTools/admin/apply_media_phash_search_ddl.sh"
+fi
 
 # Step 3: Run deduplication
-echo "==> Step 3: Running two-pass deduplication"
+echo "==> Step 3: Running multi-pass deduplication"
+DEDUP_ARGS=(
+    --manifest "$MANIFEST_CSV"
+    --output "$DEDUP_CSV"
+    --db-connection "$DB_CONNECTION"
+)
+if [[ -n "$PHASH_MAX_DISTANCE" ]]; then
+    DEDUP_ARGS+=(--phash-max-distance "$PHASH_MAX_DISTANCE" --phash-exclude-dataset "$DATASET")
+fi
 if [[ ! -f "$DEDUP_CSV" ]] || [[ "$DEDUP_CSV" -ot "$MANIFEST_CSV" ]]; then
-    run_cmd uv run python3 "${SCRIPT_DIR}/deduplicate_anthophila.py" \
-        --manifest "$MANIFEST_CSV" \
-        --output "$DEDUP_CSV" \
-        --db-connection "$DB_CONNECTION"
+    run_cmd uv run python3 "${SCRIPT_DIR}/deduplicate_anthophila.py" "${DEDUP_ARGS[@]}"
 else
     echo "    Deduplication results already exist and are up to date: $DEDUP_CSV"
 fi
@@ -185,6 +201,7 @@ if [[ ! -f "$RESOLVED_CSV" ]] || [[ "$RESOLVED_CSV" -ot "$DEDUP_CSV" ]]; then
     run_cmd uv run python3 "${SCRIPT_DIR}/resolve_anthophila_taxa.py" \
         --manifest "$DEDUP_CSV" \
         --output "$RESOLVED_CSV" \
+        --release "$RELEASE" \
         --db-connection "$DB_CONNECTION"
 else
     echo "    Resolved manifest already exists and is up to date: $RESOLVED_CSV"
@@ -195,6 +212,8 @@ echo "==> Step 4: Materializing anthophila_flat/ and inserting records"
 run_cmd uv run python3 "${SCRIPT_DIR}/materialize_anthophila_flat.py" \
     --manifest "$RESOLVED_CSV" \
     --flat-dir "$FLAT_DIR" \
+    --link-strategy "$LINK_STRATEGY" \
+    --materialize-workers "$MATERIALIZE_WORKERS" \
     --db-connection "$DB_CONNECTION" \
     --dataset "$DATASET" \
     --origin "$ORIGIN" \
@@ -265,7 +284,11 @@ ANTHOPHILA_DIR=$ANTHOPHILA_DIR
 FLAT_DIR=$FLAT_DIR
 MANIFEST_DIR=$MANIFEST_DIR
 MANIFEST_CSV=$MANIFEST_CSV
+MANIFEST_WORKERS=$MANIFEST_WORKERS
+LINK_STRATEGY=$LINK_STRATEGY
+MATERIALIZE_WORKERS=$MATERIALIZE_WORKERS
 DEDUP_CSV=$DEDUP_CSV
+PHASH_MAX_DISTANCE=$PHASH_MAX_DISTANCE
 RESOLVED_CSV=$RESOLVED_CSV
 DB_CONNECTION=$DB_CONNECTION_DISPLAY
 DATASET=$DATASET
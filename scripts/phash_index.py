@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Multi-index hashing (MIH) over media.phash_64 for near-duplicate detection.
+
+Exact sha256 dedup (deduplicate_anthophila.py Pass B) misses re-encoded,
+resized or lightly cropped copies of the same image. Their 64-bit pHashes
+differ by only a few bits, so near-duplicates are "Hamming distance <= k"
+neighbours of each other.
+
+The index splits every hash into NUM_BANDS (4) bands of 16 bits. By the
+pigeonhole principle, two hashes within distance k agree to within
+floor(k / NUM_BANDS) bits on at least one band. For each band the index keeps
+the row positions sorted by band value plus a 65537-entry offset table (CSR
+layout), so looking up a band value is two array reads. A query enumerates
+every band value within radius floor(k / 4) of its own band (1 value for
+k < 4, 17 for k < 8), unions the posting lists, and verifies the candidates
+with an exact XOR + popcount. Results are exact: no true neighbour is missed.
+
+Hashes are stored as uint64 internally; PostgreSQL BIGINT values (signed, see
+materialize_anthophila_flat.parse_phash_64) and manifest hex strings are both
+accepted.
+
+Usage:
+  # Near-duplicate pairs for a manifest against existing media
+  uv run python3 scripts/phash_index.py query \
+    --manifest anthophila_manifest.csv \
+    --output anthophila_phash_pairs.csv \
+    --max-distance 6 --exclude-dataset anthophila
+
+  # Synthetic benchmark: MIH vs brute-force scan at several catalog sizes
+  uv run python3 scripts/phash_index.py benchmark --sizes 100000,1000000,5000000
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from itertools import combinations
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+NUM_BANDS = 4
+BAND_BITS = 16
+BAND_VALUES = 1 << BAND_BITS
+BAND_MASK = np.uint64(BAND_VALUES - 1)
+FETCH_BATCH_SIZE = 200_000
+
+POPCOUNT_8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def parse_phash_hex(value) -> Optional[int]:
+    """Parse a hex pHash string into an unsigned 64-bit int (None if invalid)."""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if text.startswith("0x"):
+        text = text[2:]
+    if not text:
+        return None
+    try:
+        raw = int(text, 16)
+    except ValueError:
+        return None
+    if raw >= (1 << 64):
+        return None
+    return raw
+
+
+def hamming_distances(hashes: np.ndarray, query: int) -> np.ndarray:
+    """Hamming distance from every hash in a uint64 array to one query hash."""
+    xor = np.bitwise_xor(hashes, np.uint64(query))
+    return POPCOUNT_8[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def band_flip_masks(radius: int) -> np.ndarray:
+    """All 16-bit masks with at most `radius` bits set."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), r):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            masks.append(mask)
+    return np.array(masks, dtype=np.int64)
+
+
+class MultiIndexHash:
+    """
+    Static multi-index hash table over a fixed set of (media_id, phash) rows.
+
+    Build once (O(N log N) per band), then answer any number of Hamming-radius
+    queries. The index is read-only; rebuild it to pick up new media.
+    """
+
+    def __init__(self, ids: np.ndarray, hashes: np.ndarray):
+        if len(ids) != len(hashes):
+            raise ValueError("ids and hashes must have the same length")
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        pos_dtype = np.int32 if len(self.hashes) < (1 << 31) else np.int64
+
+        self.band_order: List[np.ndarray] = []
+        self.band_offsets: List[np.ndarray] = []
+        for band in range(NUM_BANDS):
+            keys = self.band_keys(self.hashes, band)
+            order = np.argsort(keys, kind="stable").astype(pos_dtype)
+            offsets = np.zeros(BAND_VALUES + 1, dtype=np.int64)
+            np.cumsum(np.bincount(keys, minlength=BAND_VALUES), out=offsets[1:])
+            self.band_order.append(order)
+            self.band_offsets.append(offsets)
+
+        self._mask_cache = {}
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @staticmethod
+    def band_keys(hashes: np.ndarray, band: int) -> np.ndarray:
+        """Extract one 16-bit band from each hash as an int64 array."""
+        shift = np.uint64(band * BAND_BITS)
+        return ((hashes >> shift) & BAND_MASK).astype(np.int64)
+
+    def _masks(self, radius: int) -> np.ndarray:
+        if radius not in self._mask_cache:
+            self._mask_cache[radius] = band_flip_masks(radius)
+        return self._mask_cache[radius]
+
+    def candidates(self, query: int, max_distance: int) -> np.ndarray:
+        """Row positions whose hash shares a near-equal band with `query`."""
+        radius = max_distance // NUM_BANDS
+        masks = self._masks(radius)
+        query_arr = np.array([query], dtype=np.uint64)
+
+        postings = []
+        for band in range(NUM_BANDS):
+            value = int(self.band_keys(query_arr, band)[0])
+            offsets = self.band_offsets[band]
+            order = self.band_order[band]
+            probe = np.bitwise_xor(masks, value)
+            starts = offsets[probe]
+            ends = offsets[probe + 1]
+            for start, end in zip(starts[ends > starts], ends[ends > starts]):
+                postings.append(order[start:end])
+
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(postings))
+
+    def query(self, query: int, max_distance: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (media_ids, distances) for all rows within max_distance."""
+        positions = self.candidates(query, max_distance)
+        if positions.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint8)
+        distances = hamming_distances(self.hashes[positions], query)
+        keep = distances <= max_distance
+        return self.ids[positions[keep]], distances[keep]
+
+    def query_batch(
+        self, queries: np.ndarray, max_distance: int
+    ) -> List[Tuple[int, int, int]]:
+        """Return (query_index, media_id, distance) for every match in a batch."""
+        matches: List[Tuple[int, int, int]] = []
+        for query_idx, query in enumerate(np.asarray(queries, dtype=np.uint64)):
+            ids, distances = self.query(int(query), max_distance)
+            matches.extend(
+                (query_idx, int(media_id), int(dist))
+                for media_id, dist in zip(ids, distances)
+            )
+        return matches
+
+
+def brute_force_query(hashes: np.ndarray, ids: np.ndarray, query: int, max_distance: int):
+    """Reference linear scan used by the benchmark to check recall."""
+    distances = hamming_distances(hashes, query)
+    keep = distances <= max_distance
+    return ids[keep], distances[keep]
+
+
+def load_media_hashes(conn, exclude_dataset: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Stream (media_id, phash_64) from media with a server-side cursor."""
+    sql = "SELECT media_id, phash_64 FROM media WHERE phash_64 IS NOT NULL"
+    params: Tuple = ()
+    if exclude_dataset:
+        sql += " AND dataset <> %s"
+        params = (exclude_dataset,)
+
+    id_chunks: List[np.ndarray] = []
+    hash_chunks: List[np.ndarray] = []
+    with conn.cursor(name="phash_index_media") as cursor:
+        cursor.itersize = FETCH_BATCH_SIZE
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+            id_chunks.append(np.array([r[0] for r in rows], dtype=np.int64))
+            hash_chunks.append(np.array([r[1] for r in rows], dtype=np.int64).view(np.uint64))
+
+    if not id_chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    return np.concatenate(id_chunks), np.concatenate(hash_chunks)
+
+
+def load_manifest_hashes(manifest_path: Path, id_column: str) -> Tuple[List[str], np.ndarray]:
+    """Read (row id, phash) pairs from a manifest CSV, skipping rows without a pHash."""
+    row_ids: List[str] = []
+    hashes: List[int] = []
+    with open(manifest_path, newline="", encoding="utf-8") as handle:
+        reader = csv.DictReader(handle)
+        if reader.fieldnames is None or "phash" not in reader.fieldnames:
+            raise ValueError(f"{manifest_path} has no phash column")
+        if id_column not in reader.fieldnames:
+            raise ValueError(f"{manifest_path} has no {id_column} column")
+        for row in reader:
+            value = parse_phash_hex(row.get("phash"))
+            if value is None:
+                continue
+            row_ids.append(row[id_column])
+            hashes.append(value)
+    return row_ids, np.array(hashes, dtype=np.uint64)
+
+
+def run_query(args) -> int:
+    import psycopg2
+
+    manifest_path = Path(args.manifest)
+    if not manifest_path.exists():
+        print(f"Error: Manifest file not found: {manifest_path}")
+        return 1
+
+    try:
+        row_ids, query_hashes = load_manifest_hashes(manifest_path, args.id_column)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Loaded {len(query_hashes)} query hashes from {manifest_path}")
+
+    try:
+        conn = psycopg2.connect(args.db_connection)
+    except psycopg2.Error as e:
+        print(f"Error connecting to database: {e}")
+        return 1
+
+    try:
+        start = time.time()
+        ids, hashes = load_media_hashes(conn, exclude_dataset=args.exclude_dataset)
+        print(f"Loaded {len(ids)} media hashes in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+
+    start = time.time()
+    index = MultiIndexHash(ids, hashes)
+    print(f"Built multi-index ({NUM_BANDS}x{BAND_BITS}-bit bands) in {time.time() - start:.1f}s")
+
+    start = time.time()
+    matches = index.query_batch(query_hashes, args.max_distance)
+    elapsed = time.time() - start
+    rate = len(query_hashes) / elapsed if elapsed > 0 else float("inf")
+    print(f"Queried {len(query_hashes)} hashes in {elapsed:.1f}s ({rate:,.0f} queries/s)")
+
+    output_path = Path(args.output)
+    with open(output_path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow([args.id_column, "media_id", "hamming_distance"])
+        for query_idx, media_id, dist in matches:
+            writer.writerow([row_ids[query_idx], media_id, dist])
+
+    matched_rows = len({query_idx for query_idx, _, _ in matches})
+    print(f"Found {len(matches)} pairs within distance {args.max_distance} "
+          f"covering {matched_rows} manifest rows")
+    print(f"Pairs written to {output_path}")
+    return 0
+
+
+def flip_random_bits(hashes: np.ndarray, max_bits: int, rng: np.random.Generator) -> np.ndarray:
+    """Perturb each hash by flipping between 0 and max_bits random bits."""
+    out = hashes.copy()
+    flips = rng.integers(0, max_bits + 1, size=len(hashes))
+    for i, n_bits in enumerate(flips):
+        for bit in rng.choice(64, size=n_bits, replace=False):
+            out[i] ^= np.uint64(1) << np.uint64(bit)
+    return out
+
+
+def run_benchmark(args) -> int:
+    rng = np.random.default_rng(args.seed)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    k = args.max_distance
+
+    print(f"=== pHash MIH benchmark (k={k}, queries={args.queries}, "
+          f"brute-force sample={args.brute_queries}) ===")
+    print(f"{'catalog':>10} {'build_s':>8} {'mih_q/s':>10} {'brute_q/s':>10} "
+          f"{'speedup':>8} {'cand/q':>8} {'recall':>7}")
+
+    for size in sizes:
+        hashes = rng.integers(0, np.iinfo(np.uint64).max, size=size, dtype=np.uint64, endpoint=True)
+        ids = np.arange(size, dtype=np.int64)
+
+        # Half the queries are planted near-duplicates of catalog rows, half
+        # are random (mostly no match), mirroring a typical ingest batch.
+        n_planted = args.queries // 2
+        planted = flip_random_bits(hashes[rng.integers(0, size, size=n_planted)], k, rng)
+        random_q = rng.integers(0, np.iinfo(np.uint64).max, size=args.queries - n_planted,
+                                dtype=np.uint64, endpoint=True)
+        queries = np.concatenate([planted, random_q])
+
+        start = time.time()
+        index = MultiIndexHash(ids, hashes)
+        build_secs = time.time() - start
+
+        start = time.time()
+        total_candidates = 0
+        mih_results = []
+        for query in queries:
+            total_candidates += index.candidates(int(query), k).size
+            mih_results.append(set(index.query(int(query), k)[0].tolist()))
+        mih_secs = time.time() - start
+
+        n_brute = min(args.brute_queries, len(queries))
+        brute_idx = np.linspace(0, len(queries) - 1, n_brute).astype(np.int64)
+        start = time.time()
+        found = expected = 0
+        for qi in brute_idx:
+            truth = set(brute_force_query(hashes, ids, int(queries[qi]), k)[0].tolist())
+            expected += len(truth)
+            found += len(truth & mih_results[qi])
+        brute_secs = time.time() - start
+
+        mih_rate = len(queries) / mih_secs if mih_secs > 0 else float("inf")
+        brute_rate = n_brute / brute_secs if brute_secs > 0 else float("inf")
+        recall = found / expected if expected else 1.0
+        print(f"{size:>10,} {build_secs:>8.2f} {mih_rate:>10,.0f} {brute_rate:>10,.0f} "
+              f"{mih_rate / brute_rate:>7.1f}x {total_candidates / len(queries):>8.1f} "
+              f"{recall:>7.3f}")
+
+    print("\nNote: synthetic hashes are uniform; real pHashes cluster, which raises "
+          "candidates/query. Check cand/q on a real catalog with the query subcommand.")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Near-duplicate pHash search via multi-index hashing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    query_parser = subparsers.add_parser("query", help="Match manifest pHashes against media.phash_64")
+    query_parser.add_argument("--manifest", required=True,
+                              help="Manifest CSV with a phash (hex) column")
+    query_parser.add_argument("--output", required=True,
+                              help="Output CSV of (row id, media_id, hamming_distance) pairs")
+    query_parser.add_argument("--max-distance", type=int, default=6,
+                              help="Maximum Hamming distance to report (default: 6)")
+    query_parser.add_argument("--id-column", default="asset_row_uuid",
+                              help="Manifest column identifying each row (default: asset_row_uuid)")
+    query_parser.add_argument("--exclude-dataset",
+                              help="Ignore media rows from this dataset (e.g. the one being ingested)")
+    query_parser.add_argument(
+        "--db-connection",
+        default=os.getenv("IBRIDADB_DSN", "postgresql://postgres@localhost/ibrida-v0"),
+        help="PostgreSQL connection string (prefer env/.pgpass over inline passwords)"
+    )
+
+    bench_parser = subparsers.add_parser("benchmark", help="Benchmark MIH against a brute-force scan")
+    bench_parser.add_argument("--sizes", default="10000,100000,1000000",
+                              help="Comma-separated catalog sizes (default: 10000,100000,1000000)")
+    bench_parser.add_argument("--queries", type=int, default=2000,
+                              help="Queries per catalog size (default: 2000)")
+    bench_parser.add_argument("--brute-queries", type=int, default=50,
+                              help="Queries also run by brute force for speed/recall (default: 50)")
+    bench_parser.add_argument("--max-distance", type=int, default=6,
+                              help="Hamming radius k (default: 6)")
+    bench_parser.add_argument("--seed", type=int, default=42)
+
+    args = parser.parse_args()
+    if args.max_distance < 0 or args.max_distance > 64:
+        print("Error: --max-distance must be between 0 and 64")
+        return 1
+
+    if args.command == "query":
+        return run_query(args)
+    return run_benchmark(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
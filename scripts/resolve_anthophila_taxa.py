@@ -2,6 +2,12 @@
 """
 Resolve anthophila scientific names to taxon_id using taxa/expanded_taxa tables.
 
+Names are resolved in memory against a NameIndex (every lower(name) in the
+taxa table with its candidate taxa), loaded once per release from a pickle
+cache and scored vectorized across all rows. Names the index does not know are
+looked up in the database as a fallback. --no-name-index restores the plain
+per-name database lookup.
+
 Usage:
   uv run python3 scripts/resolve_anthophila_taxa.py \
     --manifest anthophila_duplicates.csv \
@@ -11,9 +17,11 @@ Usage:
 
 import argparse
 import os
+import pickle
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -129,6 +137,184 @@ def fetch_name_map(conn, names: List[str], table_name: str) -> Dict[str, List[Di
     return name_map
 
 
+NAME_INDEX_CACHE_DIR = Path(os.getenv("IBRIDADB_CACHE_DIR", Path.home() / ".cache" / "ibridadb"))
+
+
+class NameIndex:
+    """
+    In-memory lower(name) -> candidate taxa index for one taxa table + release.
+
+    Built with a single scan of the table and pickled under
+    <cache_dir>/name_index_<table>_<release>.pkl. The pickle stores a cheap
+    fingerprint (row count, max taxon_id); if the table no longer matches, the
+    index is rebuilt. Names missing from the index are looked up in the
+    database (fetch_name_map) and added, so a stale index never loses matches.
+    """
+
+    COLUMNS = ["name_key", "taxon_id", "name", "rank_level", "rank"]
+
+    def __init__(self, frame: pd.DataFrame, table_name: str, release: str, fingerprint: Tuple):
+        self.frame = frame
+        self.table_name = table_name
+        self.release = release
+        self.fingerprint = fingerprint
+        self.known_misses: set = set()
+
+    @staticmethod
+    def cache_path(cache_dir: Path, table_name: str, release: str) -> Path:
+        return Path(cache_dir) / f"name_index_{table_name}_{release}.pkl"
+
+    @staticmethod
+    def table_fingerprint(conn, table_name: str) -> Tuple:
+        mapping = resolve_column_mapping(get_table_columns(conn, table_name), table_name)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*), MAX({quote_ident(mapping['taxon_id'])}) FROM {quote_ident(table_name)}"
+            )
+            count, max_id = cursor.fetchone()
+        return (int(count), int(max_id) if max_id is not None else None)
+
+    @classmethod
+    def build(cls, conn, table_name: str, release: str) -> "NameIndex":
+        mapping = resolve_column_mapping(get_table_columns(conn, table_name), table_name)
+        fingerprint = cls.table_fingerprint(conn, table_name)
+        sql = (
+            f"SELECT lower({quote_ident(mapping['name'])}), {quote_ident(mapping['taxon_id'])}, "
+            f"{quote_ident(mapping['name'])}, {quote_ident(mapping['rank_level'])}, "
+            f"{quote_ident(mapping['rank'])} "
+            f"FROM {quote_ident(table_name)} WHERE {quote_ident(mapping['name'])} IS NOT NULL"
+        )
+        chunks = []
+        with conn.cursor(name="name_index_scan") as cursor:
+            cursor.itersize = 100_000
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(100_000)
+                if not rows:
+                    break
+                chunks.append(pd.DataFrame(rows, columns=cls.COLUMNS))
+        frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=cls.COLUMNS)
+        frame["rank_level"] = pd.to_numeric(frame["rank_level"], errors="coerce").astype(float)
+        frame["name_key"] = frame["name_key"].astype("category")
+        print(f"Built name index from {table_name}: {len(frame)} names")
+        return cls(frame, table_name, release, fingerprint)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        conn,
+        table_name: str,
+        release: str,
+        cache_dir: Path = NAME_INDEX_CACHE_DIR,
+        rebuild: bool = False,
+    ) -> "NameIndex":
+        path = cls.cache_path(cache_dir, table_name, release)
+        if path.exists() and not rebuild:
+            with open(path, "rb") as handle:
+                index = pickle.load(handle)
+            if index.fingerprint == cls.table_fingerprint(conn, table_name):
+                print(f"Loaded name index from {path}: {len(index.frame)} names")
+                return index
+            print(f"Name index {path} is stale (table changed); rebuilding")
+
+        index = cls.build(conn, table_name, release)
+        index.save(path)
+        return index
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as handle:
+            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        print(f"Saved name index to {path}")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["known_misses"] = set()
+        return state
+
+    def add_from_db(self, conn, names: List[str]) -> int:
+        """Cache-miss fallback: fetch names from the database and add any hits."""
+        names = [n for n in names if n not in self.known_misses]
+        if not names:
+            return 0
+        fetched = fetch_name_map(conn, names, self.table_name)
+        rows = [
+            (key, row["taxon_id"], row["name"], row.get("rank_level"), row.get("rank"))
+            for key, candidates in fetched.items()
+            for row in candidates
+        ]
+        self.known_misses.update(n for n in names if not fetched.get(n))
+        if rows:
+            extra = pd.DataFrame(rows, columns=self.COLUMNS)
+            extra["rank_level"] = pd.to_numeric(extra["rank_level"], errors="coerce").astype(float)
+            frame = self.frame.assign(name_key=self.frame["name_key"].astype(str))
+            frame = pd.concat([frame, extra], ignore_index=True)
+            frame["name_key"] = frame["name_key"].astype("category")
+            self.frame = frame
+        return len({r[0] for r in rows})
+
+    def resolve(self, names: pd.Series, rank_guesses: pd.Series) -> pd.DataFrame:
+        """
+        Pick the best candidate for every (name, rank_guess) pair at once.
+
+        Same rule as choose_best_candidate: closest rank_level to the rank
+        guess, else lowest rank_level; ties broken by taxon_id, null
+        rank_level last. Returns one row per input row (same index).
+        """
+        queries = pd.DataFrame({
+            "name_key": names.fillna("").astype(str).str.lower().values,
+            "target_level": rank_guesses.map(RANK_LEVEL_GUESS).astype(float).values,
+        })
+        pairs = queries.drop_duplicates().reset_index(drop=True)
+        pairs["pair_id"] = np.arange(len(pairs))
+
+        index_frame = self.frame.assign(name_key=self.frame["name_key"].astype(str))
+        cand = pairs.merge(index_frame, on="name_key", how="inner")
+        cand["level_missing"] = cand["rank_level"].isna()
+        cand["score"] = np.where(
+            cand["target_level"].notna(),
+            (cand["rank_level"] - cand["target_level"]).abs(),
+            cand["rank_level"],
+        )
+        cand = cand.sort_values(["pair_id", "level_missing", "score", "taxon_id"], kind="mergesort")
+        n_candidates = cand.groupby("pair_id").size().rename("n_candidates")
+        best = cand.drop_duplicates("pair_id", keep="first").set_index("pair_id")
+        best = best.join(n_candidates)
+
+        pairs = pairs.join(best[["taxon_id", "rank", "rank_level", "n_candidates"]], on="pair_id")
+        pairs["taxonomy_status"] = np.select(
+            [pairs["n_candidates"].isna(), pairs["n_candidates"] > 1],
+            ["no_match", "multiple_match"],
+            default="exact_match",
+        )
+        resolved = queries.merge(pairs, on=["name_key", "target_level"], how="left")
+        resolved.index = names.index
+        return pd.DataFrame({
+            "taxon_id": resolved["taxon_id"].astype("Int64"),
+            "taxon_rank": resolved["rank"],
+            "taxon_rank_level": resolved["rank_level"],
+            "taxonomy_status": resolved["taxonomy_status"],
+        }, index=names.index)
+
+
+def resolve_names(df: pd.DataFrame, index: NameIndex, conn=None) -> pd.DataFrame:
+    """Resolve df.scientific_name_norm into taxon columns; DB fallback for index misses."""
+    rank_guesses = df["rank_guess"] if "rank_guess" in df.columns else pd.Series("unknown", index=df.index)
+    resolved = index.resolve(df["scientific_name_norm"], rank_guesses)
+
+    if conn is not None:
+        missing = df.loc[resolved["taxonomy_status"] == "no_match", "scientific_name_norm"]
+        miss_names = sorted({n.lower() for n in missing.dropna().astype(str) if n})
+        if miss_names and index.add_from_db(conn, miss_names):
+            retry = resolved["taxonomy_status"] == "no_match"
+            resolved.loc[retry] = index.resolve(
+                df.loc[retry, "scientific_name_norm"], rank_guesses[retry]
+            )
+    return resolved
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Resolve anthophila scientific names to taxon IDs")
     parser.add_argument("--manifest", required=True, help="Input CSV (deduped manifest)")
@@ -143,6 +329,26 @@ def main() -> int:
         action="store_true",
         help="Force using expanded_taxa when available",
     )
+    parser.add_argument(
+        "--release",
+        default=os.getenv("RELEASE", "r2"),
+        help="Taxonomy release the name index cache is keyed by",
+    )
+    parser.add_argument(
+        "--name-index-cache-dir",
+        default=str(NAME_INDEX_CACHE_DIR),
+        help="Directory for pickled name indexes (default: $IBRIDADB_CACHE_DIR or ~/.cache/ibridadb)",
+    )
+    parser.add_argument(
+        "--rebuild-name-index",
+        action="store_true",
+        help="Ignore any cached name index and rebuild it from the database",
+    )
+    parser.add_argument(
+        "--no-name-index",
+        action="store_true",
+        help="Resolve with per-name database lookups instead of the in-memory index",
+    )
 
     args = parser.parse_args()
 
@@ -176,33 +382,39 @@ def main() -> int:
 
         print(f"Resolving taxa using table: {table_name}")
 
-        name_map = fetch_name_map(conn, names, table_name)
-
-        taxon_ids = []
-        taxon_ranks = []
-        taxon_rank_levels = []
-        taxonomy_status = []
-
-        for _, row in df.iterrows():
-            name_key = str(row["scientific_name_norm"]).lower()
-            candidates = name_map.get(name_key, [])
-            if not candidates:
-                taxon_ids.append("")
-                taxon_ranks.append("")
-                taxon_rank_levels.append("")
-                taxonomy_status.append("no_match")
-                continue
-
-            chosen = choose_best_candidate(candidates, row.get("rank_guess", "unknown"))
-            taxon_ids.append(chosen.get("taxon_id", ""))
-            taxon_ranks.append(chosen.get("rank", ""))
-            taxon_rank_levels.append(chosen.get("rank_level", ""))
-            taxonomy_status.append("multiple_match" if len(candidates) > 1 else "exact_match")
-
-        df["taxon_id"] = taxon_ids
-        df["taxon_rank"] = taxon_ranks
-        df["taxon_rank_level"] = taxon_rank_levels
-        df["taxonomy_status"] = taxonomy_status
+        if args.no_name_index:
+            name_map = fetch_name_map(conn, names, table_name)
+            resolved = []
+            for name, rank_guess in zip(df["scientific_name_norm"], df["rank_guess"]):
+                candidates = name_map.get(str(name).lower(), [])
+                if not candidates:
+                    resolved.append((None, None, None, "no_match"))
+                    continue
+                chosen = choose_best_candidate(candidates, rank_guess)
+                resolved.append((
+                    chosen.get("taxon_id"),
+                    chosen.get("rank"),
+                    chosen.get("rank_level"),
+                    "multiple_match" if len(candidates) > 1 else "exact_match",
+                ))
+            resolved_df = pd.DataFrame(
+                resolved,
+                columns=["taxon_id", "taxon_rank", "taxon_rank_level", "taxonomy_status"],
+                index=df.index,
+            )
+            resolved_df["taxon_id"] = resolved_df["taxon_id"].astype("Int64")
+        else:
+            index = NameIndex.load_or_build(
+                conn,
+                table_name,
+                args.release,
+                cache_dir=Path(args.name_index_cache_dir),
+                rebuild=args.rebuild_name_index,
+            )
+            resolved_df = resolve_names(df, index, conn)
+
+        for column in ["taxon_id", "taxon_rank", "taxon_rank_level", "taxonomy_status"]:
+            df[column] = resolved_df[column]
 
         df.to_csv(output_path, index=False)
         print(f"Resolved manifest written to {output_path}")